@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark a running server with many concurrent sensor connections.
+
+Start the server to be measured first, *e.g.*, ``bin/mesito`` or
+``bin/mesito-asgi``, then point the benchmark to its port. Each connection
+keeps its socket alive and posts the states of its own machine one after
+another.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Any, List, Tuple
+
+
+async def post(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str,
+        path: str, data: Any) -> Tuple[int, bytes]:
+    """Post the JSON data over the kept-alive connection."""
+    body = json.dumps(data).encode('utf-8')
+    writer.write((
+        'POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\n'
+        'Content-Length: {}\r\nConnection: keep-alive\r\n\r\n'
+    ).format(path, host, len(body)).encode('latin-1') + body)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value.strip())
+
+    return status, await reader.readexactly(length)
+
+
+async def sensor(
+        host: str, port: int, machine_id: int, requests: int,
+        latencies: List[float]) -> int:
+    """Post the states of a single machine and count the failures."""
+    reader, writer = await asyncio.open_connection(host, port)
+
+    failures = 0
+    try:
+        for i in range(requests):
+            start = time.perf_counter()
+            status, _ = await post(
+                reader=reader,
+                writer=writer,
+                host=host,
+                path='/api/v1/put_machine_state',
+                data={
+                    'machine_id': machine_id,
+                    'start': 1577836800 + 60 * i,
+                    'stop': 1577836800 + 60 * (i + 1),
+                    'condition': 'working',
+                    'total_energy': 1.5
+                })
+            latencies.append(time.perf_counter() - start)
+
+            if status != 200:
+                failures += 1
+    finally:
+        writer.close()
+
+    return failures
+
+
+async def run(host: str, port: int, connections: int, requests: int) -> int:
+    """Register the machines and execute the sensors concurrently."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, body = await post(
+            reader=reader,
+            writer=writer,
+            host=host,
+            path='/api/v1/put_machines',
+            data=[{
+                'name': 'sensor-{:06d}'.format(i)
+            } for i in range(connections)])
+    finally:
+        writer.close()
+
+    if status != 200:
+        print("Failed to register the machines: {} {!r}".format(status, body))
+        return 1
+
+    machine_ids = [item['id'] for item in json.loads(body)]
+
+    latencies = []  # type: List[float]
+    start = time.perf_counter()
+
+    failures = await asyncio.gather(
+        *[
+            sensor(
+                host=host,
+                port=port,
+                machine_id=machine_id,
+                requests=requests,
+                latencies=latencies) for machine_id in machine_ids
+        ],
+        return_exceptions=True)
+
+    duration = time.perf_counter() - start
+
+    errors = [failure for failure in failures if isinstance(failure, Exception)]
+    rejected = sum(failure for failure in failures if isinstance(failure, int))
+
+    latencies.sort()
+    print("Connections:       {}".format(connections))
+    print("Requests:          {}".format(len(latencies)))
+    print("Rejected:          {}".format(rejected))
+    print("Broken sensors:    {}".format(len(errors)))
+    print(
+        "Throughput:        {:.1f} requests/s".format(
+            len(latencies) / duration))
+    if latencies:
+        print(
+            "Median latency:    {:.1f} ms".format(
+                1000 * statistics.median(latencies)))
+        print(
+            "99th percentile:   {:.1f} ms".format(
+                1000 * latencies[int(0.99 * (len(latencies) - 1))]))
+
+    return 0
+
+
+def main() -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--host", help="host of the server", default='localhost')
+    parser.add_argument(
+        "--port", help="port of the server", type=int, required=True)
+    parser.add_argument(
+        "--connections",
+        help="how many sensors post concurrently",
+        type=int,
+        default=1000)
+    parser.add_argument(
+        "--requests",
+        help="how many states each sensor posts",
+        type=int,
+        default=10)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            run(
+                host=str(args.host),
+                port=int(args.port),
+                connections=int(args.connections),
+                requests=int(args.requests)))
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the fleet concurrency profile against a naive per-bin scan.
+
+The naive scan intersects every state with every bin it overlaps in pure
+Python, while :py:func:`mesito.fleet.concurrency_profile` sweeps over
+the sorted events with numpy. Both read the same states from a fresh
+in-memory SQLite database.
+"""
+import argparse
+import random
+import sys
+import time
+from typing import List
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.fleet
+import mesito.model
+
+
+def naive(
+        session: sqlalchemy.orm.Session, start: int, stop: int,
+        resolution: int) -> List[float]:
+    """Compute the average count of the working machines bin by bin."""
+    state = mesito.model.MachineState
+
+    rows = session.query(
+        state.start,
+        state.stop).filter((state.start < stop) & (state.stop > start)
+                           & (state.condition == 'working')).all()
+
+    edges = list(range(start, stop, resolution)) + [stop]
+    bins = list(zip(edges[:-1], edges[1:]))
+    busy = [0.0] * len(bins)
+
+    for state_start, state_stop in rows:
+        for i, (bin_start, bin_stop) in enumerate(bins):
+            overlap = min(state_stop, bin_stop) - max(state_start, bin_start)
+            if overlap > 0:
+                busy[i] += overlap
+
+    return [
+        round(time_busy / (bin_stop - bin_start), 3)
+        for time_busy, (bin_start, bin_stop) in zip(busy, bins)
+    ]
+
+
+def main() -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--machines",
+        help="how many machines are in the fleet",
+        type=int,
+        default=2000)
+    parser.add_argument(
+        "--states", help="how many states per machine", type=int, default=24)
+    parser.add_argument(
+        "--resolution", help="width of a bin in seconds", type=int, default=60)
+    args = parser.parse_args()
+
+    engine = sqlalchemy.create_engine('sqlite://')
+    mesito.model.Base.metadata.create_all(engine)
+    session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+    rng = random.Random(0)
+
+    session.add_all([
+        mesito.model.Machine(name='machine-{:06d}'.format(i), version=1)
+        for i in range(int(args.machines))
+    ])
+
+    stop = 0
+    for machine_id in range(1, int(args.machines) + 1):
+        cursor = 0
+        for _ in range(int(args.states)):
+            duration = rng.randint(60, 7200)
+            session.add(
+                mesito.model.MachineState(
+                    machine_id=machine_id,
+                    start=cursor,
+                    stop=cursor + duration,
+                    condition=rng.choice(['working', 'idle']),
+                    avg_power_consumption=rng.uniform(1.0, 10.0)))
+            cursor += duration
+        stop = max(stop, cursor)
+    session.commit()
+
+    resolution = int(args.resolution)
+
+    begin = time.process_time()
+    naive_counts = naive(
+        session=session, start=0, stop=stop, resolution=resolution)
+    naive_duration = time.process_time() - begin
+
+    begin = time.process_time()
+    profile = mesito.fleet.concurrency_profile(
+        session=session,
+        start=0,
+        stop=stop,
+        resolution=resolution,
+        conditions=['working'])
+    sweep_duration = time.process_time() - begin
+
+    assert naive_counts == profile['profiles'][0]['average_count']
+
+    print("bins:  {}".format(len(naive_counts)))
+    print("naive: {:8.3f} s CPU".format(naive_duration))
+    print("sweep: {:8.3f} s CPU".format(sweep_duration))
+    print("naive/sweep: {:.1f}".format(naive_duration / sweep_duration))
+
+    session.close()
+    engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark the JSON codecs on typical large responses."""
+import argparse
+import statistics
+import sys
+import time
+from typing import Any, Callable, List
+
+import mesito.front.codec
+import mesito.front.out
+
+
+def machines(count: int) -> List[mesito.front.out.Machine]:
+    """Generate a machine list as served by the machines endpoint."""
+    return [
+        mesito.front.out.machine(
+            id=i, name='machine-{:06d}'.format(i), version=1)
+        for i in range(1, count + 1)
+    ]
+
+
+def machine_states(count: int) -> List[mesito.front.out.MachineState]:
+    """Generate a time series as served by the machine states endpoint."""
+    return [
+        mesito.front.out.machine_state(
+            machine_id=1,
+            start=1577836800 + 60 * i,
+            stop=1577836800 + 60 * (i + 1),
+            condition='working',
+            min_power_consumption=1.25 * i,
+            max_power_consumption=2.5 * i,
+            avg_power_consumption=1.75 * i,
+            total_energy=105.0 * i,
+            pieces=i % 7) for i in range(count)
+    ]
+
+
+def measure(func: Callable[[], Any], repetitions: int) -> float:
+    """Measure the median duration of the function in seconds."""
+    durations = []  # type: List[float]
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations)
+
+
+def main() -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--repetitions",
+        help="how many times to encode each payload",
+        type=int,
+        default=10)
+    args = parser.parse_args()
+
+    repetitions = int(args.repetitions)
+
+    payloads = [
+        ('50k machines', machines(count=50 * 1000)),
+        ('100k machine states', machine_states(count=100 * 1000)),
+    ]
+
+    print("Selected by default: {}".format(mesito.front.codec.select().name))
+
+    for name in mesito.front.codec.NAMES:
+        try:
+            codec = mesito.front.codec.select(name=name)
+        except ImportError:
+            print("{:<8} not installed".format(name))
+            continue
+
+        for payload_name, payload in payloads:
+            duration = measure(
+                func=lambda: codec.dumpb(payload),  # pylint: disable=cell-var-from-loop
+                repetitions=repetitions)
+            print(
+                "{:<8} {:<22} {:8.1f} ms".format(
+                    codec.name, payload_name, 1000 * duration))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
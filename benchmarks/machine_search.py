@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Benchmark the machine search and the keyset pagination over many machines."""
+import argparse
+import statistics
+import sys
+import time
+from typing import Any, Callable, List
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.model
+import mesito.operation
+import mesito.search
+
+
+def measure(func: Callable[[], Any], repetitions: int) -> float:
+    """Measure the median duration of the function in seconds."""
+    durations = []  # type: List[float]
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations)
+
+
+def main() -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--machines",
+        help="how many machines to insert",
+        type=int,
+        default=50 * 1000)
+    parser.add_argument(
+        "--repetitions",
+        help="how many times to run each query",
+        type=int,
+        default=50)
+    args = parser.parse_args()
+
+    count = int(args.machines)
+    repetitions = int(args.repetitions)
+
+    engine = sqlalchemy.create_engine('sqlite://')
+    mesito.model.Base.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            mesito.model.Machine.__table__.insert(),
+            [{
+                'name': 'hall-{}-press-{:06d}'.format(i % 7, i),
+                'version': 1
+            } for i in range(count)])
+
+    session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+    queries = [
+        ('prefix', {
+            'prefix': 'hall-3-press-0012'
+        }, False),
+        ('substring, scan', {
+            'substring': 'ss-0012'
+        }, False),
+    ]  # type: List[Any]
+
+    for name, data, fts in queries:
+        duration = measure(
+            func=lambda: mesito.operation.search_machines(  # pylint: disable=cell-var-from-loop
+                session=session, data=data, fts=fts),
+            repetitions=repetitions)
+        print("{:<24} {:8.2f} ms".format(name, 1000 * duration))
+
+    mesito.search.create_index(engine)
+
+    duration = measure(
+        func=lambda: mesito.operation.search_machines(
+            session=session, data={'substring': 'ss-0012'}, fts=True),
+        repetitions=repetitions)
+    print("{:<24} {:8.2f} ms".format('substring, FTS5', 1000 * duration))
+
+    duration = measure(
+        func=lambda: mesito.operation.get_machines(
+            session=session,
+            page={
+                'limit': 100,
+                'after': {
+                    'name': 'hall-5-press-030000',
+                    'id': 30001
+                }
+            }),
+        repetitions=repetitions)
+    print("{:<24} {:8.2f} ms".format('keyset page of 100', 1000 * duration))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Benchmark the cold start of the mesito commands in fresh interpreters."""
+import argparse
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Mapping
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# Each scenario runs in a new interpreter so that nothing is cached
+# in-process; the on-disk byte code caches apply.
+SCENARIOS = {
+    'mesito --help': [str(REPO_ROOT / 'bin' / 'mesito'), '--help'],
+    'mesito-setup --help': [str(REPO_ROOT / 'bin' / 'mesito-setup'), '--help'],
+    'create_server': [
+        '-c', 'import mesito.args\n'
+        'import mesito.main\n'
+        'import mesito.front.valid\n'
+        'mesito.main.create_server(args=mesito.args.parse_args('
+        '["--port", "0", "--database_url", "sqlite://"]))\n'
+        'mesito.front.valid.machine_put(data={"name": "x"})\n'
+        'mesito.front.valid.machine_state_put(data={})\n'
+    ],
+}  # type: Mapping[str, List[str]]
+
+
+def measure(command: List[str], repetitions: int) -> List[float]:
+    """Measure the wall-clock durations of running the command."""
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(
+        [str(REPO_ROOT)] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+
+    durations = []  # type: List[float]
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable] + command,
+                              cwd=str(REPO_ROOT),
+                              env=env,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - start)
+
+    return durations
+
+
+def main() -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--repetitions",
+        help="how many times to run each scenario",
+        type=int,
+        default=10)
+    parser.add_argument(
+        "--budget",
+        help="if set, fail if the median of create_server exceeds "
+        "this many seconds",
+        type=float)
+    args = parser.parse_args()
+
+    repetitions = int(args.repetitions)
+
+    medians = dict()
+    for name, command in SCENARIOS.items():
+        # Warm up the on-disk caches.
+        measure(command=command, repetitions=1)
+
+        durations = measure(command=command, repetitions=repetitions)
+        medians[name] = statistics.median(durations)
+        print(
+            '{:<24} median {:7.1f} ms, min {:7.1f} ms'.format(
+                name, 1000 * medians[name], 1000 * min(durations)))
+
+    if args.budget is not None and medians['create_server'] > args.budget:
+        print(
+            'The median startup of create_server exceeds '
+            'the budget of {} seconds.'.format(args.budget),
+            file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
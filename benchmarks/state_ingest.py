@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark the CPU time of the machine state ingestion per ingest path.
+
+Each path puts the same sequence of new and prolonged states into a fresh
+in-memory SQLite database, so that the measured time is dominated by
+the Python side of SQLAlchemy rather than by the disk.
+"""
+import argparse
+import sys
+import time
+from typing import List
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.front.valid
+import mesito.ingest
+import mesito.model
+
+
+def requests(machines: int,
+             states: int) -> List[mesito.front.valid.MachineStatePut]:
+    """Generate the put requests, every second one prolonging a state."""
+    result = []  # type: List[mesito.front.valid.MachineStatePut]
+    for i in range(states):
+        start = 1577836800 + 60 * (i // (2 * machines))
+        stop = start + (30 if (i // machines) % 2 == 0 else 60)
+
+        data, local_err = mesito.front.valid.machine_state_put(
+            data={
+                'machine_id': 1 + i % machines,
+                'start': start,
+                'stop': stop,
+                'condition': 'working',
+                'total_energy': 1.5
+            })
+        assert local_err is None, local_err
+        assert data is not None
+        result.append(data)
+
+    return result
+
+
+def run(
+        name: str, machines: int,
+        data: List[mesito.front.valid.MachineStatePut]) -> float:
+    """Ingest the data with the given path and return the CPU seconds."""
+    engine = sqlalchemy.create_engine('sqlite://')
+    mesito.model.Base.metadata.create_all(engine)
+
+    session_factory = sqlalchemy.orm.scoped_session(
+        sqlalchemy.orm.sessionmaker(bind=engine))
+
+    session = session_factory()
+    session.add_all([
+        mesito.model.Machine(name='machine-{:06d}'.format(i), version=1)
+        for i in range(machines)
+    ])
+    session.commit()
+    session_factory.remove()
+
+    put_machine_state = mesito.ingest.select(name=name)
+
+    # Warm up the caches of the compiled statements.
+    put_machine_state(session_factory(), data[0])
+    session_factory.remove()
+
+    start = time.process_time()
+    for item in data:
+        # A new session per state as in a request
+        _, err = put_machine_state(session_factory(), item)
+        assert err is None, err
+        session_factory.remove()
+
+    duration = time.process_time() - start
+
+    engine.dispose()
+    return duration
+
+
+def main() -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--machines",
+        help="how many machines to ingest for",
+        type=int,
+        default=100)
+    parser.add_argument(
+        "--states", help="how many states to put", type=int, default=20000)
+    args = parser.parse_args()
+
+    machines = int(args.machines)
+    data = requests(machines=machines, states=int(args.states))
+
+    durations = {}
+    for name in mesito.ingest.NAMES:
+        durations[name] = run(name=name, machines=machines, data=data)
+        print(
+            "{:<6} {:8.1f} us CPU per state".format(
+                name, 1e6 * durations[name] / len(data)))
+
+    print("core/orm: {:.2f}".format(durations['core'] / durations['orm']))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
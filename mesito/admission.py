@@ -0,0 +1,164 @@
+"""
+Bound the concurrency of the routes and shed the excess load.
+
+A request first tries to take a slot of its route's budget. If none is free,
+it waits in a bounded queue. A request which finds the queue full is
+rejected with 429 and a request which waits longer than the queue timeout
+is rejected with 503, both with ``Retry-After``. The waiting requests do not
+hold a database session as the session is acquired only by the handler.
+
+The primitives come from :py:mod:`threading` so that they cooperate with
+gevent once the standard library has been monkey-patched.
+"""
+import functools
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+import flask
+
+import mesito.front.error
+import mesito.front.out
+import mesito.gateway
+import mesito.route
+
+
+class Budget:
+    """Limit the requests in flight of a group of routes."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+            self, name: str, max_in_flight: int, max_queued: int,
+            queue_timeout: float, retry_after: int) -> None:
+        """
+        Initialize with the given values.
+
+        :param name: name of the budget as reported in the statistics
+        :param max_in_flight: maximum number of concurrently handled requests
+        :param max_queued: maximum number of requests waiting for a slot
+        :param queue_timeout: maximum wait for a slot, in seconds
+        :param retry_after: value of the Retry-After header, in seconds
+        """
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+
+        self._slots = threading.Semaphore(max_in_flight)
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> int:
+        """
+        Acquire a slot.
+
+        :return: 0 if acquired, otherwise the status code of the rejection
+        """
+        if self._slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+            with self._lock:
+                self.in_flight += 1
+            return 0
+
+        with self._lock:
+            if self.queued >= self.max_queued:
+                self.shed += 1
+                return 429
+
+            self.queued += 1
+
+        acquired = self._slots.acquire(timeout=self.queue_timeout)  # pylint: disable=consider-using-with
+
+        with self._lock:
+            self.queued -= 1
+            if not acquired:
+                self.shed += 1
+                return 503
+
+            self.in_flight += 1
+
+        return 0
+
+    def _release(self) -> None:
+        """Release the slot."""
+        with self._lock:
+            self.in_flight -= 1
+
+        self._slots.release()
+
+    def guard(self, handler: Callable[[], Any]) -> Callable[[], Any]:
+        """Wrap the route handler so that it observes the budget."""
+
+        @functools.wraps(handler)
+        def guarded() -> Any:
+            """Handle the request if there is a slot, or reject it."""
+            status = self._acquire()
+            if status != 0:
+                response = flask.current_app.response_class(
+                    mesito.route.json_codec().dumpb(
+                        mesito.front.error.overloaded(
+                            budget=self.name, retry_after=self.retry_after)),
+                    status=status,
+                    mimetype='application/json')
+                response.headers['Retry-After'] = str(self.retry_after)
+                return response
+
+            try:
+                return handler()
+            finally:
+                self._release()
+
+        return guarded
+
+    def guard_event(
+            self, handler: mesito.gateway.Handler) -> mesito.gateway.Handler:
+        """Wrap the Socket.IO event handler so that it observes the budget."""
+
+        @functools.wraps(handler)
+        def guarded(data: Any, key: Optional[Any] = None) -> Tuple[int, Any]:
+            """Handle the event if there is a slot, or reject it."""
+            status = self._acquire()
+            if status != 0:
+                return status, mesito.front.error.overloaded(
+                    budget=self.name, retry_after=self.retry_after)
+
+            try:
+                return handler(data, key)
+            finally:
+                self._release()
+
+        return guarded
+
+    def stats(self) -> mesito.front.out.BudgetStats:
+        """Report the current load of the budget."""
+        with self._lock:
+            return mesito.front.out.budget_stats(
+                name=self.name,
+                in_flight=self.in_flight,
+                queued=self.queued,
+                shed=self.shed,
+                max_in_flight=self.max_in_flight,
+                max_queued=self.max_queued)
+
+
+class Budgets:
+    """Group the budgets of the routes."""
+
+    def __init__(self, ingest: Budget, read: Budget) -> None:
+        """
+        Initialize with the given values.
+
+        :param ingest: budget of the routes which write to the database
+        :param read:
+            budget of the read endpoints, separate so that the dashboards
+            can not starve the ingestion
+        """
+        self.ingest = ingest
+        self.read = read
+
+    def stats(self) -> List[mesito.front.out.BudgetStats]:
+        """Report the current load of all the budgets."""
+        return [self.ingest.stats(), self.read.stats()]
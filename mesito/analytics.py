@@ -0,0 +1,352 @@
+"""
+Execute the heavy analytics in a bounded pool of worker processes.
+
+The server handles all the requests in a single process, so a CPU-bound
+aggregation blocks the ingestion until it finishes. The analytics routes
+therefore submit their queries as named tasks (see :py:data:`TASKS`) to
+a pool of worker processes. Each worker opens its own database engines on
+start-up and executes the task in its own session, so the analytics scale
+across the cores while the server process only waits for the result.
+
+If read replicas are given, each task is executed on the next replica which
+is fresh enough, picked by a :py:class:`mesito.replica.Router` of
+the worker, so that the heavy queries do not compete with the ingestion on
+the primary. The primary serves the task only if no replica is fresh
+enough. The tasks do not follow the caller's own recent writes to
+the primary; the results may lag by up to the maximum lag of the replicas.
+
+Each worker is connected to the server by a pipe and executes one task at
+a time. The server waits for an idle worker on a :py:class:`queue.Queue`
+and for the result by polling the pipe, so the waits only yield to
+the other greenlets once gevent has monkey-patched the standard library;
+no helper thread is involved. The workers are spawned rather than forked
+so that they do not inherit the patched standard library nor
+the connections of the server.
+
+The timeout of a task runs from its submission and includes the wait for
+an idle worker. A worker which is still busy with the task once
+the timeout elapses is terminated and replaced.
+"""
+import multiprocessing
+import multiprocessing.connection
+import queue
+import signal
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.archive
+import mesito.fleet
+import mesito.front.error
+import mesito.operation
+import mesito.replica
+import mesito.shift
+import mesito.timeline
+
+# State of a worker process, set by _initialize
+_ROUTER = None  # type: Optional[mesito.replica.Router]
+_ARCHIVE = None  # type: Optional[mesito.archive.Archive]
+_CALENDAR = mesito.shift.default()
+
+# yapf: disable
+#: tasks which can be executed in the pool, called with the session,
+#: the archive, the shift calendar and the keyword arguments of the submission
+TASKS = {
+    'machine_timeline':
+    lambda session, archive, calendar, **kwargs:
+    mesito.timeline.machine_timeline(
+        session=session, archive=archive, **kwargs),
+    'machine_state_aggregates':
+    lambda session, archive, calendar, **kwargs:
+    mesito.operation.aggregate_machine_states(
+        session=session, archive=archive, **kwargs),
+    'concurrency_profile':
+    lambda session, archive, calendar, **kwargs:
+    mesito.fleet.concurrency_profile(session=session, **kwargs),
+    'shift_report':
+    lambda session, archive, calendar, **kwargs:
+    mesito.operation.shift_report(
+        session=session, calendar=calendar, **kwargs)
+}  # type: Dict[str, Callable[..., Any]]
+# yapf: enable
+
+
+# yapf: disable
+def compute(
+        session: sqlalchemy.orm.Session,
+        task: str,
+        kwargs: Mapping[str, Any],
+        archive: Optional[mesito.archive.Archive],
+        calendar: mesito.shift.Calendar
+) -> Any:  # yapf: enable
+    """
+    Compute the task in the given session, without a pool.
+
+    :param session: database session
+    :param task: name of the task in :py:data:`TASKS`
+    :param kwargs: keyword arguments of the task
+    :param archive: archive of the machine states, if any
+    :param calendar: shift calendar of the plant
+    :return: result of the task
+    """
+    return TASKS[task](session, archive, calendar, **kwargs)
+
+
+# yapf: disable
+def _initialize(
+        database_url: str,
+        replica_urls: List[str],
+        max_lag: float,
+        archive: Optional[mesito.archive.Archive],
+        calendar: mesito.shift.Calendar
+) -> None:  # yapf: enable
+    """Set up the state of a worker process."""
+    # pylint: disable=global-statement
+    global _ROUTER, _ARCHIVE, _CALENDAR
+
+    _ROUTER = mesito.replica.Router(
+        primary=sqlalchemy.create_engine(database_url),
+        replicas=[sqlalchemy.create_engine(url) for url in replica_urls],
+        max_lag=max_lag,
+        read_your_writes=0.0)
+    _ARCHIVE = archive
+    _CALENDAR = calendar
+
+    # The server shuts the pool down; the workers ignore the interruption
+    # sent to the whole process group.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _execute(task: str, kwargs: Mapping[str, Any]) -> Any:
+    """Execute the task in a worker process."""
+    assert _ROUTER is not None, "Expected the worker initialized"
+
+    session = sqlalchemy.orm.Session(bind=_ROUTER.pick())
+    try:
+        return compute(
+            session=session,
+            task=task,
+            kwargs=kwargs,
+            archive=_ARCHIVE,
+            calendar=_CALENDAR)
+    finally:
+        session.close()
+
+
+# yapf: disable
+def _serve(
+        requests: multiprocessing.connection.Connection,
+        replies: multiprocessing.connection.Connection,
+        database_url: str,
+        replica_urls: List[str],
+        max_lag: float,
+        archive: Optional[mesito.archive.Archive],
+        calendar: mesito.shift.Calendar
+) -> None:  # yapf: enable
+    """Execute the tasks received over the pipe until it is closed."""
+    # pylint: disable=too-many-arguments
+    _initialize(
+        database_url=database_url,
+        replica_urls=replica_urls,
+        max_lag=max_lag,
+        archive=archive,
+        calendar=calendar)
+
+    while True:
+        try:
+            message = requests.recv()
+        except EOFError:
+            return
+
+        if message is None:
+            return
+
+        task, kwargs = message
+
+        try:
+            reply = (
+                _execute(task=task, kwargs=kwargs), None
+            )  # type: Tuple[Any, Optional[Exception]]
+        except Exception as exception:  # pylint: disable=broad-except
+            reply = (None, exception)
+
+        try:
+            replies.send(reply)
+        except Exception as exception:  # pylint: disable=broad-except
+            # The exception or the result could not be pickled.
+            replies.send((None, RuntimeError(repr(exception))))
+
+
+class _Worker:
+    """Represent a worker process connected by a pipe."""
+
+    # yapf: disable
+    def __init__(
+            self,
+            context: Any,
+            database_url: str,
+            replica_urls: List[str],
+            max_lag: float,
+            archive: Optional[mesito.archive.Archive],
+            calendar: mesito.shift.Calendar
+    ) -> None:  # yapf: enable
+        """Start the worker process."""
+        # pylint: disable=too-many-arguments
+        # The pipes are one-way since a two-way pipe is a socket pair which
+        # gevent makes non-blocking, also in the worker process.
+        requests, self.requests = context.Pipe(duplex=False)
+        self.replies, replies = context.Pipe(duplex=False)
+
+        self.process = context.Process(
+            target=_serve,
+            args=(
+                requests, replies, database_url, replica_urls, max_lag,
+                archive, calendar),
+            daemon=True)
+        self.process.start()
+
+        requests.close()
+        replies.close()
+
+    def kill(self) -> None:
+        """Terminate the worker regardless of its task."""
+        self.process.terminate()
+        self.process.join()
+        self.requests.close()
+        self.replies.close()
+
+    def stop(self, timeout: float) -> None:
+        """Ask the worker to exit and terminate it if it does not."""
+        try:
+            self.requests.send(None)
+        except OSError:
+            pass
+
+        self.process.join(timeout)
+        self.kill()
+
+
+class Pool:
+    """Execute the analytics tasks in the worker processes."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    # yapf: disable
+    def __init__(
+            self,
+            database_url: str,
+            workers: int,
+            timeout: float,
+            archive: Optional[mesito.archive.Archive] = None,
+            calendar: Optional[mesito.shift.Calendar] = None,
+            replica_urls: Optional[List[str]] = None,
+            replica_max_lag: float = 5.0
+    ) -> None:  # yapf: enable
+        """
+        Start the workers.
+
+        :param database_url:
+            SQLAlchemy database URL of the primary, serving the tasks if
+            there is no fresh replica
+        :param workers: number of the worker processes
+        :param timeout: maximum duration of a task from its submission,
+            in seconds
+        :param archive: if set, the timelines and the aggregates include
+            the archived states
+        :param calendar: shifts of the plant; if not set, the default ones
+        :param replica_urls:
+            SQLAlchemy database URLs of the read replicas executing the tasks
+        :param replica_max_lag:
+            maximum lag of a replica to execute a task, in seconds
+        """
+        # pylint: disable=too-many-arguments
+        self.workers = workers
+        self.timeout = timeout
+
+        self._context = multiprocessing.get_context('spawn')
+        self._database_url = database_url
+        self._replica_urls = list(replica_urls or [])
+        self._replica_max_lag = replica_max_lag
+        self._archive = archive
+        self._calendar = (
+            calendar if calendar is not None else mesito.shift.default())
+
+        self._idle = queue.Queue()  # type: queue.Queue[_Worker]
+        for _ in range(workers):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self) -> _Worker:
+        """Start a new worker process."""
+        return _Worker(
+            context=self._context,
+            database_url=self._database_url,
+            replica_urls=self._replica_urls,
+            max_lag=self._replica_max_lag,
+            archive=self._archive,
+            calendar=self._calendar)
+
+    # yapf: disable
+    def run(
+            self,
+            task: str,
+            kwargs: Mapping[str, Any]
+    ) -> Tuple[Any, Optional[mesito.front.error.TaskTimedOut]]:  # yapf: enable
+        """
+        Execute the task in a worker and wait for its result.
+
+        An exception raised by the task is re-raised.
+
+        :param task: name of the task in :py:data:`TASKS`
+        :param kwargs: keyword arguments of the task, picklable
+        :return: result of the task, error if it timed out
+        """
+        if task not in TASKS:
+            raise KeyError("Unknown analytics task: {!r}".format(task))
+
+        deadline = time.monotonic() + self.timeout
+        timed_out = mesito.front.error.task_timed_out(
+            task=task, timeout=self.timeout)
+
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            return None, timed_out
+
+        try:
+            if time.monotonic() >= deadline:
+                return None, timed_out
+
+            worker.requests.send((task, dict(kwargs)))
+
+            if not worker.replies.poll(max(0.0,
+                                              deadline - time.monotonic())):
+                # The task is abandoned together with its worker.
+                worker.kill()
+                worker = self._start_worker()
+                return None, timed_out
+
+            result, exception = worker.replies.recv()
+        except (EOFError, OSError):
+            # The worker died in the middle of the task.
+            worker.kill()
+            worker = self._start_worker()
+            raise
+        finally:
+            self._idle.put(worker)
+
+        if exception is not None:
+            raise exception
+
+        return result, None
+
+    def shutdown(self) -> None:
+        """Stop the workers once their current tasks finish."""
+        for _ in range(self.workers):
+            try:
+                worker = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                break
+
+            worker.stop(timeout=self.timeout)
@@ -2,61 +2,352 @@
 
 # pylint: disable=invalid-name
 # pylint: disable=no-member
-from typing import Any, Tuple
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import flask
 import flask_cors
 import flask_socketio
 import sqlalchemy.orm
 
+import mesito.admission
+import mesito.analytics
+import mesito.archive
+import mesito.assets
+import mesito.board
+import mesito.changelog
+import mesito.compress
+import mesito.front.codec
+import mesito.gateway
+import mesito.handle
+import mesito.idempotency
+import mesito.ingest
+import mesito.recent
+import mesito.replica
 import mesito.route
+import mesito.search
+import mesito.shift
 
 
+def _unguarded(handler: Callable[[], Any]) -> Callable[[], Any]:
+    """Leave the route handler as-is if no guard is set."""
+    return handler
+
+
+# yapf: disable
 def _v1_api_blueprint(
-        session_factory: sqlalchemy.orm.scoped_session) -> flask.Blueprint:
+        session_factory: sqlalchemy.orm.scoped_session,
+        archive: Optional[mesito.archive.Archive],
+        budgets: Optional[mesito.admission.Budgets],
+        board: mesito.board.Board,
+        recent: mesito.recent.Recent,
+        name_fts: bool,
+        idempotency: Optional[mesito.idempotency.Idempotency],
+        read_session_factory: sqlalchemy.orm.scoped_session,
+        router: Optional[mesito.replica.Router],
+        state_ingest: mesito.ingest.PutMachineState,
+        shift_calendar: mesito.shift.Calendar,
+        gap_table: bool,
+        change_log: bool,
+        analytics: Optional[mesito.analytics.Pool]
+) -> flask.Blueprint:  # yapf: enable
     """
     Produce v1 API blueprint.
 
     :param session_factory: SQLAlchemy session factory
+    :param archive: archive of cold machine states, if available
+    :param budgets: budgets of the ingest and read routes, if any
+    :param board: current state of every machine
+    :param recent: latest states of every machine
+    :param name_fts: if set, the FTS5 table of the machine names is available
+    :param idempotency: responses remembered for the retried ingest requests
+    :param read_session_factory:
+        SQLAlchemy session factory of the read endpoints
+    :param router: routes the reads to the replicas, if any
+    :param state_ingest: operation upserting a machine state
+    :param shift_calendar: shift calendar of the plant
+    :param gap_table: if set, the gap table is maintained and read
+    :param change_log: if set, the change log is maintained and served
+    :param analytics: pool executing the heavy analytics, if any
     :return: flask application
     """
     blueprint = flask.Blueprint(name='api_v1', import_name=__name__)
 
+    ingest_budget = budgets.ingest.guard if budgets is not None else _unguarded
+    read = budgets.read.guard if budgets is not None else _unguarded
+
+    replay = idempotency.guard if idempotency is not None else _unguarded
+    track = router.track_writes if router is not None else _unguarded
+
+    def ingest(handler: Callable[[], Any]) -> Callable[[], Any]:
+        """Replay the retried requests before they take an ingest slot."""
+        return replay(ingest_budget(track(handler)))
+
     blueprint.route(
         '/put_machine', methods=['POST'], endpoint='put_machine')(
-            lambda: mesito.route.put_machine(session_factory=session_factory))
+            ingest(
+                lambda: mesito.route.put_machine(
+                    session_factory=session_factory)))
+
+    blueprint.route(
+        '/put_machines', methods=['POST'], endpoint='put_machines')(
+            ingest(
+                lambda: mesito.route.put_machines(
+                    session_factory=session_factory)))
+
+    blueprint.route(
+        '/machines', methods=['POST'], endpoint='machines')(
+            read(
+                lambda: mesito.route.serve_machines(
+                    session_factory=read_session_factory)))
+
+    blueprint.route(
+        '/machines/changes', methods=['POST'], endpoint='machine_changes')(
+            read(
+                lambda: mesito.route.serve_machine_changes(
+                    session_factory=read_session_factory)))
+
+    blueprint.route(
+        '/search_machines', methods=['POST'], endpoint='search_machines')(
+            read(
+                lambda: mesito.route.serve_machine_search(
+                    session_factory=read_session_factory, fts=name_fts)))
+
+    blueprint.route(
+        '/put_machine_state', methods=['POST'], endpoint='put_machine_state')(
+            ingest(
+                lambda: mesito.route.put_machine_state(
+                    session_factory=session_factory,
+                    board=board,
+                    recent=recent,
+                    state_ingest=state_ingest,
+                    gap_table=gap_table,
+                    change_log=change_log)))
 
     blueprint.route(
-        '/machines', methods=['POST'], endpoint='machines'
-    )(lambda: mesito.route.serve_machines(session_factory=session_factory))
+        '/extend_machine_state',
+        methods=['POST'],
+        endpoint='extend_machine_state')(
+            ingest(
+                lambda: mesito.route.extend_machine_state(
+                    session_factory=session_factory,
+                    board=board,
+                    recent=recent,
+                    gap_table=gap_table,
+                    change_log=change_log)))
+
+    blueprint.route(
+        '/machine_states', methods=['POST'], endpoint='machine_states')(
+            read(
+                lambda: mesito.route.serve_machine_states(
+                    session_factory=read_session_factory, archive=archive)))
+
+    blueprint.route(
+        '/machine_state_aggregates',
+        methods=['POST'],
+        endpoint='machine_state_aggregates')(
+            read(
+                lambda: mesito.route.serve_analytics(
+                    task='machine_state_aggregates',
+                    session_factory=read_session_factory,
+                    archive=archive,
+                    calendar=shift_calendar,
+                    pool=analytics)))
+
+    blueprint.route(
+        '/machine_timeline', methods=['POST'], endpoint='machine_timeline')(
+            read(
+                lambda: mesito.route.serve_analytics(
+                    task='machine_timeline',
+                    session_factory=read_session_factory,
+                    archive=archive,
+                    calendar=shift_calendar,
+                    pool=analytics)))
+
+    blueprint.route(
+        '/machine_state_gaps',
+        methods=['POST'],
+        endpoint='machine_state_gaps')(
+            read(
+                lambda: mesito.route.serve_machine_state_gaps(
+                    session_factory=read_session_factory,
+                    gap_table=gap_table)))
+
+    blueprint.route(
+        '/concurrency_profile',
+        methods=['POST'],
+        endpoint='concurrency_profile')(
+            read(
+                lambda: mesito.route.serve_analytics(
+                    task='concurrency_profile',
+                    session_factory=read_session_factory,
+                    archive=archive,
+                    calendar=shift_calendar,
+                    pool=analytics)))
+
+    blueprint.route(
+        '/shift_report', methods=['POST'], endpoint='shift_report')(
+            read(
+                lambda: mesito.route.serve_analytics(
+                    task='shift_report',
+                    session_factory=read_session_factory,
+                    archive=archive,
+                    calendar=shift_calendar,
+                    pool=analytics)))
+
+    blueprint.route(
+        '/current_states', methods=['POST'], endpoint='current_states')(
+            lambda: mesito.route.serve_current_states(board=board))
+
+    blueprint.route(
+        '/recent_power', methods=['POST'], endpoint='recent_power')(
+            lambda: mesito.route.serve_recent_power(
+                session_factory=session_factory, recent=recent))
+
+    if change_log:
+        # The long polls wait most of the time and are hence not budgeted,
+        # but the number of the waiting ones is capped.
+        waiters = threading.BoundedSemaphore(mesito.changelog.MAX_WAITERS)
+        blueprint.route(
+            '/machine_state_changes',
+            methods=['POST'],
+            endpoint='machine_state_changes')(
+                lambda: mesito.route.serve_machine_state_changes(
+                    session_factory=read_session_factory, waiters=waiters))
 
     blueprint.route(
-        '/put_machine_state', methods=['POST'], endpoint='put_machine_state'
-    )(lambda: mesito.route.put_machine_state(session_factory=session_factory))
+        '/load', methods=['GET', 'POST'],
+        endpoint='load')(lambda: mesito.route.serve_load(budgets=budgets))
 
     return blueprint
 
 
-def _static_blueprint() -> flask.Blueprint:
+def _static_blueprint(assets: mesito.assets.Assets) -> flask.Blueprint:
     """
     Produce route blueprint for serving static files.
 
+    :param assets: static files in memory
     :return: generated blueprint
     """
     blueprint = flask.Blueprint('static', __name__)
 
-    blueprint.route('/', endpoint='serve_index')(mesito.route.serve_index)
+    blueprint.route(
+        '/', endpoint='serve_index')(
+            lambda: mesito.route.serve_index(assets=assets))
 
     blueprint.route(
-        '/<path:path>', endpoint='serve_static')(mesito.route.serve_static)
+        '/<path:path>', endpoint='serve_static')(
+            lambda path: mesito.route.serve_static(assets=assets, path=path))
 
     return blueprint
 
 
+# yapf: disable
+def _register_gateway(
+        socketio: flask_socketio.SocketIO,
+        session_factory: sqlalchemy.orm.scoped_session,
+        board: mesito.board.Board,
+        recent: mesito.recent.Recent,
+        state_ingest: mesito.ingest.PutMachineState,
+        gap_table: bool,
+        change_log: bool,
+        tokens: List[str],
+        budgets: Optional[mesito.admission.Budgets],
+        idempotency: Optional[mesito.idempotency.Idempotency]
+) -> None:  # yapf: enable
+    """
+    Handle the states streamed by the gateways over Socket.IO.
+
+    See :py:mod:`mesito.gateway` for the protocol.
+
+    :param socketio: Socket.IO server of the application
+    :param session_factory: SQLAlchemy session factory
+    :param board: current state of every machine
+    :param recent: latest states of every machine
+    :param state_ingest: operation upserting a machine state
+    :param gap_table: if set, the gap table is maintained
+    :param change_log: if set, the change log is maintained
+    :param tokens: tokens of the gateways
+    :param budgets: budgets of the routes; the events observe the ingest one
+    :param idempotency: acknowledgements remembered for the retried events
+    """
+    # pylint: disable=too-many-arguments
+
+    def connect() -> bool:
+        """Refuse the gateways which are not authorized."""
+        return mesito.gateway.authorized(
+            tokens=tokens,
+            authorization=flask.request.headers.get('Authorization', None),
+            token=flask.request.args.get('token', None))
+
+    def put_machine_state(data: Any, key: Optional[Any]) -> Tuple[int, Any]:  # pylint: disable=unused-argument
+        """Upsert the state and acknowledge with its ID or the error."""
+        return mesito.handle.put_machine_state(
+            session=session_factory(),
+            data=data,
+            board=board,
+            recent=recent,
+            state_ingest=state_ingest,
+            gap_table=gap_table,
+            change_log=change_log)
+
+    def extend_machine_state(data: Any, key: Optional[Any]) -> Tuple[int, Any]:  # pylint: disable=unused-argument
+        """Prolong the state and acknowledge with it or the error."""
+        return mesito.handle.extend_machine_state(
+            session=session_factory(),
+            data=data,
+            board=board,
+            recent=recent,
+            gap_table=gap_table,
+            change_log=change_log)
+
+    namespace = mesito.gateway.NAMESPACE
+    socketio.on_event('connect', connect, namespace=namespace)
+
+    def register(event: str, handler: mesito.gateway.Handler) -> None:
+        """Replay the retried events before they take an ingest slot."""
+        if budgets is not None:
+            handler = budgets.ingest.guard_event(handler)
+
+        if idempotency is not None:
+            handler = idempotency.guard_event(
+                event='{}:{}'.format(namespace, event), handler=handler)
+
+        def acknowledge(data: Any, key: Optional[Any] = None) -> Any:
+            """Acknowledge with the body without the status code."""
+            _, ack = handler(data, key)
+            return ack
+
+        socketio.on_event(event, acknowledge, namespace=namespace)
+
+    handlers = {
+        'put_machine_state': put_machine_state,
+        'extend_machine_state': extend_machine_state
+    }  # type: Dict[str, mesito.gateway.Handler]
+
+    for event in mesito.gateway.EVENTS:
+        register(event=event, handler=handlers[event])
+
+
 # yapf: disable
 def produce(
         session_factory: sqlalchemy.orm.scoped_session,
-        cors_allowed_all_origins: bool
+        cors_allowed_all_origins: bool,
+        archive: Optional[mesito.archive.Archive] = None,
+        json_codec: Optional[mesito.front.codec.Codec] = None,
+        compression: Optional[mesito.compress.Compression] = None,
+        budgets: Optional[mesito.admission.Budgets] = None,
+        board: Optional[mesito.board.Board] = None,
+        recent: Optional[mesito.recent.Recent] = None,
+        idempotency: Optional[mesito.idempotency.Idempotency] = None,
+        router: Optional[mesito.replica.Router] = None,
+        state_ingest: Optional[mesito.ingest.PutMachineState] = None,
+        shift_calendar: Optional[mesito.shift.Calendar] = None,
+        gap_table: bool = False,
+        change_log: bool = False,
+        gateway_tokens: Optional[List[str]] = None,
+        analytics: Optional[mesito.analytics.Pool] = None,
+        assets: Optional[mesito.assets.Assets] = None
 ) -> Tuple[flask.Flask, flask_socketio.SocketIO]:  # yapf: enable
     """
     Produce our flask application.
@@ -64,26 +355,141 @@ def produce(
     :param session_factory: SQLAlchemy session factory
     :param cors_allowed_origins:
         if set, changes the CORS allowed origins of the app to everybody
+    :param archive:
+        if set, the read endpoints merge the archived machine states
+    :param json_codec:
+        codec used for the responses and Socket.IO payloads;
+        if not set, the fastest installed codec is used
+    :param compression:
+        if set, compresses the responses negotiated by ``Accept-Encoding``
+    :param budgets:
+        if set, bounds the concurrency of the ingest and read routes
+    :param board:
+        current state of every machine;
+        if not set, a new board is warmed from the database
+    :param recent:
+        ring buffers of the latest states of every machine;
+        if not set, the buffers of the default capacity are used
+    :param idempotency:
+        if set, the retried ingest requests with the same ``Idempotency-Key``
+        are answered with the remembered responses
+    :param router:
+        if set, the read endpoints are routed to the read replicas
+    :param state_ingest:
+        operation upserting a machine state;
+        if not set, the Core statements of :py:mod:`mesito.ingest` are used
+    :param shift_calendar:
+        shift calendar of the plant;
+        if not set, three eight-hour shifts every day in UTC
+    :param gap_table:
+        if set, the gap table is updated on each put and the gaps are read
+        from it; see :py:mod:`mesito.gap`
+    :param change_log:
+        if set, every change of a machine state is appended to the change log
+        and the log is served to the consumers; see :py:mod:`mesito.changelog`
+    :param gateway_tokens:
+        if set, the gateways authenticated with these tokens can stream
+        the states over Socket.IO; see :py:mod:`mesito.gateway`
+    :param analytics:
+        if set, the timelines, the aggregates, the concurrency profiles and
+        the shift reports are computed in this pool of worker processes;
+        see :py:mod:`mesito.analytics`
+    :param assets:
+        static files served from memory;
+        if not set, the static directory of the package is read once
     :return: flask application
     """
     app = flask.Flask(__name__)
 
-    v1_api = _v1_api_blueprint(session_factory=session_factory)
+    if json_codec is None:
+        json_codec = mesito.front.codec.select()
+
+    app.extensions['mesito.front.codec'] = json_codec
+    app.logger.info("Encoding JSON with: %s", json_codec.name)
+
+    if analytics is not None:
+        app.extensions['mesito.analytics'] = analytics
+
+    if state_ingest is None:
+        state_ingest = mesito.ingest.put_machine_state
+
+    if shift_calendar is None:
+        shift_calendar = mesito.shift.default()
+
+    if board is None:
+        board = mesito.board.Board()
+        try:
+            board.warm(session=session_factory())
+        finally:
+            session_factory.remove()
+
+    if recent is None:
+        recent = mesito.recent.Recent()
+
+    try:
+        name_fts = mesito.search.has_fts(session=session_factory())
+    finally:
+        session_factory.remove()
+
+    if name_fts:
+        app.logger.info("Searching machine names with the FTS5 table.")
+
+    read_session_factory = (
+        sqlalchemy.orm.scoped_session(router.read_session)
+        if router is not None else session_factory)
+
+    v1_api = _v1_api_blueprint(
+        session_factory=session_factory,
+        archive=archive,
+        budgets=budgets,
+        board=board,
+        recent=recent,
+        name_fts=name_fts,
+        idempotency=idempotency,
+        read_session_factory=read_session_factory,
+        router=router,
+        state_ingest=state_ingest,
+        shift_calendar=shift_calendar,
+        gap_table=gap_table,
+        change_log=change_log,
+        analytics=analytics)
     app.register_blueprint(v1_api, url_prefix='/api/v1')
 
-    static = _static_blueprint()
+    if assets is None:
+        assets = mesito.assets.Assets(directory=mesito.assets.STATIC_DIR)
+
+    static = _static_blueprint(assets=assets)
     app.register_blueprint(static)
 
+    if compression is not None:
+        app.after_request(compression.apply)
+
     if cors_allowed_all_origins:
         flask_cors.CORS(app)
-        socketio = flask_socketio.SocketIO(app=app, cors_allowed_origins="*")
+        socketio = flask_socketio.SocketIO(
+            app=app, cors_allowed_origins="*", json=json_codec)
     else:
-        socketio = flask_socketio.SocketIO(app=app)
+        socketio = flask_socketio.SocketIO(app=app, json=json_codec)
+
+    if gateway_tokens is not None:
+        _register_gateway(
+            socketio=socketio,
+            session_factory=session_factory,
+            board=board,
+            recent=recent,
+            state_ingest=state_ingest,
+            gap_table=gap_table,
+            change_log=change_log,
+            tokens=gateway_tokens,
+            budgets=budgets,
+            idempotency=idempotency)
 
     def cleanup(
             resp_or_exc: Any) -> Any:  # pylint: disable=unused-argument, unused-variable
         """Release resources acquired in an app context."""
         session_factory.remove()
+        if read_session_factory is not session_factory:
+            read_session_factory.remove()
 
     app.teardown_appcontext(cleanup)
 
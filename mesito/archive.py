@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Move cold machine states out of the database into local chunk files.
+
+Each chunk holds the states of a single machine which started in a single
+calendar month (UTC). The chunk is stored column-wise: every column is
+compressed separately so that a reader can memory-map the file and
+decompress only the columns it needs.
+"""
+import argparse
+import array
+import calendar
+import datetime
+import logging
+import math
+import mmap
+import os
+import pathlib
+import struct
+import sys
+import time
+import zlib
+from typing import Any, Dict, List, Sequence, Tuple, Iterator
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.front.out
+import mesito.model
+
+logging.basicConfig(level=logging.INFO)
+
+# Header: magic, format version, row count, min start, max stop
+_HEADER = struct.Struct('<4sHIqq')
+_MAGIC = b'MSTC'
+_FORMAT_VERSION = 1
+
+# Column table entry: offset and length of the compressed column
+_COLUMN_ENTRY = struct.Struct('<QQ')
+
+# (column name, array type code); the order defines the layout of the file
+_COLUMNS = [
+    ('start', 'q'),
+    ('stop', 'q'),
+    ('condition', 'B'),
+    ('min_power_consumption', 'd'),
+    ('max_power_consumption', 'd'),
+    ('avg_power_consumption', 'd'),
+    ('total_energy', 'd'),
+    ('pieces', 'q'),
+]  # type: List[Tuple[str, str]]
+
+_CONDITIONS = [cond.value for cond in mesito.model.MachineCondition]
+
+_CONDITION_CODES = {cond: i for i, cond in enumerate(_CONDITIONS)}
+
+# Sentinel for a missing number of pieces; float columns use NaN instead.
+_NO_PIECES = -1
+
+# Number of the archived states deleted per batch, bounding the ``IN`` list of
+# the deletion; SQLite limits the number of bound variables in a statement to
+# 999 by default.
+_IN_CHUNK = 500
+
+
+def month_of(timestamp: int) -> str:
+    """
+    Determine the chunk month (UTC) of the given timestamp.
+
+    :param timestamp: seconds since epoch
+    :return: month formatted as YYYY-MM
+
+    >>> month_of(0)
+    '1970-01'
+    >>> month_of(1577836800)
+    '2020-01'
+    """
+    return datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m')
+
+
+def _month_start(month: str) -> int:
+    """Compute the beginning of the month in seconds since epoch (UTC)."""
+    year, mon = month.split('-')
+    return calendar.timegm((int(year), int(mon), 1, 0, 0, 0))
+
+
+def _next_month_start(month: str) -> int:
+    """Compute the beginning of the following month (UTC)."""
+    year, mon = (int(part) for part in month.split('-'))
+    if mon == 12:
+        return calendar.timegm((year + 1, 1, 1, 0, 0, 0))
+
+    return calendar.timegm((year, mon + 1, 1, 0, 0, 0))
+
+
+def _encode(states: List[mesito.front.out.MachineState], level: int) -> bytes:
+    """
+    Serialize the states into the chunk format.
+
+    :param states: states sorted by start
+    :param level: zlib compression level of the columns
+    :return: content of the chunk file
+    """
+    columns = {
+        name: array.array(code)
+        for name, code in _COLUMNS
+    }  # type: Dict[str, array.array[Any]]
+
+    for state in states:
+        columns['start'].append(state['start'])
+        columns['stop'].append(state['stop'])
+        columns['condition'].append(_CONDITION_CODES[state['condition']])
+
+        for name in ['min_power_consumption', 'max_power_consumption',
+                     'avg_power_consumption', 'total_energy']:
+            value = state[name]  # type: ignore
+            columns[name].append(math.nan if value is None else value)
+
+        pieces = state['pieces']
+        columns['pieces'].append(_NO_PIECES if pieces is None else pieces)
+
+    blobs = []  # type: List[bytes]
+    for name, _ in _COLUMNS:
+        column = columns[name]
+        if sys.byteorder == 'big':
+            column.byteswap()
+
+        blobs.append(zlib.compress(column.tobytes(), level))
+
+    offset = _HEADER.size + _COLUMN_ENTRY.size * len(_COLUMNS)
+    parts = [
+        _HEADER.pack(
+            _MAGIC, _FORMAT_VERSION, len(states),
+            min(state['start'] for state in states),
+            max(state['stop'] for state in states))
+    ]
+
+    for blob in blobs:
+        parts.append(_COLUMN_ENTRY.pack(offset, len(blob)))
+        offset += len(blob)
+
+    parts.extend(blobs)
+
+    return b''.join(parts)
+
+
+class Chunk:
+    """Represent a memory-mapped chunk file."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """Map the file and parse its header."""
+        with path.open('rb') as fid:
+            self._mmap = mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, self.min_start, self.max_stop = \
+            _HEADER.unpack_from(self._mmap, 0)
+
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(
+                "Unexpected chunk format in {}: {!r} version {}".format(
+                    path, magic, version))
+
+    def column(self, name: str) -> 'array.array[Any]':
+        """Decompress the given column."""
+        for i, (column_name, code) in enumerate(_COLUMNS):
+            if column_name == name:
+                offset, length = _COLUMN_ENTRY.unpack_from(
+                    self._mmap, _HEADER.size + i * _COLUMN_ENTRY.size)
+
+                result = array.array(code)  # type: array.array[Any]
+                result.frombytes(
+                    zlib.decompress(self._mmap[offset:offset + length]))
+                if sys.byteorder == 'big':
+                    result.byteswap()
+
+                return result
+
+        raise KeyError(name)
+
+    def states(self, machine_id: int) -> List[mesito.front.out.MachineState]:
+        """Decompress all the columns and assemble the states."""
+        columns = {name: self.column(name) for name, _ in _COLUMNS}
+
+        result = []  # type: List[mesito.front.out.MachineState]
+        for i in range(self.count):
+            floats = [
+                None if math.isnan(columns[name][i]) else columns[name][i]
+                for name in [
+                    'min_power_consumption', 'max_power_consumption',
+                    'avg_power_consumption', 'total_energy'
+                ]
+            ]
+
+            pieces = columns['pieces'][i]
+
+            result.append(
+                mesito.front.out.machine_state(
+                    machine_id=machine_id,
+                    start=columns['start'][i],
+                    stop=columns['stop'][i],
+                    condition=_CONDITIONS[columns['condition'][i]],
+                    min_power_consumption=floats[0],
+                    max_power_consumption=floats[1],
+                    avg_power_consumption=floats[2],
+                    total_energy=floats[3],
+                    pieces=None if pieces == _NO_PIECES else pieces))
+
+        return result
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self._mmap.close()
+
+
+class Archive:
+    """Store archived machine states as ``<machine ID>/<YYYY-MM>.chunk``."""
+
+    def __init__(
+            self, directory: pathlib.Path, compression_level: int = 6) -> None:
+        """
+        Initialize with the given values.
+
+        :param directory: root directory of the archive
+        :param compression_level: zlib compression level of the columns
+        """
+        self.directory = directory
+        self.compression_level = compression_level
+
+    def chunk_path(self, machine_id: int, month: str) -> pathlib.Path:
+        """Determine the path to the chunk of the machine for the month."""
+        return self.directory / str(machine_id) / '{}.chunk'.format(month)
+
+    def machine_ids(self) -> List[int]:
+        """List the machines which have archived states."""
+        if not self.directory.exists():
+            return []
+
+        return sorted(
+            int(pth.name) for pth in self.directory.iterdir()
+            if pth.is_dir() and pth.name.isdigit())
+
+    def _chunks(self, machine_id: int, start: int,
+                stop: int) -> Iterator[Chunk]:
+        """Iterate over the chunks which might overlap with [start, stop)."""
+        machine_dir = self.directory / str(machine_id)
+        if not machine_dir.exists():
+            return
+
+        for pth in sorted(machine_dir.glob('*.chunk')):
+            if _month_start(pth.stem) >= stop:
+                break
+
+            chunk = Chunk(path=pth)
+            try:
+                if chunk.max_stop > start:
+                    yield chunk
+            finally:
+                chunk.close()
+
+    def read(self, machine_id: int, start: int,
+             stop: int) -> List[mesito.front.out.MachineState]:
+        """
+        Retrieve the archived states overlapping with [start, stop).
+
+        :param machine_id: ID of the machine
+        :param start: start of the time range, seconds since epoch
+        :param stop: end of the time range, seconds since epoch
+        :return: archived states sorted by start
+        """
+        result = []  # type: List[mesito.front.out.MachineState]
+        for chunk in self._chunks(machine_id=machine_id, start=start,
+                                  stop=stop):
+            result.extend(
+                state for state in chunk.states(machine_id=machine_id)
+                if state['start'] < stop and state['stop'] > start)
+
+        return result
+
+    def write(
+            self, machine_id: int,
+            states: List[mesito.front.out.MachineState]) -> None:
+        """
+        Merge the states into the chunks of the machine.
+
+        Archived states with the same start are overwritten. The chunks
+        are replaced atomically so that the concurrent readers always see
+        a consistent chunk.
+
+        :param machine_id: ID of the machine
+        :param states: states to be archived
+        """
+        by_month = {
+        }  # type: Dict[str, Dict[int, mesito.front.out.MachineState]]
+        for state in states:
+            by_month.setdefault(month_of(state['start']),
+                                {})[state['start']] = state
+
+        for month, new_states in sorted(by_month.items()):
+            pth = self.chunk_path(machine_id=machine_id, month=month)
+            pth.parent.mkdir(parents=True, exist_ok=True)
+
+            merged = {}  # type: Dict[int, mesito.front.out.MachineState]
+            if pth.exists():
+                chunk = Chunk(path=pth)
+                try:
+                    for state in chunk.states(machine_id=machine_id):
+                        merged[state['start']] = state
+                finally:
+                    chunk.close()
+
+            merged.update(new_states)
+
+            data = _encode(
+                states=[merged[key] for key in sorted(merged.keys())],
+                level=self.compression_level)
+
+            tmp_pth = pth.parent / (pth.name + '.tmp')
+            tmp_pth.write_bytes(data)
+            os.replace(str(tmp_pth), str(pth))
+
+
+def archive_states(
+        session: sqlalchemy.orm.Session, archive: Archive, cutoff: int) -> int:
+    """
+    Move the machine states which stopped before the cutoff to the archive.
+
+    The states are archived machine by machine and month by month so that
+    every chunk is merged and written only once. The rows of the month are
+    deleted after the chunk has been written, in batches of at most
+    :py:data:`_IN_CHUNK` states, each committed on its own. A failure in
+    between leaves the states both in the archive and in the database; the
+    read path prefers the database in that case.
+
+    :param session: database session
+    :param archive: archive to write to
+    :param cutoff: states with stop at or before the cutoff are archived,
+        seconds since epoch
+    :return: number of archived states
+    """
+    # mesito.operation imports this module.
+    import mesito.operation  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
+    state = mesito.model.MachineState
+
+    machine_ids = [
+        row.machine_id for row in session.query(state.machine_id).filter(
+            state.stop <= cutoff).distinct().all()
+    ]
+
+    count = 0
+    for machine_id in sorted(machine_ids):
+        archived = 0
+
+        to_archive = (state.machine_id == machine_id) & (state.stop <= cutoff)
+
+        # Each month is deleted once written so that the next query picks up
+        # the earliest month left.
+        while True:
+            first_start = session.query(sqlalchemy.func.min(
+                state.start)).filter(to_archive).scalar()
+
+            if first_start is None:
+                break
+
+            month = month_of(first_start)
+
+            rows = session.query(state).filter(
+                to_archive & (state.start >= _month_start(month))
+                & (state.start < _next_month_start(month))).order_by(
+                    state.start.asc()).all()
+
+            archive.write(
+                machine_id=machine_id,
+                states=[
+                    mesito.operation.machine_state_to_out(row) for row in rows
+                ])
+
+            ids = [row.id for row in rows]
+
+            for i in range(0, len(ids), _IN_CHUNK):
+                session.query(state).filter(state.id.in_(
+                    ids[i:i + _IN_CHUNK])).delete(synchronize_session=False)
+                session.commit()
+
+            archived += len(ids)
+
+        count += archived
+        logging.info(
+            "Archived %d state(s) of the machine %d.", archived, machine_id)
+
+    return count
+
+
+def main(command_line_args: Sequence[str]) -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database_url",
+        help="SQLAlchemy database URL; "
+        "see https://docs.sqlalchemy.org/en/13/core/engines.html",
+        required=True)
+    parser.add_argument(
+        "--archive_dir",
+        help="directory where the archived states are stored",
+        required=True)
+    parser.add_argument(
+        "--keep_days",
+        help="number of most recent days to keep in the database",
+        type=int,
+        default=28)
+    parser.add_argument(
+        "--cutoff",
+        help="if set, archive the states stopped at or before this moment "
+        "(seconds since epoch) instead of using --keep_days",
+        type=int)
+    parser.add_argument(
+        "--compression_level",
+        help="zlib compression level of the archived columns",
+        type=int,
+        default=6)
+    args = parser.parse_args(args=command_line_args)
+
+    cutoff = (
+        int(args.cutoff) if args.cutoff is not None else int(time.time()) -
+        int(args.keep_days) * 24 * 3600)  # type: int
+
+    engine = sqlalchemy.create_engine(str(args.database_url))
+    session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+    archive = Archive(
+        directory=pathlib.Path(args.archive_dir),
+        compression_level=int(args.compression_level))
+
+    logging.info("Archiving the states stopped at or before %d...", cutoff)
+    try:
+        count = archive_states(session=session, archive=archive, cutoff=cutoff)
+    finally:
+        session.close()
+
+    logging.info("Archived %d state(s) in total.", count)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(command_line_args=sys.argv[1:]))
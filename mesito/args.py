@@ -0,0 +1,297 @@
+"""
+Parse the command-line arguments of the mesito servers.
+
+The module has no side effects on import so that both the gevent server
+(:py:mod:`mesito.main`) and the ASGI server (:py:mod:`mesito.asgi`) can share
+the arguments without patching or configuring each other's interpreter.
+"""
+import argparse
+import pathlib
+from typing import List, Optional, Sequence
+
+
+class Args:
+    """Represent parsed program arguments."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    # yapf: disable
+    def __init__(
+            self,
+            *,
+            port: int,
+            database_url: str,
+            cors_allowed_all_origins: bool,
+            archive_dir: Optional[pathlib.Path],
+            json_codec: str,
+            compression_min_size: int,
+            compression_level: int,
+            ingest_max_in_flight: int,
+            ingest_max_queued: int,
+            read_max_in_flight: int,
+            read_max_queued: int,
+            queue_timeout: float,
+            retry_after: int,
+            idempotency_max_keys: int,
+            idempotency_ttl: float,
+            idempotency_persist: bool,
+            read_replica_urls: List[str],
+            replica_max_lag: float,
+            read_your_writes: float,
+            replica_heartbeat_interval: float,
+            ingest_path: str,
+            shift_calendar: Optional[pathlib.Path],
+            gap_table: bool,
+            change_log: bool,
+            recent_capacity: int,
+            gateway_tokens: Optional[pathlib.Path],
+            analytics_workers: int,
+            analytics_timeout: float,
+            static_reload: bool
+    ) -> None:  # yapf: enable
+        """Initialize with the given values."""
+        self.port = port
+        self.database_url = database_url
+        self.cors_allowed_all_origins = cors_allowed_all_origins
+        self.archive_dir = archive_dir
+        self.json_codec = json_codec
+        self.compression_min_size = compression_min_size
+        self.compression_level = compression_level
+        self.ingest_max_in_flight = ingest_max_in_flight
+        self.ingest_max_queued = ingest_max_queued
+        self.read_max_in_flight = read_max_in_flight
+        self.read_max_queued = read_max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.idempotency_max_keys = idempotency_max_keys
+        self.idempotency_ttl = idempotency_ttl
+        self.idempotency_persist = idempotency_persist
+        self.read_replica_urls = read_replica_urls
+        self.replica_max_lag = replica_max_lag
+        self.read_your_writes = read_your_writes
+        self.replica_heartbeat_interval = replica_heartbeat_interval
+        self.ingest_path = ingest_path
+        self.shift_calendar = shift_calendar
+        self.gap_table = gap_table
+        self.change_log = change_log
+        self.recent_capacity = recent_capacity
+        self.gateway_tokens = gateway_tokens
+        self.analytics_workers = analytics_workers
+        self.analytics_timeout = analytics_timeout
+        self.static_reload = static_reload
+
+
+def parse_args(
+        command_line_args: Sequence[str],
+        description: str = "Run a mesito server.") -> Args:
+    """
+    Parse the given command-line arguments and raise exceptions on errors.
+
+    :param command_line_args: command-line arguments without the program
+    :param description: description of the program in the help
+    :return: parsed arguments
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--port", help="port on which to serve", required=True, type=int)
+    parser.add_argument(
+        "--database_url",
+        help="SQLAlchemy database URL; "
+        "see https://docs.sqlalchemy.org/en/13/core/engines.html",
+        required=True)
+    parser.add_argument(
+        "--cors_allowed_all_origins",
+        help="If set, allows CORS on all origins",
+        action="store_true")
+    parser.add_argument(
+        "--archive_dir",
+        help="If set, the read endpoints merge the states archived "
+        "with mesito-archive in this directory")
+    parser.add_argument(
+        "--json_codec",
+        help="JSON codec of the responses and Socket.IO payloads; "
+        "auto picks the fastest installed one",
+        choices=['auto', 'orjson', 'json'],
+        default='auto')
+    parser.add_argument(
+        "--compression_min_size",
+        help="Responses smaller than this many bytes are sent uncompressed; "
+        "if negative, the responses are never compressed",
+        type=int,
+        default=1024)
+    parser.add_argument(
+        "--compression_level",
+        help="Compression level of the responses; "
+        "clamped to the range of each encoding",
+        type=int,
+        default=6)
+    # The default budgets sum up to the default size of the SQLAlchemy
+    # connection pool (5 connections plus 10 overflow).
+    parser.add_argument(
+        "--ingest_max_in_flight",
+        help="Maximum number of concurrently handled ingest requests",
+        type=int,
+        default=10)
+    parser.add_argument(
+        "--ingest_max_queued",
+        help="Maximum number of ingest requests waiting for a slot; "
+        "the excess is rejected with 429",
+        type=int,
+        default=100)
+    parser.add_argument(
+        "--read_max_in_flight",
+        help="Maximum number of concurrently handled read requests",
+        type=int,
+        default=5)
+    parser.add_argument(
+        "--read_max_queued",
+        help="Maximum number of read requests waiting for a slot; "
+        "the excess is rejected with 429",
+        type=int,
+        default=20)
+    parser.add_argument(
+        "--queue_timeout",
+        help="Maximum wait for a slot in seconds; "
+        "the requests waiting longer are rejected with 503",
+        type=float,
+        default=5.0)
+    parser.add_argument(
+        "--retry_after",
+        help="Retry-After in seconds sent with the rejected requests",
+        type=int,
+        default=1)
+    parser.add_argument(
+        "--idempotency_max_keys",
+        help="Maximum number of responses kept in memory for the retried "
+        "ingest requests with the same Idempotency-Key; "
+        "if zero, the header is ignored",
+        type=int,
+        default=10000)
+    parser.add_argument(
+        "--idempotency_ttl",
+        help="Time-to-live of the responses kept for the Idempotency-Key "
+        "in seconds",
+        type=float,
+        default=24 * 3600.0)
+    parser.add_argument(
+        "--idempotency_persist",
+        help="If set, the responses kept for the Idempotency-Key are also "
+        "persisted to the database",
+        action="store_true")
+    parser.add_argument(
+        "--read_replica_url",
+        help="SQLAlchemy database URL of a read-only replica; "
+        "repeat for more replicas",
+        action="append",
+        default=[])
+    parser.add_argument(
+        "--replica_max_lag",
+        help="Maximum lag of a replica in seconds to serve the reads; "
+        "the primary serves the reads if no replica is fresh enough",
+        type=float,
+        default=5.0)
+    parser.add_argument(
+        "--read_your_writes",
+        help="How long the reads of a caller go to the primary "
+        "after the caller's write, in seconds",
+        type=float,
+        default=10.0)
+    parser.add_argument(
+        "--replica_heartbeat_interval",
+        help="How often the heartbeat measuring the replica lag is written "
+        "to the primary, in seconds",
+        type=float,
+        default=1.0)
+    parser.add_argument(
+        "--ingest_path",
+        help="Implementation of the machine state ingestion: "
+        "core executes the pre-built SQL statements, "
+        "orm goes through the SQLAlchemy ORM",
+        choices=['core', 'orm'],
+        default='core')
+    parser.add_argument(
+        "--shift_calendar",
+        help="Path to the JSON file defining the shifts of the plant; "
+        "if not set, three eight-hour shifts every day in UTC")
+    parser.add_argument(
+        "--gap_table",
+        help="If set, maintains the gaps between the machine states "
+        "in the gap table on each put and serves them from it; "
+        "rebuild the table with mesito-gaps --rebuild before the first use",
+        action="store_true")
+    parser.add_argument(
+        "--change_log",
+        help="If set, appends every change of a machine state to the change "
+        "log and serves it at /api/v1/machine_state_changes; "
+        "the log numbers the changes in a single counter so the concurrent "
+        "puts and prolongations wait for each other to commit",
+        action="store_true")
+    parser.add_argument(
+        "--recent_capacity",
+        help="Number of the latest states of each machine kept in memory "
+        "for the recent power endpoint",
+        type=int,
+        default=360)
+    parser.add_argument(
+        "--gateway_tokens",
+        help="Path to the file listing the tokens of the gateways, one per "
+        "line; if set, the authenticated gateways can stream the states "
+        "over Socket.IO in the namespace /ingest")
+    parser.add_argument(
+        "--analytics_workers",
+        help="Number of the worker processes computing the timelines, "
+        "the aggregates, the concurrency profiles and the shift reports "
+        "against the read replicas, or the primary if none is fresh enough; "
+        "if zero, they are computed in the server process",
+        type=int,
+        default=0)
+    parser.add_argument(
+        "--analytics_timeout",
+        help="Maximum duration of an analytics request in the worker "
+        "processes, including the queueing, in seconds; "
+        "the requests running longer are cancelled with 503",
+        type=float,
+        default=30.0)
+    parser.add_argument(
+        "--static_reload",
+        help="If set, reloads the static files whenever they change "
+        "instead of serving the ones read on start-up; meant for development",
+        action="store_true")
+    args = parser.parse_args(args=command_line_args)
+
+    return Args(
+        port=int(args.port),
+        database_url=str(args.database_url),
+        cors_allowed_all_origins=bool(args.cors_allowed_all_origins),
+        archive_dir=(
+            pathlib.Path(args.archive_dir)
+            if args.archive_dir is not None else None),
+        json_codec=str(args.json_codec),
+        compression_min_size=int(args.compression_min_size),
+        compression_level=int(args.compression_level),
+        ingest_max_in_flight=int(args.ingest_max_in_flight),
+        ingest_max_queued=int(args.ingest_max_queued),
+        read_max_in_flight=int(args.read_max_in_flight),
+        read_max_queued=int(args.read_max_queued),
+        queue_timeout=float(args.queue_timeout),
+        retry_after=int(args.retry_after),
+        idempotency_max_keys=int(args.idempotency_max_keys),
+        idempotency_ttl=float(args.idempotency_ttl),
+        idempotency_persist=bool(args.idempotency_persist),
+        read_replica_urls=[str(url) for url in args.read_replica_url],
+        replica_max_lag=float(args.replica_max_lag),
+        read_your_writes=float(args.read_your_writes),
+        replica_heartbeat_interval=float(args.replica_heartbeat_interval),
+        ingest_path=str(args.ingest_path),
+        shift_calendar=(
+            pathlib.Path(args.shift_calendar)
+            if args.shift_calendar is not None else None),
+        gap_table=bool(args.gap_table),
+        change_log=bool(args.change_log),
+        recent_capacity=int(args.recent_capacity),
+        gateway_tokens=(
+            pathlib.Path(args.gateway_tokens)
+            if args.gateway_tokens is not None else None),
+        analytics_workers=int(args.analytics_workers),
+        analytics_timeout=float(args.analytics_timeout),
+        static_reload=bool(args.static_reload))
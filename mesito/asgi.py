@@ -0,0 +1,778 @@
+#!/usr/bin/env python3
+"""
+Serve mesito as an ASGI application on asyncio.
+
+This is an alternative to the Flask and gevent server of :py:mod:`mesito.main`
+with the same ``/api/v1`` routes and Socket.IO events. The database is
+accessed through SQLAlchemy's async engine so that the event loop is not
+blocked by the driver, *e.g.*, ``sqlite+aiosqlite://`` or
+``postgresql+asyncpg://``. The validation (:py:mod:`mesito.front.valid`),
+the errors (:py:mod:`mesito.front.error`) and the handling of the requests
+(:py:mod:`mesito.handle`) are shared with the Flask server; the handlers
+are executed with :py:meth:`AsyncSession.run_sync`.
+
+The route budgets, the idempotency keys, the response compression and
+the read replicas are not available in this mode. The server refuses to
+start if any of their options is set.
+"""
+
+# Uvicorn and the async drivers are optional dependencies, hence imported
+# only when needed.
+
+# pylint: disable=import-outside-toplevel
+
+import asyncio
+import logging
+import sys
+import threading
+from typing import (
+    Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple,
+    TYPE_CHECKING)
+
+import mesito.analytics
+import mesito.args
+import mesito.assets
+import mesito.board
+import mesito.changelog
+import mesito.front.codec
+import mesito.front.valid
+import mesito.gateway
+import mesito.handle
+import mesito.ingest
+import mesito.recent
+import mesito.search
+import mesito.shift
+
+if TYPE_CHECKING:
+    # pylint: disable=unused-import
+    import sqlalchemy.ext.asyncio
+    import socketio
+
+    import mesito.archive
+
+# Receive, send and scope of the ASGI interface
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Scope = Dict[str, Any]
+
+# Handler of an API route given the decoded JSON body, returning
+# the status code and the JSON-able response
+Handler = Callable[[Any], Awaitable[Tuple[int, Any]]]
+
+
+class Api:
+    """Serve the API routes and the static files."""
+
+    # pylint: disable=too-many-instance-attributes,too-many-public-methods
+
+    # yapf: disable
+    def __init__(
+            self,
+            session_factory: Callable[
+                [], 'sqlalchemy.ext.asyncio.AsyncSession'],
+            sio: 'socketio.AsyncServer',
+            json_codec: mesito.front.codec.Codec,
+            cors_allowed_all_origins: bool,
+            archive: Optional['mesito.archive.Archive'] = None,
+            board: Optional[mesito.board.Board] = None,
+            recent: Optional[mesito.recent.Recent] = None,
+            state_ingest: mesito.ingest.PutMachineState = (
+                mesito.ingest.put_machine_state),
+            shift_calendar: Optional[mesito.shift.Calendar] = None,
+            gap_table: bool = False,
+            change_log: bool = False,
+            analytics: Optional[mesito.analytics.Pool] = None,
+            assets: Optional[mesito.assets.Assets] = None
+    ) -> None:  # yapf: enable
+        """
+        Initialize with the given values.
+
+        :param session_factory: produces async SQLAlchemy sessions
+        :param sio: Socket.IO server broadcasting the events
+        :param json_codec: codec of the requests and the responses
+        :param cors_allowed_all_origins:
+            if set, allows the cross-origin requests from everybody
+        :param archive:
+            if set, the read endpoints merge the archived machine states
+        :param board:
+            current state of every machine;
+            if not set, a new board is warmed from the database on startup
+        :param recent:
+            ring buffers of the latest states of every machine;
+            if not set, the buffers of the default capacity are used
+        :param state_ingest: operation upserting a machine state
+        :param shift_calendar:
+            shift calendar of the plant;
+            if not set, three eight-hour shifts every day in UTC
+        :param gap_table: if set, the gap table is maintained and read
+        :param change_log: if set, the change log is maintained and served
+        :param analytics: pool executing the heavy analytics, if any
+        :param assets:
+            static files served from memory;
+            if not set, the static directory of the package is read once
+        """
+        self.session_factory = session_factory
+        self.sio = sio
+        self.json_codec = json_codec
+        self.cors_allowed_all_origins = cors_allowed_all_origins
+        self.archive = archive
+        self.state_ingest = state_ingest
+        self.shift_calendar = (
+            shift_calendar
+            if shift_calendar is not None else mesito.shift.default())
+        self.gap_table = gap_table
+        self.change_log = change_log
+        self.analytics = analytics
+        self.assets = (
+            assets if assets is not None else
+            mesito.assets.Assets(directory=mesito.assets.STATIC_DIR))
+
+        self._warm = board is None
+        self.board = board if board is not None else mesito.board.Board()
+        self.recent = recent if recent is not None else mesito.recent.Recent()
+        self.name_fts = False
+
+        # The long polls of the change log are capped at a time.
+        self.waiters = threading.BoundedSemaphore(mesito.changelog.MAX_WAITERS)
+
+        self._started = False
+
+        # The lock is created in the running event loop since the locks bind
+        # to the event loop on creation in older Pythons.
+        self._start_lock = None  # type: Optional[asyncio.Lock]
+
+        # yapf: disable
+        self.routes = {
+            '/put_machine': (['POST'], self.put_machine),
+            '/put_machines': (['POST'], self.put_machines),
+            '/machines': (['POST'], self.serve_machines),
+            '/machines/changes': (['POST'], self.serve_machine_changes),
+            '/search_machines': (['POST'], self.serve_machine_search),
+            '/put_machine_state': (['POST'], self.put_machine_state),
+            '/extend_machine_state': (['POST'], self.extend_machine_state),
+            '/machine_states': (['POST'], self.serve_machine_states),
+            '/machine_state_aggregates': (
+                ['POST'], self.serve_machine_state_aggregates),
+            '/machine_timeline': (['POST'], self.serve_machine_timeline),
+            '/machine_state_gaps': (['POST'], self.serve_machine_state_gaps),
+            '/concurrency_profile': (
+                ['POST'], self.serve_concurrency_profile),
+            '/shift_report': (['POST'], self.serve_shift_report),
+            '/recent_power': (['POST'], self.serve_recent_power),
+            '/current_states': (['POST'], self.serve_current_states),
+            '/load': (['GET', 'POST'], self.serve_load)
+        }  # type: Dict[str, Tuple[List[str], Handler]]
+        # yapf: enable
+
+        if change_log:
+            self.routes['/machine_state_changes'] = ([
+                'POST'
+            ], self.serve_machine_state_changes)
+
+    async def run(self, func: Callable[[Any], Any]) -> Any:
+        """Execute the synchronous operation in a new async session."""
+        session = self.session_factory()
+        try:
+            return await session.run_sync(func)
+        finally:
+            await session.close()
+
+    async def handle(self, handler: Callable[[Any], Tuple[int, Any]]
+                     ) -> Tuple[int, Any]:
+        """Execute the handler of a request in a new async session."""
+        status, body = await self.run(handler)
+        return status, body
+
+    async def startup(self) -> None:
+        """Warm the board and detect the search index, once."""
+        if self._started:
+            return
+
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+
+        async with self._start_lock:
+            if self._started:
+                return
+
+            if self._warm:
+                await self.run(lambda session: self.board.warm(session=session))
+
+            self.name_fts = await self.run(
+                lambda session: mesito.search.has_fts(session=session))
+
+            self._started = True
+
+    async def broadcast(self, events: mesito.handle.Events) -> None:
+        """Emit the events of a handler to every client."""
+        for event, data in events:
+            await self.sio.emit(event, data, namespace="/")
+
+    async def put_machine(self, data: Any,
+                          if_match: Optional[str] = None) -> Tuple[int, Any]:
+        """Upsert a machine, optionally on the version given in If-Match."""
+        events = []  # type: mesito.handle.Events
+        response = await self.handle(
+            lambda session: mesito.handle.put_machine(
+                session=session, data=data, if_match=if_match, events=events))
+
+        await self.broadcast(events=events)
+
+        return response
+
+    async def put_machines(self, data: Any) -> Tuple[int, Any]:
+        """Upsert many machines in a single transaction."""
+        events = []  # type: mesito.handle.Events
+        response = await self.handle(
+            lambda session: mesito.handle.put_machines(
+                session=session, data=data, events=events))
+
+        await self.broadcast(events=events)
+
+        return response
+
+    async def serve_machines(self, data: Any) -> Tuple[int, Any]:
+        """Serve the machines ordered by (name, ID), optionally paginated."""
+        return await self.handle(
+            lambda session: mesito.handle.serve_machines(
+                session=session, data=data))
+
+    async def serve_machine_changes(self, data: Any) -> Tuple[int, Any]:
+        """Serve the machines changed after the cursor."""
+        return await self.handle(
+            lambda session: mesito.handle.serve_machine_changes(
+                session=session, data=data))
+
+    async def serve_machine_search(self, data: Any) -> Tuple[int, Any]:
+        """Serve the machines matching the name prefix or substring."""
+        return await self.handle(
+            lambda session: mesito.handle.serve_machine_search(
+                session=session, data=data, fts=self.name_fts))
+
+    async def put_machine_state(self, data: Any) -> Tuple[int, Any]:
+        """Upsert the state of the given machine."""
+        return await self.handle(
+            lambda session: mesito.handle.put_machine_state(
+                session=session,
+                data=data,
+                board=self.board,
+                recent=self.recent,
+                state_ingest=self.state_ingest,
+                gap_table=self.gap_table,
+                change_log=self.change_log))
+
+    async def extend_machine_state(self, data: Any) -> Tuple[int, Any]:
+        """Prolong the latest state of the given machine."""
+        return await self.handle(
+            lambda session: mesito.handle.extend_machine_state(
+                session=session,
+                data=data,
+                board=self.board,
+                recent=self.recent,
+                gap_table=self.gap_table,
+                change_log=self.change_log))
+
+    async def serve_machine_states(self, data: Any) -> Tuple[int, Any]:
+        """Serve the states of a machine in a time range, including archived."""
+        return await self.handle(
+            lambda session: mesito.handle.serve_machine_states(
+                session=session, data=data, archive=self.archive))
+
+    async def serve_analytics(self, task: str, data: Any) -> Tuple[int, Any]:
+        """
+        Serve the analytics task, computed in the pool if there is one.
+
+        :param task: name of the task in :py:data:`mesito.analytics.TASKS`
+        :param data: JSON data of the request
+        :return: status code, response
+        """
+        kwargs, local_err = mesito.handle.analytics_request(
+            task=task, data=data)
+        if local_err is not None:
+            return 400, local_err
+
+        assert kwargs is not None
+
+        if self.analytics is None:
+            return await self.handle(
+                lambda session: mesito.handle.analyze(
+                    session=session,
+                    task=task,
+                    kwargs=kwargs,
+                    archive=self.archive,
+                    calendar=self.shift_calendar))
+
+        # The pool enforces the timeout itself.
+        analytics = self.analytics
+        return await asyncio.get_event_loop().run_in_executor(
+            None, lambda: mesito.handle.analyze_in_pool(
+                pool=analytics, task=task, kwargs=kwargs))
+
+    async def serve_machine_state_aggregates(self,
+                                             data: Any) -> Tuple[int, Any]:
+        """Serve the states of a machine in a time range aggregated."""
+        return await self.serve_analytics(
+            task='machine_state_aggregates', data=data)
+
+    async def serve_machine_timeline(self, data: Any) -> Tuple[int, Any]:
+        """Serve the condition timeline of a machine decimated to buckets."""
+        return await self.serve_analytics(task='machine_timeline', data=data)
+
+    async def serve_machine_state_gaps(self, data: Any) -> Tuple[int, Any]:
+        """Serve the gaps between the consecutive machine states."""
+        return await self.handle(
+            lambda session: mesito.handle.serve_machine_state_gaps(
+                session=session, data=data, gap_table=self.gap_table))
+
+    async def serve_concurrency_profile(self, data: Any) -> Tuple[int, Any]:
+        """Serve how many machines were in the conditions over time."""
+        return await self.serve_analytics(task='concurrency_profile', data=data)
+
+    async def serve_shift_report(self, data: Any) -> Tuple[int, Any]:
+        """Serve the production per shift, machine and condition."""
+        return await self.serve_analytics(task='shift_report', data=data)
+
+    async def serve_recent_power(self, data: Any) -> Tuple[int, Any]:
+        """Serve the latest states of a machine from memory, warming if cold."""
+        return await self.handle(
+            lambda session: mesito.handle.serve_recent_power(
+                session=session, data=data, recent=self.recent))
+
+    async def serve_machine_state_changes(self, data: Any) -> Tuple[int, Any]:
+        """Serve the entries of the change log, waiting for them if asked."""
+        casted, local_err = mesito.front.valid.machine_state_changes_request(
+            data=data)
+        if local_err is not None:
+            return 400, local_err
+
+        assert casted is not None
+
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + casted.get('wait', 0)
+        waiting = False
+        try:
+            while True:
+                changes = await self.run(
+                    lambda session: mesito.changelog.tail(
+                        session=session, request=casted))
+
+                remaining = deadline - loop.time()
+                if changes['changes'] or remaining <= 0:
+                    return 200, changes
+
+                # Serve the empty page at once if all the slots are taken.
+                if not waiting:
+                    waiting = self.waiters.acquire(blocking=False)  # pylint: disable=consider-using-with
+                    if not waiting:
+                        return 200, changes
+
+                await asyncio.sleep(
+                    min(mesito.changelog.POLL_INTERVAL, remaining))
+        finally:
+            if waiting:
+                self.waiters.release()
+
+    async def serve_current_states(self, data: Any) -> Tuple[int, Any]:  # pylint: disable=unused-argument
+        """Serve the current state of every machine from memory."""
+        return 200, self.board.states()
+
+    async def serve_load(self, data: Any) -> Tuple[int, Any]:  # pylint: disable=unused-argument
+        """Serve the load of the route budgets; there are none in this mode."""
+        return 200, []
+
+    def _headers(self, content_type: str) -> List[Tuple[bytes, bytes]]:
+        """Produce the headers of a response."""
+        headers = [(b'content-type', content_type.encode('latin-1'))]
+        if self.cors_allowed_all_origins:
+            headers.append((b'access-control-allow-origin', b'*'))
+        return headers
+
+    async def _respond(
+            self, send: Send, status: int, body: bytes,
+            content_type: str) -> None:
+        """Send the complete response."""
+        headers = self._headers(content_type=content_type)
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _serve_static(self, send: Send, path: str, scope: Scope) -> None:
+        """Serve the static file from memory, or 404 if it does not exist."""
+        headers = {
+            key.decode('latin-1').title(): value.decode('latin-1')
+            for key, value in scope['headers']
+        }  # type: Dict[str, str]
+
+        response = self.assets.respond(
+            path=path.lstrip('/') or 'index.html', headers=headers)
+
+        response_headers = [
+            (key.lower().encode('latin-1'), value.encode('latin-1'))
+            for key, value in response.headers
+        ]
+        if self.cors_allowed_all_origins:
+            response_headers.append((b'access-control-allow-origin', b'*'))
+        if response.status != 304:
+            response_headers.append(
+                (b'content-length', str(len(response.body)).encode('latin-1')))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': response_headers
+        })
+        await send({'type': 'http.response.body', 'body': response.body})
+
+    async def __call__(
+            self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle an ASGI connection."""
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await self.startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    if self.analytics is not None:
+                        self.analytics.shutdown()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        if scope['type'] != 'http':
+            return
+
+        await self.startup()
+
+        path = scope['path']  # type: str
+        method = scope['method']  # type: str
+
+        if not path.startswith('/api/v1/'):
+            await self._serve_static(send=send, path=path, scope=scope)
+            return
+
+        route = self.routes.get(path[len('/api/v1'):], None)
+        if route is None:
+            await self._respond(
+                send=send,
+                status=404,
+                body=b'Not Found',
+                content_type='text/plain')
+            return
+
+        methods, handler = route
+
+        if method == 'OPTIONS' and self.cors_allowed_all_origins:
+            headers = self._headers(content_type='text/plain')
+            headers.append((
+                b'access-control-allow-methods',
+                ', '.join(methods).encode('latin-1')))
+            headers.append(
+                (b'access-control-allow-headers', b'content-type, if-match'))
+
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': headers
+            })
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        if method not in methods:
+            await self._respond(
+                send=send,
+                status=405,
+                body=b'Method Not Allowed',
+                content_type='text/plain')
+            return
+
+        chunks = []  # type: List[bytes]
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+
+        body = b''.join(chunks)
+
+        # Invalid JSON is passed on as None and rejected by the validation,
+        # except for the endpoints which accept an empty body.
+        data = None  # type: Any
+        if body:
+            try:
+                data = self.json_codec.loads(body)
+            except ValueError:
+                data = None
+
+        if path == '/api/v1/put_machine':
+            # The only route conditioned on a request header.
+            if_match = None  # type: Optional[str]
+            for key, value in scope['headers']:
+                if key.lower() == b'if-match':
+                    if_match = value.decode('latin-1')
+
+            status, response = await self.put_machine(
+                data=data, if_match=if_match)
+        else:
+            status, response = await handler(data)
+
+        await self._respond(
+            send=send,
+            status=status,
+            body=self.json_codec.dumpb(response),
+            content_type='application/json')
+
+
+def _register_gateway(
+        sio: 'socketio.AsyncServer', api: Api, tokens: List[str]) -> None:
+    """Handle the states streamed by the gateways over Socket.IO."""
+    import urllib.parse
+
+    def connect(sid: str, environ: Dict[str, Any]) -> bool:  # pylint: disable=unused-argument
+        """Refuse the gateways which are not authorized."""
+        query = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
+
+        return mesito.gateway.authorized(
+            tokens=tokens,
+            authorization=environ.get('HTTP_AUTHORIZATION', None),
+            token=query['token'][0] if 'token' in query else None)
+
+    # The idempotency keys are not available in this mode and hence ignored.
+
+    async def put_machine_state(
+            sid: str, data: Any, key: Optional[Any] = None) -> Any:  # pylint: disable=unused-argument
+        """Upsert the state and acknowledge with its ID or the error."""
+        await api.startup()
+        _, body = await api.put_machine_state(data=data)
+        return body
+
+    async def extend_machine_state(
+            sid: str, data: Any, key: Optional[Any] = None) -> Any:  # pylint: disable=unused-argument
+        """Prolong the state and acknowledge with it or the error."""
+        await api.startup()
+        _, body = await api.extend_machine_state(data=data)
+        return body
+
+    namespace = mesito.gateway.NAMESPACE
+    sio.on('connect', connect, namespace=namespace)
+
+    handlers = {
+        'put_machine_state': put_machine_state,
+        'extend_machine_state': extend_machine_state
+    }  # type: Dict[str, Callable[..., Awaitable[Any]]]
+
+    for event in mesito.gateway.EVENTS:
+        sio.on(event, handlers[event], namespace=namespace)
+
+
+# yapf: disable
+def produce(
+        engine: 'sqlalchemy.ext.asyncio.AsyncEngine',
+        cors_allowed_all_origins: bool,
+        archive: Optional['mesito.archive.Archive'] = None,
+        json_codec: Optional[mesito.front.codec.Codec] = None,
+        board: Optional[mesito.board.Board] = None,
+        recent: Optional[mesito.recent.Recent] = None,
+        state_ingest: Optional[mesito.ingest.PutMachineState] = None,
+        shift_calendar: Optional[mesito.shift.Calendar] = None,
+        gap_table: bool = False,
+        change_log: bool = False,
+        gateway_tokens: Optional[List[str]] = None,
+        analytics: Optional[mesito.analytics.Pool] = None,
+        assets: Optional[mesito.assets.Assets] = None
+) -> Tuple[Any, Api, 'socketio.AsyncServer']:  # yapf: enable
+    """
+    Produce the ASGI application.
+
+    :param engine: async SQLAlchemy engine
+    :param cors_allowed_all_origins:
+        if set, changes the CORS allowed origins of the app to everybody
+    :param archive:
+        if set, the read endpoints merge the archived machine states
+    :param json_codec:
+        codec used for the responses and Socket.IO payloads;
+        if not set, the fastest installed codec is used
+    :param board:
+        current state of every machine;
+        if not set, a new board is warmed from the database on startup
+    :param recent:
+        ring buffers of the latest states of every machine;
+        if not set, the buffers of the default capacity are used
+    :param state_ingest:
+        operation upserting a machine state;
+        if not set, the Core statements of :py:mod:`mesito.ingest` are used
+    :param shift_calendar:
+        shift calendar of the plant;
+        if not set, three eight-hour shifts every day in UTC
+    :param gap_table:
+        if set, the gap table is updated on each put and the gaps are read
+        from it; see :py:mod:`mesito.gap`
+    :param change_log:
+        if set, every change of a machine state is appended to the change log
+        and the log is served to the consumers; see :py:mod:`mesito.changelog`
+    :param gateway_tokens:
+        if set, the gateways authenticated with these tokens can stream
+        the states over Socket.IO; see :py:mod:`mesito.gateway`
+    :param analytics:
+        if set, the heavy analytics are computed in this pool of worker
+        processes; see :py:mod:`mesito.analytics`
+    :param assets:
+        static files served from memory;
+        if not set, the static directory of the package is read once
+    :return: ASGI application, API application, Socket.IO server
+    """
+    import socketio
+    import sqlalchemy.ext.asyncio
+    import sqlalchemy.orm
+
+    if json_codec is None:
+        json_codec = mesito.front.codec.select()
+
+    logging.info("Encoding JSON with: %s", json_codec.name)
+
+    if cors_allowed_all_origins:
+        sio = socketio.AsyncServer(
+            async_mode='asgi', cors_allowed_origins='*', json=json_codec)
+    else:
+        sio = socketio.AsyncServer(async_mode='asgi', json=json_codec)
+
+    api = Api(
+        session_factory=sqlalchemy.orm.sessionmaker(
+            bind=engine, class_=sqlalchemy.ext.asyncio.AsyncSession),
+        sio=sio,
+        json_codec=json_codec,
+        cors_allowed_all_origins=cors_allowed_all_origins,
+        archive=archive,
+        board=board,
+        recent=recent,
+        state_ingest=(
+            state_ingest
+            if state_ingest is not None else mesito.ingest.put_machine_state),
+        shift_calendar=shift_calendar,
+        gap_table=gap_table,
+        change_log=change_log,
+        analytics=analytics,
+        assets=assets)
+
+    if gateway_tokens is not None:
+        _register_gateway(sio=sio, api=api, tokens=gateway_tokens)
+
+    return socketio.ASGIApp(sio, other_asgi_app=api), api, sio
+
+
+# Options of the servers not available in this mode as the names of
+# the attributes in :py:class:`mesito.args.Args`
+_UNSUPPORTED = [
+    'compression_min_size', 'compression_level', 'ingest_max_in_flight',
+    'ingest_max_queued', 'read_max_in_flight', 'read_max_queued',
+    'queue_timeout', 'retry_after', 'idempotency_max_keys', 'idempotency_ttl',
+    'idempotency_persist', 'read_replica_urls', 'replica_max_lag',
+    'read_your_writes', 'replica_heartbeat_interval'
+]
+
+
+def reject_unsupported(args: mesito.args.Args) -> None:
+    """
+    Reject the options which this mode would silently ignore.
+
+    :param args: parsed command-line arguments
+    :raise ValueError: if any of the unsupported options differs from default
+    """
+    # The required options are irrelevant for the defaults.
+    defaults = mesito.args.parse_args(
+        command_line_args=['--port', '0', '--database_url', ''])
+
+    unsupported = [
+        name for name in _UNSUPPORTED
+        if getattr(args, name) != getattr(defaults, name)
+    ]
+
+    if unsupported:
+        raise ValueError(
+            "The route budgets, the idempotency keys, the response "
+            "compression and the read replicas are not available in "
+            "the ASGI server, but the options were set: {}".format(
+                ', '.join(unsupported)))
+
+
+def create_server(args: mesito.args.Args) -> Any:
+    """Create the dependencies and the ASGI application."""
+    import sqlalchemy.engine
+    import sqlalchemy.ext.asyncio
+
+    import mesito.archive
+
+    reject_unsupported(args=args)
+
+    engine = sqlalchemy.ext.asyncio.create_async_engine(args.database_url)
+
+    gateway_tokens = (
+        mesito.gateway.load_tokens(path=args.gateway_tokens)
+        if args.gateway_tokens is not None else None)
+
+    archive = (
+        mesito.archive.Archive(directory=args.archive_dir)
+        if args.archive_dir is not None else None)
+
+    shift_calendar = (
+        mesito.shift.load(path=args.shift_calendar)
+        if args.shift_calendar is not None else None)
+
+    # The workers query through the synchronous driver of the database.
+    url = sqlalchemy.engine.make_url(args.database_url)
+    analytics = (
+        mesito.analytics.Pool(
+            database_url=str(url.set(drivername=url.get_backend_name())),
+            workers=args.analytics_workers,
+            timeout=args.analytics_timeout,
+            archive=archive,
+            calendar=shift_calendar)
+        if args.analytics_workers > 0 else None)
+
+    app, _, _ = produce(
+        engine=engine,
+        cors_allowed_all_origins=args.cors_allowed_all_origins,
+        archive=archive,
+        json_codec=mesito.front.codec.select(name=args.json_codec),
+        state_ingest=mesito.ingest.select(name=args.ingest_path),
+        shift_calendar=shift_calendar,
+        gap_table=args.gap_table,
+        change_log=args.change_log,
+        recent=mesito.recent.Recent(capacity=args.recent_capacity),
+        gateway_tokens=gateway_tokens,
+        analytics=analytics,
+        assets=mesito.assets.Assets(
+            directory=mesito.assets.STATIC_DIR, reload=args.static_reload))
+
+    return app
+
+
+def main(command_line_args: Sequence[str]) -> int:
+    """Execute the main routine."""
+    args = mesito.args.parse_args(
+        command_line_args=command_line_args,
+        description="Serve mesito as an ASGI application on asyncio.")
+
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+
+    app = create_server(args=args)
+
+    logging.info("Serving forever on port %d ...", args.port)
+
+    # Uvicorn shuts down gracefully on SIGTERM and SIGINT.
+    uvicorn.run(app, port=args.port)
+
+    logging.info("Goodbye.")
+    logging.shutdown()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(command_line_args=sys.argv[1:]))
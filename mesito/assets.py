@@ -0,0 +1,308 @@
+"""
+Serve the static files from memory.
+
+The static directory is read once on start-up. Each file is kept in memory
+together with the ETag derived from its content and the bodies compressed
+with every installed encoding at the highest level, so that serving a page
+costs neither a system call nor a compression.
+
+The files whose name contains a content fingerprint (*e.g.*,
+``app.3f2a9c1b.js``) never change under the same name and are cached by
+the clients for a year. The other files, such as ``index.html``, are
+revalidated by the clients on every load and answered with 304 as long as
+their ETag matches.
+
+A precompressed variant next to a file (*e.g.*, ``app.js.gz``) is served
+instead of compressing the file, even if the encoder is not installed.
+
+In development, the cache can watch the directory and reload it whenever
+a file is added, removed or modified.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+import mesito.compress
+
+#: static directory of the package
+STATIC_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'static')
+
+#: ``Cache-Control`` of the fingerprinted files
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+#: ``Cache-Control`` of the other files
+REVALIDATE = 'no-cache'
+
+# Hexadecimal fingerprint of at least 8 digits delimited by a dot or a dash
+# before the extension of a file name
+_FINGERPRINT_RE = re.compile(r'[.-][0-9a-fA-F]{8,}\.[^/]+$')
+
+# Key of the directory state compared on reload: relative path to
+# the modification time in nanoseconds and the size of each file
+_Snapshot = Dict[str, Tuple[int, int]]
+
+
+def fingerprinted(path: str) -> bool:
+    """
+    Check whether the file name contains a content fingerprint.
+
+    >>> fingerprinted('js/app.3f2a9c1b.js')
+    True
+    >>> fingerprinted('app-3f2a9c1b0d.min.css')
+    True
+    >>> fingerprinted('index.html')
+    False
+    """
+    return _FINGERPRINT_RE.search(path.rsplit('/', 1)[-1]) is not None
+
+
+class Asset:
+    """Represent a static file in memory."""
+
+    # yapf: disable
+    def __init__(
+            self,
+            body: bytes,
+            mimetype: str,
+            etag: str,
+            cache_control: str,
+            encoded: Dict[str, bytes]
+    ) -> None:  # yapf: enable
+        """
+        Initialize with the given values.
+
+        :param body: content of the file
+        :param mimetype: MIME type of the content
+        :param etag: quoted ETag of the content without an encoding
+        :param cache_control: value of the ``Cache-Control`` header
+        :param encoded: compressed bodies by the name of the encoding
+        """
+        # pylint: disable=too-many-arguments
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.cache_control = cache_control
+        self.encoded = encoded
+
+    def etag_of(self, encoding: Optional[str]) -> str:
+        """Produce the quoted ETag of the body in the given encoding."""
+        if encoding is None:
+            return self.etag
+
+        return '{}-{}"'.format(self.etag[:-1], encoding)
+
+
+def _compressible(mimetype: str) -> bool:
+    """Check whether the content of the given MIME type compresses well."""
+    return (
+        mimetype.startswith('text/') or mimetype in {
+            'application/json', 'application/javascript',
+            'application/manifest+json', 'application/xml', 'image/svg+xml'
+        })
+
+
+def _snapshot(directory: str) -> _Snapshot:
+    """List the files of the directory with their modification times."""
+    root = os.path.realpath(directory)
+
+    result = {}  # type: _Snapshot
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            pth = os.path.join(dirpath, filename)
+
+            # Do not follow the links pointing out of the directory.
+            if not os.path.realpath(pth).startswith(root + os.sep):
+                continue
+
+            try:
+                stat = os.stat(pth)
+            except FileNotFoundError:
+                continue
+
+            relative = os.path.relpath(pth, root).replace(os.sep, '/')
+            result[relative] = (stat.st_mtime_ns, stat.st_size)
+
+    return result
+
+
+# yapf: disable
+def _load(
+        directory: str,
+        paths: List[str],
+        encodings: List[mesito.compress.Encoding]
+) -> Dict[str, Asset]:  # yapf: enable
+    """Read and compress the files of the directory."""
+    known = set(paths)
+    precompressed = mesito.compress.precompressed_encodings()
+
+    variants = {
+        path
+        for path in paths for variant in precompressed
+        if path.endswith(variant.suffix)
+        and path[:-len(variant.suffix)] in known
+    }  # type: Set[str]
+
+    result = {}  # type: Dict[str, Asset]
+    for path in sorted(known - variants):
+        pth = os.path.join(directory, *path.split('/'))
+        with open(pth, 'rb') as fid:
+            body = fid.read()
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        encoded = {}  # type: Dict[str, bytes]
+        for variant in precompressed:
+            if path + variant.suffix in variants:
+                with open(pth + variant.suffix, 'rb') as fid:
+                    encoded[variant.name] = fid.read()
+
+        if _compressible(mimetype):
+            for encoding in encodings:
+                if encoding.name not in encoded:
+                    data = encoding.compress(body, encoding.max_level)
+                    if len(data) < len(body):
+                        encoded[encoding.name] = data
+
+        result[path] = Asset(
+            body=body,
+            mimetype=mimetype,
+            etag='"{}"'.format(hashlib.sha256(body).hexdigest()[:32]),
+            cache_control=IMMUTABLE if fingerprinted(path) else REVALIDATE,
+            encoded=encoded)
+
+    return result
+
+
+class Response:
+    """Represent a framework-agnostic response serving an asset."""
+
+    def __init__(
+            self, status: int, headers: List[Tuple[str, str]],
+            body: bytes) -> None:
+        """Initialize with the given values."""
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class Assets:
+    """Keep the static files in memory."""
+
+    # yapf: disable
+    def __init__(
+            self,
+            directory: str,
+            reload: bool = False,
+            encodings: Optional[List[mesito.compress.Encoding]] = None
+    ) -> None:  # yapf: enable
+        """
+        Read the directory.
+
+        :param directory: directory of the static files
+        :param reload:
+            if set, the directory is checked for changes on every request
+            and reloaded if changed; meant for development
+        :param encodings:
+            encodings of the compressed bodies in the order of preference;
+            if not set, all the installed ones
+        """
+        self.directory = directory
+        self.reload = reload
+        self.encodings = (
+            encodings if encodings is not None else
+            mesito.compress.available_encodings())
+
+        self._lock = threading.Lock()
+        self._snapshot = _snapshot(directory=directory)
+        self._assets = _load(
+            directory=directory,
+            paths=list(self._snapshot),
+            encodings=self.encodings)
+
+    def _reload_if_changed(self) -> None:
+        """Reload the directory if any file has been changed."""
+        snapshot = _snapshot(directory=self.directory)
+        if snapshot == self._snapshot:
+            return
+
+        with self._lock:
+            if snapshot == self._snapshot:
+                return
+
+            self._assets = _load(
+                directory=self.directory,
+                paths=list(snapshot),
+                encodings=self.encodings)
+            self._snapshot = snapshot
+
+    def get(self, path: str) -> Optional[Asset]:
+        """
+        Retrieve the file.
+
+        :param path: path relative to the directory with ``/`` as separator
+        :return: the file, if it exists
+        """
+        if self.reload:
+            self._reload_if_changed()
+
+        return self._assets.get(path, None)
+
+    def respond(self, path: str, headers: Mapping[str, str]) -> Response:
+        """
+        Respond to the request of a file.
+
+        :param path: path relative to the directory with ``/`` as separator
+        :param headers:
+            request headers; ``Accept-Encoding`` and ``If-None-Match``
+            are considered
+        :return: 200, 304 if the client's copy is fresh, or 404
+        """
+        asset = self.get(path=path)
+        if asset is None:
+            return Response(
+                status=404,
+                headers=[('Content-Type', 'text/plain')],
+                body=b'Not Found')
+
+        # The encoded bodies are preferred in the order of the encoders and
+        # then of the precompressed variants.
+        candidates = [encoding.name for encoding in self.encodings] + [
+            variant.name
+            for variant in mesito.compress.precompressed_encodings()
+        ]
+
+        names = []  # type: List[str]
+        for candidate in candidates:
+            if candidate in asset.encoded and candidate not in names:
+                names.append(candidate)
+
+        name = mesito.compress.negotiate(
+            accept_encoding=headers.get('Accept-Encoding', ''),
+            names=names) if names else None  # type: Optional[str]
+
+        etag = asset.etag_of(encoding=name)
+
+        response_headers = [
+            ('ETag', etag), ('Cache-Control', asset.cache_control)
+        ]  # type: List[Tuple[str, str]]
+        if asset.encoded:
+            response_headers.append(('Vary', 'Accept-Encoding'))
+
+        if_none_match = headers.get('If-None-Match', None)
+        if if_none_match is not None:
+            tags = {tag.strip() for tag in if_none_match.split(',')}
+            tags.update({tag[2:] for tag in tags if tag.startswith('W/')})
+            if '*' in tags or etag in tags:
+                return Response(status=304, headers=response_headers, body=b'')
+
+        response_headers.append(('Content-Type', asset.mimetype))
+        if name is not None:
+            response_headers.append(('Content-Encoding', name))
+
+        return Response(
+            status=200,
+            headers=response_headers,
+            body=asset.encoded[name] if name is not None else asset.body)
@@ -0,0 +1,61 @@
+"""Keep the current state of every machine in memory."""
+import threading
+from typing import Dict, List, Optional
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.front.out
+import mesito.model
+import mesito.operation
+
+
+class Board:
+    """Map each machine to its latest state, i.e., the one started last."""
+
+    def __init__(self) -> None:
+        """Initialize an empty board."""
+        self._states = {}  # type: Dict[int, mesito.front.out.MachineState]
+        self._lock = threading.Lock()
+
+    def update(self, state: mesito.front.out.MachineState) -> None:
+        """Record the state unless the board knows a later one."""
+        with self._lock:
+            current = self._states.get(state['machine_id'], None)
+            if current is None or current['start'] <= state['start']:
+                self._states[state['machine_id']] = state
+
+    def get(self, machine_id: int) -> Optional[mesito.front.out.MachineState]:
+        """Retrieve the current state of the machine, if known."""
+        with self._lock:
+            return self._states.get(machine_id, None)
+
+    def states(self) -> List[mesito.front.out.MachineState]:
+        """List the current states sorted by machine ID."""
+        with self._lock:
+            return [self._states[key] for key in sorted(self._states.keys())]
+
+    def warm(self, session: sqlalchemy.orm.Session) -> None:
+        """
+        Load the latest state of every machine from the database.
+
+        The states are retrieved in a single query joining on
+        the per-machine maximum start, which is served by the index
+        on (machine ID, start).
+
+        :param session: database session
+        """
+        latest = session.query(
+            mesito.model.MachineState.machine_id.label('machine_id'),
+            sqlalchemy.func.max(
+                mesito.model.MachineState.start).label('start')).group_by(
+                    mesito.model.MachineState.machine_id).subquery()
+
+        rows = session.query(mesito.model.MachineState).join(
+            latest,
+            (mesito.model.MachineState.machine_id == latest.c.machine_id)
+            & (mesito.model.MachineState.start == latest.c.start)).all()
+
+        for row in rows:
+            self.update(
+                mesito.operation.machine_state_to_out(machine_state=row))
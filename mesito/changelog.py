@@ -0,0 +1,191 @@
+"""
+Record the changes of the machine states in an append-only log.
+
+Every put and prolongation of a machine state appends an entry to
+the table :py:class:`mesito.model.MachineStateChange` in the same transaction
+so that the downstream consumers can tail the log from a cursor instead of
+re-scanning the time ranges.
+
+The entries are numbered by a counter in the table
+:py:class:`mesito.model.ChangeCounter`. The counter row stays locked by
+the writing transaction until it commits so that the entries become visible
+in the order of their sequence numbers and a consumer never skips an entry
+committed late. The entry is therefore written as the last statement of
+the transaction to hold the lock as shortly as possible.
+
+The number of the requests waiting for new entries is capped by
+:py:data:`MAX_WAITERS`. A request over the cap receives the empty page at
+once so that the long polls can not occupy all the workers.
+
+The log is opt-in with ``--change_log`` since the counter serializes
+the concurrent ingestion. Without it, the changes are not recorded and
+the log is not served.
+
+The archived states are not recorded.
+"""
+from typing import List, Optional
+
+import sqlalchemy
+import sqlalchemy.exc
+import sqlalchemy.orm
+
+import mesito.front.out
+import mesito.front.valid
+import mesito.model
+
+#: seconds between the queries of a waiting tail
+POLL_INTERVAL = 0.5
+
+#: maximum number of the requests waiting for new entries at a time
+MAX_WAITERS = 32
+
+
+def _increment(session: sqlalchemy.orm.Session, name: str,
+               count: int) -> Optional[int]:
+    """Increment the counter and return its value, if the counter exists."""
+    counter = mesito.model.ChangeCounter.__table__
+
+    update = counter.update().where(counter.c.name == name).values(
+        value=counter.c.value + count)
+
+    if getattr(session.get_bind().dialect, 'full_returning', False):
+        value = session.execute(update.returning(counter.c.value)).scalar()
+        return int(value) if value is not None else None
+
+    if session.execute(update).rowcount == 1:
+        return int(
+            session.execute(
+                sqlalchemy.select([counter.c.value
+                                   ]).where(counter.c.name == name)).scalar())
+
+    return None
+
+
+def advance(
+        session: sqlalchemy.orm.Session, name: str, count: int,
+        column: sqlalchemy.Column) -> int:
+    """
+    Advance the counter of a sequence of changes.
+
+    :param session: transaction to the database
+    :param name: name of the counter
+    :param count: number of the sequence numbers to reserve
+    :param column:
+        column holding the sequence numbers, read to start the counter if
+        the database has been created without mesito-setup
+    :return: last of the reserved sequence numbers
+    """
+    value = _increment(session=session, name=name, count=count)
+    if value is not None:
+        return value
+
+    start = session.execute(
+        sqlalchemy.select([
+            sqlalchemy.func.coalesce(sqlalchemy.func.max(column), 0)
+        ])).scalar() + count
+
+    # A concurrent transaction might start the counter first. The insert is
+    # hence tried in a savepoint and, if it lost, the counter is incremented.
+    counter = mesito.model.ChangeCounter.__table__
+    try:
+        with session.begin_nested():
+            session.execute(counter.insert().values(name=name, value=start))
+    except sqlalchemy.exc.IntegrityError:
+        value = _increment(session=session, name=name, count=count)
+        assert value is not None, \
+            "Expected the counter {!r} after the conflict".format(name)
+        return value
+
+    return int(start)
+
+
+def record(
+        session: sqlalchemy.orm.Session, machine_id: int, start: int,
+        operation: mesito.model.MachineStateOperation) -> int:
+    """
+    Append the change of a machine state to the log.
+
+    The change is committed with the transaction of the caller.
+
+    :param session: transaction to the database
+    :param machine_id: ID of the machine
+    :param start: start of the changed state
+    :param operation: operation on the state
+    :return: sequence number of the entry
+    """
+    table = mesito.model.MachineStateChange.__table__
+
+    seq = advance(
+        session=session,
+        name=mesito.model.ChangeCounter.MACHINE_STATE,
+        count=1,
+        column=table.c.seq)
+
+    session.execute(
+        table.insert().values(
+            seq=seq,
+            machine_id=machine_id,
+            start=start,
+            operation=operation.value))
+
+    return seq
+
+
+# yapf: disable
+def tail(
+        session: sqlalchemy.orm.Session,
+        request: mesito.front.valid.MachineStateChangesRequest
+) -> mesito.front.out.MachineStateChanges:  # yapf: enable
+    """
+    Retrieve the entries of the log after the cursor.
+
+    Each entry is given with the current state, or null if the state has
+    been archived in the meanwhile.
+
+    :param session: database session
+    :param request: cursor and the limit, if any
+    :return: entries and the cursor of the next request
+    """
+    change = mesito.model.MachineStateChange.__table__
+    state = mesito.model.MachineState.__table__
+
+    limit = request.get('limit', mesito.front.valid.MAX_MACHINE_STATE_CHANGES)
+
+    # yapf: disable
+    rows = session.execute(
+        sqlalchemy.select([
+            change.c.seq, change.c.machine_id, change.c.start,
+            change.c.operation, state.c.stop, state.c.condition,
+            state.c.min_power_consumption, state.c.max_power_consumption,
+            state.c.avg_power_consumption, state.c.total_energy,
+            state.c.pieces
+        ]).select_from(
+            change.outerjoin(
+                state,
+                (state.c.machine_id == change.c.machine_id) &
+                (state.c.start == change.c.start))
+        ).where(change.c.seq > request['since']).order_by(
+            change.c.seq.asc()).limit(limit)).fetchall()  # yapf: enable
+
+    changes = []  # type: List[mesito.front.out.MachineStateChange]
+    for row in rows:
+        changes.append(
+            mesito.front.out.machine_state_change(
+                seq=row.seq,
+                machine_id=row.machine_id,
+                start=row.start,
+                operation=row.operation,
+                state=mesito.front.out.machine_state(
+                    machine_id=row.machine_id,
+                    start=row.start,
+                    stop=row.stop,
+                    condition=row.condition,
+                    min_power_consumption=row.min_power_consumption,
+                    max_power_consumption=row.max_power_consumption,
+                    avg_power_consumption=row.avg_power_consumption,
+                    total_energy=row.total_energy,
+                    pieces=row.pieces) if row.stop is not None else None))
+
+    return mesito.front.out.machine_state_changes(
+        changes=changes,
+        cursor=changes[-1]['seq'] if changes else request['since'])
@@ -0,0 +1,317 @@
+"""
+Negotiate and apply the compression of HTTP responses.
+
+Gzip is always available. Brotli and Zstandard are used if the ``brotli``
+and ``zstandard`` packages are installed, respectively.
+"""
+import abc
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import flask
+
+# pylint: disable=import-outside-toplevel
+
+
+class Stream(abc.ABC):
+    """Compress a stream of chunks."""
+
+    @abc.abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """Compress the chunk and flush it so that the client can decode it."""
+
+    @abc.abstractmethod
+    def finish(self) -> bytes:
+        """Finish the stream."""
+
+
+class Encoding(abc.ABC):
+    """Represent a content encoding."""
+
+    #: name of the encoding as in ``Accept-Encoding``
+    name = ''
+
+    #: range of the compression levels
+    min_level = 0
+    max_level = 0
+
+    def clamp(self, level: int) -> int:
+        """Clamp the compression level to the range of the encoding."""
+        return max(self.min_level, min(self.max_level, level))
+
+    @abc.abstractmethod
+    def compress(self, data: bytes, level: int) -> bytes:
+        """Compress the whole body."""
+
+    @abc.abstractmethod
+    def stream(self, level: int) -> Stream:
+        """Start compressing a stream."""
+
+
+class _GzipStream(Stream):
+    def __init__(self, level: int) -> None:
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressobj.compress(data) + self._compressobj.flush(
+            zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressobj.flush()
+
+
+class Gzip(Encoding):
+    """Compress with gzip from the standard library."""
+
+    name = 'gzip'
+    min_level = 1
+    max_level = 9
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        """Compress the whole body."""
+        compressobj = zlib.compressobj(self.clamp(level), zlib.DEFLATED, 31)
+        return compressobj.compress(data) + compressobj.flush()
+
+    def stream(self, level: int) -> Stream:
+        """Start compressing a stream."""
+        return _GzipStream(level=self.clamp(level))
+
+
+class _BrotliStream(Stream):
+    def __init__(self, brotli: Any, level: int) -> None:
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._compressor.process(data) + self._compressor.flush())
+
+    def finish(self) -> bytes:
+        return bytes(self._compressor.finish())
+
+
+class Brotli(Encoding):
+    """Compress with brotli; raise ImportError if it is not installed."""
+
+    name = 'br'
+    min_level = 0
+    max_level = 11
+
+    def __init__(self) -> None:
+        """Import the brotli package."""
+        import brotli
+        self._brotli = brotli
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        """Compress the whole body."""
+        return bytes(self._brotli.compress(data, quality=self.clamp(level)))
+
+    def stream(self, level: int) -> Stream:
+        """Start compressing a stream."""
+        return _BrotliStream(brotli=self._brotli, level=self.clamp(level))
+
+
+class _ZstdStream(Stream):
+    def __init__(self, zstandard: Any, level: int) -> None:
+        self._zstandard = zstandard
+        self._compressobj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(
+            self._compressobj.compress(data) +
+            self._compressobj.flush(self._zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+    def finish(self) -> bytes:
+        return bytes(self._compressobj.flush())
+
+
+class Zstd(Encoding):
+    """Compress with Zstandard; raise ImportError if it is not installed."""
+
+    name = 'zstd'
+    min_level = 1
+    max_level = 22
+
+    def __init__(self) -> None:
+        """Import the zstandard package."""
+        import zstandard
+        self._zstandard = zstandard
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        """Compress the whole body."""
+        return bytes(
+            self._zstandard.ZstdCompressor(
+                level=self.clamp(level)).compress(data))
+
+    def stream(self, level: int) -> Stream:
+        """Start compressing a stream."""
+        return _ZstdStream(zstandard=self._zstandard, level=self.clamp(level))
+
+
+def available_encodings() -> List[Encoding]:
+    """List the installed encodings in the order of server preference."""
+    result = []  # type: List[Encoding]
+    for cls in [Brotli, Zstd]:
+        try:
+            result.append(cls())
+        except ImportError:
+            pass
+
+    result.append(Gzip())
+    return result
+
+
+def negotiate(accept_encoding: str, names: List[str]) -> Optional[str]:
+    """
+    Pick the encoding accepted by the client.
+
+    Among the encodings with the highest quality value, the server preference
+    given by the order of ``names`` applies.
+
+    :param accept_encoding: value of the ``Accept-Encoding`` header
+    :param names:
+        names of the candidate encodings in the order of server preference
+    :return: name of the picked encoding, if any
+
+    >>> negotiate('gzip, deflate', ['br', 'gzip'])
+    'gzip'
+    >>> negotiate('*', ['br', 'gzip'])
+    'br'
+    >>> negotiate('gzip;q=0, identity', ['gzip']) is None
+    True
+    """
+    qualities = {}  # type: Dict[str, float]
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+
+        qualities[name] = quality
+
+    best = None  # type: Optional[str]
+    best_quality = 0.0
+    for name in names:
+        quality = qualities.get(name, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best = name
+            best_quality = quality
+
+    return best
+
+
+_COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/x-ndjson',
+    'image/svg+xml'
+}
+
+
+def _compressible(mimetype: Optional[str]) -> bool:
+    """Check whether the content of the given MIME type compresses well."""
+    return mimetype is not None and (
+        mimetype.startswith('text/') or mimetype in _COMPRESSIBLE_MIMETYPES)
+
+
+def _compress_stream(chunks: Iterable[Any], stream: Stream) -> Iterator[bytes]:
+    """Compress the chunks of a streamed response one by one."""
+    for chunk in chunks:
+        data = stream.compress(
+            chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+
+    yield stream.finish()
+
+
+class Compression:
+    """Compress the responses according to the client's ``Accept-Encoding``."""
+
+    def __init__(
+            self,
+            min_size: int = 1024,
+            level: int = 6,
+            encodings: Optional[List[Encoding]] = None) -> None:
+        """
+        Initialize with the given values.
+
+        :param min_size:
+            bodies smaller than this many bytes are sent uncompressed;
+            streamed responses are always compressed
+        :param level:
+            compression level, clamped to the range of each encoding
+        :param encodings:
+            encodings in the order of preference;
+            if not set, all the installed ones
+        """
+        self.min_size = min_size
+        self.level = level
+        self.encodings = (
+            encodings if encodings is not None else available_encodings())
+
+    def apply(self, response: flask.Response) -> flask.Response:
+        """Compress the response in-place if possible (``after_request``)."""
+        # pylint: disable=too-many-return-statements
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough
+                or not _compressible(response.mimetype)):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        name = negotiate(
+            accept_encoding=flask.request.headers.get('Accept-Encoding', ''),
+            names=[encoding.name for encoding in self.encodings])
+
+        if name is None:
+            return response
+
+        encoding = next(
+            encoding for encoding in self.encodings if encoding.name == name)
+
+        if response.is_streamed:
+            response.response = _compress_stream(
+                chunks=response.response, stream=encoding.stream(self.level))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+
+            response.set_data(encoding.compress(data, self.level))
+
+        response.headers['Content-Encoding'] = encoding.name
+        return response
+
+
+class Precompressed:
+    """Represent the encoding of the precompressed static files."""
+
+    def __init__(self, name: str, suffix: str) -> None:
+        """
+        Initialize with the given values.
+
+        :param name: name of the encoding as in ``Accept-Encoding``
+        :param suffix: file suffix of the precompressed variants
+        """
+        self.name = name
+        self.suffix = suffix
+
+
+# The variants are served without an encoder, hence all the known encodings.
+_PRECOMPRESSED = [
+    Precompressed(name='br', suffix='.br'),
+    Precompressed(name='zstd', suffix='.zst'),
+    Precompressed(name='gzip', suffix='.gz')
+]  # type: List[Precompressed]
+
+
+def precompressed_encodings() -> List[Precompressed]:
+    """List the encodings of the precompressed static files by preference."""
+    return list(_PRECOMPRESSED)
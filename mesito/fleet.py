@@ -0,0 +1,173 @@
+"""
+Profile the concurrency of the whole fleet over time.
+
+The profile answers how many machines were simultaneously in the given
+conditions and what their summed average power consumption was. It is
+computed with a vectorized sweep line: the starts and the stops of
+the states become events of +1 and -1 (respectively, of +power and -power),
+the events are sorted once and accumulated into a step function which is
+finally resampled to the requested resolution.
+
+The states with an unknown average power consumption count as consuming no
+power. The archived states are not included.
+"""
+from typing import List, Tuple
+
+import numpy as np
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.front.out
+import mesito.model
+
+#: conditions profiled if none are requested
+DEFAULT_CONDITIONS = ['working', 'retooling']
+
+
+def _load(
+        session: sqlalchemy.orm.Session, start: int, stop: int,
+        conditions: List[str]) -> np.ndarray:
+    """
+    Load the states overlapping the time range as a numeric array.
+
+    :return: rows of (start, stop, condition index, average power)
+    """
+    table = mesito.model.MachineState.__table__
+
+    # Encode the condition as its index so that every column is numeric.
+    code = sqlalchemy.case([(table.c.condition == condition, i)
+                            for i, condition in enumerate(conditions)],
+                           else_=-1)
+
+    rows = session.execute(
+        sqlalchemy.select([
+            table.c.start, table.c.stop, code,
+            sqlalchemy.func.coalesce(table.c.avg_power_consumption, 0.0)
+        ]).where((table.c.start < stop) & (table.c.stop > start)
+                 & table.c.condition.in_(conditions))).fetchall()
+
+    flat = np.fromiter((value for row in rows for value in row),
+                       dtype=np.float64,
+                       count=4 * len(rows))
+
+    return flat.reshape((len(rows), 4))
+
+
+def _step(event_times: np.ndarray,
+          deltas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Accumulate the events into a step function.
+
+    :param event_times: times of the events
+    :param deltas: change of the value at each event
+    :return: distinct sorted event times, value right after each of them
+    """
+    if len(event_times) == 0:
+        return event_times, deltas
+
+    order = np.argsort(event_times, kind='stable')
+    times = event_times[order]
+    values = np.cumsum(deltas[order])
+
+    # Only the value after the last of the simultaneous events holds.
+    last = np.append(times[1:] != times[:-1], True)
+    return times[last], values[last]
+
+
+def _resample(times: np.ndarray, values: np.ndarray,
+              edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Resample the step function to the bins between the edges.
+
+    :param times: sorted event times
+    :param values: value right after each event
+    :param edges: edges of the bins, sorted
+    :return: time-weighted average and peak of the step function in each bin
+    """
+    bins = len(edges) - 1
+
+    if len(times) == 0:
+        return np.zeros(bins), np.zeros(bins)
+
+    # Value at each edge (0 before the first event)
+    at = np.searchsorted(times, edges, side='right') - 1
+    edge_values = np.where(at >= 0, values[np.maximum(at, 0)], 0.0)
+
+    # Integral of the step function from the first event to each event
+    areas = np.concatenate(([0.0], np.cumsum(values[:-1] * np.diff(times))))
+
+    edge_areas = np.where(
+        at >= 0, areas[np.maximum(at, 0)] + values[np.maximum(at, 0)] *
+        (edges - times[np.maximum(at, 0)]), 0.0)
+
+    averages = np.diff(edge_areas) / np.diff(edges)
+
+    # The peak is reached either at the start of the bin or right after
+    # an event strictly within the bin.
+    peaks = edge_values[:-1].copy()
+
+    low = np.searchsorted(times, edges[:-1], side='right')
+    high = np.searchsorted(times, edges[1:], side='left')
+    nonempty = high > low
+
+    if nonempty.any():
+        padded = np.append(values, 0.0)
+        bounds = np.stack((low[nonempty], high[nonempty]), axis=1).ravel()
+        peaks[nonempty] = np.maximum(
+            peaks[nonempty],
+            np.maximum.reduceat(padded, bounds)[::2])
+
+    return averages, peaks
+
+
+def concurrency_profile(
+        session: sqlalchemy.orm.Session, start: int, stop: int, resolution: int,
+        conditions: List[str]) -> mesito.front.out.ConcurrencyProfile:
+    """
+    Profile how many machines were in the conditions and their summed power.
+
+    :param session: database session
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param resolution: width of a bin of the profile in seconds
+    :param conditions: profiled conditions
+    :return: profile per condition, binned at the resolution
+    """
+    states = _load(
+        session=session, start=start, stop=stop, conditions=conditions)
+
+    # The last bin is cut short at the stop.
+    edges = np.append(
+        np.arange(start, stop, resolution, dtype=np.float64), float(stop))
+
+    state_starts = np.maximum(states[:, 0], start)
+    state_stops = np.minimum(states[:, 1], stop)
+
+    profiles = []  # type: List[mesito.front.out.ConditionProfile]
+
+    for i, condition in enumerate(conditions):
+        mask = states[:, 2] == i
+
+        event_times = np.concatenate((state_starts[mask], state_stops[mask]))
+
+        ones = np.ones(int(mask.sum()))
+        power = states[mask, 3]
+
+        times, counts = _step(
+            event_times=event_times, deltas=np.concatenate((ones, -ones)))
+        average_counts, peak_counts = _resample(
+            times=times, values=counts, edges=edges)
+
+        times, powers = _step(
+            event_times=event_times, deltas=np.concatenate((power, -power)))
+        average_powers, _ = _resample(times=times, values=powers, edges=edges)
+
+        profiles.append(
+            mesito.front.out.condition_profile(
+                condition=condition,
+                average_count=np.round(average_counts, 3).tolist(),
+                peak_count=np.rint(peak_counts).astype(int).tolist(),
+                average_power=np.round(average_powers, 3).tolist()))
+
+    return mesito.front.out.concurrency_profile(
+        start=start, stop=stop, resolution=resolution, profiles=profiles)
@@ -0,0 +1,104 @@
+"""
+Encode and decode JSON exchanged with the outside world.
+
+The codec is pluggable so that a fast third-party encoder can be used when
+it is installed. The standard library serves as the fallback.
+"""
+import abc
+import json
+from typing import Any, List, Optional
+
+# pylint: disable=import-outside-toplevel
+
+
+class Codec(abc.ABC):
+    """Represent a JSON codec with the interface of the ``json`` module."""
+
+    #: name of the codec as given on the command line
+    name = ''
+
+    @abc.abstractmethod
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """
+        Encode the object as JSON.
+
+        The keyword arguments are accepted for compatibility with
+        the standard library, but a codec might ignore them.
+        """
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Encode the object as compact JSON in UTF-8."""
+        return self.dumps(obj).encode('utf-8')
+
+    @abc.abstractmethod
+    def loads(self, text: Any, **kwargs: Any) -> Any:
+        """Decode the JSON text (``str`` or ``bytes``)."""
+
+
+class StandardCodec(Codec):
+    """Encode and decode with the standard library."""
+
+    name = 'json'
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Encode the object as compact JSON."""
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, text: Any, **kwargs: Any) -> Any:
+        """Decode the JSON text."""
+        return json.loads(text, **kwargs)
+
+
+class OrjsonCodec(Codec):
+    """Encode and decode with orjson, ignoring the formatting arguments."""
+
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        """Import orjson and raise ImportError if it is not installed."""
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Encode the object as compact JSON."""
+        return str(self._orjson.dumps(obj).decode('utf-8'))
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Encode the object as compact JSON in UTF-8 without a copy."""
+        return bytes(self._orjson.dumps(obj))
+
+    def loads(self, text: Any, **kwargs: Any) -> Any:
+        """Decode the JSON text."""
+        return self._orjson.loads(text)
+
+
+#: names of the codecs in the order of preference
+NAMES = ['orjson', 'json']  # type: List[str]
+
+
+def select(name: Optional[str] = None) -> Codec:
+    """
+    Instantiate the codec.
+
+    :param name:
+        name of the codec; if None or ``auto``, the fastest installed codec
+    :return: codec
+    :raise ImportError: if the requested codec is not installed
+
+    >>> select('json').name
+    'json'
+    """
+    if name == 'json':
+        return StandardCodec()
+
+    if name == 'orjson':
+        return OrjsonCodec()
+
+    if name is not None and name != 'auto':
+        raise ValueError("Unknown JSON codec: {!r}".format(name))
+
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return StandardCodec()
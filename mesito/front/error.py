@@ -120,3 +120,166 @@ class MachineNotFound(TypedDict):
 def machine_not_found(machine_id: int) -> MachineNotFound:
     """Indicate the the given machine ID does not exist in the database."""
     return {'what': MachineNotFound.__name__, 'why': {'machine_id': machine_id}}
+
+
+class _MachineVersionConflictWhy(TypedDict):
+    machine_id: int
+    expected: int
+    actual: int
+
+
+class MachineVersionConflict(TypedDict):
+    """
+    Represent an error when the machine changed since the client read it.
+
+    Produce with :func:`machine_version_conflict`.
+    """
+
+    what: str
+    why: _MachineVersionConflictWhy
+
+
+def machine_version_conflict(
+        machine_id: int, expected: int, actual: int) -> MachineVersionConflict:
+    """Indicate that the version of the machine is not the expected one."""
+    return {
+        'what': MachineVersionConflict.__name__,
+        'why': {
+            'machine_id': machine_id,
+            'expected': expected,
+            'actual': actual
+        }
+    }
+
+
+class _OverloadedWhy(TypedDict):
+    budget: str
+    retry_after: int
+
+
+class Overloaded(TypedDict):
+    """
+    Represent a rejection of a request due to the server load.
+
+    Produce with :func:`overloaded`.
+    """
+
+    what: str
+    why: _OverloadedWhy
+
+
+def overloaded(budget: str, retry_after: int) -> Overloaded:
+    """Indicate that the request has been shed and should be retried later."""
+    return {
+        'what': Overloaded.__name__,
+        'why': {
+            'budget': budget,
+            'retry_after': retry_after
+        }
+    }
+
+
+class _TaskTimedOutWhy(TypedDict):
+    task: str
+    timeout: float
+
+
+class TaskTimedOut(TypedDict):
+    """
+    Represent an analytics task which did not finish in time.
+
+    Produce with :func:`task_timed_out`.
+    """
+
+    what: str
+    why: _TaskTimedOutWhy
+
+
+def task_timed_out(task: str, timeout: float) -> TaskTimedOut:
+    """Indicate that the analytics task has been cancelled on timeout."""
+    return {
+        'what': TaskTimedOut.__name__,
+        'why': {
+            'task': task,
+            'timeout': timeout
+        }
+    }
+
+
+class _IdempotencyKeyReusedWhy(TypedDict):
+    key: str
+
+
+class IdempotencyKeyReused(TypedDict):
+    """
+    Represent a reuse of an idempotency key for a different request.
+
+    Produce with :func:`idempotency_key_reused`.
+    """
+
+    what: str
+    why: _IdempotencyKeyReusedWhy
+
+
+def idempotency_key_reused(key: str) -> IdempotencyKeyReused:
+    """Indicate that the idempotency key was used with another request body."""
+    return {'what': IdempotencyKeyReused.__name__, 'why': {'key': key}}
+
+
+class _MachineStateNotFoundWhy(TypedDict):
+    machine_id: int
+    start: int
+
+
+class MachineStateNotFound(TypedDict):
+    """
+    Represent an error when the machine state to be extended does not exist.
+
+    Produce with :func:`machine_state_not_found`.
+    """
+
+    what: str
+    why: _MachineStateNotFoundWhy
+
+
+def machine_state_not_found(
+        machine_id: int, start: int) -> MachineStateNotFound:
+    """Indicate that there is no state of the machine with the given start."""
+    return {
+        'what': MachineStateNotFound.__name__,
+        'why': {
+            'machine_id': machine_id,
+            'start': start
+        }
+    }
+
+
+class _MachineStateSupersededWhy(TypedDict):
+    machine_id: int
+    start: int
+    later_start: int
+
+
+class MachineStateSuperseded(TypedDict):
+    """
+    Represent an error when the machine state to be extended is not the latest.
+
+    Produce with :func:`machine_state_superseded`.
+    """
+
+    what: str
+    why: _MachineStateSupersededWhy
+
+
+def machine_state_superseded(
+        machine_id: int, start: int,
+        later_start: int) -> MachineStateSuperseded:
+    """Indicate that a later state of the machine exists."""
+    return {
+        'what': MachineStateSuperseded.__name__,
+        'why': {
+            'machine_id': machine_id,
+            'start': start,
+            'later_start': later_start
+        }
+    }
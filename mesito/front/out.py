@@ -1,4 +1,6 @@
 """Define output structures."""
+from typing import Any, Dict, List, Optional
+
 from typing_extensions import TypedDict
 
 from icontract._decorators import require
@@ -34,20 +36,394 @@ class MachinePutEmit(TypedDict):
     """
     Represent an event emitted when a machine changed.
 
+    The clients which see a gap in the change sequence numbers missed some
+    events and catch up with ``/machines/changes``.
+
     Produce with :func:`machine_put_emit`
     """
 
     id: int
     name: str
     version: int
+    change_seq: int
 
 
 @require(
     lambda id: id <= 2**53,
     "ID exactly serializable in JSON double-precision float")
 @require(
-    lambda version: version <= 2 * 53,
+    lambda version: version <= 2**53,
     "Version exactly serializable in JSON double-precision float")
-def machine_put_emit(id: int, name: str, version: int) -> MachinePutEmit:
+@require(
+    lambda change_seq: change_seq <= 2**53,
+    "Change sequence number exactly serializable in JSON double-precision "
+    "float")
+def machine_put_emit(
+        id: int, name: str, version: int, change_seq: int) -> MachinePutEmit:
     """Cast the machine into a put event to be emitted."""
-    return {"id": id, "name": name, "version": version}
+    return {
+        "id": id,
+        "name": name,
+        "version": version,
+        "change_seq": change_seq
+    }
+
+
+class MachineChanges(TypedDict):
+    """
+    Represent the machines changed after a cursor.
+
+    The client passes ``cursor`` as ``since`` of the next request and repeats
+    until no machines are returned.
+
+    Produce with :func:`machine_changes`
+    """
+
+    machines: List[Machine]
+    cursor: int
+
+
+def machine_changes(machines: List[Machine], cursor: int) -> MachineChanges:
+    """Cast the changed machines into a JSON-able response."""
+    return {"machines": machines, "cursor": cursor}
+
+
+class MachineState(TypedDict):
+    """
+    Represent a machine state retrieved.
+
+    Produce with :func:`machine_state`
+    """
+
+    machine_id: int
+    start: int
+    stop: int
+    condition: str
+    min_power_consumption: Optional[float]
+    max_power_consumption: Optional[float]
+    avg_power_consumption: Optional[float]
+    total_energy: Optional[float]
+    pieces: Optional[int]
+
+
+# yapf: disable
+def machine_state(
+        machine_id: int,
+        start: int,
+        stop: int,
+        condition: str,
+        min_power_consumption: Optional[float],
+        max_power_consumption: Optional[float],
+        avg_power_consumption: Optional[float],
+        total_energy: Optional[float],
+        pieces: Optional[int]
+) -> MachineState:  # yapf: enable
+    """Cast the machine state into a JSON-able response."""
+    return {
+        "machine_id": machine_id,
+        "start": start,
+        "stop": stop,
+        "condition": condition,
+        "min_power_consumption": min_power_consumption,
+        "max_power_consumption": max_power_consumption,
+        "avg_power_consumption": avg_power_consumption,
+        "total_energy": total_energy,
+        "pieces": pieces
+    }
+
+
+class MachineStateChange(TypedDict):
+    """
+    Represent an entry of the machine state change log.
+
+    Produce with :func:`machine_state_change`
+    """
+
+    seq: int
+    machine_id: int
+    start: int
+    operation: str
+    state: Optional[MachineState]
+
+
+# yapf: disable
+def machine_state_change(
+        seq: int,
+        machine_id: int,
+        start: int,
+        operation: str,
+        state: Optional[MachineState]
+) -> MachineStateChange:  # yapf: enable
+    """Cast the change log entry into a JSON-able response."""
+    return {
+        "seq": seq,
+        "machine_id": machine_id,
+        "start": start,
+        "operation": operation,
+        "state": state
+    }
+
+
+class MachineStateChanges(TypedDict):
+    """
+    Represent the entries of the machine state change log after a cursor.
+
+    The client passes ``cursor`` as ``since`` of the next request.
+
+    Produce with :func:`machine_state_changes`
+    """
+
+    changes: List[MachineStateChange]
+    cursor: int
+
+
+def machine_state_changes(
+        changes: List[MachineStateChange], cursor: int) -> MachineStateChanges:
+    """Cast the change log entries into a JSON-able response."""
+    return {"changes": changes, "cursor": cursor}
+
+
+class MachineStateAggregate(TypedDict):
+    """
+    Represent the aggregated machine states of a single condition.
+
+    Produce with :func:`machine_state_aggregate`
+    """
+
+    condition: str
+    count: int
+    duration: int
+    total_energy: float
+    pieces: int
+
+
+def machine_state_aggregate(
+        condition: str, count: int, duration: int, total_energy: float,
+        pieces: int) -> MachineStateAggregate:
+    """Cast the aggregate into a JSON-able response."""
+    return {
+        "condition": condition,
+        "count": count,
+        "duration": duration,
+        "total_energy": total_energy,
+        "pieces": pieces
+    }
+
+
+class TimelineSegment(TypedDict):
+    """
+    Represent a segment of the decimated condition timeline of a machine.
+
+    Produce with :func:`timeline_segment`
+    """
+
+    start: int
+    stop: int
+    condition: str
+    fractions: Dict[str, float]
+
+
+def timeline_segment(
+        start: int, stop: int, condition: str,
+        fractions: Dict[str, float]) -> TimelineSegment:
+    """Cast the timeline segment into a JSON-able response."""
+    return {
+        "start": start,
+        "stop": stop,
+        "condition": condition,
+        "fractions": fractions
+    }
+
+
+class MachineStateGap(TypedDict):
+    """
+    Represent a gap between two consecutive states of a machine.
+
+    Produce with :func:`machine_state_gap`
+    """
+
+    machine_id: int
+    start: int
+    stop: int
+
+
+def machine_state_gap(machine_id: int, start: int,
+                      stop: int) -> MachineStateGap:
+    """Cast the gap into a JSON-able response."""
+    return {"machine_id": machine_id, "start": start, "stop": stop}
+
+
+class ShiftInstance(TypedDict):
+    """
+    Represent a single occurrence of a shift.
+
+    Produce with :func:`shift_instance`
+    """
+
+    name: str
+    start: int
+    stop: int
+
+
+def shift_instance(name: str, start: int, stop: int) -> ShiftInstance:
+    """Cast the shift occurrence into a JSON-able response."""
+    return {"name": name, "start": start, "stop": stop}
+
+
+#: columns of the rows in the shift report
+SHIFT_REPORT_COLUMNS = [
+    'shift', 'machine_id', 'condition', 'duration', 'pieces'
+]
+
+
+class ShiftReport(TypedDict):
+    """
+    Represent the production per shift, machine and condition as a table.
+
+    The ``shift`` column of a row indexes the ``shifts``.
+
+    Produce with :func:`shift_report`
+    """
+
+    shifts: List[ShiftInstance]
+    columns: List[str]
+    rows: List[List[Any]]
+
+
+def shift_report(
+        shifts: List[ShiftInstance], rows: List[List[Any]]) -> ShiftReport:
+    """Cast the shift report into a JSON-able response."""
+    return {
+        "shifts": shifts,
+        "columns": SHIFT_REPORT_COLUMNS,
+        "rows": rows
+    }
+
+
+class ConditionProfile(TypedDict):
+    """
+    Represent how many machines were in a condition over time.
+
+    Produce with :func:`condition_profile`
+    """
+
+    condition: str
+    average_count: List[float]
+    peak_count: List[int]
+    average_power: List[float]
+
+
+def condition_profile(
+        condition: str, average_count: List[float], peak_count: List[int],
+        average_power: List[float]) -> ConditionProfile:
+    """Cast the profile of a condition into a JSON-able response."""
+    return {
+        "condition": condition,
+        "average_count": average_count,
+        "peak_count": peak_count,
+        "average_power": average_power
+    }
+
+
+class ConcurrencyProfile(TypedDict):
+    """
+    Represent the concurrency of the fleet binned at a resolution.
+
+    The i-th value of each profile refers to the bin starting at
+    ``start + i * resolution``; the last bin is cut short at ``stop``.
+
+    Produce with :func:`concurrency_profile`
+    """
+
+    start: int
+    stop: int
+    resolution: int
+    profiles: List[ConditionProfile]
+
+
+def concurrency_profile(
+        start: int, stop: int, resolution: int,
+        profiles: List[ConditionProfile]) -> ConcurrencyProfile:
+    """Cast the concurrency profile into a JSON-able response."""
+    return {
+        "start": start,
+        "stop": stop,
+        "resolution": resolution,
+        "profiles": profiles
+    }
+
+
+class RecentPower(TypedDict):
+    """
+    Represent the latest states of a machine as parallel arrays.
+
+    The conditions are given as codes indexing ``conditions``. The unknown
+    power values are null.
+
+    Produce with :func:`recent_power`
+    """
+
+    machine_id: int
+    conditions: List[str]
+    start: List[int]
+    stop: List[int]
+    condition: List[int]
+    min_power: List[Optional[float]]
+    max_power: List[Optional[float]]
+    avg_power: List[Optional[float]]
+    energy: List[Optional[float]]
+
+
+# yapf: disable
+def recent_power(
+        machine_id: int,
+        conditions: List[str],
+        start: List[int],
+        stop: List[int],
+        condition: List[int],
+        min_power: List[Optional[float]],
+        max_power: List[Optional[float]],
+        avg_power: List[Optional[float]],
+        energy: List[Optional[float]]
+) -> RecentPower:  # yapf: enable
+    """Cast the latest states into a JSON-able response."""
+    return {
+        "machine_id": machine_id,
+        "conditions": conditions,
+        "start": start,
+        "stop": stop,
+        "condition": condition,
+        "min_power": min_power,
+        "max_power": max_power,
+        "avg_power": avg_power,
+        "energy": energy
+    }
+
+
+class BudgetStats(TypedDict):
+    """
+    Represent the current load of a route budget.
+
+    Produce with :func:`budget_stats`
+    """
+
+    name: str
+    in_flight: int
+    queued: int
+    shed: int
+    max_in_flight: int
+    max_queued: int
+
+
+def budget_stats(
+        name: str, in_flight: int, queued: int, shed: int, max_in_flight: int,
+        max_queued: int) -> BudgetStats:
+    """Cast the budget statistics into a JSON-able response."""
+    return {
+        "name": name,
+        "in_flight": in_flight,
+        "queued": queued,
+        "shed": shed,
+        "max_in_flight": max_in_flight,
+        "max_queued": max_queued
+    }
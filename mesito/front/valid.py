@@ -1,6 +1,10 @@
 """Validate the input according to schemas from the wild outside world."""
+import hashlib
+import importlib
+import json
+import pathlib
 import typing
-from typing import Any, Tuple, Optional, Union
+from typing import Any, Callable, List, Mapping, Tuple, Optional, Union
 
 import fastjsonschema
 from typing_extensions import TypedDict
@@ -11,23 +15,125 @@ import mesito.model
 # Pylint fires false positive on TypedDict and JSON schema definitions.
 # pylint: disable=invalid-name
 
-_machine_put = fastjsonschema.compile({
-    'type': 'object',
-    'properties': {
-        'id': {
-            'type':
-            'integer',
-            'description':
-            'machine ID; '
-            'if not provided, a new machine should be created.'
+#: package of the validation modules generated at build time;
+#: see :py:func:`generate`
+GENERATED_PACKAGE = 'mesito.front.generated'
+
+
+def _digest(definition: Mapping[str, Any]) -> str:
+    """Identify the code generated for the schema by fastjsonschema."""
+    return hashlib.sha256(
+        (fastjsonschema.VERSION +
+         json.dumps(definition, sort_keys=True)).encode('utf-8')).hexdigest()
+
+
+def _load(
+        name: str, definition: Mapping[str, Any],
+        package: str = GENERATED_PACKAGE) -> Callable[[Any], Any]:
+    """
+    Load the validation function of the schema.
+
+    The code generated by fastjsonschema is imported from the package if
+    it has been generated at build time (see :py:func:`generate`) for
+    the same schema and fastjsonschema version. Otherwise, the schema is
+    compiled in memory.
+
+    :param name: name of the schema, the name of the generated module
+    :param definition: JSON schema
+    :param package: package of the generated modules
+    :return: validation function
+    """
+    try:
+        module = importlib.import_module('{}.{}'.format(package, name))
+    except ImportError:
+        module = None
+
+    if module is not None and getattr(module, 'DIGEST',
+                                      None) == _digest(definition):
+        return typing.cast(Callable[[Any], Any], module.validate)
+
+    return typing.cast(Callable[[Any], Any], fastjsonschema.compile(definition))
+
+
+# Validators of all the schemas, registered on construction
+_VALIDATORS = []  # type: List[_Validator]
+
+
+class _Validator:
+    """Validate against a JSON schema which is compiled on the first use."""
+
+    def __init__(self, name: str, definition: Mapping[str, Any]) -> None:
+        """Initialize with the given values and register the validator."""
+        self.name = name
+        self.definition = definition
+        self._validate = None  # type: Optional[Callable[[Any], Any]]
+
+        _VALIDATORS.append(self)
+
+    def __call__(self, data: Any) -> Any:
+        """Validate the data and raise fastjsonschema exceptions on errors."""
+        if self._validate is None:
+            self._validate = _load(name=self.name, definition=self.definition)
+
+        return self._validate(data)
+
+
+def generate(directory: pathlib.Path) -> List[pathlib.Path]:
+    """
+    Generate the validation modules of all the schemas.
+
+    The modules are meant to be generated into the installed package at
+    build time so that they are trusted as much as the rest of the code.
+    Each module records the digest of its schema and the fastjsonschema
+    version; a stale module is ignored by :py:func:`_load`.
+
+    :param directory: directory of the package :py:data:`GENERATED_PACKAGE`
+    :return: paths to the generated modules
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / '__init__.py').write_text(
+        '"""Provide the validation code generated at build time."""\n')
+
+    paths = []  # type: List[pathlib.Path]
+    for validator in _VALIDATORS:
+        pth = directory / '{}.py'.format(validator.name)
+        pth.write_text(
+            'DIGEST = {!r}\n{}'.format(
+                _digest(validator.definition),
+                fastjsonschema.compile_to_code(validator.definition)))
+        paths.append(pth)
+
+    return paths
+
+
+_machine_put = _Validator(
+    name='machine_put',
+    definition={
+        'type': 'object',
+        'properties': {
+            'id': {
+                'type':
+                'integer',
+                'description':
+                'machine ID; '
+                'if not provided, a new machine should be created.'
+            },
+            'name': {
+                'type': 'string',
+                'description': 'machine name'
+            },
+            'version': {
+                'type':
+                'integer',
+                'minimum':
+                1,
+                'description':
+                'expected current version of the machine; '
+                'if provided, the machine is only updated if it matches.'
+            }
         },
-        'name': {
-            'type': 'string',
-            'description': 'machine name'
-        }
-    },
-    'required': ['name']
-})
+        'required': ['name']
+    })
 
 
 class _MachinePutMandatory(TypedDict):
@@ -42,27 +148,101 @@ class MachinePut(_MachinePutMandatory, total=False):
     """
 
     id: int
+    version: int
 
 
 # yapf: disable
 def machine_put(
-        data: Any
+        data: Any,
+        if_match: Optional[str] = None
 ) -> Tuple[
     Optional[MachinePut],
-    Optional[mesito.front.error.SchemaViolation]]:  # yapf: enable
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
     """
     Validate and cast the input data.
 
     :param data: JSON data
+    :param if_match:
+        value of the ``If-Match`` header, if any, giving the expected version
+        as an entity tag (*e.g.*, ``"3"``)
     :return: cast, error message if any
     """
     try:
         _machine_put(data)
-        return typing.cast(MachinePut, data), None
+        casted = typing.cast(MachinePut, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if if_match is not None:
+        tag = if_match.strip()
+        if tag.startswith('W/'):
+            tag = tag[len('W/'):]
+        tag = tag.strip('"')
+
+        if not tag.isdigit() or int(tag) < 1:
+            return None, mesito.front.error.constraint_violation(
+                why='expected a version in If-Match, but got: {!r}'.format(
+                    if_match))
+
+        if 'version' in casted and casted['version'] != int(tag):
+            return None, mesito.front.error.constraint_violation(
+                why='version differs from If-Match')
+
+        casted = typing.cast(MachinePut, dict(casted))
+        casted['version'] = int(tag)
+
+    if 'version' in casted and 'id' not in casted:
+        return None, mesito.front.error.constraint_violation(
+            why='version given without id')
+
+    return casted, None
+
+
+_machines_put = _Validator(
+    name='machines_put',
+    definition={
+        'type': 'array',
+        'items': _machine_put.definition,
+        'minItems': 1,
+        'maxItems': 10000
+    })
+
+
+# yapf: disable
+def machines_put(
+        data: Any
+) -> Tuple[
+    Optional[List[MachinePut]],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machines_put(data)
+        casted = typing.cast(List[MachinePut], data)
     except fastjsonschema.JsonSchemaException as err:
         return None, mesito.front.error.schema_violation(why=str(err))
 
-_machine_state_put = fastjsonschema.compile({
+    ids = [machine['id'] for machine in casted if 'id' in machine]
+    if len(ids) != len(set(ids)):
+        return None, mesito.front.error.constraint_violation(
+            why='duplicate machine ID')
+
+    if any('version' in machine for machine in casted):
+        return None, mesito.front.error.constraint_violation(
+            why='expected versions are only supported by put_machine')
+
+    return casted, None
+
+
+_machine_state_put = _Validator(name='machine_state_put', definition={
     'type':
         'object',
     'properties': {
@@ -157,3 +337,772 @@ def machine_state_put(
             why='stop before start')
 
     return casted, None
+
+
+_machine_state_extend = _Validator(name='machine_state_extend', definition={
+    'type': 'object',
+    'properties': {
+        'machine_id': {
+            'type': 'integer',
+            'description': 'machine ID'
+        },
+        'start': {
+            'type': 'integer',
+            'description': 'start of the latest state, seconds since epoch'
+        },
+        'stop': {
+            'type': 'integer',
+            'description': 'new end of the latest state, seconds since epoch'
+        },
+        'min_power_consumption': {
+            'type': 'number',
+            'description': 'minimum power consumption in the given time range'
+        },
+        'max_power_consumption': {
+            'type': 'number',
+            'description': 'maximum power consumption in the given time range'
+        },
+        'avg_power_consumption': {
+            'type': 'number',
+            'description': 'average power consumption in the given time range'
+        },
+        'total_energy': {
+            'type': 'number',
+            'description': 'total energy used in the given time range',
+            'minimum': 0
+        }
+    },
+    'required': ['machine_id', 'start', 'stop']
+})
+
+
+class _MachineStateExtendMandatory(TypedDict):
+    machine_id: int
+    start: int
+    stop: int
+
+
+class MachineStateExtend(_MachineStateExtendMandatory, total=False):
+    """
+    Define a request to prolong the latest state of the machine.
+
+    The optional aggregates replace the stored ones.
+
+    Produce with :func:`machine_state_extend`.
+    """
+
+    min_power_consumption: float
+    max_power_consumption: float
+    avg_power_consumption: float
+    total_energy: float
+
+
+# yapf: disable
+def machine_state_extend(
+        data: Any
+) -> Tuple[
+    Optional[MachineStateExtend],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_state_extend(data)
+        casted = typing.cast(MachineStateExtend, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if casted['start'] > casted['stop']:
+        return None, mesito.front.error.constraint_violation(
+            why='stop before start')
+
+    return casted, None
+
+
+_machine_state_range = _Validator(name='machine_state_range', definition={
+    'type': 'object',
+    'properties': {
+        'machine_id': {
+            'type': 'integer',
+            'description': 'machine ID'
+        },
+        'start': {
+            'type': 'integer',
+            'description': 'beginning of the time range, seconds since epoch'
+        },
+        'stop': {
+            'type': 'integer',
+            'description': 'end of the time range, seconds since epoch'
+        }
+    },
+    'required': ['machine_id', 'start', 'stop']
+})
+
+
+class MachineStateRange(TypedDict):
+    """
+    Define a request for the machine states in a time range.
+
+    Produce with :func:`machine_state_range`.
+    """
+
+    machine_id: int
+    start: int
+    stop: int
+
+
+# yapf: disable
+def machine_state_range(
+        data: Any
+) -> Tuple[
+    Optional[MachineStateRange],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_state_range(data)
+        casted = typing.cast(MachineStateRange, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if casted['start'] > casted['stop']:
+        return None, mesito.front.error.constraint_violation(
+            why='stop before start')
+
+    return casted, None
+
+
+_machine_search = _Validator(name='machine_search', definition={
+    'type': 'object',
+    'properties': {
+        'prefix': {
+            'type': 'string',
+            'minLength': 1,
+            'description': 'beginning of the machine name'
+        },
+        'substring': {
+            'type': 'string',
+            'minLength': 1,
+            'description': 'part of the machine name, case-insensitive'
+        },
+        'limit': {
+            'type': 'integer',
+            'minimum': 1,
+            'maximum': 1000,
+            'description': 'maximum number of the machines in the result'
+        }
+    }
+})
+
+
+class MachineSearch(TypedDict, total=False):
+    """
+    Define a search of the machines by name.
+
+    Exactly one of ``prefix`` and ``substring`` is given.
+
+    Produce with :func:`machine_search`.
+    """
+
+    prefix: str
+    substring: str
+    limit: int
+
+
+# yapf: disable
+def machine_search(
+        data: Any
+) -> Tuple[
+    Optional[MachineSearch],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_search(data)
+        casted = typing.cast(MachineSearch, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if ('prefix' in casted) == ('substring' in casted):
+        return None, mesito.front.error.constraint_violation(
+            why='expected exactly one of prefix and substring')
+
+    return casted, None
+
+
+_machine_page = _Validator(name='machine_page', definition={
+    'type': 'object',
+    'properties': {
+        'limit': {
+            'type': 'integer',
+            'minimum': 1,
+            'description': 'maximum number of the machines in the page'
+        },
+        'after': {
+            'type': 'object',
+            'properties': {
+                'name': {
+                    'type': 'string',
+                    'description': 'name of the last machine of the last page'
+                },
+                'id': {
+                    'type': 'integer',
+                    'description': 'ID of the last machine of the last page'
+                }
+            },
+            'required': ['name', 'id'],
+            'description': 'continue after this machine in the (name, ID) order'
+        }
+    }
+})
+
+
+class MachinePageAfter(TypedDict):
+    """Identify the last machine of the previous page."""
+
+    name: str
+    id: int
+
+
+class MachinePage(TypedDict, total=False):
+    """
+    Define a request for a page of the machines ordered by (name, ID).
+
+    Produce with :func:`machine_page`.
+    """
+
+    limit: int
+    after: MachinePageAfter
+
+
+# yapf: disable
+def machine_page(
+        data: Any
+) -> Tuple[
+    Optional[MachinePage],
+    Optional[mesito.front.error.SchemaViolation]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_page(data)
+        return typing.cast(MachinePage, data), None
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+
+#: longest time range of a shift report, in seconds
+SHIFT_REPORT_MAX_RANGE = 31 * 24 * 60 * 60
+
+_shift_report_request = _Validator(name='shift_report_request', definition={
+    'type': 'object',
+    'properties': {
+        'start': {
+            'type': 'integer',
+            'description': 'beginning of the time range, seconds since epoch'
+        },
+        'stop': {
+            'type': 'integer',
+            'description': 'end of the time range, seconds since epoch'
+        },
+        'machine_ids': {
+            'type': 'array',
+            'items': {'type': 'integer'},
+            'maxItems': 1000,
+            'description': 'if given, only these machines are reported'
+        }
+    },
+    'required': ['start', 'stop']
+})
+
+
+class _ShiftReportRequestMandatory(TypedDict):
+    start: int
+    stop: int
+
+
+class ShiftReportRequest(_ShiftReportRequestMandatory, total=False):
+    """
+    Define a request for the production per shift in a time range.
+
+    Produce with :func:`shift_report_request`.
+    """
+
+    machine_ids: List[int]
+
+
+# yapf: disable
+def shift_report_request(
+        data: Any
+) -> Tuple[
+    Optional[ShiftReportRequest],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _shift_report_request(data)
+        casted = typing.cast(ShiftReportRequest, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if casted['start'] > casted['stop']:
+        return None, mesito.front.error.constraint_violation(
+            why='stop before start')
+
+    if casted['stop'] - casted['start'] > SHIFT_REPORT_MAX_RANGE:
+        return None, mesito.front.error.constraint_violation(
+            why='time range longer than {} seconds'.format(
+                SHIFT_REPORT_MAX_RANGE))
+
+    return casted, None
+
+
+#: default and maximum number of the changed machines in a response
+MAX_MACHINE_CHANGES = 1000
+
+_machine_changes_request = _Validator(
+    name='machine_changes_request',
+    definition={
+        'type': 'object',
+        'properties': {
+            'since': {
+                'type': 'integer',
+                'minimum': 0,
+                'description':
+                    'cursor of the last response, or 0 to retrieve all '
+                    'the machines'
+            },
+            'limit': {
+                'type': 'integer',
+                'minimum': 1,
+                'maximum': MAX_MACHINE_CHANGES,
+                'description': 'maximum number of the changed machines'
+            }
+        },
+        'required': ['since']
+    })
+
+
+class _MachineChangesRequestMandatory(TypedDict):
+    since: int
+
+
+class MachineChangesRequest(_MachineChangesRequestMandatory, total=False):
+    """
+    Define a request for the machines changed after a cursor.
+
+    Produce with :func:`machine_changes_request`.
+    """
+
+    limit: int
+
+
+# yapf: disable
+def machine_changes_request(
+        data: Any
+) -> Tuple[
+    Optional[MachineChangesRequest],
+    Optional[mesito.front.error.SchemaViolation]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_changes_request(data)
+        casted = typing.cast(MachineChangesRequest, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    return casted, None
+
+
+#: default and maximum number of the change log entries in a response
+MAX_MACHINE_STATE_CHANGES = 1000
+
+#: maximum seconds to wait for the change log entries
+MAX_MACHINE_STATE_CHANGES_WAIT = 60
+
+_machine_state_changes_request = _Validator(
+    name='machine_state_changes_request',
+    definition={
+        'type': 'object',
+        'properties': {
+            'since': {
+                'type': 'integer',
+                'minimum': 0,
+                'description':
+                    'cursor of the last response, or 0 to read the log '
+                    'from the beginning'
+            },
+            'limit': {
+                'type': 'integer',
+                'minimum': 1,
+                'maximum': MAX_MACHINE_STATE_CHANGES,
+                'description': 'maximum number of the entries'
+            },
+            'wait': {
+                'type': 'number',
+                'minimum': 0,
+                'maximum': MAX_MACHINE_STATE_CHANGES_WAIT,
+                'description':
+                    'if given, seconds to wait for new entries '
+                    'if there are none after the cursor'
+            }
+        },
+        'required': ['since']
+    })
+
+
+class _MachineStateChangesRequestMandatory(TypedDict):
+    since: int
+
+
+class MachineStateChangesRequest(
+        _MachineStateChangesRequestMandatory, total=False):
+    """
+    Define a request for the entries of the machine state change log.
+
+    Produce with :func:`machine_state_changes_request`.
+    """
+
+    limit: int
+    wait: float
+
+
+# yapf: disable
+def machine_state_changes_request(
+        data: Any
+) -> Tuple[
+    Optional[MachineStateChangesRequest],
+    Optional[mesito.front.error.SchemaViolation]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_state_changes_request(data)
+        casted = typing.cast(MachineStateChangesRequest, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    return casted, None
+
+
+_machine_state_gaps = _Validator(name='machine_state_gaps', definition={
+    'type': 'object',
+    'properties': {
+        'start': {
+            'type': 'integer',
+            'description': 'beginning of the time range, seconds since epoch'
+        },
+        'stop': {
+            'type': 'integer',
+            'description': 'end of the time range, seconds since epoch'
+        },
+        'longer_than': {
+            'type': 'integer',
+            'minimum': 0,
+            'description': 'only the gaps longer than this many seconds'
+        },
+        'machine_ids': {
+            'type': 'array',
+            'items': {'type': 'integer'},
+            'maxItems': 1000,
+            'description': 'if given, only the gaps of these machines'
+        }
+    },
+    'required': ['start', 'stop']
+})
+
+
+class _MachineStateGapsMandatory(TypedDict):
+    start: int
+    stop: int
+
+
+class MachineStateGaps(_MachineStateGapsMandatory, total=False):
+    """
+    Define a request for the gaps between the machine states in a time range.
+
+    Produce with :func:`machine_state_gaps`.
+    """
+
+    longer_than: int
+    machine_ids: List[int]
+
+
+# yapf: disable
+def machine_state_gaps(
+        data: Any
+) -> Tuple[
+    Optional[MachineStateGaps],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_state_gaps(data)
+        casted = typing.cast(MachineStateGaps, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if casted['start'] > casted['stop']:
+        return None, mesito.front.error.constraint_violation(
+            why='stop before start')
+
+    return casted, None
+
+
+#: largest number of the buckets of a machine timeline
+MAX_TIMELINE_BUCKETS = 10000
+
+_machine_timeline = _Validator(name='machine_timeline', definition={
+    'type': 'object',
+    'properties': {
+        'machine_id': {
+            'type': 'integer',
+            'description': 'machine ID'
+        },
+        'start': {
+            'type': 'integer',
+            'description': 'beginning of the time range, seconds since epoch'
+        },
+        'stop': {
+            'type': 'integer',
+            'description': 'end of the time range, seconds since epoch'
+        },
+        'buckets': {
+            'type': 'integer',
+            'minimum': 1,
+            'maximum': MAX_TIMELINE_BUCKETS,
+            'description': 'number of the buckets, e.g., the width in pixels'
+        }
+    },
+    'required': ['machine_id', 'start', 'stop', 'buckets']
+})
+
+
+class MachineTimeline(TypedDict):
+    """
+    Define a request for the decimated condition timeline of a machine.
+
+    Produce with :func:`machine_timeline`.
+    """
+
+    machine_id: int
+    start: int
+    stop: int
+    buckets: int
+
+
+# yapf: disable
+def machine_timeline(
+        data: Any
+) -> Tuple[
+    Optional[MachineTimeline],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _machine_timeline(data)
+        casted = typing.cast(MachineTimeline, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if casted['start'] > casted['stop']:
+        return None, mesito.front.error.constraint_violation(
+            why='stop before start')
+
+    return casted, None
+
+
+#: largest number of the bins of a concurrency profile
+MAX_PROFILE_BINS = 100000
+
+_concurrency_profile_request = _Validator(
+    name='concurrency_profile_request',
+    definition={
+        'type': 'object',
+        'properties': {
+            'start': {
+                'type': 'integer',
+                'description':
+                    'beginning of the time range, seconds since epoch'
+            },
+            'stop': {
+                'type': 'integer',
+                'description': 'end of the time range, seconds since epoch'
+            },
+            'resolution': {
+                'type': 'integer',
+                'minimum': 1,
+                'description': 'width of a bin in seconds'
+            },
+            'conditions': {
+                'type': 'array',
+                'items': {
+                    'type': 'string',
+                    'enum': [
+                        cond.value for cond in mesito.model.MachineCondition
+                    ]
+                },
+                'minItems': 1,
+                'uniqueItems': True,
+                'description': 'profiled conditions'
+            }
+        },
+        'required': ['start', 'stop', 'resolution']
+    })
+
+
+class _ConcurrencyProfileRequestMandatory(TypedDict):
+    start: int
+    stop: int
+    resolution: int
+
+
+class ConcurrencyProfileRequest(
+        _ConcurrencyProfileRequestMandatory, total=False):
+    """
+    Define a request for the concurrency profile of the fleet.
+
+    Produce with :func:`concurrency_profile_request`.
+    """
+
+    conditions: List[str]
+
+
+# yapf: disable
+def concurrency_profile_request(
+        data: Any
+) -> Tuple[
+    Optional[ConcurrencyProfileRequest],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _concurrency_profile_request(data)
+        casted = typing.cast(ConcurrencyProfileRequest, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    if casted['start'] >= casted['stop']:
+        return None, mesito.front.error.constraint_violation(
+            why='stop not after start')
+
+    bins = -(-(casted['stop'] - casted['start']) // casted['resolution'])
+    if bins > MAX_PROFILE_BINS:
+        return None, mesito.front.error.constraint_violation(
+            why='more than {} bins'.format(MAX_PROFILE_BINS))
+
+    return casted, None
+
+
+_recent_power_request = _Validator(
+    name='recent_power_request',
+    definition={
+        'type': 'object',
+        'properties': {
+            'machine_id': {
+                'type': 'integer',
+                'description': 'machine ID'
+            },
+            'since': {
+                'type': 'integer',
+                'description':
+                    'if given, only the states stopping after it, '
+                    'seconds since epoch'
+            },
+            'limit': {
+                'type': 'integer',
+                'minimum': 1,
+                'description': 'if given, at most this many latest states'
+            }
+        },
+        'required': ['machine_id']
+    })
+
+
+class _RecentPowerRequestMandatory(TypedDict):
+    machine_id: int
+
+
+class RecentPowerRequest(_RecentPowerRequestMandatory, total=False):
+    """
+    Define a request for the latest states of a machine kept in memory.
+
+    Produce with :func:`recent_power_request`.
+    """
+
+    since: int
+    limit: int
+
+
+# yapf: disable
+def recent_power_request(
+        data: Any
+) -> Tuple[
+    Optional[RecentPowerRequest],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate and cast the input data.
+
+    :param data: JSON data
+    :return: cast, error message if any
+    """
+    try:
+        _recent_power_request(data)
+        casted = typing.cast(RecentPowerRequest, data)
+    except fastjsonschema.JsonSchemaException as err:
+        return None, mesito.front.error.schema_violation(why=str(err))
+
+    return casted, None
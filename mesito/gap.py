@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Find the gaps between the consecutive states of the machines.
+
+A gap is a time range between the stop of a state and the start of the next
+state of the same machine, *e.g.*, where the telemetry went missing.
+
+The gaps are found with the window function ``LAG()`` over the states of
+each machine ordered by start so that the database walks the composite index
+on (machine ID, start) instead of us iterating the rows in Python.
+
+Optionally, the gaps are recorded in the table
+:py:class:`mesito.model.MachineStateGap` which is updated on each put. Since
+the table only reflects the puts made while it was maintained, it needs to be
+rebuilt (see :py:func:`rebuild`) before its maintenance is switched on for
+an existing database.
+"""
+import argparse
+import logging
+import sys
+from typing import List, Optional, Sequence
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.front.out
+import mesito.model
+
+logging.basicConfig(level=logging.INFO)
+
+
+def _window_query(session: sqlalchemy.orm.Session) -> sqlalchemy.orm.Query:
+    """Query every state with the stop of its predecessor as ``prev_stop``."""
+    state = mesito.model.MachineState
+
+    return session.query(
+        state.machine_id, state.start,
+        sqlalchemy.func.lag(state.stop).over(
+            partition_by=state.machine_id,
+            order_by=state.start).label('prev_stop'))
+
+
+def find(
+        session: sqlalchemy.orm.Session,
+        start: int,
+        stop: int,
+        longer_than: int,
+        machine_ids: Optional[List[int]] = None
+) -> List[mesito.front.out.MachineStateGap]:
+    """
+    Find the gaps which lie within the time range with ``LAG()``.
+
+    :param session: database session
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param longer_than: only the gaps longer than this are listed, in seconds
+    :param machine_ids: if given, only the gaps of these machines are listed
+    :return: gaps sorted by machine ID and start
+    """
+    state = mesito.model.MachineState
+
+    query = _window_query(session=session).filter((state.start < stop)
+                                                  & (state.stop > start))
+
+    if machine_ids is not None:
+        query = query.filter(state.machine_id.in_(machine_ids))
+
+    states = query.subquery()
+
+    gaps = session.query(
+        states.c.machine_id, states.c.prev_stop, states.c.start).filter(
+            states.c.prev_stop.isnot(None)
+            & (states.c.start - states.c.prev_stop > longer_than)).order_by(
+                states.c.machine_id, states.c.prev_stop)
+
+    return [
+        mesito.front.out.machine_state_gap(
+            machine_id=machine_id, start=gap_start, stop=gap_stop)
+        for machine_id, gap_start, gap_stop in gaps.all()
+    ]
+
+
+def find_recorded(
+        session: sqlalchemy.orm.Session,
+        start: int,
+        stop: int,
+        longer_than: int,
+        machine_ids: Optional[List[int]] = None
+) -> List[mesito.front.out.MachineStateGap]:
+    """
+    Find the gaps which lie within the time range in the gap table.
+
+    The result equals the one of :py:func:`find` if the table is maintained.
+
+    :param session: database session
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param longer_than: only the gaps longer than this are listed, in seconds
+    :param machine_ids: if given, only the gaps of these machines are listed
+    :return: gaps sorted by machine ID and start
+    """
+    gap = mesito.model.MachineStateGap
+
+    query = session.query(
+        gap.machine_id, gap.start,
+        gap.stop).filter((gap.start > start) & (gap.stop < stop)
+                         & (gap.stop - gap.start > longer_than))
+
+    if machine_ids is not None:
+        query = query.filter(gap.machine_id.in_(machine_ids))
+
+    return [
+        mesito.front.out.machine_state_gap(
+            machine_id=machine_id, start=gap_start, stop=gap_stop)
+        for machine_id, gap_start, gap_stop in query.order_by(
+            gap.machine_id, gap.start).all()
+    ]
+
+
+def record(
+        session: sqlalchemy.orm.Session, machine_id: int, start: int) -> None:
+    """
+    Update the gap table around the state which has just been put.
+
+    The gaps between the predecessor and the successor of the state are
+    replaced by the gaps before and after the state. The gaps are flushed,
+    but committed with the transaction of the caller so that the table
+    never diverges from the states.
+
+    :param session: database session
+    :param machine_id: ID of the machine
+    :param start: start of the put state, seconds since epoch
+    """
+    state = mesito.model.MachineState
+    gap = mesito.model.MachineStateGap
+
+    stop = session.query(state.stop).filter((state.machine_id == machine_id)
+                                            & (state.start == start)).scalar()
+
+    if stop is None:
+        return
+
+    prev_stop = session.query(
+        state.stop).filter((state.machine_id == machine_id)
+                           & (state.start < start)).order_by(
+                               state.start.desc()).limit(1).scalar()
+
+    next_start = session.query(
+        state.start).filter((state.machine_id == machine_id)
+                            & (state.start > start)).order_by(
+                                state.start).limit(1).scalar()
+
+    stale = session.query(gap).filter(gap.machine_id == machine_id)
+    if prev_stop is not None:
+        stale = stale.filter(gap.start >= prev_stop)
+    if next_start is not None:
+        stale = stale.filter(gap.stop <= next_start)
+
+    stale.delete(synchronize_session=False)
+
+    if prev_stop is not None and prev_stop < start:
+        session.add(
+            mesito.model.MachineStateGap(
+                machine_id=machine_id, start=prev_stop, stop=start))
+
+    if next_start is not None and stop < next_start:
+        session.add(
+            mesito.model.MachineStateGap(
+                machine_id=machine_id, start=stop, stop=next_start))
+
+    session.flush()
+
+
+def rebuild(session: sqlalchemy.orm.Session) -> int:
+    """
+    Rebuild the gap table from all the states with a single INSERT ... SELECT.
+
+    :param session: database session
+    :return: number of the recorded gaps
+    """
+    gap_table = mesito.model.MachineStateGap.__table__
+
+    states = _window_query(session=session).subquery()
+
+    select = sqlalchemy.select(
+        [states.c.machine_id, states.c.prev_stop, states.c.start]).where(
+            states.c.prev_stop.isnot(None)
+            & (states.c.prev_stop < states.c.start))
+
+    session.execute(gap_table.delete())
+    session.execute(
+        gap_table.insert().from_select(['machine_id', 'start', 'stop'], select))
+    session.commit()
+
+    count = session.query(
+        sqlalchemy.func.count()).select_from(gap_table).scalar()
+    assert isinstance(count, int)
+    return count
+
+
+def main(command_line_args: Sequence[str]) -> int:
+    """Execute the main routine."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database_url",
+        help="SQLAlchemy database URL; "
+        "see https://docs.sqlalchemy.org/en/13/core/engines.html",
+        required=True)
+    parser.add_argument(
+        "--rebuild",
+        help="If set, rebuilds the gap table from all the states and exits",
+        action="store_true")
+    parser.add_argument(
+        "--start",
+        help="beginning of the time range, seconds since epoch",
+        type=int,
+        default=0)
+    parser.add_argument(
+        "--stop",
+        help="end of the time range, seconds since epoch",
+        type=int,
+        default=2**53)
+    parser.add_argument(
+        "--longer_than",
+        help="only the gaps longer than this many seconds are listed",
+        type=int,
+        default=0)
+    parser.add_argument(
+        "--machine_id",
+        help="if given, only the gaps of this machine are listed; "
+        "can be repeated",
+        type=int,
+        action='append')
+    parser.add_argument(
+        "--from_table",
+        help="If set, reads the gaps from the gap table",
+        action="store_true")
+    args = parser.parse_args(args=command_line_args)
+
+    engine = sqlalchemy.create_engine(str(args.database_url))
+    session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+    try:
+        if args.rebuild:
+            logging.info("Rebuilding the gap table...")
+            count = rebuild(session=session)
+            logging.info("Recorded %d gap(s).", count)
+            return 0
+
+        finder = find_recorded if args.from_table else find
+        gaps = finder(
+            session=session,
+            start=int(args.start),
+            stop=int(args.stop),
+            longer_than=int(args.longer_than),
+            machine_ids=([int(machine_id) for machine_id in args.machine_id]
+                         if args.machine_id is not None else None))
+    finally:
+        session.close()
+
+    print("machine_id\tstart\tstop\tduration")
+    for gap in gaps:
+        print(
+            "{}\t{}\t{}\t{}".format(
+                gap['machine_id'], gap['start'], gap['stop'],
+                gap['stop'] - gap['start']))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(command_line_args=sys.argv[1:]))
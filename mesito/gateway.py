@@ -0,0 +1,91 @@
+"""
+Authenticate the gateways streaming the machine states over Socket.IO.
+
+A gateway reporting every second keeps a single Socket.IO connection open
+in the namespace :py:data:`NAMESPACE` instead of sending an HTTP request per
+state. It emits the events ``put_machine_state`` and ``extend_machine_state``
+with the same payloads as the equally-named endpoints and receives the same
+response bodies as the acknowledgements: the ID of the put state or
+the prolonged state on success, and the :py:mod:`mesito.front.error` payload
+otherwise.
+
+The gateway authenticates on connect with one of the configured tokens,
+either in the header ``Authorization: Bearer <token>`` or, for the clients
+which can not set the headers, in the query parameter ``token``.
+
+The events observe the ingest budget of :py:mod:`mesito.admission` and are
+acknowledged with the :py:func:`mesito.front.error.overloaded` payload if
+shed. A gateway retrying an event can give the idempotency key as the second
+argument of the event; see :py:mod:`mesito.idempotency`.
+"""
+import hmac
+import pathlib
+from typing import Any, Callable, List, Optional, Tuple
+
+#: Socket.IO namespace of the ingestion
+NAMESPACE = '/ingest'
+
+#: events handled in the namespace
+EVENTS = ['put_machine_state', 'extend_machine_state']
+
+#: handler of an event given the payload and the idempotency key, if any,
+#: returning the status code as in HTTP and the acknowledgement
+Handler = Callable[[Any, Optional[Any]], Tuple[int, Any]]
+
+
+def load_tokens(path: pathlib.Path) -> List[str]:
+    """
+    Load the tokens of the gateways, one per line.
+
+    The blank lines and the lines starting with ``#`` are ignored.
+
+    :param path: path to the token file
+    :return: loaded tokens
+    :raise ValueError: if the file lists no tokens
+    """
+    tokens = [
+        line.strip() for line in path.read_text().splitlines()
+        if line.strip() and not line.strip().startswith('#')
+    ]
+
+    if not tokens:
+        raise ValueError("Expected at least one token in: {}".format(path))
+
+    return tokens
+
+
+def authorized(
+        tokens: List[str], authorization: Optional[str],
+        token: Optional[str]) -> bool:
+    """
+    Check the credentials of a connecting gateway.
+
+    :param tokens: tokens of the gateways
+    :param authorization: value of the ``Authorization`` header, if any
+    :param token: value of the query parameter ``token``, if any
+    :return: True if one of the credentials matches a token
+
+    >>> authorized(['secret'], 'Bearer secret', None)
+    True
+    >>> authorized(['secret'], None, 'secret')
+    True
+    >>> authorized(['secret'], 'Basic secret', 'other')
+    False
+    """
+    candidates = []  # type: List[str]
+
+    if authorization is not None and authorization.startswith('Bearer '):
+        candidates.append(authorization[len('Bearer '):].strip())
+
+    if token is not None:
+        candidates.append(token)
+
+    # Compare in constant time against every token not to leak which matched.
+    matched = False
+    for candidate in candidates:
+        for expected in tokens:
+            if hmac.compare_digest(candidate.encode('utf-8'),
+                                   expected.encode('utf-8')):
+                matched = True
+
+    return matched
@@ -0,0 +1,463 @@
+"""
+Handle the API requests independent of the web framework.
+
+Each handler validates the decoded JSON body of a request, executes
+the operation in the given session and returns the status code together with
+the JSON-able response. The Flask routes (:py:mod:`mesito.route`),
+the ASGI application (:py:mod:`mesito.asgi`) and the Socket.IO gateways only
+adapt the requests and the responses of their framework.
+
+The handlers changing the machines append the Socket.IO events to the given
+list instead of emitting them, since each server emits in its own way.
+The analytics are likewise split into the validation of the request and
+the computation, either in a session or in the pool of worker processes, so
+that each server can wait for the pool in its own way. The long polls of
+the change log stay in the servers as they wait in their own way as well.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import sqlalchemy.orm
+
+import mesito.analytics
+import mesito.archive
+import mesito.board
+import mesito.fleet
+import mesito.front.error
+import mesito.front.out
+import mesito.front.valid
+import mesito.gap
+import mesito.ingest
+import mesito.operation
+import mesito.recent
+import mesito.shift
+
+# Socket.IO events to be broadcast once the request has been handled,
+# given as (event, data)
+Events = List[Tuple[str, Any]]
+
+
+def put_machine(
+        session: sqlalchemy.orm.Session, data: Any, if_match: Optional[str],
+        events: Events) -> Tuple[int, Any]:
+    """
+    Upsert a machine, optionally on the version given in If-Match.
+
+    :param session: database session
+    :param data: JSON data of the request
+    :param if_match: value of the If-Match header, if any
+    :param events: collects the events to be broadcast
+    :return: status code, response
+    """
+    casted, local_err = mesito.front.valid.machine_put(
+        data=data, if_match=if_match)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    machine_id_version, global_err = mesito.operation.put_machine(
+        session=session, data=casted)
+
+    if global_err is not None:
+        if global_err['what'] == 'MachineVersionConflict':
+            return 409, global_err
+
+        return 400, global_err
+
+    assert machine_id_version is not None
+    machine_id, version, change_seq = machine_id_version
+
+    assert machine_id is not None, \
+        "Expected machine ID to be set on successful operation"
+
+    events.append((
+        "put_machine",
+        mesito.front.out.machine_put_emit(
+            id=machine_id,
+            name=casted["name"],
+            version=version,
+            change_seq=change_seq)))
+
+    return 200, {'id': machine_id, 'version': version}
+
+
+def put_machines(session: sqlalchemy.orm.Session, data: Any,
+                 events: Events) -> Tuple[int, Any]:
+    """
+    Upsert many machines in a single transaction.
+
+    :param session: database session
+    :param data: JSON data of the request
+    :param events: collects the events to be broadcast
+    :return: status code, response
+    """
+    casted, local_err = mesito.front.valid.machines_put(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    ids_versions, global_err = mesito.operation.put_machines(
+        session=session, data=casted)
+
+    if global_err is not None:
+        return 400, global_err
+
+    assert ids_versions is not None
+
+    # A single aggregated event instead of one broadcast per machine
+    events.append((
+        "put_machines", [
+            mesito.front.out.machine_put_emit(
+                id=machine_id,
+                name=machine["name"],
+                version=version,
+                change_seq=change_seq)
+            for machine, (machine_id, version,
+                          change_seq) in zip(casted, ids_versions)
+        ]))
+
+    return 200, [{
+        'id': machine_id,
+        'version': version
+    } for machine_id, version, _ in ids_versions]
+
+
+def serve_machines(session: sqlalchemy.orm.Session,
+                   data: Any) -> Tuple[int, Any]:
+    """
+    Serve the machines ordered by (name, ID).
+
+    Without a request body, all the machines are served. Otherwise, the body
+    specifies a page in keyset pagination.
+
+    :param session: database session
+    :param data: JSON data of the request, None if there is no body
+    :return: status code, response
+    """
+    page = None  # type: Optional[mesito.front.valid.MachinePage]
+
+    if data is not None:
+        page, local_err = mesito.front.valid.machine_page(data=data)
+
+        if local_err is not None:
+            return 400, local_err
+
+        assert page is not None
+
+    return 200, mesito.operation.get_machines(session=session, page=page)
+
+
+def serve_machine_changes(session: sqlalchemy.orm.Session,
+                          data: Any) -> Tuple[int, Any]:
+    """Serve the machines changed after the cursor in the order of changes."""
+    casted, local_err = mesito.front.valid.machine_changes_request(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    return 200, mesito.operation.get_machine_changes(
+        session=session, request=casted)
+
+
+def serve_machine_search(session: sqlalchemy.orm.Session, data: Any,
+                         fts: bool) -> Tuple[int, Any]:
+    """
+    Serve the machines matching the name prefix or substring.
+
+    :param session: database session
+    :param data: JSON data of the request
+    :param fts: if set, the substrings are searched in the full-text index
+    :return: status code, response
+    """
+    casted, local_err = mesito.front.valid.machine_search(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    return 200, mesito.operation.search_machines(
+        session=session, data=casted, fts=fts)
+
+
+def _remember(
+        session: sqlalchemy.orm.Session, recent: mesito.recent.Recent,
+        state: mesito.front.out.MachineState) -> None:
+    """Record the state in the recent buffer, warming it if necessary."""
+    if not recent.update(state=state):
+        recent.warm(session=session, state=state)
+
+
+# yapf: disable
+def put_machine_state(
+        session: sqlalchemy.orm.Session,
+        data: Any,
+        board: mesito.board.Board,
+        recent: mesito.recent.Recent,
+        state_ingest: mesito.ingest.PutMachineState,
+        gap_table: bool,
+        change_log: bool
+) -> Tuple[int, Any]:  # yapf: enable
+    """
+    Validate and upsert the state, then update the in-memory views.
+
+    :param session: database session
+    :param data: JSON data of the request
+    :param board: current state of every machine
+    :param recent: latest states of every machine
+    :param state_ingest: operation upserting a machine state
+    :param gap_table: if set, the gap table is maintained
+    :param change_log: if set, the change log is maintained
+    :return: status code, ID of the machine state or the error
+    """
+    # pylint: disable=too-many-arguments
+    casted, local_err = mesito.front.valid.machine_state_put(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    machine_state_id, global_err = state_ingest(
+        session, casted, gap_table, change_log)
+
+    if global_err is not None:
+        return 400, global_err
+
+    assert machine_state_id is not None
+
+    machine_state = mesito.operation.machine_state_from_put(data=casted)
+    board.update(machine_state)
+    _remember(session=session, recent=recent, state=machine_state)
+
+    return 200, machine_state_id
+
+
+# yapf: disable
+def extend_machine_state(
+        session: sqlalchemy.orm.Session,
+        data: Any,
+        board: mesito.board.Board,
+        recent: mesito.recent.Recent,
+        gap_table: bool,
+        change_log: bool
+) -> Tuple[int, Any]:  # yapf: enable
+    """
+    Validate and prolong the latest state, then update the in-memory views.
+
+    :param session: database session
+    :param data: JSON data of the request
+    :param board: current state of every machine
+    :param recent: latest states of every machine
+    :param gap_table: if set, the gap table is maintained
+    :param change_log: if set, the change log is maintained
+    :return: status code, prolonged machine state or the error
+    """
+    casted, local_err = mesito.front.valid.machine_state_extend(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    machine_state, global_err = mesito.operation.extend_machine_state(
+        session=session,
+        data=casted,
+        current=board.get(casted['machine_id']),
+        gap_table=gap_table,
+        change_log=change_log)
+
+    if global_err is not None:
+        return 400, global_err
+
+    assert machine_state is not None
+
+    board.update(machine_state)
+    _remember(session=session, recent=recent, state=machine_state)
+
+    return 200, machine_state
+
+
+def serve_machine_states(
+        session: sqlalchemy.orm.Session, data: Any,
+        archive: Optional[mesito.archive.Archive]) -> Tuple[int, Any]:
+    """
+    Serve the states of a machine in a time range, including archived.
+
+    :param session: database session
+    :param data: JSON data of the request
+    :param archive: if set, the archived machine states are merged
+    :return: status code, response
+    """
+    casted, local_err = mesito.front.valid.machine_state_range(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    return 200, mesito.operation.get_machine_states(
+        session=session,
+        machine_id=casted['machine_id'],
+        start=casted['start'],
+        stop=casted['stop'],
+        archive=archive)
+
+
+def serve_machine_state_gaps(session: sqlalchemy.orm.Session, data: Any,
+                             gap_table: bool) -> Tuple[int, Any]:
+    """
+    Serve the gaps between the consecutive machine states in a time range.
+
+    :param session: database session
+    :param data: JSON data of the request
+    :param gap_table: if set, the gaps are read from the gap table
+    :return: status code, response
+    """
+    casted, local_err = mesito.front.valid.machine_state_gaps(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    finder = mesito.gap.find_recorded if gap_table else mesito.gap.find
+
+    return 200, finder(
+        session=session,
+        start=casted['start'],
+        stop=casted['stop'],
+        longer_than=casted.get('longer_than', 0),
+        machine_ids=casted.get('machine_ids', None))
+
+
+def serve_recent_power(
+        session: sqlalchemy.orm.Session, data: Any,
+        recent: mesito.recent.Recent) -> Tuple[int, Any]:
+    """
+    Serve the latest states of a machine from memory, warming if cold.
+
+    :param session: database session, only queried if the buffer is cold
+    :param data: JSON data of the request
+    :param recent: latest states of every machine
+    :return: status code, response
+    """
+    casted, local_err = mesito.front.valid.recent_power_request(data=data)
+
+    if local_err is not None:
+        return 400, local_err
+
+    assert casted is not None
+
+    if not recent.is_warm(machine_id=casted['machine_id']):
+        recent.warm_for_read(session=session, machine_id=casted['machine_id'])
+
+    return 200, recent.get(
+        machine_id=casted['machine_id'],
+        since=casted.get('since', None),
+        limit=casted.get('limit', None))
+
+
+# Validation of the request of an analytics task, the required keyword
+# arguments and the optional ones with their defaults
+_Analytics = Tuple[
+    Callable[..., Tuple[Any, Any]], Sequence[str], Dict[str, Any]]
+
+# yapf: disable
+_ANALYTICS = {
+    'machine_state_aggregates': (
+        mesito.front.valid.machine_state_range,
+        ['machine_id', 'start', 'stop'], {}),
+    'machine_timeline': (
+        mesito.front.valid.machine_timeline,
+        ['machine_id', 'start', 'stop', 'buckets'], {}),
+    'concurrency_profile': (
+        mesito.front.valid.concurrency_profile_request,
+        ['start', 'stop', 'resolution'],
+        {'conditions': mesito.fleet.DEFAULT_CONDITIONS}),
+    'shift_report': (
+        mesito.front.valid.shift_report_request,
+        ['start', 'stop'], {'machine_ids': None})
+}  # type: Dict[str, _Analytics]
+# yapf: enable
+
+
+# yapf: disable
+def analytics_request(
+        task: str,
+        data: Any
+) -> Tuple[
+    Optional[Dict[str, Any]],
+    Optional[Union[
+        mesito.front.error.SchemaViolation,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Validate the request of an analytics task.
+
+    :param task: name of the task in :py:data:`mesito.analytics.TASKS`
+    :param data: JSON data of the request
+    :return: keyword arguments of the task, error if any
+    """
+    validate, required, optional = _ANALYTICS[task]
+
+    casted, local_err = validate(data=data)
+
+    if local_err is not None:
+        return None, local_err
+
+    assert casted is not None
+
+    kwargs = {name: casted[name] for name in required}
+    for name, default in optional.items():
+        kwargs[name] = casted.get(name, default)
+
+    return kwargs, None
+
+
+# yapf: disable
+def analyze(
+        session: sqlalchemy.orm.Session,
+        task: str,
+        kwargs: Dict[str, Any],
+        archive: Optional[mesito.archive.Archive],
+        calendar: mesito.shift.Calendar
+) -> Tuple[int, Any]:  # yapf: enable
+    """
+    Compute the analytics task in the session, without a pool.
+
+    :param session: database session
+    :param task: name of the task in :py:data:`mesito.analytics.TASKS`
+    :param kwargs: keyword arguments of the task
+    :param archive: if set, the archived machine states are merged
+    :param calendar: shift calendar of the plant
+    :return: status code, response
+    """
+    return 200, mesito.analytics.compute(
+        session=session,
+        task=task,
+        kwargs=kwargs,
+        archive=archive,
+        calendar=calendar)
+
+
+def analyze_in_pool(pool: mesito.analytics.Pool, task: str,
+                    kwargs: Dict[str, Any]) -> Tuple[int, Any]:
+    """
+    Execute the analytics task in the pool and wait for its result.
+
+    :param pool: pool of the worker processes
+    :param task: name of the task in :py:data:`mesito.analytics.TASKS`
+    :param kwargs: keyword arguments of the task
+    :return: status code, response; 503 if the task timed out
+    """
+    result, err = pool.run(task=task, kwargs=kwargs)
+
+    if err is not None:
+        return 503, err
+
+    return 200, result
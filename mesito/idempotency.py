@@ -0,0 +1,289 @@
+"""
+Replay the responses to the retried requests with the same idempotency key.
+
+The gateways retry the posts on timeouts. A request carrying
+the ``Idempotency-Key`` header which has been successfully handled before
+is answered with the remembered response without touching the handler or,
+if the response is still in memory, the database. The responses are kept
+in a bounded LRU and expire after a time-to-live. Optionally, they are also
+persisted to the table :py:class:`mesito.model.IdempotencyKey` so that they
+survive restarts and are shared among the processes.
+
+The keys are scoped by the endpoint. A key reused with a different request
+body is rejected with 422.
+
+The gateways streaming over Socket.IO give the key as the second argument of
+the event instead of the header; see :py:mod:`mesito.gateway`.
+
+Only the successful responses are remembered. Two concurrent requests with
+the same key are both handled, which is harmless as the upserts themselves
+are idempotent.
+"""
+import collections
+import functools
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+import flask
+import sqlalchemy.exc
+import sqlalchemy.orm
+
+import mesito.front.error
+import mesito.gateway
+import mesito.model
+import mesito.route
+
+#: name of the request header
+HEADER = 'Idempotency-Key'
+
+#: name of the response header set on the replayed responses
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+#: maximum length of the key in the header
+MAX_KEY_LENGTH = 256
+
+# How many responses are persisted between two prunings of the expired rows.
+_PRUNE_EVERY = 1000
+
+
+class Entry:
+    """Represent a remembered response."""
+
+    def __init__(
+            self, fingerprint: str, status: int, body: bytes,
+            created: float) -> None:
+        """
+        Initialize with the given values.
+
+        :param fingerprint: SHA-256 of the request body
+        :param status: status code of the response
+        :param body: JSON body of the response
+        :param created: when the response was remembered, seconds since epoch
+        """
+        self.fingerprint = fingerprint
+        self.status = status
+        self.body = body
+        self.created = created
+
+
+class Idempotency:
+    """Remember the responses by their idempotency keys."""
+
+    # yapf: disable
+    def __init__(
+            self,
+            max_keys: int,
+            ttl: float,
+            session_factory: Optional[sqlalchemy.orm.scoped_session] = None,
+            clock: Callable[[], float] = time.time
+    ) -> None:  # yapf: enable
+        """
+        Initialize with the given values.
+
+        :param max_keys: maximum number of the responses kept in memory
+        :param ttl: time-to-live of the responses, in seconds
+        :param session_factory:
+            if set, the responses are also persisted to the database
+        :param clock: source of the current time, seconds since epoch
+        """
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.session_factory = session_factory
+        self.clock = clock
+
+        self._entries = collections.OrderedDict(
+        )  # type: collections.OrderedDict[str, Entry]
+        self._lock = threading.Lock()
+        self._persisted = 0
+
+    def lookup(self, key: str) -> Optional[Entry]:
+        """
+        Retrieve the response remembered for the key, if not expired.
+
+        :param key: key scoped by the endpoint
+        :return: remembered response, if any
+        """
+        now = self.clock()
+
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                if now - entry.created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry
+
+                del self._entries[key]
+
+        if self.session_factory is None:
+            return None
+
+        row = self.session_factory().query(mesito.model.IdempotencyKey).get(key)
+        if row is None or now - row.created > self.ttl:
+            return None
+
+        entry = Entry(
+            fingerprint=row.fingerprint,
+            status=row.status,
+            body=row.body,
+            created=row.created)
+        self._keep(key=key, entry=entry)
+
+        return entry
+
+    def _keep(self, key: str, entry: Entry) -> None:
+        """Keep the response in memory and evict the least recently used."""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def remember(self, key: str, entry: Entry) -> None:
+        """
+        Remember the response for the key.
+
+        :param key: key scoped by the endpoint
+        :param entry: response to be remembered
+        """
+        self._keep(key=key, entry=entry)
+
+        if self.session_factory is None:
+            return
+
+        session = self.session_factory()
+
+        row = mesito.model.IdempotencyKey()
+        row.key = key
+        row.fingerprint = entry.fingerprint
+        row.status = entry.status
+        row.body = entry.body
+        row.created = int(entry.created)
+
+        try:
+            # Merge so that an expired row with the same key is overwritten.
+            session.merge(row)
+            session.commit()
+        except sqlalchemy.exc.IntegrityError:
+            # A concurrent request with the same key has been persisted first.
+            session.rollback()
+            return
+
+        with self._lock:
+            self._persisted += 1
+            prune = self._persisted % _PRUNE_EVERY == 0
+
+        if prune:
+            cutoff = int(entry.created - self.ttl)
+            session.query(mesito.model.IdempotencyKey).filter(
+                mesito.model.IdempotencyKey.created < cutoff).delete(
+                    synchronize_session=False)
+            session.commit()
+
+    def guard(self, handler: Callable[[], Any]) -> Callable[[], Any]:
+        """Wrap the route handler so that the retried requests are replayed."""
+
+        @functools.wraps(handler)
+        def guarded() -> Any:
+            """Replay the remembered response or handle the request."""
+            key = flask.request.headers.get(HEADER, None)
+            if key is None:
+                return handler()
+
+            codec = mesito.route.json_codec()
+
+            if key == '' or len(key) > MAX_KEY_LENGTH:
+                return flask.current_app.response_class(
+                    codec.dumpb(
+                        mesito.front.error.constraint_violation(
+                            why='expected {} of 1 to {} characters'.format(
+                                HEADER, MAX_KEY_LENGTH))),
+                    status=400,
+                    mimetype='application/json')
+
+            scoped_key = '{}:{}'.format(flask.request.endpoint, key)
+            fingerprint = hashlib.sha256(flask.request.get_data()).hexdigest()
+
+            entry = self.lookup(key=scoped_key)
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    return flask.current_app.response_class(
+                        codec.dumpb(
+                            mesito.front.error.idempotency_key_reused(key=key)),
+                        status=422,
+                        mimetype='application/json')
+
+                response = flask.current_app.response_class(
+                    entry.body,
+                    status=entry.status,
+                    mimetype='application/json')
+                response.headers[REPLAYED_HEADER] = 'true'
+                return response
+
+            response = flask.make_response(handler())
+
+            if response.status_code == 200 and not response.is_streamed:
+                self.remember(
+                    key=scoped_key,
+                    entry=Entry(
+                        fingerprint=fingerprint,
+                        status=response.status_code,
+                        body=response.get_data(),
+                        created=self.clock()))
+
+            return response
+
+        return guarded
+
+    def guard_event(
+            self, event: str,
+            handler: mesito.gateway.Handler) -> mesito.gateway.Handler:
+        """
+        Wrap the Socket.IO event handler so that retried events are replayed.
+
+        :param event: name of the event scoping the keys
+        :param handler: handler of the event
+        :return: wrapped handler
+        """
+
+        @functools.wraps(handler)
+        def guarded(data: Any, key: Optional[Any] = None) -> Tuple[int, Any]:
+            """Replay the remembered acknowledgement or handle the event."""
+            if key is None:
+                return handler(data, key)
+
+            if (not isinstance(key, str) or key == ''
+                    or len(key) > MAX_KEY_LENGTH):
+                return 400, mesito.front.error.constraint_violation(
+                    why='expected the idempotency key of 1 to {} characters'.
+                    format(MAX_KEY_LENGTH))
+
+            codec = mesito.route.json_codec()
+
+            scoped_key = '{}:{}'.format(event, key)
+            fingerprint = hashlib.sha256(codec.dumpb(data)).hexdigest()
+
+            entry = self.lookup(key=scoped_key)
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    return 422, mesito.front.error.idempotency_key_reused(
+                        key=key)
+
+                return entry.status, codec.loads(entry.body)
+
+            status, ack = handler(data, key)
+
+            if status == 200:
+                self.remember(
+                    key=scoped_key,
+                    entry=Entry(
+                        fingerprint=fingerprint,
+                        status=status,
+                        body=codec.dumpb(ack),
+                        created=self.clock()))
+
+            return status, ack
+
+        return guarded
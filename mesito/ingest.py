@@ -0,0 +1,196 @@
+"""
+Ingest the machine states with pre-built Core statements.
+
+:py:func:`mesito.operation.put_machine_state` goes through the ORM: each
+state becomes a :py:class:`mesito.model.MachineState` tracked by
+the identity map and written by the unit-of-work flush. This module
+implements the same operation with SQLAlchemy Core statements which are
+built once at import and compiled once per dialect, so that an ingested
+state costs only the parameter binding and the round trips.
+
+The semantics and the errors are identical to the ORM path. The path is
+selected on startup with :py:func:`select`.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.changelog
+import mesito.front.error
+import mesito.front.valid
+import mesito.gap
+import mesito.model
+import mesito.operation
+
+# yapf: disable
+PutMachineState = Callable[
+    [sqlalchemy.orm.Session, mesito.front.valid.MachineStatePut, bool, bool],
+    Tuple[
+        Optional[int],
+        Optional[Union[
+            mesito.front.error.MachineStateOverlap,
+            mesito.front.error.MachineStateConditionChanged,
+            mesito.front.error.MachineNotFound]]]]
+# yapf: enable
+
+_MACHINE = mesito.model.Machine.__table__
+_STATE = mesito.model.MachineState.__table__
+
+_MACHINE_EXISTS = sqlalchemy.select([
+    sqlalchemy.literal(True)
+]).where(_MACHINE.c.id == sqlalchemy.bindparam('machine_id')).limit(1)
+
+_FIND_STATE = sqlalchemy.select([
+    _STATE.c.id, _STATE.c.condition
+]).where((_STATE.c.machine_id == sqlalchemy.bindparam('machine_id'))
+         & (_STATE.c.start == sqlalchemy.bindparam('start'))).limit(1)
+
+_OVERLAP = sqlalchemy.select([_STATE.c.start, _STATE.c.stop]).where(
+    (_STATE.c.start < sqlalchemy.bindparam('stop'))
+    & (_STATE.c.stop > sqlalchemy.bindparam('start'))
+    & (_STATE.c.machine_id == sqlalchemy.bindparam('machine_id'))).limit(1)
+
+# Columns written on both insert and update of a state
+_VALUES = [
+    'stop', 'condition', 'min_power_consumption', 'max_power_consumption',
+    'avg_power_consumption', 'total_energy', 'pieces'
+]
+
+_INSERT_STATE = _STATE.insert().values(
+    machine_id=sqlalchemy.bindparam('machine_id'),
+    start=sqlalchemy.bindparam('start'),
+    **{name: sqlalchemy.bindparam(name)
+       for name in _VALUES})
+
+_UPDATE_STATE = _STATE.update().where(
+    _STATE.c.id == sqlalchemy.bindparam('state_id')).values(
+        **{name: sqlalchemy.bindparam(name)
+           for name in _VALUES})
+
+# Compiled forms of the statements above, keyed by the statement and
+# the dialect. The statements are fixed so the cache stays small.
+_COMPILED_CACHE = {}  # type: Dict[Any, Any]
+
+
+# yapf: disable
+def put_machine_state(
+        session: sqlalchemy.orm.Session,
+        data: mesito.front.valid.MachineStatePut,
+        gap_table: bool = False,
+        change_log: bool = False
+) -> Tuple[
+    Optional[int],
+    Optional[Union[
+        mesito.front.error.MachineStateOverlap,
+        mesito.front.error.MachineStateConditionChanged,
+        mesito.front.error.MachineNotFound]]]:  # yapf: enable
+    """
+    Upsert the machine state into the database with Core statements.
+
+    See :py:func:`mesito.operation.put_machine_state` for the semantics.
+
+    :param session: database session
+    :param data: validated request data
+    :param gap_table: if set, the gap table is updated in the same transaction
+    :param change_log: if set, the change is appended to the change log
+    :return: ID of the machine state or error, if any
+    """
+    connection = session.connection().execution_options(
+        compiled_cache=_COMPILED_CACHE)
+
+    machine_id = data['machine_id']
+    start = data['start']
+    stop = data['stop']
+
+    machine_exists = connection.execute(
+        _MACHINE_EXISTS, {
+            'machine_id': machine_id
+        }).first()
+
+    if not machine_exists:
+        return None, mesito.front.error.machine_not_found(
+            machine_id=machine_id)
+
+    existing = connection.execute(
+        _FIND_STATE, {
+            'machine_id': machine_id,
+            'start': start
+        }).first()
+
+    ##
+    # Verify
+    ##
+
+    # Existing machine state must not change condition.
+    if existing is not None and existing.condition != data['condition']:
+        return None, mesito.front.error.machine_state_condition_changed(
+            old=existing.condition, new=data['condition'])
+
+    first = connection.execute(
+        _OVERLAP, {
+            'machine_id': machine_id,
+            'start': start,
+            'stop': stop
+        }).first()
+
+    if first is not None and not (first.start == start and first.stop <= stop):
+        return None, mesito.front.error.machine_state_overlap(
+            start=first.start, stop=first.stop, machine_id=machine_id)
+
+    ##
+    # Upsert
+    ##
+
+    values = {name: data.get(name, None) for name in _VALUES}
+
+    if existing is None:
+        values['machine_id'] = machine_id
+        values['start'] = start
+        result = connection.execute(_INSERT_STATE, values)
+        machine_state_id = result.inserted_primary_key[0]
+        operation = mesito.model.MachineStateOperation.INSERT
+    else:
+        values['state_id'] = existing.id
+        connection.execute(_UPDATE_STATE, values)
+        machine_state_id = existing.id
+        operation = mesito.model.MachineStateOperation.UPDATE
+
+    if gap_table:
+        mesito.gap.record(session=session, machine_id=machine_id, start=start)
+
+    if change_log:
+        mesito.changelog.record(
+            session=session,
+            machine_id=machine_id,
+            start=start,
+            operation=operation)
+
+    session.commit()
+
+    assert isinstance(machine_state_id, int)
+
+    return machine_state_id, None
+
+
+#: names of the ingest paths as given on the command line
+NAMES = ['core', 'orm']
+
+
+def select(name: str) -> PutMachineState:
+    """
+    Select the implementation of the machine state ingestion.
+
+    :param name: ``core`` for the Core statements, ``orm`` for the ORM
+    :return: operation upserting a machine state
+
+    >>> select('core') is put_machine_state
+    True
+    """
+    if name == 'core':
+        return put_machine_state
+
+    if name == 'orm':
+        return mesito.operation.put_machine_state
+
+    raise ValueError("Unknown ingest path: {!r}".format(name))
@@ -1,88 +1,152 @@
 #!/usr/bin/env python3
 """Run a mesito server."""
 
-# pylint: disable=wrong-import-position,wrong-import-order,ungrouped-imports
+# The heavy dependencies (Flask, SQLAlchemy) are imported only once
+# the arguments have been parsed so that the command-line paths such as
+# ``--help`` and argument errors return quickly.
+#
+# Gevent needs to patch the standard library before anything else imports it,
+# otherwise the locks created in the meanwhile are not cooperative. The entry
+# point (``bin/mesito``) patches it hence before importing this module so
+# that importing the module has no such side effect.
 
-import gevent.monkey
-gevent.monkey.patch_all()
+# pylint: disable=import-outside-toplevel
 
 import logging
-import argparse
 import platform
 import signal
 import sys
-from typing import Sequence, Tuple
+from typing import Optional, Sequence, Tuple, TYPE_CHECKING
 
-import flask
-import flask_socketio
-import sqlalchemy
-import sqlalchemy.orm
+import mesito.args
 
-import mesito.app
+if TYPE_CHECKING:
+    # pylint: disable=unused-import
+    import flask
+    import flask_socketio
 
 logging.basicConfig(level=logging.INFO)
 
 
-class Args:
-    """Represent parsed program arguments."""
-
-    def __init__(
-            self, port: int, database_url: str,
-            cors_allowed_all_origins: bool) -> None:
-        """Initialize with the given values."""
-        self.port = port
-        self.database_url = database_url
-        self.cors_allowed_all_origins = cors_allowed_all_origins
-
-
-def parse_args(command_line_args: Sequence[str]) -> Args:
-    """Parse the given command-line arguments and raise exceptions on errors."""
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument(
-        "--port", help="port on which to serve", required=True, type=int)
-    parser.add_argument(
-        "--database_url",
-        help="SQLAlchemy database URL; "
-        "see https://docs.sqlalchemy.org/en/13/core/engines.html",
-        required=True)
-    parser.add_argument(
-        "--cors_allowed_all_origins",
-        help="If set, allows CORS on all origins",
-        action="store_true")
-    args = parser.parse_args(args=command_line_args)
-
-    return Args(
-        port=int(args.port),
-        database_url=str(args.database_url),
-        cors_allowed_all_origins=bool(args.cors_allowed_all_origins))
-
-
 # yapf: disable
 def create_server(
-    database_url: str,
-    cors_allowed_all_origins: bool
+    args: mesito.args.Args
 ) -> Tuple[
-    flask.Flask,
-    flask_socketio.SocketIO]:  # yapf: enable
+    'flask.Flask',
+    'flask_socketio.SocketIO']:  # yapf: enable
     """Create the dependencies, the Flask application and the server."""
-    engine = sqlalchemy.create_engine(database_url)
+    # pylint: disable=redefined-outer-name
+    import sqlalchemy
+    import sqlalchemy.orm
+
+    import mesito.admission
+    import mesito.analytics
+    import mesito.app
+    import mesito.archive
+    import mesito.assets
+    import mesito.compress
+    import mesito.front.codec
+    import mesito.gateway
+    import mesito.idempotency
+    import mesito.ingest
+    import mesito.recent
+    import mesito.replica
+    import mesito.shift
+
+    engine = sqlalchemy.create_engine(args.database_url)
     session_factory = sqlalchemy.orm.scoped_session(
         sqlalchemy.orm.sessionmaker(bind=engine))
 
+    archive = (
+        mesito.archive.Archive(directory=args.archive_dir)
+        if args.archive_dir is not None else None)
+
+    compression = (
+        mesito.compress.Compression(
+            min_size=args.compression_min_size, level=args.compression_level)
+        if args.compression_min_size >= 0 else None)
+
+    budgets = mesito.admission.Budgets(
+        ingest=mesito.admission.Budget(
+            name='ingest',
+            max_in_flight=args.ingest_max_in_flight,
+            max_queued=args.ingest_max_queued,
+            queue_timeout=args.queue_timeout,
+            retry_after=args.retry_after),
+        read=mesito.admission.Budget(
+            name='read',
+            max_in_flight=args.read_max_in_flight,
+            max_queued=args.read_max_queued,
+            queue_timeout=args.queue_timeout,
+            retry_after=args.retry_after))
+
+    idempotency = (
+        mesito.idempotency.Idempotency(
+            max_keys=args.idempotency_max_keys,
+            ttl=args.idempotency_ttl,
+            session_factory=(
+                session_factory if args.idempotency_persist else None))
+        if args.idempotency_max_keys > 0 else None)
+
+    router = None  # type: Optional[mesito.replica.Router]
+    if args.read_replica_urls:
+        router = mesito.replica.Router(
+            primary=engine,
+            replicas=[
+                sqlalchemy.create_engine(url)
+                for url in args.read_replica_urls
+            ],
+            max_lag=args.replica_max_lag,
+            read_your_writes=args.read_your_writes)
+        router.beat_periodically(interval=args.replica_heartbeat_interval)
+
+    shift_calendar = (
+        mesito.shift.load(path=args.shift_calendar)
+        if args.shift_calendar is not None else None)
+
+    gateway_tokens = (
+        mesito.gateway.load_tokens(path=args.gateway_tokens)
+        if args.gateway_tokens is not None else None)
+
+    analytics = (
+        mesito.analytics.Pool(
+            database_url=args.database_url,
+            workers=args.analytics_workers,
+            timeout=args.analytics_timeout,
+            archive=archive,
+            calendar=shift_calendar,
+            replica_urls=args.read_replica_urls,
+            replica_max_lag=args.replica_max_lag)
+        if args.analytics_workers > 0 else None)
+
     app, socketio = mesito.app.produce(
         session_factory=session_factory,
-        cors_allowed_all_origins=cors_allowed_all_origins)
+        cors_allowed_all_origins=args.cors_allowed_all_origins,
+        archive=archive,
+        json_codec=mesito.front.codec.select(name=args.json_codec),
+        compression=compression,
+        budgets=budgets,
+        idempotency=idempotency,
+        router=router,
+        state_ingest=mesito.ingest.select(name=args.ingest_path),
+        shift_calendar=shift_calendar,
+        gap_table=args.gap_table,
+        change_log=args.change_log,
+        recent=mesito.recent.Recent(capacity=args.recent_capacity),
+        gateway_tokens=gateway_tokens,
+        analytics=analytics,
+        assets=mesito.assets.Assets(
+            directory=mesito.assets.STATIC_DIR, reload=args.static_reload))
 
     return app, socketio
 
 
 def main(command_line_args: Sequence[str]) -> int:
     """Execute the main routine."""
-    args = parse_args(command_line_args=command_line_args)
+    args = mesito.args.parse_args(
+        command_line_args=command_line_args, description=__doc__)
 
-    app, socketio = create_server(
-        database_url=args.database_url,
-        cors_allowed_all_origins=args.cors_allowed_all_origins)
+    app, socketio = create_server(args=args)
 
     def shutdown(signal_name: str) -> None:
         """Signal the server to shut down gracefully."""
@@ -102,6 +166,11 @@ def main(command_line_args: Sequence[str]) -> int:
 
     socketio.run(app=app, port=args.port)
 
+    analytics = app.extensions.get('mesito.analytics', None)
+    if analytics is not None:
+        app.logger.info("Stopping the analytics workers...")
+        analytics.shutdown()
+
     app.logger.info("Goodbye.")
     logging.shutdown()
 
@@ -109,4 +178,9 @@ def main(command_line_args: Sequence[str]) -> int:
 
 
 if __name__ == "__main__":
+    # Patch as early as possible when run as a module; bin/mesito patches
+    # before the standard library has been imported.
+    import gevent.monkey
+    gevent.monkey.patch_all()
+
     sys.exit(main(command_line_args=sys.argv[1:]))
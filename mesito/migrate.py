@@ -0,0 +1,354 @@
+"""
+Migrate the schema of an existing database in versioned steps.
+
+``metadata.create_all`` only creates the missing tables, so the deployments
+never get the indexes added after their set-up. The migrations are therefore
+numbered and recorded in the table :py:class:`mesito.model.SchemaMigration`
+once applied; :py:func:`migrate` applies the pending ones in order.
+
+The indexes are created online where the dialect supports it, *i.e.*,
+``CREATE INDEX CONCURRENTLY`` on PostgreSQL and ``ALGORITHM=INPLACE,
+LOCK=NONE`` on MySQL, so that the ingestion continues during the build.
+SQLite has no online index build and locks the database for its duration.
+"""
+import abc
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+import sqlalchemy
+import sqlalchemy.engine
+
+import mesito.model
+
+
+class Migration(abc.ABC):
+    """Represent a versioned change of the schema."""
+
+    #: number of the migration, increasing by one
+    version = 0
+
+    #: short description of the migration
+    name = ''
+
+    @abc.abstractmethod
+    def apply(self, engine: sqlalchemy.engine.Engine) -> None:
+        """Apply the change; must be safe to repeat after an interruption."""
+
+
+class AddIndex(Migration):
+    """Create an index online if the dialect supports it."""
+
+    # yapf: disable
+    def __init__(
+            self,
+            version: int,
+            name: str,
+            table: str,
+            columns: Sequence[str],
+            include: Sequence[str] = (),
+            dialects: Optional[Sequence[str]] = None
+    ) -> None:  # yapf: enable
+        """
+        Initialize with the given values.
+
+        :param version: number of the migration
+        :param name: name of the index
+        :param table: name of the indexed table
+        :param columns: key columns of the index
+        :param include:
+            columns stored in the index to cover the queries; they are
+            appended to the key columns unless the dialect supports
+            ``INCLUDE``
+        :param dialects:
+            if set, the index is only created in these dialects and
+            the migration does nothing in the others
+        """
+        # pylint: disable=too-many-arguments
+        self.version = version
+        self.name = name
+        self.table = table
+        self.columns = list(columns)
+        self.include = list(include)
+        self.dialects = list(dialects) if dialects is not None else None
+
+    def statement(self, dialect: str) -> str:
+        """
+        Produce the statement creating the index in the dialect.
+
+        >>> AddIndex(1, 'i', 't', ['a', 'b'], include=['c']).statement('sqlite')
+        'CREATE INDEX i ON t (a, b, c)'
+        >>> AddIndex(1, 'i', 't', ['a'], include=['c']).statement('postgresql')
+        'CREATE INDEX CONCURRENTLY i ON t (a) INCLUDE (c)'
+        """
+        if dialect == 'postgresql':
+            return "CREATE INDEX CONCURRENTLY {} ON {} ({}){}".format(
+                self.name, self.table, ', '.join(self.columns),
+                " INCLUDE ({})".format(', '.join(self.include))
+                if self.include else '')
+
+        columns = ', '.join(self.columns + self.include)
+
+        if dialect == 'mysql':
+            return ("CREATE INDEX {} ON {} ({}) "
+                    "ALGORITHM=INPLACE LOCK=NONE").format(
+                        self.name, self.table, columns)
+
+        return "CREATE INDEX {} ON {} ({})".format(
+            self.name, self.table, columns)
+
+    def apply(self, engine: sqlalchemy.engine.Engine) -> None:
+        """Create the index unless it already exists."""
+        dialect = engine.dialect.name
+
+        if self.dialects is not None and dialect not in self.dialects:
+            logging.info(
+                "The index %s is not needed in the dialect %s.", self.name,
+                dialect)
+            return
+
+        if dialect == 'postgresql':
+            # An interrupted concurrent build leaves an invalid index behind.
+            with engine.connect() as connection:
+                invalid = connection.execute(
+                    sqlalchemy.text(
+                        "SELECT 1 FROM pg_index "
+                        "JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                        "WHERE pg_class.relname = :name "
+                        "AND NOT pg_index.indisvalid"), {
+                            'name': self.name
+                        }).first() is not None
+
+            if invalid:
+                logging.info("Dropping the invalid index %s...", self.name)
+                _execute_autocommit(
+                    engine=engine,
+                    statement="DROP INDEX CONCURRENTLY {}".format(self.name))
+
+        existing = {
+            index['name']
+            for index in sqlalchemy.inspect(engine).get_indexes(self.table)
+        }
+
+        if self.name in existing:
+            logging.info("The index %s already exists.", self.name)
+            return
+
+        # CREATE INDEX CONCURRENTLY can not run inside a transaction.
+        _execute_autocommit(engine=engine, statement=self.statement(dialect))
+
+
+class SequenceMachineChanges(Migration):
+    """Add the change sequence to the machines and start its counter."""
+
+    def __init__(self, version: int, name: str) -> None:
+        """Initialize with the given values."""
+        self.version = version
+        self.name = name
+
+    def apply(self, engine: sqlalchemy.engine.Engine) -> None:
+        """Add the column unless it exists and number the existing machines."""
+        existing = {
+            column['name']
+            for column in sqlalchemy.inspect(engine).get_columns('machine')
+        }
+
+        if 'change_seq' not in existing:
+            with engine.begin() as connection:
+                connection.execute(
+                    sqlalchemy.text(
+                        "ALTER TABLE machine "
+                        "ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0"))
+
+        table = mesito.model.Machine.__table__
+        counter = mesito.model.ChangeCounter.__table__
+
+        with engine.begin() as connection:
+            # The machines put before the migration are numbered by their IDs
+            # so that the clients catching up from zero receive them as well.
+            connection.execute(
+                table.update().where(table.c.change_seq == 0).values(
+                    change_seq=table.c.id))
+
+            value = connection.execute(
+                sqlalchemy.select([counter.c.value]).where(
+                    counter.c.name == mesito.model.ChangeCounter.MACHINE)
+            ).scalar()
+
+            if value is None:
+                connection.execute(
+                    counter.insert().values(
+                        name=mesito.model.ChangeCounter.MACHINE,
+                        value=connection.execute(
+                            sqlalchemy.select([
+                                sqlalchemy.func.coalesce(
+                                    sqlalchemy.func.max(table.c.change_seq), 0)
+                            ])).scalar()))
+
+
+def _execute_autocommit(
+        engine: sqlalchemy.engine.Engine, statement: str) -> None:
+    """Execute the statement outside of a transaction on PostgreSQL."""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            connection.execution_options(
+                isolation_level='AUTOCOMMIT').execute(
+                    sqlalchemy.text(statement))
+    else:
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text(statement))
+
+
+# The overlap and the range queries bound both the start and the stop of
+# a state. The indexes on (machine ID, start) and (machine ID, stop) can only
+# serve one of the bounds and need to look up every row in the table for
+# the other one, while this index serves the former and checks the latter
+# (and reads the condition) without leaving the index.
+#
+# PostgreSQL can serve ``LIKE 'prefix%'`` from a B-tree index only if the index
+# compares the strings byte by byte, which the index on the name does not
+# under the collations other than "C"; see mesito.operation.search_machines.
+MIGRATIONS = [
+    AddIndex(
+        version=1,
+        name='machine_state_covering',
+        table='machine_state',
+        columns=['machine_id', 'start', 'stop'],
+        include=['condition']),
+    SequenceMachineChanges(version=2, name='machine_change_seq_column'),
+    AddIndex(
+        version=3,
+        name='machine_change_seq',
+        table='machine',
+        columns=['change_seq']),
+    AddIndex(
+        version=4,
+        name='machine_name_pattern',
+        table='machine',
+        columns=['name text_pattern_ops'],
+        dialects=['postgresql']),
+]  # type: List[Migration]
+
+
+def applied_versions(engine: sqlalchemy.engine.Engine) -> Set[int]:
+    """Retrieve the versions of the applied migrations."""
+    table = mesito.model.SchemaMigration.__table__
+
+    with engine.connect() as connection:
+        return {
+            row[0]
+            for row in connection.execute(sqlalchemy.select([table.c.version]))
+        }
+
+
+def pending(engine: sqlalchemy.engine.Engine,
+            target: Optional[int] = None) -> List[Migration]:
+    """
+    List the migrations not applied yet, in order.
+
+    :param engine: database engine
+    :param target: if given, only the migrations up to this version
+    :return: pending migrations
+    """
+    applied = applied_versions(engine=engine)
+
+    return [
+        migration for migration in MIGRATIONS
+        if migration.version not in applied and (
+            target is None or migration.version <= target)
+    ]
+
+
+def migrate(engine: sqlalchemy.engine.Engine,
+            target: Optional[int] = None) -> List[Migration]:
+    """
+    Apply the pending migrations in order and record them.
+
+    :param engine: database engine
+    :param target: if given, only the migrations up to this version
+    :return: applied migrations
+    """
+    table = mesito.model.SchemaMigration.__table__
+
+    migrations = pending(engine=engine, target=target)
+    for migration in migrations:
+        logging.info(
+            "Applying the migration %d: %s...", migration.version,
+            migration.name)
+
+        migration.apply(engine=engine)
+
+        with engine.begin() as connection:
+            connection.execute(
+                table.insert().values(
+                    version=migration.version,
+                    name=migration.name,
+                    applied=int(time.time())))
+
+    return migrations
+
+
+def hot_queries() -> Dict[str, sqlalchemy.sql.expression.Select]:
+    """Produce the hot queries of the ingestion and the reads for explaining."""
+    table = mesito.model.MachineState.__table__
+
+    machine_id = 1
+    start = 1577836800
+    stop = start + 3600
+
+    return {
+        'overlap':
+            sqlalchemy.select([table.c.start, table.c.stop]).where(
+                (table.c.machine_id == machine_id)
+                & (table.c.start < stop) & (table.c.stop > start)).limit(1),
+        'machine_states':
+            sqlalchemy.select([table.c.start, table.c.stop,
+                               table.c.condition]).where(
+                                   (table.c.machine_id == machine_id)
+                                   & (table.c.start < stop)
+                                   & (table.c.stop > start)).order_by(
+                                       table.c.start),
+        'latest_state':
+            sqlalchemy.select([table.c.start, table.c.stop]).where(
+                table.c.machine_id == machine_id).order_by(
+                    table.c.start.desc()).limit(1)
+    }
+
+
+def explain(engine: sqlalchemy.engine.Engine) -> Dict[str, List[str]]:
+    """
+    Explain how the database plans the hot queries.
+
+    :param engine: database engine
+    :return: lines of the plan for each hot query
+    :raise NotImplementedError: if the dialect is not supported
+    """
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect in ['postgresql', 'mysql']:
+        prefix = 'EXPLAIN '
+    else:
+        raise NotImplementedError(
+            "Explaining is not supported for the dialect: {}".format(dialect))
+
+    plans = {}  # type: Dict[str, List[str]]
+
+    with engine.connect() as connection:
+        for name, query in hot_queries().items():
+            sql = str(
+                query.compile(
+                    dialect=engine.dialect,
+                    compile_kwargs={'literal_binds': True}))
+
+            rows = connection.execute(sqlalchemy.text(prefix + sql)).fetchall()
+
+            if dialect == 'sqlite':
+                # The last column is the human-readable detail.
+                plans[name] = [str(row[-1]) for row in rows]
+            else:
+                plans[name] = [
+                    ' '.join(str(value) for value in row) for row in rows
+                ]
+
+    return plans
@@ -5,7 +5,7 @@ import sqlalchemy.ext.declarative
 # These "from ..." imports are necessary for readability even though
 # they are against the general coding guidelines.
 from sqlalchemy import (
-    Column, Integer, String, ForeignKey, BigInteger, Index, Float)
+    Column, Integer, String, ForeignKey, BigInteger, Index, Float, LargeBinary)
 
 Base = sqlalchemy.ext.declarative.declarative_base()
 
@@ -19,6 +19,13 @@ class Machine(Base):  # type: ignore
     name = Column('name', String(256), nullable=False, index=True)
     version = Column('version', Integer, nullable=False)
 
+    # Position in the sequence of the machine changes, see ChangeCounter
+    change_seq = Column(
+        'change_seq', BigInteger, nullable=False, default=0, server_default='0')
+
+
+Index('machine_change_seq', Machine.change_seq)
+
 
 class MachineCondition(enum.Enum):
     """Represent machine condition."""
@@ -58,3 +65,92 @@ class MachineState(Base):  # type: ignore
 
 Index('machine_state_start', MachineState.machine_id, MachineState.start)
 Index('machine_state_stop', MachineState.machine_id, MachineState.stop)
+
+
+class MachineStateGap(Base):  # type: ignore
+    """Represent a gap between two consecutive states of a machine."""
+
+    __tablename__ = 'machine_state_gap'
+
+    machine_id = Column(
+        'machine_id', Integer, ForeignKey('machine.id'), primary_key=True)
+    start = Column('start', BigInteger, primary_key=True)
+    stop = Column('stop', BigInteger, nullable=False)
+
+
+Index(
+    'machine_state_gap_stop', MachineStateGap.machine_id, MachineStateGap.stop)
+
+
+class MachineStateOperation(enum.Enum):
+    """Represent an operation on a machine state recorded in the change log."""
+
+    INSERT = "insert"
+    UPDATE = "update"
+    EXTEND = "extend"
+
+
+class MachineStateChange(Base):  # type: ignore
+    """Represent an entry of the append-only machine state change log."""
+
+    __tablename__ = 'machine_state_change'
+
+    seq = Column('seq', BigInteger, primary_key=True, autoincrement=False)
+    machine_id = Column(
+        'machine_id', Integer, ForeignKey('machine.id'), nullable=False)
+    start = Column('start', BigInteger, nullable=False)
+    operation = Column(
+        'operation',
+        sqlalchemy.Enum(*[op.value for op in MachineStateOperation]),
+        nullable=False)
+
+
+class IdempotencyKey(Base):  # type: ignore
+    """Represent a response remembered for the retries of a request."""
+
+    __tablename__ = 'idempotency_key'
+
+    key = Column('key', String(512), primary_key=True)
+    fingerprint = Column('fingerprint', String(64), nullable=False)
+    status = Column('status', Integer, nullable=False)
+    body = Column('body', LargeBinary, nullable=False)
+    created = Column('created', BigInteger, nullable=False, index=True)
+
+
+class ReplicationHeartbeat(Base):  # type: ignore
+    """Represent the last heartbeat written to the primary database."""
+
+    __tablename__ = 'replication_heartbeat'
+
+    id = Column('id', Integer, primary_key=True)
+    stamp = Column('stamp', Float, nullable=False)
+
+
+class ChangeCounter(Base):  # type: ignore
+    """
+    Represent the last position in a sequence of changes.
+
+    The counter row stays locked by the changing transaction until it
+    commits so that the changes become visible in the order of the sequence.
+    """
+
+    __tablename__ = 'change_counter'
+
+    #: name of the counter of the changes to the machines
+    MACHINE = 'machine'
+
+    #: name of the counter of the machine state change log
+    MACHINE_STATE = 'machine_state'
+
+    name = Column('name', String(64), primary_key=True)
+    value = Column('value', BigInteger, nullable=False)
+
+
+class SchemaMigration(Base):  # type: ignore
+    """Represent a schema migration applied to the database."""
+
+    __tablename__ = 'schema_migration'
+
+    version = Column('version', Integer, primary_key=True)
+    name = Column('name', String(256), nullable=False)
+    applied = Column('applied', BigInteger, nullable=False)
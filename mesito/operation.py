@@ -1,13 +1,28 @@
 """Implement operations to be executed by the back end."""
-from typing import List, Tuple, Optional, Union
+import typing
+from typing import Any, Dict, List, Set, Tuple, Optional, Union
 
 import sqlalchemy.orm
 from icontract._decorators import ensure
 
+import mesito.archive
+import mesito.changelog
 import mesito.front.error
 import mesito.front.out
 import mesito.front.valid
+import mesito.gap
 import mesito.model
+import mesito.search
+import mesito.shift
+
+
+def _next_change_seq(session: sqlalchemy.orm.Session, count: int = 1) -> int:
+    """Reserve the sequence numbers of the machine changes, return the last."""
+    return mesito.changelog.advance(
+        session=session,
+        name=mesito.model.ChangeCounter.MACHINE,
+        count=count,
+        column=mesito.model.Machine.__table__.c.change_seq)
 
 
 # yapf: disable
@@ -25,50 +40,376 @@ def put_machine(
         session: sqlalchemy.orm.Session,
         data: mesito.front.valid.MachinePut
 ) -> Tuple[
-    Optional[Tuple[int, int]],
-    Optional[mesito.front.error.MachineNotFound]]:  # yapf: enable
+    Optional[Tuple[int, int, int]],
+    Optional[Union[
+        mesito.front.error.MachineNotFound,
+        mesito.front.error.MachineVersionConflict]]]:  # yapf: enable
     """
     Upsert the machine into the database.
 
+    An existing machine is renamed with a single UPDATE which increments
+    the version in the database, conditioned on the expected version if
+    given, so that concurrent renames can not overwrite each other silently.
+    The new version is returned by the UPDATE where the dialect supports
+    ``RETURNING``. The queries diagnosing the error are executed only if
+    nothing matched.
+
     :param session: transaction to the database
     :param data: machine data
-    :return: (ID, version), error if any
+    :return: (ID, version, change sequence number), error if any
     """
     # pylint: disable=invalid-name
-    if 'id' in data:
-        machine = session.query(mesito.model.Machine).get(data['id'])
-        if machine is None:
-            return None, mesito.front.error.machine_not_found(
-                machine_id=data['id'])
+    if 'id' not in data:
+        # The insert can not conflict so the counter row is locked only for
+        # the insert and the commit.
+        change_seq = _next_change_seq(session=session)
 
-        machine.name = data['name']
-        machine.version += 1
-    else:
         machine = mesito.model.Machine()
         machine.name = data['name']
         machine.version = 1
+        machine.change_seq = change_seq
         session.add(machine)
+        session.commit()
+
+        assert isinstance(machine.id, int)
+
+        return (machine.id, machine.version, change_seq), None
+
+    table = mesito.model.Machine.__table__
+
+    condition = table.c.id == data['id']
+    if 'version' in data:
+        condition = condition & (table.c.version == data['version'])
+
+    update = table.update().where(condition).values(
+        name=data['name'], version=table.c.version + 1)
+
+    # UPDATE ... RETURNING is supported by the dialect only if it returns
+    # the rows of all the statements (SQLAlchemy 1.4+), not just the primary
+    # key of an INSERT.
+    version = None  # type: Optional[int]
+    if getattr(session.get_bind().dialect, 'full_returning', False):
+        version = session.execute(update.returning(table.c.version)).scalar()
+    elif session.execute(update).rowcount == 1:
+        version = (
+            data['version'] + 1 if 'version' in data else session.execute(
+                sqlalchemy.select([table.c.version
+                                   ]).where(table.c.id == data['id'])).scalar())
+
+    if version is None:
+        actual = session.execute(
+            sqlalchemy.select([table.c.version
+                               ]).where(table.c.id == data['id'])).scalar()
+        session.rollback()
+
+        if actual is None:
+            return None, mesito.front.error.machine_not_found(
+                machine_id=data['id'])
+
+        return None, mesito.front.error.machine_version_conflict(
+            machine_id=data['id'], expected=data['version'], actual=actual)
+
+    # The sequence number is reserved only once the rename succeeded, as
+    # the last statements of the transaction, so that the counter row is
+    # never locked on a conflict and otherwise only until the commit.
+    change_seq = _next_change_seq(session=session)
+    session.execute(
+        table.update().where(table.c.id == data['id']).values(
+            change_seq=change_seq))
+
+    session.commit()
+
+    return (data['id'], version, change_seq), None
+
+
+# Chunk size of the ``IN`` lists; SQLite limits the number of bound variables
+# in a statement to 999 by default.
+_IN_CHUNK = 500
+
+
+# yapf: disable
+@ensure(
+    lambda data, result:
+    result[1] is not None or len(result[0]) == len(data),
+    'One (ID, version) per input machine.'
+)
+def put_machines(
+        session: sqlalchemy.orm.Session,
+        data: List[mesito.front.valid.MachinePut]
+) -> Tuple[
+    Optional[List[Tuple[int, int, int]]],
+    Optional[mesito.front.error.MachineNotFound]]:  # yapf: enable
+    """
+    Upsert many machines into the database in a single transaction.
+
+    The new machines are inserted with a multi-row INSERT returning their
+    IDs where the dialect supports ``RETURNING``, and with an executemany
+    INSERT otherwise. The existing ones are renamed and have their versions
+    incremented in a single executemany UPDATE. The machines are given
+    consecutive change sequence numbers in the order of the input so that
+    the generated IDs and the versions are read back with a single query
+    over that range.
+
+    :param session: transaction to the database
+    :param data: machines without duplicate IDs
+    :return:
+        (ID, version, change sequence number) in the order of the input,
+        error if any
+    """
+    # pylint: disable=invalid-name
+    existing_ids = [machine['id'] for machine in data if 'id' in machine]
+
+    found = set()  # type: Set[int]
+    for i in range(0, len(existing_ids), _IN_CHUNK):
+        found.update(
+            row.id for row in session.query(mesito.model.Machine.id).filter(
+                mesito.model.Machine.id.in_(existing_ids[i:i + _IN_CHUNK])))
+
+    for machine_id in existing_ids:
+        if machine_id not in found:
+            return None, mesito.front.error.machine_not_found(
+                machine_id=machine_id)
+
+    table = mesito.model.Machine.__table__
+
+    last_seq = _next_change_seq(session=session, count=len(data))
+    change_seqs = list(range(last_seq - len(data) + 1, last_seq + 1))
+
+    updates = []  # type: List[Dict[str, Any]]
+    new_rows = []  # type: List[Dict[str, Any]]
+    for machine, change_seq in zip(data, change_seqs):
+        if 'id' in machine:
+            updates.append({
+                'b_id': machine['id'],
+                'b_name': machine['name'],
+                'b_change_seq': change_seq
+            })
+        else:
+            new_rows.append({
+                'name': machine['name'],
+                'version': 1,
+                'change_seq': change_seq
+            })
+
+    if updates:
+        session.execute(
+            table.update().where(
+                table.c.id == sqlalchemy.bindparam('b_id')).values(
+                    name=sqlalchemy.bindparam('b_name'),
+                    version=table.c.version + 1,
+                    change_seq=sqlalchemy.bindparam('b_change_seq')),
+            updates)
+
+    # (ID, version) by the change sequence number which is unique to
+    # the machine in the reserved range
+    written = {}  # type: Dict[int, Tuple[int, int]]
+
+    returning = getattr(session.get_bind().dialect, 'full_returning', False)
+
+    if new_rows:
+        if returning:
+            for i in range(0, len(new_rows), _IN_CHUNK):
+                written.update(
+                    (row.change_seq, (row.id, 1)) for row in session.execute(
+                        table.insert().values(new_rows[i:i + _IN_CHUNK]).
+                        returning(table.c.id, table.c.change_seq)))
+        else:
+            session.execute(table.insert(), new_rows)
+
+    if updates or (new_rows and not returning):
+        # The reserved range is scanned on the index of the change sequence
+        # numbers instead of looking up each machine.
+        in_range = table.c.change_seq.between(change_seqs[0], change_seqs[-1])
+        rows = session.execute(
+            sqlalchemy.select([table.c.id, table.c.version,
+                               table.c.change_seq]).where(in_range))
+
+        written.update((row.change_seq, (row.id, row.version)) for row in rows)
 
     session.commit()
 
-    assert isinstance(machine.id, int)
+    result = [
+        (written[change_seq][0], written[change_seq][1], change_seq)
+        for change_seq in change_seqs
+    ]  # type: List[Tuple[int, int, int]]
+
+    return result, None
+
 
-    return (machine.id, machine.version), None
+def _machine_to_out(machine: mesito.model.Machine) -> mesito.front.out.Machine:
+    """Cast the database row into the output structure."""
+    return mesito.front.out.machine(
+        id=machine.id, name=machine.name, version=machine.version)
 
 
 # yapf: disable
 def get_machines(
-        session: sqlalchemy.orm.Session
+        session: sqlalchemy.orm.Session,
+        page: Optional[mesito.front.valid.MachinePage] = None
 ) -> List[mesito.front.out.Machine]:  # yapf: enable
-    """Retrieve the mapping (id -> name) of all the machines."""
-    result = []  # type: List[mesito.front.out.Machine]
-    for machine in session.query(mesito.model.Machine).order_by(
-            mesito.model.Machine.name.asc()).all():
-        result.append(
-            mesito.front.out.machine(
-                id=machine.id, name=machine.name, version=machine.version))
+    """
+    Retrieve the machines ordered by (name, ID).
+
+    If the page is given, the machines are retrieved with keyset pagination:
+    only the machines after the last machine of the previous page are
+    retrieved so that the index on the name is scanned from that point on
+    instead of skipping over an offset.
+
+    :param session: database session
+    :param page: limit and the last machine of the previous page, if any
+    :return: machines
+    """
+    query = session.query(mesito.model.Machine)
+
+    if page is not None and 'after' in page:
+        name = page['after']['name']
+        machine_id = page['after']['id']
+
+        # The redundant range on the name lets the planner seek the index
+        # instead of scanning it with the disjunction alone.
+        # yapf: disable
+        query = query.filter(
+            (mesito.model.Machine.name >= name) &
+            ((mesito.model.Machine.name > name) |
+             (mesito.model.Machine.id > machine_id)))  # yapf: enable
+
+    query = query.order_by(
+        mesito.model.Machine.name.asc(), mesito.model.Machine.id.asc())
+
+    if page is not None and 'limit' in page:
+        query = query.limit(page['limit'])
+
+    return [_machine_to_out(machine=machine) for machine in query.all()]
+
+
+# yapf: disable
+def get_machine_changes(
+        session: sqlalchemy.orm.Session,
+        request: mesito.front.valid.MachineChangesRequest
+) -> mesito.front.out.MachineChanges:  # yapf: enable
+    """
+    Retrieve the machines changed after the cursor in the order of changes.
+
+    A machine changed several times after the cursor is returned only once
+    with its latest state.
+
+    :param session: database session
+    :param request: cursor and the limit, if any
+    :return: changed machines and the cursor of the next request
+    """
+    limit = request.get('limit', mesito.front.valid.MAX_MACHINE_CHANGES)
+
+    machines = session.query(mesito.model.Machine).filter(
+        mesito.model.Machine.change_seq > request['since']).order_by(
+            mesito.model.Machine.change_seq.asc()).limit(limit).all()
+
+    return mesito.front.out.machine_changes(
+        machines=[_machine_to_out(machine=machine) for machine in machines],
+        cursor=(
+            machines[-1].change_seq if machines else request['since']))
+
+
+def _escape_like(text: str) -> str:
+    r"""
+    Escape the wildcards of a ``LIKE`` pattern with a backslash.
+
+    >>> _escape_like('50%_x\\')
+    '50\\%\\_x\\\\'
+    """
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace(
+        '_', '\\_')
+
+
+def _successor(prefix: str) -> Optional[str]:
+    r"""
+    Compute the smallest string greater than all the strings with the prefix.
+
+    >>> _successor('machine-1')
+    'machine-2'
+    >>> _successor('\U0010ffff') is None
+    True
+    """
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10ffff:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+
+    return None
+
+
+#: default maximum number of the machines found by the search
+SEARCH_LIMIT = 20
+
+# Dialects comparing the names byte by byte by default so that the names
+# with a prefix form a contiguous range of the index on the name
+_BINARY_COLLATION_DIALECTS = ['sqlite']
+
+
+def search_machines(
+        session: sqlalchemy.orm.Session, data: mesito.front.valid.MachineSearch,
+        fts: bool) -> List[mesito.front.out.Machine]:
+    """
+    Search the machines by the beginning or a part of their names.
+
+    The prefix is searched with a left-anchored ``LIKE``. On SQLite, whose
+    ``LIKE`` is case-insensitive and never uses the index, the prefix is also
+    bounded by a range over the name so that it is served by the index on
+    the name. The range is only correct under the binary collation; with
+    other collations it may miss the names with the prefix. PostgreSQL
+    therefore serves the ``LIKE`` alone from the ``text_pattern_ops`` index
+    created by :py:mod:`mesito.migrate`.
+
+    The substring is searched case-insensitive with the FTS5 table on SQLite
+    (see :py:mod:`mesito.search`) if available and the substring is long
+    enough for trigrams, and with ``ILIKE`` otherwise, which PostgreSQL
+    serves with the pg_trgm index if one was created.
 
-    return result
+    :param session: database session
+    :param data: validated search request
+    :param fts: if set, the FTS5 table is available
+    :return: machines ordered by (name, ID)
+    """
+    query = session.query(mesito.model.Machine)
+
+    if 'prefix' in data:
+        prefix = data['prefix']
+
+        dialect = session.get_bind().dialect.name
+        if dialect in _BINARY_COLLATION_DIALECTS:
+            query = query.filter(mesito.model.Machine.name >= prefix)
+
+            successor = _successor(prefix)
+            if successor is not None:
+                query = query.filter(mesito.model.Machine.name < successor)
+
+        query = query.filter(
+            mesito.model.Machine.name.like(
+                _escape_like(prefix) + '%', escape='\\'))
+    else:
+        substring = data['substring']
+        if fts and len(substring) >= mesito.search.MIN_SUBSTRING_LENGTH:
+            # Match the substring as a single phrase of trigrams.
+            phrase = '"{}"'.format(substring.replace('"', '""'))
+
+            query = query.filter(
+                mesito.model.Machine.id.in_(
+                    sqlalchemy.select([sqlalchemy.column('rowid')]).select_from(
+                        sqlalchemy.table(mesito.search.FTS_TABLE)).where(
+                            sqlalchemy.text(
+                                '{} MATCH :phrase'.format(
+                                    mesito.search.FTS_TABLE)).bindparams(
+                                        phrase=phrase))))
+        else:
+            query = query.filter(
+                mesito.model.Machine.name.ilike(
+                    '%' + _escape_like(substring) + '%', escape='\\'))
+
+    query = query.order_by(
+        mesito.model.Machine.name.asc(), mesito.model.Machine.id.asc()).limit(
+            data.get('limit', SEARCH_LIMIT))
+
+    return [_machine_to_out(machine=machine) for machine in query.all()]
 
 
 def find_machine_state(
@@ -129,7 +470,9 @@ def machine_state_overlap(
 # yapf: disable
 def put_machine_state(
         session: sqlalchemy.orm.Session,
-        data: mesito.front.valid.MachineStatePut
+        data: mesito.front.valid.MachineStatePut,
+        gap_table: bool = False,
+        change_log: bool = False
 ) -> Tuple[
     Optional[int],
     Optional[Union[
@@ -148,6 +491,8 @@ def put_machine_state(
 
     :param session: database session
     :param data: validated request data
+    :param gap_table: if set, the gap table is updated in the same transaction
+    :param change_log: if set, the change is appended to the change log
     :return: ID of the machine state or error, if any
     """
     # See https://stackoverflow.com/q/7646173/1600678
@@ -185,10 +530,13 @@ def put_machine_state(
     # Upsert
     ##
 
+    operation = mesito.model.MachineStateOperation.UPDATE
+
     if machine_state is None:
         machine_state = mesito.model.MachineState()
         machine_state.machine_id = data['machine_id']
         machine_state.start = data['start']
+        operation = mesito.model.MachineStateOperation.INSERT
 
     machine_state.stop = data['stop']
     machine_state.condition = data['condition']
@@ -204,9 +552,340 @@ def put_machine_state(
 
     machine_state.total_energy = data.get('total_energy', None)
 
+    machine_state.pieces = data.get('pieces', None)
+
     session.add(machine_state)
+    session.flush()
+
+    if gap_table:
+        mesito.gap.record(
+            session=session,
+            machine_id=data['machine_id'],
+            start=data['start'])
+
+    if change_log:
+        mesito.changelog.record(
+            session=session,
+            machine_id=data['machine_id'],
+            start=data['start'],
+            operation=operation)
+
     session.commit()
 
     assert isinstance(machine_state.id, int)
 
     return machine_state.id, None
+
+
+def machine_state_to_out(
+        machine_state: mesito.model.MachineState
+) -> mesito.front.out.MachineState:
+    """Cast the database row into the output structure."""
+    return mesito.front.out.machine_state(
+        machine_id=machine_state.machine_id,
+        start=machine_state.start,
+        stop=machine_state.stop,
+        condition=machine_state.condition,
+        min_power_consumption=machine_state.min_power_consumption,
+        max_power_consumption=machine_state.max_power_consumption,
+        avg_power_consumption=machine_state.avg_power_consumption,
+        total_energy=machine_state.total_energy,
+        pieces=machine_state.pieces)
+
+
+def machine_state_from_put(
+        data: mesito.front.valid.MachineStatePut
+) -> mesito.front.out.MachineState:
+    """Cast the validated put request into the output structure."""
+    return mesito.front.out.machine_state(
+        machine_id=data['machine_id'],
+        start=data['start'],
+        stop=data['stop'],
+        condition=data['condition'],
+        min_power_consumption=data.get('min_power_consumption', None),
+        max_power_consumption=data.get('max_power_consumption', None),
+        avg_power_consumption=data.get('avg_power_consumption', None),
+        total_energy=data.get('total_energy', None),
+        pieces=data.get('pieces', None))
+
+
+# Aggregates of the machine state which are replaced on prolongation
+_EXTENDED_AGGREGATES = [
+    'min_power_consumption', 'max_power_consumption', 'avg_power_consumption',
+    'total_energy'
+]
+
+
+# yapf: disable
+def extend_machine_state(
+        session: sqlalchemy.orm.Session,
+        data: mesito.front.valid.MachineStateExtend,
+        current: Optional[mesito.front.out.MachineState],
+        gap_table: bool = False,
+        change_log: bool = False
+) -> Tuple[
+    Optional[mesito.front.out.MachineState],
+    Optional[Union[
+        mesito.front.error.MachineStateNotFound,
+        mesito.front.error.MachineStateSuperseded,
+        mesito.front.error.ConstraintViolation]]]:  # yapf: enable
+    """
+    Prolong the latest state of the machine.
+
+    Unlike :func:`put_machine_state`, the state is prolonged with a single
+    conditional UPDATE keyed on (machine ID, start) which only matches if
+    no later state exists and the stop does not shrink. The queries
+    diagnosing the error are executed only if nothing matched.
+
+    :param session: database session
+    :param data: validated request data
+    :param current:
+        current state of the machine as known in memory, if any;
+        if it is later than the extended state, the request is rejected
+        without querying the database
+    :param gap_table: if set, the gap table is updated in the same transaction
+    :param change_log: if set, the change is appended to the change log
+    :return: prolonged state or error, if any
+    """
+    machine_id = data['machine_id']
+    start = data['start']
+
+    if current is not None and current['start'] > start:
+        return None, mesito.front.error.machine_state_superseded(
+            machine_id=machine_id, start=start, later_start=current['start'])
+
+    table = mesito.model.MachineState.__table__
+    later = table.alias('later')
+
+    values = {'stop': data['stop']}  # type: Dict[str, Any]
+    for key in _EXTENDED_AGGREGATES:
+        if key in data:
+            values[key] = data[key]  # type: ignore
+
+    # yapf: disable
+    result = session.execute(
+        table.update().where(
+            (table.c.machine_id == machine_id) &
+            (table.c.start == start) &
+            (table.c.stop <= data['stop']) &
+            ~sqlalchemy.exists().where(
+                (later.c.machine_id == machine_id) &
+                (later.c.start > start))
+        ).values(**values))  # yapf: enable
+
+    if result.rowcount == 0:
+        session.rollback()
+
+        machine_state = find_machine_state(
+            session=session, machine_id=machine_id, start=start)
+
+        if machine_state is None:
+            return None, mesito.front.error.machine_state_not_found(
+                machine_id=machine_id, start=start)
+
+        latest = session.query(mesito.model.MachineState.start).filter(
+            (mesito.model.MachineState.machine_id == machine_id)
+            & (mesito.model.MachineState.start > start)).order_by(
+                mesito.model.MachineState.start.desc()).first()
+
+        if latest is not None:
+            return None, mesito.front.error.machine_state_superseded(
+                machine_id=machine_id, start=start, later_start=latest.start)
+
+        return None, mesito.front.error.constraint_violation(
+            why='stop before the current stop')
+
+    if gap_table:
+        mesito.gap.record(session=session, machine_id=machine_id, start=start)
+
+    if change_log:
+        mesito.changelog.record(
+            session=session,
+            machine_id=machine_id,
+            start=start,
+            operation=mesito.model.MachineStateOperation.EXTEND)
+
+    session.commit()
+
+    if current is not None and current['start'] == start:
+        extended = typing.cast(mesito.front.out.MachineState, dict(current))
+        extended.update(values)  # type: ignore
+        return extended, None
+
+    machine_state = find_machine_state(
+        session=session, machine_id=machine_id, start=start)
+    assert machine_state is not None
+
+    return machine_state_to_out(machine_state=machine_state), None
+
+
+def get_machine_states(
+        session: sqlalchemy.orm.Session, machine_id: int, start: int,
+        stop: int, archive: Optional[mesito.archive.Archive]
+) -> List[mesito.front.out.MachineState]:
+    """
+    Retrieve the machine states overlapping with the time range.
+
+    The states in the database are merged with the archived ones. If a state
+    is both in the database and in the archive, the database takes
+    precedence.
+
+    :param session: database session
+    :param machine_id: ID of the machine
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param archive: archive of cold states, if available
+    :return: states sorted by start
+    """
+    # yapf: disable
+    rows = session.query(mesito.model.MachineState).filter(
+        (mesito.model.MachineState.machine_id == machine_id) &
+        (mesito.model.MachineState.start < stop) &
+        (mesito.model.MachineState.stop > start)
+    ).order_by(mesito.model.MachineState.start.asc()).all()  # yapf: enable
+
+    hot = [machine_state_to_out(machine_state=row) for row in rows]
+
+    if archive is None:
+        return hot
+
+    merged = {
+        state['start']: state
+        for state in archive.read(
+            machine_id=machine_id, start=start, stop=stop)
+    }  # type: Dict[int, mesito.front.out.MachineState]
+
+    if not merged:
+        return hot
+
+    merged.update((state['start'], state) for state in hot)
+
+    return [merged[key] for key in sorted(merged.keys())]
+
+
+def aggregate_machine_states(
+        session: sqlalchemy.orm.Session, machine_id: int, start: int,
+        stop: int, archive: Optional[mesito.archive.Archive]
+) -> List[mesito.front.out.MachineStateAggregate]:
+    """
+    Aggregate the machine states in the time range by condition.
+
+    The durations are clipped to the time range, while the energy and
+    the pieces are summed over all the overlapping states.
+
+    :param session: database session
+    :param machine_id: ID of the machine
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param archive: archive of cold states, if available
+    :return: aggregates sorted by condition
+    """
+    aggregates = {}  # type: Dict[str, mesito.front.out.MachineStateAggregate]
+
+    for state in get_machine_states(session=session, machine_id=machine_id,
+                                    start=start, stop=stop, archive=archive):
+        aggregate = aggregates.setdefault(
+            state['condition'],
+            mesito.front.out.machine_state_aggregate(
+                condition=state['condition'],
+                count=0,
+                duration=0,
+                total_energy=0.0,
+                pieces=0))
+
+        aggregate['count'] += 1
+        aggregate['duration'] += (
+            min(state['stop'], stop) - max(state['start'], start))
+
+        if state['total_energy'] is not None:
+            aggregate['total_energy'] += state['total_energy']
+
+        if state['pieces'] is not None:
+            aggregate['pieces'] += state['pieces']
+
+    return [aggregates[key] for key in sorted(aggregates.keys())]
+
+
+# yapf: disable
+def shift_report(
+        session: sqlalchemy.orm.Session,
+        calendar: mesito.shift.Calendar,
+        start: int,
+        stop: int,
+        machine_ids: Optional[List[int]] = None
+) -> mesito.front.out.ShiftReport:  # yapf: enable
+    """
+    Report the production per shift, machine and condition in a single query.
+
+    The occurrences of the shifts are passed to the database as a common
+    table expression. The durations of the states are clipped to the shift
+    boundaries and summed in the database. The pieces of a state are
+    attributed to the shift in which the state stops so that they are
+    counted only once.
+
+    The archived states are not included.
+
+    :param session: database session
+    :param calendar: shift calendar of the plant
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param machine_ids: if given, only these machines are reported
+    :return: report with a row per shift, machine and condition
+    """
+    instances = calendar.instances(start=start, stop=stop)
+
+    shifts = [
+        mesito.front.out.shift_instance(
+            name=instance.name, start=instance.start, stop=instance.stop)
+        for instance in instances
+    ]
+
+    if not instances or (machine_ids is not None and not machine_ids):
+        return mesito.front.out.shift_report(shifts=shifts, rows=[])
+
+    shift = sqlalchemy.union_all(
+        *[
+            sqlalchemy.select([
+                sqlalchemy.literal(i).label('index'),
+                sqlalchemy.literal(instance.start).label('start'),
+                sqlalchemy.literal(instance.stop).label('stop')
+            ]) for i, instance in enumerate(instances)
+        ]).cte('shift')
+
+    state = mesito.model.MachineState
+
+    # yapf: disable
+    clipped_start = sqlalchemy.case(
+        [(state.start > shift.c.start, state.start)], else_=shift.c.start)
+    clipped_stop = sqlalchemy.case(
+        [(state.stop < shift.c.stop, state.stop)], else_=shift.c.stop)
+
+    pieces = sqlalchemy.case(
+        [((state.stop > shift.c.start) & (state.stop <= shift.c.stop),
+          sqlalchemy.func.coalesce(state.pieces, 0))],
+        else_=0)
+    # yapf: enable
+
+    query = session.query(
+        shift.c.index, state.machine_id, state.condition,
+        sqlalchemy.func.sum(clipped_stop - clipped_start),
+        sqlalchemy.func.sum(pieces)).join(
+            shift, (state.start < shift.c.stop) &
+            (state.stop > shift.c.start)).filter((state.start < stop)
+                                                 & (state.stop > start))
+
+    if machine_ids is not None:
+        query = query.filter(state.machine_id.in_(machine_ids))
+
+    query = query.group_by(shift.c.index, state.machine_id,
+                           state.condition).order_by(
+                               shift.c.index, state.machine_id, state.condition)
+
+    rows = [[
+        int(index),
+        int(machine_id), condition,
+        int(duration),
+        int(pieces_sum)
+    ] for index, machine_id, condition, duration, pieces_sum in query.all()]
+
+    return mesito.front.out.shift_report(shifts=shifts, rows=rows)
@@ -0,0 +1,260 @@
+"""
+Keep the latest states of every machine in fixed-size ring buffers.
+
+The live energy widgets poll the power of the last hour over and over again.
+Instead of querying the database on each poll, the latest states of each
+machine are kept in a preallocated numpy array of a fixed capacity so that
+the memory is bounded by the capacity times the number of machines.
+
+The buffers are fed by the ingestion. The buffer of a machine is warmed from
+the database with a single query bounded by the capacity on the first put
+or the first read of the machine after the start-up, whichever comes first.
+The later reads never touch the database. A machine without any states is
+not kept so its reads query the database until its first put.
+"""
+import math
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.front.out
+import mesito.model
+import mesito.operation
+
+#: conditions in the order of their codes
+CONDITIONS = [condition.value for condition in mesito.model.MachineCondition]
+
+_CODES = {condition: code for code, condition in enumerate(CONDITIONS)}
+
+#: default number of the states kept per machine
+DEFAULT_CAPACITY = 360
+
+# The unknown power values are stored as NaN.
+_DTYPE = np.dtype([('start', np.int64), ('stop', np.int64),
+                   ('condition', np.int8), ('min_power', np.float64),
+                   ('max_power', np.float64), ('avg_power', np.float64),
+                   ('energy', np.float64)])
+
+_POWER_FIELDS = ['min_power', 'max_power', 'avg_power', 'energy']
+
+
+def _row(state: mesito.front.out.MachineState) -> np.ndarray:
+    """Convert the state into a row of the ring buffer."""
+    values = [
+        state['min_power_consumption'], state['max_power_consumption'],
+        state['avg_power_consumption'], state['total_energy']
+    ]
+
+    return np.array(
+        (state['start'], state['stop'], _CODES[state['condition']]) +
+        tuple(np.nan if value is None else value for value in values),
+        dtype=_DTYPE)
+
+
+def _to_list(values: np.ndarray) -> List[Optional[float]]:
+    """Convert the power values to a list with NaN as None."""
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+class Ring:
+    """Hold the latest states of a machine sorted by start."""
+
+    def __init__(self, capacity: int) -> None:
+        """Preallocate the buffer for the given number of states."""
+        assert capacity > 0
+        self._rows = np.zeros(capacity, dtype=_DTYPE)
+        self._head = 0  # index of the earliest state
+        self._count = 0
+
+    def ordered(self) -> np.ndarray:
+        """Copy the states sorted by start."""
+        indices = (self._head + np.arange(self._count)) % len(self._rows)
+        return self._rows[indices]
+
+    def put(self, state: mesito.front.out.MachineState) -> None:
+        """
+        Insert the state or replace the one with the same start.
+
+        If the buffer is full, the earliest state is evicted. A state earlier
+        than all the states of a full buffer is ignored.
+        """
+        capacity = len(self._rows)
+        row = _row(state=state)
+
+        if self._count > 0:
+            latest = (self._head + self._count - 1) % capacity
+
+            # Prolonging the latest state is by far the most common case.
+            if self._rows['start'][latest] == state['start']:
+                self._rows[latest] = row
+                return
+
+            if self._rows['start'][latest] < state['start']:
+                self._append(row=row)
+                return
+        else:
+            self._append(row=row)
+            return
+
+        # The state was put out of order, so the buffer is rearranged.
+        rows = self.ordered()
+        at = int(np.searchsorted(rows['start'], state['start']))
+
+        if at < len(rows) and rows['start'][at] == state['start']:
+            rows[at] = row
+        else:
+            if at == 0 and self._count == capacity:
+                return
+
+            rows = np.insert(rows, at, row)[-capacity:]
+
+        self._rows[:len(rows)] = rows
+        self._head = 0
+        self._count = len(rows)
+
+    def _append(self, row: np.ndarray) -> None:
+        """Append the row after the latest state, evicting if full."""
+        capacity = len(self._rows)
+        self._rows[(self._head + self._count) % capacity] = row
+
+        if self._count < capacity:
+            self._count += 1
+        else:
+            self._head = (self._head + 1) % capacity
+
+
+class Recent:
+    """Map each machine to the ring buffer of its latest states."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        """
+        Initialize without any buffers.
+
+        :param capacity: number of the states kept per machine
+        """
+        if capacity <= 0:
+            raise ValueError(
+                "Expected a positive capacity, but got: {}".format(capacity))
+
+        self.capacity = capacity
+        self._rings = {}  # type: Dict[int, Ring]
+        self._lock = threading.Lock()
+
+    def update(self, state: mesito.front.out.MachineState) -> bool:
+        """
+        Record the state if the buffer of the machine is warm.
+
+        :param state: state which has just been put
+        :return: False if the buffer needs to be warmed with :py:meth:`warm`
+        """
+        with self._lock:
+            ring = self._rings.get(state['machine_id'], None)
+            if ring is None:
+                return False
+
+            ring.put(state=state)
+            return True
+
+    def _load(self, session: sqlalchemy.orm.Session,
+              machine_id: int) -> Optional[Ring]:
+        """Load the latest states of the machine, None if there are none."""
+        rows = session.query(mesito.model.MachineState).filter(
+            mesito.model.MachineState.machine_id == machine_id).order_by(
+                mesito.model.MachineState.start.desc()).limit(
+                    self.capacity).all()
+
+        if not rows:
+            return None
+
+        loaded = Ring(capacity=self.capacity)
+        for row in reversed(rows):
+            loaded.put(
+                state=mesito.operation.machine_state_to_out(machine_state=row))
+
+        return loaded
+
+    def warm(
+            self, session: sqlalchemy.orm.Session,
+            state: mesito.front.out.MachineState) -> None:
+        """
+        Load the latest states of the machine from the database, then record.
+
+        No lock is held while querying. If a concurrent put or read warmed
+        the buffer in the meantime, the loaded states are discarded and
+        the state is recorded in that buffer instead.
+
+        :param session: database session of the put
+        :param state: state which has just been put
+        """
+        machine_id = state['machine_id']
+
+        loaded = self._load(session=session, machine_id=machine_id)
+        if loaded is None:
+            loaded = Ring(capacity=self.capacity)
+
+        with self._lock:
+            ring = self._rings.setdefault(machine_id, loaded)
+            ring.put(state=state)
+
+    def is_warm(self, machine_id: int) -> bool:
+        """Check whether the buffer of the machine has been warmed."""
+        with self._lock:
+            return machine_id in self._rings
+
+    def warm_for_read(
+            self, session: sqlalchemy.orm.Session, machine_id: int) -> None:
+        """
+        Load the latest states of the machine on the read of a cold buffer.
+
+        The buffer is kept only if the machine has any states. If a concurrent
+        put or read warmed the buffer in the meantime, the loaded states are
+        discarded.
+
+        :param session: database session of the primary
+        :param machine_id: ID of the machine
+        """
+        loaded = self._load(session=session, machine_id=machine_id)
+        if loaded is None:
+            return
+
+        with self._lock:
+            self._rings.setdefault(machine_id, loaded)
+
+    def get(
+            self, machine_id: int, since: Optional[int],
+            limit: Optional[int]) -> mesito.front.out.RecentPower:
+        """
+        Slice the latest states of the machine from its buffer.
+
+        :param machine_id: ID of the machine
+        :param since: if given, only the states stopping after it are sliced
+        :param limit: if given, at most this many latest states are sliced
+        :return: states as parallel arrays sorted by start
+        """
+        with self._lock:
+            ring = self._rings.get(machine_id, None)
+            rows = (
+                ring.ordered() if ring is not None else np.zeros(
+                    0, dtype=_DTYPE))
+
+        if since is not None:
+            rows = rows[rows['stop'] > since]
+
+        if limit is not None:
+            rows = rows[-limit:]
+
+        powers = {field: _to_list(rows[field]) for field in _POWER_FIELDS}
+
+        return mesito.front.out.recent_power(
+            machine_id=machine_id,
+            conditions=CONDITIONS,
+            start=rows['start'].tolist(),
+            stop=rows['stop'].tolist(),
+            condition=rows['condition'].tolist(),
+            min_power=powers['min_power'],
+            max_power=powers['max_power'],
+            avg_power=powers['avg_power'],
+            energy=powers['energy'])
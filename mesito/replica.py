@@ -0,0 +1,206 @@
+"""
+Route the read queries to the read replicas.
+
+The replicas are picked round-robin among those which lag behind
+the primary by at most the maximum lag. If no replica is fresh enough,
+the primary serves the reads.
+
+The lag is measured with a heartbeat: the primary periodically writes
+the current time to :py:class:`mesito.model.ReplicationHeartbeat` and
+the lag of a replica is the age of the heartbeat it has replicated. This
+works with any database, including file-based SQLite replicas. The lag of
+each replica is re-checked at most once per check interval.
+
+A caller who has just written reads its own writes: the successful ingest
+responses set a cookie with the time of the write and the requests
+carrying a recent enough cookie read from the primary.
+"""
+import functools
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import flask
+import sqlalchemy.engine
+import sqlalchemy.exc
+import sqlalchemy.orm
+
+import mesito.model
+
+#: name of the cookie marking the time of the caller's last write
+COOKIE = 'mesito_wrote_at'
+
+
+class Router:
+    """Pick the database engine of each session."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    # yapf: disable
+    def __init__(
+            self,
+            primary: sqlalchemy.engine.Engine,
+            replicas: List[sqlalchemy.engine.Engine],
+            max_lag: float,
+            read_your_writes: float,
+            check_interval: float = 1.0,
+            clock: Callable[[], float] = time.time
+    ) -> None:  # yapf: enable
+        """
+        Initialize with the given values.
+
+        :param primary: engine of the primary database
+        :param replicas: engines of the read-only replicas
+        :param max_lag: maximum lag of a replica to serve reads, in seconds
+        :param read_your_writes:
+            how long the reads of a caller go to the primary after
+            the caller's write, in seconds
+        :param check_interval: how often the lag of a replica is re-checked
+        :param clock: source of the current time, seconds since epoch
+        """
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.read_your_writes = read_your_writes
+        self.check_interval = check_interval
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+        # Replica index -> (time of the check, lag or None if unavailable)
+        self._lags = {}  # type: Dict[int, Tuple[float, Optional[float]]]
+
+    def beat(self) -> None:
+        """Write the heartbeat to the primary."""
+        session = sqlalchemy.orm.Session(bind=self.primary)
+        try:
+            heartbeat = mesito.model.ReplicationHeartbeat()
+            heartbeat.id = 1
+            heartbeat.stamp = self.clock()
+            session.merge(heartbeat)
+            session.commit()
+        finally:
+            session.close()
+
+    def beat_periodically(self, interval: float) -> threading.Thread:
+        """
+        Write the heartbeat to the primary periodically in the background.
+
+        :param interval: pause between two heartbeats, in seconds
+        :return: started daemon thread
+        """
+
+        def run() -> None:
+            """Beat until the process exits."""
+            while True:
+                try:
+                    self.beat()
+                except sqlalchemy.exc.SQLAlchemyError as err:
+                    logging.warning(
+                        "Failed to write the replication heartbeat: %s", err)
+
+                time.sleep(interval)
+
+        thread = threading.Thread(
+            target=run, name='replication-heartbeat', daemon=True)
+        thread.start()
+        return thread
+
+    def _measure_lag(self, engine: sqlalchemy.engine.Engine) -> Optional[float]:
+        """Measure the lag of the replica, None if unavailable."""
+        session = sqlalchemy.orm.Session(bind=engine)
+        heartbeat = mesito.model.ReplicationHeartbeat
+        try:
+            stamp = session.query(heartbeat.stamp).filter(
+                heartbeat.id == 1).scalar()  # type: Optional[float]
+        except sqlalchemy.exc.SQLAlchemyError:
+            return None
+        finally:
+            session.close()
+
+        if stamp is None:
+            return None
+
+        return max(0.0, self.clock() - stamp)
+
+    def lag(self, index: int) -> Optional[float]:
+        """
+        Retrieve the lag of the replica, re-checked at most once per interval.
+
+        :param index: index of the replica
+        :return: lag in seconds, None if the replica is unavailable
+        """
+        now = self.clock()
+
+        with self._lock:
+            checked = self._lags.get(index, None)
+            if checked is not None and now - checked[0] < self.check_interval:
+                return checked[1]
+
+        lag = self._measure_lag(engine=self.replicas[index])
+
+        with self._lock:
+            self._lags[index] = (now, lag)
+
+        return lag
+
+    def pick(self,
+             wrote_at: Optional[float] = None) -> sqlalchemy.engine.Engine:
+        """
+        Pick the engine to read from.
+
+        :param wrote_at: time of the caller's last write, if any
+        :return: the next fresh replica, or the primary if none
+        """
+        if wrote_at is not None and \
+                self.clock() - wrote_at < self.read_your_writes:
+            return self.primary
+
+        if not self.replicas:
+            return self.primary
+
+        start = next(self._turn)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+
+            lag = self.lag(index=index)
+            if lag is not None and lag <= self.max_lag:
+                return self.replicas[index]
+
+        return self.primary
+
+    def read_session(self) -> sqlalchemy.orm.Session:
+        """Create a read session for the current request."""
+        wrote_at = None  # type: Optional[float]
+
+        if flask.has_request_context():
+            cookie = flask.request.cookies.get(COOKIE, None)
+            if cookie is not None:
+                try:
+                    wrote_at = float(cookie)
+                except ValueError:
+                    wrote_at = None
+
+        return sqlalchemy.orm.Session(bind=self.pick(wrote_at=wrote_at))
+
+    def track_writes(self, handler: Callable[[], Any]) -> Callable[[], Any]:
+        """Wrap the write handler so that its caller reads its own writes."""
+
+        @functools.wraps(handler)
+        def tracked() -> Any:
+            """Mark the successful response with the time of the write."""
+            response = flask.make_response(handler())
+
+            if response.status_code == 200:
+                response.set_cookie(
+                    COOKIE,
+                    '{:.3f}'.format(self.clock()),
+                    max_age=int(self.read_your_writes) + 1,
+                    httponly=True)
+
+            return response
+
+        return tracked
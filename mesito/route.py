@@ -1,83 +1,263 @@
 """Handle application URL routes."""
-from typing import Any
+import threading
+import time
+from typing import Any, Optional, Tuple, TYPE_CHECKING
 
 import flask
 import flask_socketio
 import sqlalchemy.orm
 
+import mesito.analytics
+import mesito.archive
+import mesito.assets
+import mesito.board
+import mesito.changelog
+import mesito.front.codec
 import mesito.front.valid
-import mesito.front.out
-import mesito.operation
+import mesito.handle
+import mesito.ingest
+import mesito.recent
+import mesito.shift
 
+if TYPE_CHECKING:
+    # pylint: disable=unused-import,cyclic-import
+    import mesito.admission
 
-def put_machine(session_factory: sqlalchemy.orm.scoped_session) -> Any:  # pylint: disable=unused-variable
-    """Upsert a machine."""
-    session = session_factory()
 
-    data, local_err = mesito.front.valid.machine_put(data=flask.request.json)
+def json_codec() -> mesito.front.codec.Codec:
+    """Retrieve the JSON codec of the current application."""
+    codec = flask.current_app.extensions['mesito.front.codec']
+    assert isinstance(codec, mesito.front.codec.Codec)
+    return codec
 
-    if local_err is not None:
-        return flask.jsonify(local_err), 400
 
-    assert data is not None
+def _jsonify(obj: Any) -> flask.Response:
+    """Encode the object as a JSON response with the application's codec."""
+    return flask.current_app.response_class(
+        json_codec().dumpb(obj), mimetype='application/json')
+
+
+def _respond(status_body: Tuple[int, Any]) -> Any:
+    """Encode the status code and the response of a handler for Flask."""
+    status, body = status_body
+    return _jsonify(body), status
+
+
+def _broadcast(events: mesito.handle.Events) -> None:
+    """Emit the events of a handler to every client."""
+    for event, data in events:
+        flask_socketio.emit(event, data, broadcast=True, namespace="/")
+
 
-    machine_id_version, global_err = mesito.operation.put_machine(
-        session=session, data=data)
+def put_machine(session_factory: sqlalchemy.orm.scoped_session) -> Any:  # pylint: disable=unused-variable
+    """Upsert a machine."""
+    events = []  # type: mesito.handle.Events
+    response = mesito.handle.put_machine(
+        session=session_factory(),
+        data=flask.request.json,
+        if_match=flask.request.headers.get('If-Match', None),
+        events=events)
 
-    if global_err is not None:
-        return flask.jsonify(global_err), 400
+    _broadcast(events=events)
 
-    assert machine_id_version is not None
-    machine_id, version = machine_id_version
+    return _respond(response)
 
-    assert machine_id is not None, \
-        "Expected machine ID to be set on successful operation"
 
-    emission = mesito.front.out.machine_put_emit(
-        id=machine_id, name=data["name"], version=version)
+def put_machines(session_factory: sqlalchemy.orm.scoped_session) -> Any:  # pylint: disable=unused-variable
+    """Upsert many machines in a single transaction."""
+    events = []  # type: mesito.handle.Events
+    response = mesito.handle.put_machines(
+        session=session_factory(), data=flask.request.json, events=events)
 
-    flask_socketio.emit("put_machine", emission, broadcast=True, namespace="/")
+    _broadcast(events=events)
 
-    return flask.jsonify({'id': machine_id, 'version': version}), 200
+    return _respond(response)
 
 
 def serve_machines(session_factory: sqlalchemy.orm.scoped_session) -> Any:  # pylint: disable=unused-variable
-    """Serve the list of all machines."""
-    session = session_factory()
+    """Serve the machines ordered by (name, ID), optionally paginated."""
+    return _respond(
+        mesito.handle.serve_machines(
+            session=session_factory(), data=flask.request.json))
+
+
+def serve_machine_changes(
+        session_factory: sqlalchemy.orm.scoped_session) -> Any:  # pylint: disable=unused-variable
+    """Serve the machines changed after the cursor in the order of changes."""
+    return _respond(
+        mesito.handle.serve_machine_changes(
+            session=session_factory(), data=flask.request.json))
 
-    machines = mesito.operation.get_machines(session=session)
 
-    return flask.jsonify(machines)
+def serve_machine_search(
+        session_factory: sqlalchemy.orm.scoped_session, fts: bool) -> Any:  # pylint: disable=unused-variable
+    """Serve the machines matching the name prefix or substring."""
+    return _respond(
+        mesito.handle.serve_machine_search(
+            session=session_factory(), data=flask.request.json, fts=fts))
 
 
-def put_machine_state(session_factory: sqlalchemy.orm.scoped_session) -> Any:  # pylint: disable=unused-variable
+def put_machine_state(
+        session_factory: sqlalchemy.orm.scoped_session,
+        board: mesito.board.Board, recent: mesito.recent.Recent,
+        state_ingest: mesito.ingest.PutMachineState, gap_table: bool,
+        change_log: bool) -> Any:  # pylint: disable=unused-variable
     """Upsert the state of the given machine."""
-    data, local_err = mesito.front.valid.machine_state_put(
+    # pylint: disable=too-many-arguments
+    return _respond(
+        mesito.handle.put_machine_state(
+            session=session_factory(),
+            data=flask.request.json,
+            board=board,
+            recent=recent,
+            state_ingest=state_ingest,
+            gap_table=gap_table,
+            change_log=change_log))
+
+
+def extend_machine_state(
+        session_factory: sqlalchemy.orm.scoped_session,
+        board: mesito.board.Board, recent: mesito.recent.Recent,
+        gap_table: bool, change_log: bool) -> Any:  # pylint: disable=unused-variable
+    """Prolong the latest state of the given machine."""
+    return _respond(
+        mesito.handle.extend_machine_state(
+            session=session_factory(),
+            data=flask.request.json,
+            board=board,
+            recent=recent,
+            gap_table=gap_table,
+            change_log=change_log))
+
+
+def serve_machine_states(
+        session_factory: sqlalchemy.orm.scoped_session,
+        archive: Optional[mesito.archive.Archive]) -> Any:  # pylint: disable=unused-variable
+    """Serve the states of a machine in a time range, including archived."""
+    return _respond(
+        mesito.handle.serve_machine_states(
+            session=session_factory(), data=flask.request.json,
+            archive=archive))
+
+
+# yapf: disable
+def serve_analytics(
+        task: str,
+        session_factory: sqlalchemy.orm.scoped_session,
+        archive: Optional[mesito.archive.Archive],
+        calendar: mesito.shift.Calendar,
+        pool: Optional[mesito.analytics.Pool]
+) -> Any:  # yapf: enable
+    """Serve the analytics task, computed in the pool if there is one."""
+    kwargs, local_err = mesito.handle.analytics_request(
+        task=task, data=flask.request.json)
+
+    if local_err is not None:
+        return _jsonify(local_err), 400
+
+    assert kwargs is not None
+
+    if pool is not None:
+        return _respond(
+            mesito.handle.analyze_in_pool(pool=pool, task=task, kwargs=kwargs))
+
+    return _respond(
+        mesito.handle.analyze(
+            session=session_factory(),
+            task=task,
+            kwargs=kwargs,
+            archive=archive,
+            calendar=calendar))
+
+
+def serve_machine_state_gaps(
+        session_factory: sqlalchemy.orm.scoped_session, gap_table: bool) -> Any:  # pylint: disable=unused-variable
+    """Serve the gaps between the consecutive machine states in a time range."""
+    return _respond(
+        mesito.handle.serve_machine_state_gaps(
+            session=session_factory(),
+            data=flask.request.json,
+            gap_table=gap_table))
+
+
+def serve_recent_power(
+        session_factory: sqlalchemy.orm.scoped_session,
+        recent: mesito.recent.Recent) -> Any:  # pylint: disable=unused-variable
+    """Serve the latest states of a machine from memory, warming if cold."""
+    return _respond(
+        mesito.handle.serve_recent_power(
+            session=session_factory(), data=flask.request.json, recent=recent))
+
+
+def serve_machine_state_changes(
+        session_factory: sqlalchemy.orm.scoped_session,
+        waiters: threading.BoundedSemaphore) -> Any:  # pylint: disable=unused-variable
+    """
+    Serve the entries of the machine state change log after the cursor.
+
+    If there are none and the request asks to wait, the log is polled until
+    new entries arrive or the wait elapses. If all the waiting slots are
+    taken, the empty page is served at once instead.
+    """
+    data, local_err = mesito.front.valid.machine_state_changes_request(
         data=flask.request.json)
 
     if local_err is not None:
-        return flask.jsonify(local_err), 400
+        return _jsonify(local_err), 400
 
     assert data is not None
 
     session = session_factory()
 
-    machine_state_id, global_err = mesito.operation.put_machine_state(
-        session=session, data=data)
+    deadline = time.monotonic() + data.get('wait', 0)
+    waiting = False
+    try:
+        while True:
+            changes = mesito.changelog.tail(session=session, request=data)
+
+            # End the transaction so that the next poll sees the new commits
+            # and the connection is not held while waiting.
+            session.rollback()
+
+            remaining = deadline - time.monotonic()
+            if changes['changes'] or remaining <= 0:
+                return _jsonify(changes)
+
+            if not waiting:
+                waiting = waiters.acquire(blocking=False)  # pylint: disable=consider-using-with
+                if not waiting:
+                    return _jsonify(changes)
+
+            time.sleep(min(mesito.changelog.POLL_INTERVAL, remaining))
+    finally:
+        if waiting:
+            waiters.release()
+
+
+def serve_current_states(board: mesito.board.Board) -> Any:  # pylint: disable=unused-variable
+    """Serve the current state of every machine from memory."""
+    return _jsonify(board.states())
+
 
-    if global_err is not None:
-        return flask.jsonify(global_err), 400
+def serve_load(budgets: Optional['mesito.admission.Budgets']) -> Any:  # pylint: disable=unused-variable
+    """Serve the current load of the route budgets for monitoring."""
+    return _jsonify(budgets.stats() if budgets is not None else [])
 
-    assert machine_state_id is not None
 
-    return flask.jsonify(machine_state_id)
+def _send_asset(assets: mesito.assets.Assets, path: str) -> flask.Response:
+    """Send the static file from memory."""
+    response = assets.respond(path=path, headers=flask.request.headers)
+    return flask.Response(
+        response=response.body,
+        status=response.status,
+        headers=response.headers)
 
 
-def serve_index() -> Any:  # pylint: disable=unused-variable
+def serve_index(assets: mesito.assets.Assets) -> Any:  # pylint: disable=unused-variable
     """Serve the index page."""
-    return flask.send_from_directory(directory='static', filename='index.html')
+    return _send_asset(assets=assets, path='index.html')
 
 
-def serve_static(path: str) -> Any:  # pylint: disable=unused-variable
+def serve_static(assets: mesito.assets.Assets, path: str) -> Any:  # pylint: disable=unused-variable
     """Serve static files."""
-    return flask.send_from_directory(directory='static', filename=path)
+    return _send_asset(assets=assets, path=path)
@@ -0,0 +1,90 @@
+"""
+Manage the optional substring index over the machine names.
+
+The prefix search is always served by a B-tree index: the one on
+``machine.name`` on SQLite and the ``text_pattern_ops`` one created by
+:py:mod:`mesito.migrate` on PostgreSQL.
+The substring search uses a trigram index if available: an external-content
+FTS5 table kept in sync by triggers on SQLite, and a pg_trgm GIN index on
+PostgreSQL. Without the index, the substring search falls back to a scan.
+"""
+from typing import List
+
+import sqlalchemy
+import sqlalchemy.engine
+import sqlalchemy.orm
+
+#: name of the FTS5 table on SQLite
+FTS_TABLE = 'machine_name_fts'
+
+#: name of the trigram index on PostgreSQL
+TRGM_INDEX = 'machine_name_trgm'
+
+#: the trigram index can only match the patterns of at least this length
+MIN_SUBSTRING_LENGTH = 3
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+    "name, content='machine', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON machine BEGIN "
+    "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON machine BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, name) "
+    "VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF name ON machine "
+    "BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, name) "
+    "VALUES ('delete', old.id, old.name); "
+    "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+]  # type: List[str]
+
+_POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS {trgm} ON machine "
+    "USING gin (name gin_trgm_ops)",
+]  # type: List[str]
+
+
+def create_index(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Create the substring index over the machine names and populate it.
+
+    :param engine: database engine
+    :raise NotImplementedError: if the dialect is not supported
+    """
+    if engine.dialect.name == 'sqlite':
+        statements = _SQLITE_DDL
+    elif engine.dialect.name == 'postgresql':
+        statements = _POSTGRESQL_DDL
+    else:
+        raise NotImplementedError(
+            "Substring index is not supported for the dialect: {}".format(
+                engine.dialect.name))
+
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(
+                sqlalchemy.text(
+                    statement.format(fts=FTS_TABLE, trgm=TRGM_INDEX)))
+
+
+def has_fts(session: sqlalchemy.orm.Session) -> bool:
+    """
+    Check whether the FTS5 table is available.
+
+    Only SQLite needs to query the FTS5 table explicitly; PostgreSQL uses
+    the trigram index for ``LIKE`` on its own.
+
+    :param session: database session
+    :return: True if the FTS5 table exists
+    """
+    if session.get_bind().dialect.name != 'sqlite':
+        return False
+
+    return session.execute(
+        sqlalchemy.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {
+            'name': FTS_TABLE
+        }).first() is not None
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
-"""Set up the database."""
+"""Set up the database and migrate its schema to the latest version."""
 import argparse
 import logging
 import sys
-from typing import Sequence
+from typing import Dict, List, Sequence
 
-import sqlalchemy
+logging.basicConfig(level=logging.INFO)
 
-import mesito.model
 
-logging.basicConfig(level=logging.INFO)
+def _print_plans(title: str, plans: Dict[str, List[str]]) -> None:
+    """Print the query plans of the hot queries."""
+    print(title)
+    for name, lines in plans.items():
+        print("  {}:".format(name))
+        for line in lines:
+            print("    {}".format(line))
 
 
 def main(command_line_args: Sequence[str]) -> int:
@@ -20,8 +25,42 @@ def main(command_line_args: Sequence[str]) -> int:
         help="SQLAlchemy database URL; "
         "see https://docs.sqlalchemy.org/en/13/core/engines.html",
         required=True)
+    parser.add_argument(
+        "--with_name_search_index",
+        help="If set, creates the trigram index for the substring search "
+        "of the machine names (FTS5 on SQLite, pg_trgm on PostgreSQL)",
+        action="store_true")
+    parser.add_argument(
+        "--target_version",
+        help="If set, migrates the schema only up to this version; "
+        "otherwise to the latest version",
+        type=int)
+    parser.add_argument(
+        "--list_migrations",
+        help="If set, lists the migrations and whether they have been applied, "
+        "and exits",
+        action="store_true")
+    parser.add_argument(
+        "--explain",
+        help="If set, reports the query plans of the hot queries "
+        "before and after the migration",
+        action="store_true")
     args = parser.parse_args(args=command_line_args)
     database_url = str(args.database_url)
+    with_name_search_index = bool(args.with_name_search_index)
+    target_version = (
+        int(args.target_version) if args.target_version is not None else None)
+    list_migrations = bool(args.list_migrations)
+    explain = bool(args.explain)
+
+    # Import SQLAlchemy only after the arguments have been parsed so that
+    # the command-line paths such as ``--help`` return immediately.
+    # pylint: disable=import-outside-toplevel
+    import sqlalchemy
+
+    import mesito.migrate
+    import mesito.model
+    import mesito.search
 
     engine = sqlalchemy.create_engine(database_url)
 
@@ -29,6 +68,34 @@ def main(command_line_args: Sequence[str]) -> int:
     mesito.model.Base.metadata.create_all(engine)
     logging.info("The database tables have been created.")
 
+    if list_migrations:
+        applied = mesito.migrate.applied_versions(engine=engine)
+        print("version\tname\tapplied")
+        for migration in mesito.migrate.MIGRATIONS:
+            print(
+                "{}\t{}\t{}".format(
+                    migration.version, migration.name,
+                    'yes' if migration.version in applied else 'no'))
+        return 0
+
+    if explain:
+        _print_plans(
+            title="Query plans before the migration:",
+            plans=mesito.migrate.explain(engine=engine))
+
+    migrations = mesito.migrate.migrate(engine=engine, target=target_version)
+    logging.info("Applied %d migration(s).", len(migrations))
+
+    if explain:
+        _print_plans(
+            title="Query plans after the migration:",
+            plans=mesito.migrate.explain(engine=engine))
+
+    if with_name_search_index:
+        logging.info("Creating the index for the machine name search...")
+        mesito.search.create_index(engine)
+        logging.info("The index for the machine name search has been created.")
+
     return 0
 
 
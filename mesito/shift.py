@@ -0,0 +1,238 @@
+"""
+Define the shift calendar of the plant.
+
+A shift recurs every day (or only on the given weekdays) at a fixed time of
+the day in the plant's local time. The local time is given as a fixed offset
+from UTC; the daylight saving time is not taken into account.
+
+The calendar is loaded from a JSON file such as:
+
+.. code-block:: json
+
+    {
+        "utc_offset": 3600,
+        "shifts": [
+            {"name": "early", "start": "06:00", "stop": "14:00"},
+            {"name": "late", "start": "14:00", "stop": "22:00"},
+            {"name": "night", "start": "22:00", "stop": "06:00",
+             "weekdays": [0, 1, 2, 3, 4]}
+        ]
+    }
+
+A shift whose stop is not after its start ends on the next day. Weekdays
+are numbered from Monday (0) to Sunday (6) and refer to the day on which
+the shift starts.
+"""
+import json
+import pathlib
+import re
+from typing import Any, List, Optional, Sequence
+
+_DAY = 24 * 60 * 60
+
+# Weekday of the day 1970-01-01, Monday being 0
+_EPOCH_WEEKDAY = 3
+
+_TIME_RE = re.compile(r'^([01][0-9]|2[0-3]):([0-5][0-9])$')
+
+
+class Shift:
+    """Represent a daily recurring shift."""
+
+    def __init__(
+            self,
+            name: str,
+            start: int,
+            duration: int,
+            weekdays: Optional[Sequence[int]] = None) -> None:
+        """
+        Initialize with the given values.
+
+        :param name: name of the shift
+        :param start: start of the shift, seconds after the local midnight
+        :param duration: duration of the shift in seconds, at most a day
+        :param weekdays:
+            days on which the shift starts, Monday being 0;
+            if not set, the shift starts on every day
+        """
+        if not 0 <= start < _DAY:
+            raise ValueError(
+                "Expected the start of the shift {!r} within a day, "
+                "but got: {}".format(name, start))
+
+        if not 0 < duration <= _DAY:
+            raise ValueError(
+                "Expected the duration of the shift {!r} within a day, "
+                "but got: {}".format(name, duration))
+
+        if weekdays is not None and any(not 0 <= day <= 6 for day in weekdays):
+            raise ValueError(
+                "Expected the weekdays of the shift {!r} in [0, 6], "
+                "but got: {}".format(name, list(weekdays)))
+
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.weekdays = frozenset(
+            weekdays if weekdays is not None else range(7))
+
+
+class Instance:
+    """Represent a single occurrence of a shift."""
+
+    def __init__(self, name: str, start: int, stop: int) -> None:
+        """
+        Initialize with the given values.
+
+        :param name: name of the shift
+        :param start: beginning of the occurrence, seconds since epoch
+        :param stop: end of the occurrence, seconds since epoch
+        """
+        self.name = name
+        self.start = start
+        self.stop = stop
+
+    def __repr__(self) -> str:
+        """Represent the instance for debugging."""
+        return 'Instance({!r}, {}, {})'.format(self.name, self.start, self.stop)
+
+
+class Calendar:
+    """Represent the shifts of the plant."""
+
+    def __init__(self, shifts: List[Shift], utc_offset: int = 0) -> None:
+        """
+        Initialize with the given values.
+
+        :param shifts: recurring shifts
+        :param utc_offset: offset of the plant's local time from UTC in seconds
+        """
+        self.shifts = shifts
+        self.utc_offset = utc_offset
+
+    def instances(self, start: int, stop: int) -> List[Instance]:
+        """
+        List the occurrences of the shifts clipped to the time range.
+
+        :param start: beginning of the time range, seconds since epoch
+        :param stop: end of the time range, seconds since epoch
+        :return: occurrences sorted by start
+
+        >>> calendar = Calendar(shifts=[
+        ...     Shift(name='day', start=6 * 3600, duration=12 * 3600),
+        ...     Shift(name='night', start=18 * 3600, duration=12 * 3600)])
+        >>> calendar.instances(start=0, stop=24 * 3600)
+        [Instance('night', 0, 21600), Instance('day', 21600, 64800), \
+Instance('night', 64800, 86400)]
+        """
+        result = []  # type: List[Instance]
+
+        # A shift starting on the previous day can reach into the range.
+        first_day = (start + self.utc_offset) // _DAY - 1
+        last_day = (stop + self.utc_offset) // _DAY
+
+        for day in range(first_day, last_day + 1):
+            weekday = (day + _EPOCH_WEEKDAY) % 7
+            midnight = day * _DAY - self.utc_offset
+
+            for shift in self.shifts:
+                if weekday not in shift.weekdays:
+                    continue
+
+                shift_start = midnight + shift.start
+                shift_stop = shift_start + shift.duration
+
+                if shift_start < stop and shift_stop > start:
+                    result.append(
+                        Instance(
+                            name=shift.name,
+                            start=max(shift_start, start),
+                            stop=min(shift_stop, stop)))
+
+        result.sort(key=lambda instance: instance.start)
+        return result
+
+
+def default() -> Calendar:
+    """Produce the calendar of three eight-hour shifts every day in UTC."""
+    return Calendar(
+        shifts=[
+            Shift(name='early', start=6 * 3600, duration=8 * 3600),
+            Shift(name='late', start=14 * 3600, duration=8 * 3600),
+            Shift(name='night', start=22 * 3600, duration=8 * 3600)
+        ])
+
+
+def _parse_time(text: Any) -> int:
+    """Parse the time of the day as ``HH:MM`` into seconds after midnight."""
+    mtch = _TIME_RE.match(text) if isinstance(text, str) else None
+    if mtch is None:
+        raise ValueError(
+            "Expected the time of the day as HH:MM, but got: {!r}".format(text))
+
+    return int(mtch.group(1)) * 3600 + int(mtch.group(2)) * 60
+
+
+def parse(data: Any) -> Calendar:
+    """
+    Parse the calendar from its JSON representation.
+
+    :param data: JSON data
+    :return: parsed calendar
+    :raise ValueError: if the data is not a valid calendar
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('shifts', None),
+                                                    list):
+        raise ValueError("Expected an object with a list of shifts")
+
+    utc_offset = data.get('utc_offset', 0)
+    if not isinstance(utc_offset, int) or abs(utc_offset) >= _DAY:
+        raise ValueError(
+            "Expected the UTC offset in seconds within a day, "
+            "but got: {!r}".format(utc_offset))
+
+    shifts = []  # type: List[Shift]
+    for item in data['shifts']:
+        if not isinstance(item, dict) or not isinstance(item.get('name', None),
+                                                        str):
+            raise ValueError(
+                "Expected a named shift, but got: {!r}".format(item))
+
+        start = _parse_time(item.get('start', None))
+        stop = _parse_time(item.get('stop', None))
+
+        weekdays = item.get('weekdays', None)
+        if weekdays is not None and (not isinstance(weekdays, list)
+                                     or any(not isinstance(day, int)
+                                            for day in weekdays)):
+            raise ValueError(
+                "Expected the weekdays of the shift {!r} as a list of "
+                "integers, but got: {!r}".format(item['name'], weekdays))
+
+        shifts.append(
+            Shift(
+                name=item['name'],
+                start=start,
+                duration=(stop - start) if stop > start else
+                (stop - start + _DAY),
+                weekdays=weekdays))
+
+    return Calendar(shifts=shifts, utc_offset=utc_offset)
+
+
+def load(path: pathlib.Path) -> Calendar:
+    """
+    Load the calendar from the JSON file.
+
+    :param path: path to the file
+    :return: loaded calendar
+    :raise ValueError: if the file does not contain a valid calendar
+    """
+    with path.open('rt', encoding='utf-8') as fid:
+        data = json.load(fid)
+
+    try:
+        return parse(data=data)
+    except ValueError as err:
+        raise ValueError(
+            "Invalid shift calendar in {}: {}".format(path, err)) from err
@@ -0,0 +1,180 @@
+"""
+Decimate the condition timeline of a machine for the Gantt views.
+
+Over weeks, a machine accumulates hundreds of thousands of states which are
+narrower than a pixel. The time range is therefore split into a given number
+of buckets (*e.g.*, the width of the view in pixels). The states spanning
+at least a bucket are kept as segments of their own, while the narrower ones
+are merged per bucket into a segment of the dominant condition with
+the fraction of the time spent in each condition. The adjacent segments of
+a single condition are joined.
+
+The rows are decimated in a single pass in the order of the index on
+(machine ID, start), so that the response has at most two segments per
+bucket regardless of the length of the history.
+"""
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.archive
+import mesito.front.out
+import mesito.model
+
+# Start, stop and condition of a state
+Interval = Tuple[int, int, str]
+
+
+class _Pending:
+    """Represent the narrow states of a bucket merged so far."""
+
+    def __init__(self, bucket: int, start: int) -> None:
+        """Initialize with the given values."""
+        self.bucket = bucket
+        self.start = start
+        self.stop = start
+        self.durations = {}  # type: Dict[str, int]
+
+
+def decimate(
+        intervals: Iterable[Interval], start: int, stop: int,
+        buckets: int) -> List[mesito.front.out.TimelineSegment]:
+    """
+    Decimate the intervals sorted by start into at most two segments per bucket.
+
+    :param intervals: start, stop and condition of the states sorted by start
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param buckets: number of the buckets dividing the time range
+    :return: segments sorted by start
+
+    >>> segments = decimate(
+    ...     [(0, 1, 'idle'), (1, 4, 'working'), (4, 10, 'working'),
+    ...      (10, 30, 'off')], start=0, stop=30, buckets=3)
+    >>> [(s['start'], s['stop'], s['condition'], s['fractions'])
+    ...  for s in segments]
+    [(0, 10, 'working', {'idle': 0.1, 'working': 0.9}), \
+(10, 30, 'off', {'off': 1.0})]
+    """
+    width = max(1, -(-(stop - start) // buckets))
+
+    segments = []  # type: List[mesito.front.out.TimelineSegment]
+
+    def emit(seg_start: int, seg_stop: int, durations: Dict[str, int]) -> None:
+        """Append the segment or join it with the previous one."""
+        length = seg_stop - seg_start
+        condition = max(sorted(durations), key=lambda key: durations[key])
+        pure = len(durations) == 1 and durations[condition] == length
+
+        if pure and segments:
+            last = segments[-1]
+            if (last['stop'] == seg_start and last['condition'] == condition
+                    and last['fractions'] == {condition: 1.0}):
+                last['stop'] = seg_stop
+                return
+
+        segments.append(
+            mesito.front.out.timeline_segment(
+                start=seg_start,
+                stop=seg_stop,
+                condition=condition,
+                fractions={
+                    key: round(durations[key] / length, 3)
+                    for key in sorted(durations)
+                }))
+
+    pending = None  # type: Optional[_Pending]
+
+    for interval_start, interval_stop, condition in intervals:
+        interval_start = max(interval_start, start)
+        interval_stop = min(interval_stop, stop)
+        if interval_stop <= interval_start:
+            continue
+
+        bucket = (interval_start - start) // width
+        wide = interval_stop - interval_start >= width
+
+        if pending is not None and (wide or pending.bucket != bucket):
+            emit(pending.start, pending.stop, pending.durations)
+            pending = None
+
+        if wide:
+            emit(
+                interval_start, interval_stop,
+                {condition: interval_stop - interval_start})
+            continue
+
+        if pending is None:
+            pending = _Pending(bucket=bucket, start=interval_start)
+
+        pending.stop = interval_stop
+        pending.durations[condition] = (
+            pending.durations.get(condition, 0) + interval_stop -
+            interval_start)
+
+    if pending is not None:
+        emit(pending.start, pending.stop, pending.durations)
+
+    return segments
+
+
+def _merge(
+        archived: List[mesito.front.out.MachineState],
+        hot: Iterable[Interval]) -> Iterator[Interval]:
+    """Merge the archived and the hot states by start, preferring the hot."""
+    if not archived:
+        yield from hot
+        return
+
+    cold = ((state['start'], state['stop'], state['condition'])
+            for state in archived)
+
+    # The hot state sorts before the archived one with the same start.
+    tagged = heapq.merge(((interval[0], 0, interval) for interval in hot),
+                         ((interval[0], 1, interval) for interval in cold))
+
+    last_start = None  # type: Optional[int]
+    for interval_start, _, interval in tagged:
+        if interval_start != last_start:
+            yield interval
+            last_start = interval_start
+
+
+def machine_timeline(
+        session: sqlalchemy.orm.Session, machine_id: int, start: int, stop: int,
+        buckets: int, archive: Optional[mesito.archive.Archive]
+) -> List[mesito.front.out.TimelineSegment]:
+    """
+    Retrieve the decimated condition timeline of the machine.
+
+    :param session: database session
+    :param machine_id: ID of the machine
+    :param start: beginning of the time range, seconds since epoch
+    :param stop: end of the time range, seconds since epoch
+    :param buckets: number of the buckets dividing the time range
+    :param archive: archive of cold states, if available
+    :return: segments sorted by start
+    """
+    table = mesito.model.MachineState.__table__
+
+    # The rows are streamed from the cursor instead of loaded as objects.
+    rows = session.execute(
+        sqlalchemy.select([table.c.start, table.c.stop, table.c.condition
+                           ]).where((table.c.machine_id == machine_id)
+                                    & (table.c.start < stop)
+                                    & (table.c.stop > start)).order_by(
+                                        table.c.start))
+
+    hot = ((row[0], row[1], row[2]) for row in rows)
+
+    archived = (
+        archive.read(machine_id=machine_id, start=start, stop=stop)
+        if archive is not None else [])
+
+    return decimate(
+        intervals=_merge(archived=archived, hot=hot),
+        start=start,
+        stop=stop,
+        buckets=buckets)
@@ -5,13 +5,38 @@ https://packaging.python.org/en/latest/distributing.html
 https://github.com/pypa/sampleproject
 """
 import os
+import pathlib
 
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 
 import mesito_meta
 
 # pylint: disable=redefined-builtin
 
+
+class BuildPy(build_py):
+    """Generate the validation code of the JSON schemas into the package."""
+
+    def run(self):
+        """Build the package and generate the validators into it."""
+        build_py.run(self)
+
+        # The dependencies are not necessarily installed at build time;
+        # the schemas are then compiled in memory on first use.
+        try:
+            import mesito.front.valid  # pylint: disable=import-outside-toplevel
+        except ImportError as exception:
+            print(
+                "Skipping the generation of the validators: {}".format(
+                    exception))
+            return
+
+        mesito.front.valid.generate(
+            directory=pathlib.Path(self.build_lib) / 'mesito' / 'front' /
+            'generated')
+
+
 here = os.path.abspath(os.path.dirname(__file__))  # pylint: disable=invalid-name
 
 with open(os.path.join(here, 'README.rst'), encoding='utf-8') as f:
@@ -51,8 +76,14 @@ setup(
             'temppathlib>=1.0.3,<2',
             'twine>=1.12.1,<2',
         ],
+        'speedups': ['orjson>=2.6.0', 'brotli>=1.0.7', 'zstandard>=0.13.0'],
+        'asgi': ['sqlalchemy>=1.4', 'uvicorn>=0.13', 'aiosqlite>=0.17'],
         # yapf: enable
     },
     py_modules=['mesito', 'mesito_meta'],
-    scripts=['bin/mesito', 'bin/mesito-setup'],
-    package_data={"mesito": ["py.typed"]})
+    scripts=[
+        'bin/mesito', 'bin/mesito-setup', 'bin/mesito-archive',
+        'bin/mesito-asgi', 'bin/mesito-gaps'
+    ],
+    package_data={"mesito": ["py.typed"]},
+    cmdclass={'build_py': BuildPy})
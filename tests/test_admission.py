@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import threading
+import unittest
+from typing import Any
+
+import flask
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.admission
+import mesito.app
+import mesito.front.codec
+import mesito.model
+
+
+def some_budgets(
+        ingest_max_in_flight: int, ingest_max_queued: int,
+        queue_timeout: float) -> mesito.admission.Budgets:
+    return mesito.admission.Budgets(
+        ingest=mesito.admission.Budget(
+            name='ingest',
+            max_in_flight=ingest_max_in_flight,
+            max_queued=ingest_max_queued,
+            queue_timeout=queue_timeout,
+            retry_after=3),
+        read=mesito.admission.Budget(
+            name='read',
+            max_in_flight=1,
+            max_queued=1,
+            queue_timeout=queue_timeout,
+            retry_after=3))
+
+
+class TestBudgets(unittest.TestCase):
+    def test_shed_on_full_queue(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        budgets = some_budgets(
+            ingest_max_in_flight=0, ingest_max_queued=0, queue_timeout=0.0)
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            budgets=budgets)
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/put_machine', json={'name': 'some-machine'})
+            self.assertEqual(429, resp.status_code)
+            self.assertEqual('3', resp.headers['Retry-After'])
+            self.assertDictEqual({
+                'what': 'Overloaded',
+                'why': {
+                    'budget': 'ingest',
+                    'retry_after': 3
+                }
+            }, resp.json)
+
+            # The read budget is independent of the ingest one.
+            resp = client.post('/api/v1/machines')
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.get('/api/v1/load')
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([{
+                'name': 'ingest',
+                'in_flight': 0,
+                'queued': 0,
+                'shed': 1,
+                'max_in_flight': 0,
+                'max_queued': 0
+            }, {
+                'name': 'read',
+                'in_flight': 0,
+                'queued': 0,
+                'shed': 0,
+                'max_in_flight': 1,
+                'max_queued': 1
+            }], resp.json)
+
+    def test_shed_on_queue_timeout(self) -> None:
+        app = flask.Flask(__name__)
+        app.extensions['mesito.front.codec'] = mesito.front.codec.select('json')
+
+        budget = some_budgets(
+            ingest_max_in_flight=1, ingest_max_queued=1,
+            queue_timeout=0.01).ingest
+
+        entered = threading.Event()
+        leave = threading.Event()
+
+        def slow() -> Any:
+            entered.set()
+            leave.wait()
+            return 'done'
+
+        guarded = budget.guard(slow)
+
+        def occupy() -> None:
+            with app.test_request_context('/'):
+                guarded()
+
+        thread = threading.Thread(target=occupy)
+        thread.start()
+        try:
+            entered.wait()
+            self.assertEqual(1, budget.stats()['in_flight'])
+
+            with app.test_request_context('/'):
+                resp = guarded()
+                self.assertEqual(503, resp.status_code)
+                self.assertEqual('3', resp.headers['Retry-After'])
+        finally:
+            leave.set()
+            thread.join()
+
+        stats = budget.stats()
+        self.assertEqual(0, stats['in_flight'])
+        self.assertEqual(0, stats['queued'])
+        self.assertEqual(1, stats['shed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
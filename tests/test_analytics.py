@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import importlib.util
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+from typing import Any, Dict, List, Tuple
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.analytics
+import mesito.app
+import mesito.model
+
+HAS_GEVENT = importlib.util.find_spec('gevent') is not None
+
+# Routes dispatched to the pool with their requests
+ROUTES = [
+    (
+        '/api/v1/machine_timeline', {
+            'machine_id': 1,
+            'start': 0,
+            'stop': 3600,
+            'buckets': 4
+        }),
+    (
+        '/api/v1/machine_state_aggregates', {
+            'machine_id': 1,
+            'start': 0,
+            'stop': 3600
+        }),
+    (
+        '/api/v1/concurrency_profile', {
+            'start': 0,
+            'stop': 3600,
+            'resolution': 600
+        }),
+    ('/api/v1/shift_report', {
+        'start': 0,
+        'stop': 3600
+    }),
+]  # type: List[Tuple[str, Dict[str, Any]]]
+
+
+def populate(database_url: str) -> sqlalchemy.orm.scoped_session:
+    engine = sqlalchemy.create_engine(database_url)
+    mesito.model.Base.metadata.create_all(engine)
+    session_factory = sqlalchemy.orm.scoped_session(
+        sqlalchemy.orm.sessionmaker(bind=engine))
+
+    session = session_factory()
+    for i in range(3):
+        session.add(
+            mesito.model.Machine(name='machine-{}'.format(i), version=1))
+    session.commit()
+
+    for machine_id in [1, 2, 3]:
+        for start in range(0, 3600, 300):
+            session.add(
+                mesito.model.MachineState(
+                    machine_id=machine_id,
+                    start=start,
+                    stop=start + 200,
+                    condition='working' if start % 600 == 0 else 'idle',
+                    avg_power_consumption=1.0))
+    session.commit()
+    session_factory.remove()
+
+    return session_factory
+
+
+class TestPool(unittest.TestCase):
+    def test_same_as_in_process(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            database_url = 'sqlite:///{}'.format(
+                pathlib.Path(tmpdir) / 'mesito.sqlite')
+            session_factory = populate(database_url=database_url)
+
+            pool = mesito.analytics.Pool(
+                database_url=database_url, workers=2, timeout=60.0)
+            try:
+                app, _ = mesito.app.produce(
+                    session_factory=session_factory,
+                    cors_allowed_all_origins=False)
+
+                pooled_app, _ = mesito.app.produce(
+                    session_factory=session_factory,
+                    cors_allowed_all_origins=False,
+                    analytics=pool)
+
+                for path, request in ROUTES:
+                    with app.test_client() as client:
+                        expected = client.post(path, json=request)
+                    self.assertEqual(200, expected.status_code, path)
+
+                    with pooled_app.test_client() as client:
+                        got = client.post(path, json=request)
+                    self.assertEqual(200, got.status_code, path)
+
+                    self.assertEqual(expected.json, got.json, path)
+            finally:
+                pool.shutdown()
+
+    def test_timeout(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            database_url = 'sqlite:///{}'.format(
+                pathlib.Path(tmpdir) / 'mesito.sqlite')
+            session_factory = populate(database_url=database_url)
+
+            # The worker takes far longer to spawn than the timeout.
+            pool = mesito.analytics.Pool(
+                database_url=database_url, workers=1, timeout=0.001)
+            try:
+                app, _ = mesito.app.produce(
+                    session_factory=session_factory,
+                    cors_allowed_all_origins=False,
+                    analytics=pool)
+
+                path, request = ROUTES[0]
+                with app.test_client() as client:
+                    resp = client.post(path, json=request)
+
+                self.assertEqual(503, resp.status_code)
+                self.assertEqual({
+                    'what': 'TaskTimedOut',
+                    'why': {
+                        'task': 'machine_timeline',
+                        'timeout': 0.001
+                    }
+                }, resp.json)
+            finally:
+                pool.shutdown()
+
+    def test_worker_replaced_after_timeout(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            database_url = 'sqlite:///{}'.format(
+                pathlib.Path(tmpdir) / 'mesito.sqlite')
+            populate(database_url=database_url)
+
+            # The worker takes far longer to spawn than the timeout.
+            pool = mesito.analytics.Pool(
+                database_url=database_url, workers=1, timeout=0.001)
+            try:
+                kwargs = {'start': 0, 'stop': 3600, 'machine_ids': None}
+                result, err = pool.run(task='shift_report', kwargs=kwargs)
+                self.assertIsNone(result)
+                self.assertIsNotNone(err)
+
+                pool.timeout = 60.0
+                result, err = pool.run(task='shift_report', kwargs=kwargs)
+                self.assertIsNone(err)
+                self.assertIsNotNone(result)
+            finally:
+                pool.shutdown()
+
+    def test_replicas(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            database_url = 'sqlite:///{}'.format(
+                pathlib.Path(tmpdir) / 'mesito.sqlite')
+            populate(database_url=database_url)
+
+            kwargs = {'start': 0, 'stop': 3600, 'machine_ids': None}
+
+            pool = mesito.analytics.Pool(
+                database_url=database_url, workers=1, timeout=60.0)
+            try:
+                expected, err = pool.run(task='shift_report', kwargs=kwargs)
+                self.assertIsNone(err)
+            finally:
+                pool.shutdown()
+
+            # The replicas are empty so that the results tell them apart
+            # from the primary.
+            replica_urls = []  # type: List[str]
+            for name, stamp in [('stale', 0.0), ('fresh', 1e12)]:
+                replica_url = 'sqlite:///{}'.format(
+                    pathlib.Path(tmpdir) / '{}.sqlite'.format(name))
+                replica_urls.append(replica_url)
+
+                engine = sqlalchemy.create_engine(replica_url)
+                mesito.model.Base.metadata.create_all(engine)
+                session = sqlalchemy.orm.Session(bind=engine)
+                session.add(
+                    mesito.model.ReplicationHeartbeat(id=1, stamp=stamp))
+                session.commit()
+                session.close()
+
+            # The stale replica is skipped in favour of the fresh one, or of
+            # the primary if there is no other replica.
+            for urls, from_primary in [(replica_urls[:1], True),
+                                       (replica_urls, False)]:
+                pool = mesito.analytics.Pool(
+                    database_url=database_url,
+                    workers=1,
+                    timeout=60.0,
+                    replica_urls=urls,
+                    replica_max_lag=5.0)
+                try:
+                    for _ in range(2):
+                        result, err = pool.run(
+                            task='shift_report', kwargs=kwargs)
+                        self.assertIsNone(err)
+                        self.assertEqual(from_primary, result == expected)
+                finally:
+                    pool.shutdown()
+
+    def test_unknown_task(self) -> None:
+        pool = mesito.analytics.Pool(
+            database_url='sqlite://', workers=1, timeout=1.0)
+        try:
+            with self.assertRaises(KeyError):
+                pool.run(task='nonexisting', kwargs={})
+        finally:
+            pool.shutdown()
+
+
+# Waits for the pool in greenlets while another greenlet ticks
+GEVENT_SCRIPT = """
+import gevent.monkey
+gevent.monkey.patch_all()
+
+import sys
+import time
+
+import gevent
+
+import mesito.analytics
+
+pool = mesito.analytics.Pool(database_url=sys.argv[1], workers=2, timeout=60)
+
+ticks = []
+
+
+def tick():
+    while True:
+        ticks.append(time.monotonic())
+        gevent.sleep(0.01)
+
+
+ticker = gevent.spawn(tick)
+jobs = [
+    gevent.spawn(
+        pool.run, 'shift_report',
+        {'start': 0, 'stop': 3600, 'machine_ids': None})
+    for _ in range(4)
+]
+gevent.joinall(jobs, raise_error=True)
+ticker.kill()
+pool.shutdown()
+
+assert all(job.value[1] is None for job in jobs), [job.value for job in jobs]
+print(len(ticks))
+"""
+
+
+@unittest.skipUnless(HAS_GEVENT, "gevent is not installed")
+class TestGevent(unittest.TestCase):
+    def test_waiting_is_cooperative(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            database_url = 'sqlite:///{}'.format(
+                pathlib.Path(tmpdir) / 'mesito.sqlite')
+            populate(database_url=database_url)
+
+            completed = subprocess.run(
+                [sys.executable, '-c', GEVENT_SCRIPT, database_url],
+                cwd=str(pathlib.Path(__file__).parent.parent),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=120,
+                check=False)
+
+            stderr = completed.stderr.decode('utf-8')
+            self.assertEqual(0, completed.returncode, stderr)
+            self.assertNotIn('Traceback', stderr)
+
+            # Spawning the workers alone takes far longer than a tick so
+            # the ticker only advances if the waits yield to the hub.
+            self.assertGreater(int(completed.stdout.decode('utf-8')), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring,protected-access
+import pathlib
+import tempfile
+import unittest
+from typing import List
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.archive
+import mesito.front.out
+import mesito.model
+
+
+def some_state(start: int, stop: int) -> mesito.front.out.MachineState:
+    return mesito.front.out.machine_state(
+        machine_id=1,
+        start=start,
+        stop=stop,
+        condition=mesito.model.MachineCondition.WORKING.value,
+        min_power_consumption=None,
+        max_power_consumption=2.5,
+        avg_power_consumption=1.5,
+        total_energy=None,
+        pieces=3 if start % 2 == 0 else None)
+
+
+class TestArchive(unittest.TestCase):
+    def test_roundtrip(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = mesito.archive.Archive(directory=pathlib.Path(tmpdir))
+
+            # 1577836800 is 2020-01-01, 1580515200 is 2020-02-01
+            states = [
+                some_state(start=1577836800, stop=1577836900),
+                some_state(start=1580515100, stop=1580515300),
+                some_state(start=1580515301, stop=1580515400)
+            ]
+            archive.write(machine_id=1, states=states)
+
+            self.assertListEqual(
+                ['2020-01.chunk', '2020-02.chunk'],
+                sorted(
+                    pth.name for pth in (pathlib.Path(tmpdir) / '1').iterdir()))
+
+            self.assertListEqual(
+                states, archive.read(machine_id=1, start=0, stop=2**40))
+
+            # The state started in January overlaps with February.
+            self.assertListEqual(
+                states[1:2],
+                archive.read(machine_id=1, start=1580515200, stop=1580515250))
+
+            self.assertListEqual([],
+                                 archive.read(
+                                     machine_id=2, start=0, stop=2**40))
+
+    def test_write_merges(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = mesito.archive.Archive(directory=pathlib.Path(tmpdir))
+
+            archive.write(
+                machine_id=1,
+                states=[some_state(start=1577836800, stop=1577836900)])
+            archive.write(
+                machine_id=1,
+                states=[
+                    some_state(start=1577836800, stop=1577836950),
+                    some_state(start=1577837000, stop=1577837100)
+                ])
+
+            self.assertListEqual([
+                some_state(start=1577836800, stop=1577836950),
+                some_state(start=1577837000, stop=1577837100)
+            ], archive.read(machine_id=1, start=0, stop=2**40))
+
+
+class TestArchiveStates(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            engine = sqlalchemy.create_engine('sqlite://')
+            mesito.model.Base.metadata.create_all(engine)
+
+            session_factory = sqlalchemy.orm.scoped_session(
+                sqlalchemy.orm.sessionmaker(bind=engine))
+
+            archive = mesito.archive.Archive(directory=pathlib.Path(tmpdir))
+
+            app, _ = mesito.app.produce(
+                session_factory=session_factory,
+                cors_allowed_all_origins=False,
+                archive=archive)
+
+            with app.test_client() as client:
+                resp = client.post(
+                    '/api/v1/put_machine', json={'name': 'some-machine'})
+                self.assertEqual(200, resp.status_code)
+
+                for start, stop in [(1000, 2000), (2000, 3000), (5000, 6000)]:
+                    resp = client.post(
+                        '/api/v1/put_machine_state',
+                        json={
+                            "machine_id": 1,
+                            "start": start,
+                            "stop": stop,
+                            "condition":
+                            mesito.model.MachineCondition.WORKING.value,
+                            "total_energy": 1.0
+                        })
+                    self.assertEqual(200, resp.status_code)
+
+                count = mesito.archive.archive_states(
+                    session=session_factory(), archive=archive, cutoff=3000)
+                self.assertEqual(2, count)
+
+                session = session_factory()
+                self.assertEqual(
+                    1,
+                    session.query(mesito.model.MachineState).count())
+                session_factory.remove()
+
+                resp = client.post(
+                    '/api/v1/machine_states',
+                    json={
+                        'machine_id': 1,
+                        'start': 1500,
+                        'stop': 5500
+                    })
+                self.assertEqual(200, resp.status_code)
+                self.assertListEqual([(1000, 2000), (2000, 3000), (5000, 6000)],
+                                     [(state['start'], state['stop'])
+                                      for state in resp.json])
+
+                resp = client.post(
+                    '/api/v1/machine_state_aggregates',
+                    json={
+                        'machine_id': 1,
+                        'start': 1500,
+                        'stop': 5500
+                    })
+                self.assertEqual(200, resp.status_code)
+                self.assertListEqual([{
+                    'condition': 'working',
+                    'count': 3,
+                    'duration': 500 + 1000 + 500,
+                    'total_energy': 3.0,
+                    'pieces': 0
+                }], resp.json)
+
+    def test_in_batches(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            engine = sqlalchemy.create_engine('sqlite://')
+            mesito.model.Base.metadata.create_all(engine)
+            session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+            session.add(mesito.model.Machine(name='some-machine', version=1))
+
+            # More states than fit in an IN list on SQLite
+            count = 2 * mesito.archive._IN_CHUNK + 100
+            session.add_all([
+                mesito.model.MachineState(
+                    machine_id=1,
+                    start=10 * i,
+                    stop=10 * i + 5,
+                    condition=mesito.model.MachineCondition.WORKING.value)
+                for i in range(count + 1)
+            ])
+            session.commit()
+
+            archive = mesito.archive.Archive(directory=pathlib.Path(tmpdir))
+
+            self.assertEqual(
+                count,
+                mesito.archive.archive_states(
+                    session=session, archive=archive, cutoff=10 * count))
+
+            self.assertEqual(
+                1,
+                session.query(mesito.model.MachineState).count())
+
+            self.assertListEqual([10 * i for i in range(count)], [
+                state['start'] for state in archive.read(
+                    machine_id=1, start=0, stop=10 * count)
+            ])
+
+            session.close()
+
+    def test_writes_each_chunk_once(self) -> None:
+        class CountingArchive(mesito.archive.Archive):
+            def __init__(self, directory: pathlib.Path) -> None:
+                super().__init__(directory=directory)
+                self.months = []  # type: List[List[str]]
+
+            def write(
+                    self, machine_id: int,
+                    states: List[mesito.front.out.MachineState]) -> None:
+                self.months.append(
+                    sorted({
+                        mesito.archive.month_of(state['start'])
+                        for state in states
+                    }))
+                super().write(machine_id=machine_id, states=states)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            engine = sqlalchemy.create_engine('sqlite://')
+            mesito.model.Base.metadata.create_all(engine)
+            session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+            session.add(mesito.model.Machine(name='some-machine', version=1))
+
+            # 1970-01 and 1970-02, each with more states than a batch
+            starts = [
+                month_start + 60 * i for month_start in [0, 31 * 24 * 3600]
+                for i in range(mesito.archive._IN_CHUNK + 100)
+            ]
+            session.add_all([
+                mesito.model.MachineState(
+                    machine_id=1,
+                    start=start,
+                    stop=start + 30,
+                    condition=mesito.model.MachineCondition.WORKING.value)
+                for start in starts
+            ])
+            session.commit()
+
+            archive = CountingArchive(directory=pathlib.Path(tmpdir))
+
+            self.assertEqual(
+                len(starts),
+                mesito.archive.archive_states(
+                    session=session, archive=archive, cutoff=starts[-1] + 30))
+
+            self.assertListEqual([['1970-01'], ['1970-02']], archive.months)
+
+            self.assertEqual(
+                0,
+                session.query(mesito.model.MachineState).count())
+
+            session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
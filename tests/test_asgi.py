@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import asyncio
+import importlib.util
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+from typing import Any, Dict, List, Optional, Tuple
+
+HAS_ASYNC_SQLITE = importlib.util.find_spec('aiosqlite') is not None
+
+
+async def call(app: Any, method: str, path: str,
+               data: Optional[Any] = None) -> Tuple[int, Any]:
+    """Send the request to the ASGI application and decode the response."""
+    body = json.dumps(data).encode('utf-8') if data is not None else b''
+    received = False
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal received
+        assert not received
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    messages = []  # type: List[Dict[str, Any]]
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    await app({
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'content-type', b'application/json')]
+    }, receive, send)
+
+    status = messages[0]['status']
+    content = b''.join(message.get('body', b'') for message in messages[1:])
+
+    if (b'content-type', b'application/json') in messages[0]['headers']:
+        return status, json.loads(content)
+
+    return status, content
+
+
+@unittest.skipUnless(HAS_ASYNC_SQLITE, "aiosqlite is not installed")
+class TestAsgi(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        import sqlalchemy.ext.asyncio
+
+        import mesito.asgi
+        import mesito.model
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pth = pathlib.Path(tmpdir) / 'mesito.sqlite'
+
+            engine = sqlalchemy.create_engine('sqlite:///{}'.format(pth))
+            mesito.model.Base.metadata.create_all(engine)
+            engine.dispose()
+
+            async def scenario() -> None:
+                async_engine = sqlalchemy.ext.asyncio.create_async_engine(
+                    'sqlite+aiosqlite:///{}'.format(pth))
+
+                app, _, _ = mesito.asgi.produce(
+                    engine=async_engine,
+                    cors_allowed_all_origins=False,
+                    change_log=True)
+
+                try:
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/put_machine',
+                        {'name': 'some-machine'})
+                    self.assertEqual(200, status)
+                    self.assertDictEqual({'id': 1, 'version': 1}, resp)
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/put_machine', {'id': 'oi'})
+                    self.assertEqual(400, status)
+                    self.assertEqual('SchemaViolation', resp['what'])
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/put_machine', {
+                            'id': 1,
+                            'name': 'some-machine',
+                            'version': 2
+                        })
+                    self.assertEqual(409, status)
+                    self.assertEqual('MachineVersionConflict', resp['what'])
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/put_machine_state', {
+                            'machine_id': 1,
+                            'start': 1000,
+                            'stop': 1010,
+                            'condition': 'working'
+                        })
+                    self.assertEqual(200, status)
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/extend_machine_state', {
+                            'machine_id': 1,
+                            'start': 1000,
+                            'stop': 1020
+                        })
+                    self.assertEqual(200, status)
+                    self.assertEqual(1020, resp['stop'])
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/machine_states', {
+                            'machine_id': 1,
+                            'start': 0,
+                            'stop': 2000
+                        })
+                    self.assertEqual(200, status)
+                    self.assertListEqual(
+                        [(1000, 1020, 'working')],
+                        [(state['start'], state['stop'], state['condition'])
+                         for state in resp])
+
+                    status, resp = await call(app, 'POST', '/api/v1/machines')
+                    self.assertEqual(200, status)
+                    self.assertListEqual([{
+                        'id': 1,
+                        'name': 'some-machine',
+                        'version': 1
+                    }], resp)
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/shift_report', {
+                            'start': 0,
+                            'stop': 2000
+                        })
+                    self.assertEqual(200, status)
+                    self.assertListEqual([[0, 1, 'working', 20, 0]],
+                                         resp['rows'])
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/current_states')
+                    self.assertEqual(200, status)
+                    self.assertEqual(1020, resp[0]['stop'])
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/recent_power', {'machine_id': 1})
+                    self.assertEqual(200, status)
+                    self.assertListEqual([1020], resp['stop'])
+
+                    status, resp = await call(
+                        app, 'POST', '/api/v1/machine_state_changes', {
+                            'since': 1,
+                            'wait': 0.1
+                        })
+                    self.assertEqual(200, status)
+                    self.assertListEqual(
+                        ['extend'],
+                        [change['operation'] for change in resp['changes']])
+
+                    status, _ = await call(app, 'GET', '/api/v1/machines')
+                    self.assertEqual(405, status)
+
+                    status, _ = await call(app, 'POST', '/api/v1/nonexisting')
+                    self.assertEqual(404, status)
+
+                    status, content = await call(app, 'GET', '/')
+                    self.assertEqual(200, status)
+                    self.assertIn(b'<html', content)
+
+                    status, _ = await call(app, 'GET', '/../asgi.py')
+                    self.assertEqual(404, status)
+                finally:
+                    await async_engine.dispose()
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(scenario())
+            finally:
+                loop.close()
+
+    def test_gateway(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        import sqlalchemy.ext.asyncio
+
+        import mesito.asgi
+        import mesito.gateway
+        import mesito.model
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pth = pathlib.Path(tmpdir) / 'mesito.sqlite'
+
+            engine = sqlalchemy.create_engine('sqlite:///{}'.format(pth))
+            mesito.model.Base.metadata.create_all(engine)
+            engine.dispose()
+
+            async def scenario() -> None:
+                async_engine = sqlalchemy.ext.asyncio.create_async_engine(
+                    'sqlite+aiosqlite:///{}'.format(pth))
+
+                app, _, sio = mesito.asgi.produce(
+                    engine=async_engine,
+                    cors_allowed_all_origins=False,
+                    gateway_tokens=['secret'])
+
+                handlers = sio.handlers[mesito.gateway.NAMESPACE]
+
+                try:
+                    self.assertFalse(handlers['connect']('some-sid', {}))
+                    self.assertTrue(
+                        handlers['connect'](
+                            'some-sid', {
+                                'QUERY_STRING': 'token=secret'
+                            }))
+
+                    status, _ = await call(
+                        app, 'POST', '/api/v1/put_machine',
+                        {'name': 'some-machine'})
+                    self.assertEqual(200, status)
+
+                    ack = await handlers['put_machine_state'](
+                        'some-sid', {
+                            'machine_id': 1,
+                            'start': 1000,
+                            'stop': 1010,
+                            'condition': 'working'
+                        })
+                    self.assertEqual(1, ack)
+
+                    ack = await handlers['extend_machine_state'](
+                        'some-sid', {
+                            'machine_id': 1,
+                            'start': 1010,
+                            'stop': 1020
+                        })
+                    self.assertEqual('MachineStateNotFound', ack['what'])
+                finally:
+                    await async_engine.dispose()
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(scenario())
+            finally:
+                loop.close()
+
+
+class TestRejectUnsupported(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        import mesito.asgi
+        import mesito.args
+
+        required = ['--port', '8080', '--database_url', 'sqlite://']
+
+        mesito.asgi.reject_unsupported(
+            args=mesito.args.parse_args(
+                command_line_args=required + ['--gap_table']))
+
+        unsupported = [
+            ['--idempotency_persist'],
+            ['--ingest_max_in_flight', '3'],
+            ['--compression_min_size', '-1'],
+            ['--read_replica_url', 'sqlite://'],
+        ]  # type: List[List[str]]
+
+        for options in unsupported:
+            with self.assertRaises(ValueError):
+                mesito.asgi.reject_unsupported(
+                    args=mesito.args.parse_args(
+                        command_line_args=required + options))
+
+
+class TestImport(unittest.TestCase):
+    def test_gevent_not_patched(self) -> None:
+        # The ASGI server shares the arguments with the gevent server, but
+        # must run on the intact standard library.
+        completed = subprocess.run([
+            sys.executable, '-c', 'import sys\n'
+            'import mesito.args\n'
+            'import mesito.asgi\n'
+            'mesito.asgi.reject_unsupported(args=mesito.args.parse_args('
+            '["--port", "0", "--database_url", "sqlite://"]))\n'
+            'import threading\n'
+            'print(threading.get_ident.__module__)\n'
+            'print("gevent.monkey" in sys.modules)\n'
+        ],
+                                   cwd=str(
+                                       pathlib.Path(__file__).parent.parent),
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   timeout=60,
+                                   check=False)
+
+        self.assertEqual(
+            0, completed.returncode, completed.stderr.decode('utf-8'))
+        self.assertEqual(['_thread', 'False'],
+                         completed.stdout.decode('utf-8').split())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import gzip
+import os
+import pathlib
+import tempfile
+import unittest
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.assets
+import mesito.compress
+import mesito.model
+
+SCRIPT = 'var x = 1;\n' * 100
+
+
+class TestAssets(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (pathlib.Path(tmpdir) / 'index.html').write_text('<html></html>')
+            (pathlib.Path(tmpdir) / 'js').mkdir()
+            (pathlib.Path(tmpdir) / 'js' / 'app.3f2a9c1b.js').write_text(SCRIPT)
+
+            engine = sqlalchemy.create_engine('sqlite://')
+            mesito.model.Base.metadata.create_all(engine)
+            session_factory = sqlalchemy.orm.scoped_session(
+                sqlalchemy.orm.sessionmaker(bind=engine))
+
+            app, _ = mesito.app.produce(
+                session_factory=session_factory,
+                cors_allowed_all_origins=False,
+                assets=mesito.assets.Assets(
+                    directory=tmpdir, encodings=[mesito.compress.Gzip()]))
+
+            with app.test_client() as client:
+                resp = client.get('/')
+                self.assertEqual(200, resp.status_code)
+                self.assertEqual(b'<html></html>', resp.get_data())
+                self.assertEqual('no-cache', resp.headers['Cache-Control'])
+                etag = resp.headers['ETag']
+
+                resp = client.get('/', headers={'If-None-Match': etag})
+                self.assertEqual(304, resp.status_code)
+                self.assertEqual(b'', resp.get_data())
+
+                resp = client.get(
+                    '/js/app.3f2a9c1b.js', headers={'Accept-Encoding': 'gzip'})
+                self.assertEqual(200, resp.status_code)
+                self.assertEqual('gzip', resp.headers['Content-Encoding'])
+                self.assertEqual('Accept-Encoding', resp.headers['Vary'])
+                self.assertEqual(
+                    mesito.assets.IMMUTABLE, resp.headers['Cache-Control'])
+                self.assertEqual(
+                    SCRIPT.encode('utf-8'), gzip.decompress(resp.get_data()))
+                gzip_etag = resp.headers['ETag']
+
+                resp = client.get('/js/app.3f2a9c1b.js')
+                self.assertNotIn('Content-Encoding', resp.headers)
+                self.assertEqual(SCRIPT.encode('utf-8'), resp.get_data())
+                self.assertNotEqual(gzip_etag, resp.headers['ETag'])
+
+                resp = client.get(
+                    '/js/app.3f2a9c1b.js',
+                    headers={
+                        'Accept-Encoding': 'gzip',
+                        'If-None-Match': 'W/{}'.format(gzip_etag)
+                    })
+                self.assertEqual(304, resp.status_code)
+
+                resp = client.get('/nonexisting.js')
+                self.assertEqual(404, resp.status_code)
+
+                resp = client.get('/../setup.py')
+                self.assertEqual(404, resp.status_code)
+
+    def test_precompressed(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (pathlib.Path(tmpdir) / 'app.js').write_text('var x = 1;')
+            (pathlib.Path(tmpdir) / 'app.js.br').write_bytes(b'fake brotli')
+
+            assets = mesito.assets.Assets(directory=tmpdir, encodings=[])
+
+            self.assertIsNone(assets.get(path='app.js.br'))
+
+            response = assets.respond(
+                path='app.js', headers={'Accept-Encoding': 'gzip, br'})
+            self.assertEqual(200, response.status)
+            self.assertIn(('Content-Encoding', 'br'), response.headers)
+            self.assertEqual(b'fake brotli', response.body)
+
+    def test_reload(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pth = pathlib.Path(tmpdir) / 'index.html'
+            pth.write_text('before')
+
+            assets = mesito.assets.Assets(directory=tmpdir, reload=True)
+            frozen = mesito.assets.Assets(directory=tmpdir)
+
+            before = assets.get(path='index.html')
+            assert before is not None
+
+            pth.write_text('after')
+            stat = pth.stat()
+            os.utime(str(pth), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+            (pathlib.Path(tmpdir) / 'new.txt').write_text('new')
+
+            after = assets.get(path='index.html')
+            assert after is not None
+            self.assertEqual(b'after', after.body)
+            self.assertNotEqual(before.etag, after.etag)
+            self.assertIsNotNone(assets.get(path='new.txt'))
+
+            unchanged = frozen.get(path='index.html')
+            assert unchanged is not None
+            self.assertEqual(b'before', unchanged.body)
+            self.assertIsNone(frozen.get(path='new.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import pathlib
+import tempfile
+import threading
+import time
+import unittest
+from typing import Any
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.changelog
+import mesito.ingest
+import mesito.model
+
+
+class TestChangelog(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            change_log=True)
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/put_machine', json={'name': 'some-machine'})
+            self.assertEqual(200, resp.status_code)
+
+            state = {
+                'machine_id': 1,
+                'start': 1000,
+                'stop': 1010,
+                'condition': 'working'
+            }
+
+            for _ in range(2):
+                resp = client.post('/api/v1/put_machine_state', json=state)
+                self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/extend_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': 1000,
+                    'stop': 1020
+                })
+            self.assertEqual(200, resp.status_code)
+
+            # A rejected put is not recorded.
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': 1005,
+                    'stop': 1030,
+                    'condition': 'working'
+                })
+            self.assertEqual(400, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/machine_state_changes', json={'since': 0})
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(3, resp.json['cursor'])
+            self.assertListEqual([(1, 'insert'), (2, 'update'), (3, 'extend')],
+                                 [(change['seq'], change['operation'])
+                                  for change in resp.json['changes']])
+            self.assertListEqual(
+                [1020, 1020, 1020],
+                [change['state']['stop'] for change in resp.json['changes']])
+
+            resp = client.post(
+                '/api/v1/machine_state_changes', json={
+                    'since': 1,
+                    'limit': 1
+                })
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(2, resp.json['cursor'])
+            self.assertEqual(1, len(resp.json['changes']))
+
+            resp = client.post(
+                '/api/v1/machine_state_changes', json={
+                    'since': 3,
+                    'wait': 0.1
+                })
+            self.assertEqual(200, resp.status_code)
+            self.assertDictEqual({'changes': [], 'cursor': 3}, resp.json)
+
+            resp = client.post(
+                '/api/v1/machine_state_changes', json={'wait': 1})
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('SchemaViolation', resp.json['what'])
+
+    def test_disabled_by_default(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory, cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/put_machine', json={'name': 'some-machine'})
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': 1000,
+                    'stop': 1010,
+                    'condition': 'working'
+                })
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/extend_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': 1000,
+                    'stop': 1020
+                })
+            self.assertEqual(200, resp.status_code)
+
+            # Only the static files are matched at the path.
+            resp = client.post(
+                '/api/v1/machine_state_changes', json={'since': 0})
+            self.assertEqual(405, resp.status_code)
+
+        session = session_factory()
+        self.assertEqual(
+            0,
+            session.query(mesito.model.MachineStateChange).count())
+        self.assertEqual(
+            0,
+            session.query(mesito.model.ChangeCounter).filter(
+                mesito.model.ChangeCounter.name ==
+                mesito.model.ChangeCounter.MACHINE_STATE).count())
+        session_factory.remove()
+
+    def test_core_ingest_path(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+        session.add(mesito.model.Machine(name='some-machine', version=1))
+        session.commit()
+
+        for stop in [1010, 1020]:
+            _, err = mesito.ingest.put_machine_state(
+                session, {
+                    'machine_id': 1,
+                    'start': 1000,
+                    'stop': stop,
+                    'condition': 'working'
+                },
+                change_log=True)
+            self.assertIsNone(err)
+
+        self.assertListEqual(
+            [(1, 'insert'), (2, 'update')],
+            [(change.seq, change.operation)
+             for change in session.query(mesito.model.MachineStateChange).
+             order_by(mesito.model.MachineStateChange.seq)])
+
+    def test_long_poll(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # The in-memory database is not shared among the threads.
+            engine = sqlalchemy.create_engine(
+                'sqlite:///{}'.format(pathlib.Path(tmpdir) / 'mesito.sqlite'))
+            mesito.model.Base.metadata.create_all(engine)
+            session_factory = sqlalchemy.orm.scoped_session(
+                sqlalchemy.orm.sessionmaker(bind=engine))
+
+            app, _ = mesito.app.produce(
+                session_factory=session_factory,
+                cors_allowed_all_origins=False,
+                change_log=True)
+
+            with app.test_client() as client:
+                resp = client.post(
+                    '/api/v1/put_machine', json={'name': 'some-machine'})
+                self.assertEqual(200, resp.status_code)
+
+            def put_later() -> None:
+                time.sleep(0.2)
+                with app.test_client() as other:
+                    other.post(
+                        '/api/v1/put_machine_state',
+                        json={
+                            'machine_id': 1,
+                            'start': 1000,
+                            'stop': 1010,
+                            'condition': 'working'
+                        })
+
+            thread = threading.Thread(target=put_later)
+            thread.start()
+
+            start = time.monotonic()
+            with app.test_client() as client:
+                resp = client.post(
+                    '/api/v1/machine_state_changes',
+                    json={
+                        'since': 0,
+                        'wait': 10
+                    })
+            thread.join()
+
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(1, resp.json['cursor'])
+
+            engine.dispose()
+
+    def test_waiters_capped(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        max_waiters = mesito.changelog.MAX_WAITERS
+        mesito.changelog.MAX_WAITERS = 0
+        try:
+            app, _ = mesito.app.produce(
+                session_factory=session_factory,
+                cors_allowed_all_origins=False,
+                change_log=True)
+        finally:
+            mesito.changelog.MAX_WAITERS = max_waiters
+
+        start = time.monotonic()
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/machine_state_changes', json={
+                    'since': 0,
+                    'wait': 10
+                })
+
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual({'changes': [], 'cursor': 0}, resp.json)
+
+    def test_counter_started_concurrently(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+        counter = mesito.model.ChangeCounter.__table__
+        table = mesito.model.MachineStateChange.__table__
+
+        # Start the counter after it has been found missing as if by
+        # a concurrent transaction.
+        def start_counter(
+                conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+            # pylint: disable=unused-argument
+            if statement.lstrip().startswith('SELECT coalesce(max('):
+                cursor.execute(
+                    'INSERT INTO change_counter (name, value) VALUES (?, ?)',
+                    (mesito.model.ChangeCounter.MACHINE_STATE, 100))
+
+        sqlalchemy.event.listen(engine, 'before_cursor_execute', start_counter)
+        seq = mesito.changelog.advance(
+            session=session,
+            name=mesito.model.ChangeCounter.MACHINE_STATE,
+            count=1,
+            column=table.c.seq)
+        sqlalchemy.event.remove(engine, 'before_cursor_execute', start_counter)
+        session.commit()
+
+        self.assertEqual(101, seq)
+        self.assertEqual(
+            101,
+            session.execute(
+                sqlalchemy.select([counter.c.value]).where(
+                    counter.c.name ==
+                    mesito.model.ChangeCounter.MACHINE_STATE)).scalar())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import gzip
+import json
+import unittest
+from typing import Any
+
+import flask
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.compress
+import mesito.model
+
+
+class TestCompression(unittest.TestCase):
+    def test_api_response(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            compression=mesito.compress.Compression(
+                min_size=100, encodings=[mesito.compress.Gzip()]))
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/machines', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(200, resp.status_code)
+            self.assertNotIn('Content-Encoding', resp.headers)
+            self.assertEqual('Accept-Encoding', resp.headers['Vary'])
+
+            for i in range(10):
+                resp = client.post(
+                    '/api/v1/put_machine',
+                    json={'name': 'machine-{}'.format(i)})
+                self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/machines',
+                headers={'Accept-Encoding': 'gzip, br;q=0.5'})
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual('gzip', resp.headers['Content-Encoding'])
+
+            machines = json.loads(gzip.decompress(resp.get_data()))
+            self.assertEqual(10, len(machines))
+
+            resp = client.post(
+                '/api/v1/machines', headers={'Accept-Encoding': 'gzip;q=0'})
+            self.assertNotIn('Content-Encoding', resp.headers)
+            self.assertEqual(10, len(resp.json))
+
+    def test_streamed_response(self) -> None:
+        app = flask.Flask(__name__)
+
+        def stream() -> Any:
+            return flask.Response(('chunk {}\n'.format(i) for i in range(3)),
+                                  mimetype='text/plain')
+
+        app.route('/stream')(stream)
+
+        app.after_request(
+            mesito.compress.Compression(
+                min_size=1000, encodings=[mesito.compress.Gzip()]).apply)
+
+        with app.test_client() as client:
+            resp = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual('gzip', resp.headers['Content-Encoding'])
+            self.assertEqual(
+                b'chunk 0\nchunk 1\nchunk 2\n',
+                gzip.decompress(resp.get_data()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring,protected-access
+import unittest
+
+import numpy as np
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.fleet
+import mesito.model
+
+
+class TestStep(unittest.TestCase):
+    def test_simultaneous_events(self) -> None:
+        times, values = mesito.fleet._step(
+            event_times=np.array([10.0, 0.0, 10.0, 0.0]),
+            deltas=np.array([-1.0, 1.0, 1.0, 1.0]))
+
+        self.assertListEqual([0.0, 10.0], times.tolist())
+        self.assertListEqual([2.0, 2.0], values.tolist())
+
+
+class TestConcurrencyProfile(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        session = session_factory()
+        session.add_all([
+            mesito.model.Machine(name='machine-{}'.format(i), version=1)
+            for i in range(5)
+        ])
+        session.add_all([
+            mesito.model.MachineState(
+                machine_id=machine_id,
+                start=start,
+                stop=stop,
+                condition=condition,
+                avg_power_consumption=power)
+            for machine_id, start, stop, condition, power in [
+                (1, -10, 60, 'working', 10.0),
+                (2, 20, 150, 'working', 20.0),
+                (3, 25, 30, 'working', 5.0),
+                (4, 40, 70, 'retooling', None),
+                (5, 0, 100, 'idle', 1.0),
+            ]
+        ])
+        session.commit()
+        session_factory.remove()
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory, cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/concurrency_profile',
+                json={
+                    'start': 0,
+                    'stop': 100,
+                    'resolution': 50
+                })
+            self.assertEqual(200, resp.status_code)
+
+            self.assertDictEqual({
+                'start':
+                0,
+                'stop':
+                100,
+                'resolution':
+                50,
+                'profiles': [{
+                    'condition': 'working',
+                    'average_count': [1.7, 1.2],
+                    'peak_count': [3, 2],
+                    'average_power': [22.5, 22.0]
+                }, {
+                    'condition': 'retooling',
+                    'average_count': [0.2, 0.4],
+                    'peak_count': [1, 1],
+                    'average_power': [0.0, 0.0]
+                }]
+            }, resp.json)
+
+            resp = client.post(
+                '/api/v1/concurrency_profile',
+                json={
+                    'start': 0,
+                    'stop': 100,
+                    'resolution': 30,
+                    'conditions': ['idle']
+                })
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual([1.0, 1.0, 1.0, 1.0],
+                             resp.json['profiles'][0]['average_count'])
+            self.assertEqual([1.0, 1.0, 1.0, 1.0],
+                             resp.json['profiles'][0]['average_power'])
+
+            resp = client.post(
+                '/api/v1/concurrency_profile',
+                json={
+                    'start': 0,
+                    'stop': 10**9,
+                    'resolution': 1
+                })
+            self.assertEqual(400, resp.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import contextlib
+import io
+import pathlib
+import random
+import tempfile
+import unittest
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.gap
+import mesito.ingest
+import mesito.model
+import mesito.operation
+
+
+class TestGaps(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            gap_table=True)
+
+        with app.test_client() as client:
+            for name in ['machine-a', 'machine-b']:
+                resp = client.post('/api/v1/put_machine', json={'name': name})
+                self.assertEqual(200, resp.status_code)
+
+            # Put out of order to exercise filling the gaps.
+            for machine_id, start, stop in [(1, 100, 110), (1, 200, 210),
+                                            (1, 300, 310), (1, 150, 160),
+                                            (2, 0, 50), (2, 60, 100)]:
+                resp = client.post(
+                    '/api/v1/put_machine_state',
+                    json={
+                        'machine_id': machine_id,
+                        'start': start,
+                        'stop': stop,
+                        'condition': 'working'
+                    })
+                self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/extend_machine_state',
+                json={
+                    'machine_id': 2,
+                    'start': 60,
+                    'stop': 1000
+                })
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/machine_state_gaps',
+                json={
+                    'start': 0,
+                    'stop': 1000,
+                    'longer_than': 20
+                })
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual(
+                [(1, 110, 150), (1, 160, 200), (1, 210, 300)],
+                [(gap['machine_id'], gap['start'], gap['stop'])
+                 for gap in resp.json])
+
+            resp = client.post(
+                '/api/v1/machine_state_gaps',
+                json={
+                    'start': 0,
+                    'stop': 1000,
+                    'machine_ids': [2]
+                })
+            self.assertListEqual([{
+                'machine_id': 2,
+                'start': 50,
+                'stop': 60
+            }], resp.json)
+
+    def test_recorded_as_found(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+        session.add_all([
+            mesito.model.Machine(name='machine-{}'.format(i), version=1)
+            for i in range(3)
+        ])
+        session.commit()
+
+        rng = random.Random(0)
+
+        states = []
+        for machine_id in range(1, 4):
+            stop = 0
+            for _ in range(50):
+                start = stop + rng.choice([0, 0, 5, 30])
+                stop = start + rng.randint(1, 20)
+                states.append((machine_id, start, stop))
+
+        rng.shuffle(states)
+
+        for machine_id, start, stop in states:
+            session.add(
+                mesito.model.MachineState(
+                    machine_id=machine_id,
+                    start=start,
+                    stop=stop,
+                    condition='working'))
+            session.flush()
+
+            mesito.gap.record(
+                session=session, machine_id=machine_id, start=start)
+            session.commit()
+
+        for start, stop, longer_than in [(0, 10000, 0), (100, 400, 10),
+                                         (250, 260, 0)]:
+            found = mesito.gap.find(
+                session=session,
+                start=start,
+                stop=stop,
+                longer_than=longer_than)
+
+            recorded = mesito.gap.find_recorded(
+                session=session,
+                start=start,
+                stop=stop,
+                longer_than=longer_than)
+
+            self.assertListEqual(found, recorded)
+
+        recorded = mesito.gap.find_recorded(
+            session=session, start=0, stop=10000, longer_than=0)
+
+        mesito.gap.rebuild(session=session)
+
+        self.assertListEqual(
+            recorded,
+            mesito.gap.find_recorded(
+                session=session, start=0, stop=10000, longer_than=0))
+
+        session.close()
+
+    def test_recorded_in_the_transaction_of_the_put(self) -> None:
+        for state_ingest in [mesito.ingest.put_machine_state,
+                             mesito.operation.put_machine_state]:
+            engine = sqlalchemy.create_engine('sqlite://')
+            mesito.model.Base.metadata.create_all(engine)
+            session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+            session.add(mesito.model.Machine(name='some-machine', version=1))
+            session.commit()
+
+            for start, stop in [(0, 10), (40, 50), (20, 30)]:
+                _, err = state_ingest(
+                    session, {
+                        'machine_id': 1,
+                        'start': start,
+                        'stop': stop,
+                        'condition': 'working'
+                    }, True)
+                self.assertIsNone(err)
+
+            _, extend_err = mesito.operation.extend_machine_state(
+                session=session,
+                data={
+                    'machine_id': 1,
+                    'start': 40,
+                    'stop': 60
+                },
+                current=None,
+                gap_table=True)
+            self.assertIsNone(extend_err)
+
+            # The gaps must have been committed together with the states.
+            session.rollback()
+
+            self.assertListEqual(
+                [(1, 10, 20), (1, 30, 40)],
+                [(gap['machine_id'], gap['start'], gap['stop'])
+                 for gap in mesito.gap.find_recorded(
+                     session=session, start=0, stop=100, longer_than=0)])
+
+            session.close()
+
+    def test_command_line(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pth = pathlib.Path(tmpdir) / 'mesito.sqlite'
+            database_url = 'sqlite:///{}'.format(pth)
+
+            engine = sqlalchemy.create_engine(database_url)
+            mesito.model.Base.metadata.create_all(engine)
+
+            session = sqlalchemy.orm.sessionmaker(bind=engine)()
+            session.add(mesito.model.Machine(name='some-machine', version=1))
+            session.add_all([
+                mesito.model.MachineState(
+                    machine_id=1, start=start, stop=stop, condition='working')
+                for start, stop in [(0, 10), (20, 30)]
+            ])
+            session.commit()
+            session.close()
+            engine.dispose()
+
+            self.assertEqual(
+                0,
+                mesito.gap.main(
+                    command_line_args=[
+                        '--database_url', database_url, '--rebuild'
+                    ]))
+
+            for args in [[], ['--from_table']]:
+                stdout = io.StringIO()
+                with contextlib.redirect_stdout(stdout):
+                    self.assertEqual(
+                        0,
+                        mesito.gap.main(
+                            command_line_args=['--database_url', database_url] +
+                            args))
+
+                self.assertEqual(
+                    'machine_id\tstart\tstop\tduration\n1\t10\t20\t10\n',
+                    stdout.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
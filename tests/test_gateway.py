@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import pathlib
+import tempfile
+import unittest
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.admission
+import mesito.app
+import mesito.gateway
+import mesito.idempotency
+import mesito.model
+
+
+class TestLoadTokens(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pth = pathlib.Path(tmpdir) / 'tokens'
+
+            pth.write_text('# hall 1\nsecret-1\n\n  secret-2  \n')
+            self.assertListEqual(['secret-1', 'secret-2'],
+                                 mesito.gateway.load_tokens(path=pth))
+
+            pth.write_text('# no tokens\n')
+            with self.assertRaises(ValueError):
+                mesito.gateway.load_tokens(path=pth)
+
+
+class TestGateway(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, socketio = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            gateway_tokens=['secret'])
+
+        namespace = mesito.gateway.NAMESPACE
+
+        refused = socketio.test_client(
+            app, namespace=namespace, query_string='token=wrong')
+
+        gateway = socketio.test_client(
+            app,
+            namespace=namespace,
+            headers={'Authorization': 'Bearer secret'})
+        self.assertTrue(gateway.is_connected(namespace=namespace))
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/put_machine', json={'name': 'some-machine'})
+            self.assertEqual(200, resp.status_code)
+
+        ack = gateway.emit(
+            'put_machine_state', {
+                'machine_id': 1,
+                'start': 1000,
+                'stop': 1001,
+                'condition': 'working'
+            },
+            namespace=namespace,
+            callback=True)
+        self.assertEqual(1, ack)
+
+        ack = gateway.emit(
+            'extend_machine_state', {
+                'machine_id': 1,
+                'start': 1000,
+                'stop': 1002
+            },
+            namespace=namespace,
+            callback=True)
+        self.assertEqual(1002, ack['stop'])
+
+        ack = gateway.emit(
+            'put_machine_state', {
+                'machine_id': 2,
+                'start': 1000,
+                'stop': 1001,
+                'condition': 'working'
+            },
+            namespace=namespace,
+            callback=True)
+        self.assertEqual('MachineNotFound', ack['what'])
+
+        ack = gateway.emit(
+            'put_machine_state', {'machine_id': 1},
+            namespace=namespace,
+            callback=True)
+        self.assertEqual('SchemaViolation', ack['what'])
+
+        # The refused gateway is not acknowledged.
+        self.assertIsNone(
+            refused.emit(
+                'put_machine_state', {
+                    'machine_id': 1,
+                    'start': 2000,
+                    'stop': 2001,
+                    'condition': 'working'
+                },
+                namespace=namespace,
+                callback=True))
+
+        with app.test_client() as client:
+            resp = client.post('/api/v1/current_states')
+            self.assertEqual(1002, resp.json[0]['stop'])
+
+        gateway.disconnect(namespace=namespace)
+
+    def test_admission_and_idempotency(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, socketio = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            idempotency=mesito.idempotency.Idempotency(max_keys=10, ttl=3600.0),
+            gateway_tokens=['secret'])
+
+        namespace = mesito.gateway.NAMESPACE
+        gateway = socketio.test_client(
+            app, namespace=namespace, query_string='token=secret')
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/put_machine', json={'name': 'some-machine'})
+            self.assertEqual(200, resp.status_code)
+
+        data = {
+            'machine_id': 1,
+            'start': 1000,
+            'stop': 1001,
+            'condition': 'working'
+        }
+
+        ack = gateway.emit(
+            'put_machine_state',
+            data,
+            'some-key',
+            namespace=namespace,
+            callback=True)
+        self.assertEqual(1, ack)
+
+        # The retried event is replayed without touching the database.
+        session_factory().execute(mesito.model.MachineState.__table__.delete())
+        session_factory().commit()
+
+        ack = gateway.emit(
+            'put_machine_state',
+            data,
+            'some-key',
+            namespace=namespace,
+            callback=True)
+        self.assertEqual(1, ack)
+        self.assertEqual(
+            0,
+            session_factory().query(mesito.model.MachineState).count())
+
+        ack = gateway.emit(
+            'put_machine_state',
+            dict(data, stop=1002),
+            'some-key',
+            namespace=namespace,
+            callback=True)
+        self.assertEqual('IdempotencyKeyReused', ack['what'])
+
+        gateway.disconnect(namespace=namespace)
+
+        app, socketio = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            budgets=mesito.admission.Budgets(
+                ingest=mesito.admission.Budget(
+                    name='ingest',
+                    max_in_flight=0,
+                    max_queued=0,
+                    queue_timeout=0.0,
+                    retry_after=1),
+                read=mesito.admission.Budget(
+                    name='read',
+                    max_in_flight=1,
+                    max_queued=0,
+                    queue_timeout=0.0,
+                    retry_after=1)),
+            gateway_tokens=['secret'])
+
+        gateway = socketio.test_client(
+            app, namespace=namespace, query_string='token=secret')
+
+        ack = gateway.emit(
+            'put_machine_state', data, namespace=namespace, callback=True)
+        self.assertEqual('Overloaded', ack['what'])
+        self.assertEqual('ingest', ack['why']['budget'])
+
+        gateway.disconnect(namespace=namespace)
+
+
+if __name__ == '__main__':
+    unittest.main()
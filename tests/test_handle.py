@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import unittest
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.fleet
+import mesito.handle
+import mesito.model
+
+
+class TestHandle(unittest.TestCase):
+    def test_put_machine(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(bind=engine)
+        try:
+            events = []  # type: mesito.handle.Events
+            status, body = mesito.handle.put_machine(
+                session=session,
+                data={'name': 'some-machine'},
+                if_match=None,
+                events=events)
+
+            self.assertEqual(200, status)
+            self.assertEqual({'id': 1, 'version': 1}, body)
+            self.assertListEqual(['put_machine'],
+                                 [event for event, _ in events])
+
+            # The events are not collected on a conflict.
+            events = []
+            status, body = mesito.handle.put_machine(
+                session=session,
+                data={
+                    'id': 1,
+                    'name': 'renamed'
+                },
+                if_match='"7"',
+                events=events)
+
+            self.assertEqual(409, status)
+            self.assertEqual('MachineVersionConflict', body['what'])
+            self.assertListEqual([], events)
+
+            status, body = mesito.handle.put_machine(
+                session=session, data={}, if_match=None, events=events)
+
+            self.assertEqual(400, status)
+            self.assertListEqual([], events)
+        finally:
+            session.close()
+
+    def test_analytics_request(self) -> None:
+        kwargs, err = mesito.handle.analytics_request(
+            task='concurrency_profile',
+            data={
+                'start': 0,
+                'stop': 100,
+                'resolution': 10
+            })
+
+        self.assertIsNone(err)
+        assert kwargs is not None
+        self.assertDictEqual({
+            'start': 0,
+            'stop': 100,
+            'resolution': 10,
+            'conditions': mesito.fleet.DEFAULT_CONDITIONS
+        }, kwargs)
+
+        kwargs, err = mesito.handle.analytics_request(
+            task='shift_report', data={'start': 0})
+
+        self.assertIsNone(kwargs)
+        self.assertIsNotNone(err)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import unittest
+from typing import Any, List
+
+import flask
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.front.codec
+import mesito.idempotency
+import mesito.model
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1577836800.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def counting_app(
+        idempotency: mesito.idempotency.Idempotency,
+        calls: List[int]) -> flask.Flask:
+    app = flask.Flask(__name__)
+    app.extensions['mesito.front.codec'] = mesito.front.codec.select('json')
+
+    def handle() -> Any:
+        calls.append(1)
+        return flask.jsonify(len(calls))
+
+    app.route(
+        '/handle', methods=['POST'],
+        endpoint='handle')(idempotency.guard(handle))
+
+    return app
+
+
+class TestIdempotency(unittest.TestCase):
+    def test_put_machine_state(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            idempotency=mesito.idempotency.Idempotency(max_keys=10, ttl=60.0))
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/put_machine', json={'name': 'some-machine'})
+            self.assertEqual(200, resp.status_code)
+
+            state = {
+                'machine_id': 1,
+                'start': 1577836800,
+                'stop': 1577836860,
+                'condition': 'working'
+            }
+
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json=state,
+                headers={'Idempotency-Key': 'some-key'})
+            self.assertEqual(200, resp.status_code)
+            self.assertNotIn('Idempotent-Replayed', resp.headers)
+            self.assertEqual(1, resp.json)
+
+            # Remove the state behind the back of the server so that
+            # the replay can be told apart from the re-execution.
+            session = session_factory()
+            session.query(mesito.model.MachineState).delete()
+            session.commit()
+            session_factory.remove()
+
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json=state,
+                headers={'Idempotency-Key': 'some-key'})
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual('true', resp.headers['Idempotent-Replayed'])
+            self.assertEqual(1, resp.json)
+
+            session = session_factory()
+            self.assertEqual(
+                0,
+                session.query(mesito.model.MachineState).count())
+            session_factory.remove()
+
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json=dict(state, stop=1577836920),
+                headers={'Idempotency-Key': 'some-key'})
+            self.assertEqual(422, resp.status_code)
+            self.assertDictEqual({
+                'what': 'IdempotencyKeyReused',
+                'why': {
+                    'key': 'some-key'
+                }
+            }, resp.json)
+
+            # The keys are scoped by the endpoint.
+            resp = client.post(
+                '/api/v1/put_machine',
+                json={'name': 'other-machine'},
+                headers={'Idempotency-Key': 'some-key'})
+            self.assertEqual(200, resp.status_code)
+            self.assertNotIn('Idempotent-Replayed', resp.headers)
+
+            resp = client.post(
+                '/api/v1/put_machine',
+                json={'name': 'other-machine'},
+                headers={'Idempotency-Key': ''})
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('ConstraintViolation', resp.json['what'])
+
+    def test_eviction_and_expiry(self) -> None:
+        clock = Clock()
+        calls = []  # type: List[int]
+        app = counting_app(
+            idempotency=mesito.idempotency.Idempotency(
+                max_keys=2, ttl=60.0, clock=clock),
+            calls=calls)
+
+        with app.test_client() as client:
+            for key in ['a', 'b', 'a', 'c']:
+                client.post('/handle', headers={'Idempotency-Key': key})
+
+            # "b" is the least recently used one.
+            self.assertEqual(3, len(calls))
+
+            resp = client.post('/handle', headers={'Idempotency-Key': 'b'})
+            self.assertEqual(4, resp.json)
+
+            resp = client.post('/handle', headers={'Idempotency-Key': 'c'})
+            self.assertEqual(3, resp.json)
+
+            clock.now += 61.0
+            resp = client.post('/handle', headers={'Idempotency-Key': 'c'})
+            self.assertEqual(5, resp.json)
+
+            resp = client.post('/handle')
+            self.assertEqual(6, resp.json)
+
+    def test_persisted(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        clock = Clock()
+        calls = []  # type: List[int]
+
+        def some_app() -> flask.Flask:
+            app = counting_app(
+                idempotency=mesito.idempotency.Idempotency(
+                    max_keys=10,
+                    ttl=60.0,
+                    session_factory=session_factory,
+                    clock=clock),
+                calls=calls)
+            app.teardown_appcontext(lambda _: session_factory.remove())
+            return app
+
+        with some_app().test_client() as client:
+            resp = client.post('/handle', headers={'Idempotency-Key': 'a'})
+            self.assertEqual(1, resp.json)
+
+        # A restarted server replays from the database.
+        with some_app().test_client() as client:
+            resp = client.post('/handle', headers={'Idempotency-Key': 'a'})
+            self.assertEqual('true', resp.headers['Idempotent-Replayed'])
+            self.assertEqual(1, resp.json)
+
+        clock.now += 61.0
+        with some_app().test_client() as client:
+            resp = client.post('/handle', headers={'Idempotency-Key': 'a'})
+            self.assertEqual(2, resp.json)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import unittest
+from typing import Any, List, Tuple
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.front.valid
+import mesito.ingest
+import mesito.model
+
+# Sequence of the put requests exercising every branch of the ingestion
+REQUESTS = [
+    {
+        'machine_id': 2,
+        'start': 0,
+        'stop': 10,
+        'condition': 'working'
+    },
+    {
+        'machine_id': 1,
+        'start': 0,
+        'stop': 10,
+        'condition': 'working',
+        'total_energy': 1.5
+    },
+    {
+        'machine_id': 1,
+        'start': 10,
+        'stop': 20,
+        'condition': 'idle'
+    },
+    # Prolonged
+    {
+        'machine_id': 1,
+        'start': 10,
+        'stop': 30,
+        'condition': 'idle',
+        'min_power_consumption': 0.5,
+        'max_power_consumption': 2.0,
+        'avg_power_consumption': 1.0
+    },
+    # Repeated
+    {
+        'machine_id': 1,
+        'start': 10,
+        'stop': 30,
+        'condition': 'idle'
+    },
+    # Condition changed
+    {
+        'machine_id': 1,
+        'start': 10,
+        'stop': 30,
+        'condition': 'working'
+    },
+    # Overlaps
+    {
+        'machine_id': 1,
+        'start': 5,
+        'stop': 15,
+        'condition': 'off'
+    },
+    {
+        'machine_id': 1,
+        'start': 10,
+        'stop': 25,
+        'condition': 'idle'
+    },
+    {
+        'machine_id': 1,
+        'start': 30,
+        'stop': 40,
+        'condition': 'broken'
+    },
+]  # type: List[Any]
+
+
+def ingest(name: str) -> Tuple[List[Any], List[Any]]:
+    """Put all the requests with the ingest path and dump the outcome."""
+    engine = sqlalchemy.create_engine('sqlite://')
+    mesito.model.Base.metadata.create_all(engine)
+
+    session_factory = sqlalchemy.orm.sessionmaker(bind=engine)
+
+    session = session_factory()
+    session.add(mesito.model.Machine(name='some-machine', version=1))
+    session.commit()
+    session.close()
+
+    put_machine_state = mesito.ingest.select(name=name)
+
+    results = []  # type: List[Any]
+    for request in REQUESTS:
+        data, local_err = mesito.front.valid.machine_state_put(data=request)
+        assert local_err is None, local_err
+        assert data is not None
+
+        session = session_factory()
+        try:
+            results.append(put_machine_state(session, data, False, True))
+        finally:
+            session.close()
+
+    with engine.connect() as connection:
+        rows = [
+            tuple(row) for row in connection.execute(
+                mesito.model.MachineState.__table__.select().order_by(
+                    mesito.model.MachineState.id))
+        ]
+
+    return results, rows
+
+
+class TestIngest(unittest.TestCase):
+    def test_core_as_orm(self) -> None:
+        orm_results, orm_rows = ingest(name='orm')
+        core_results, core_rows = ingest(name='core')
+
+        self.assertListEqual(orm_results, core_results)
+        self.assertListEqual(orm_rows, core_rows)
+
+        self.assertListEqual([
+            'MachineNotFound', None, None, None, None,
+            'MachineStateConditionChanged', 'MachineStateOverlap',
+            'MachineStateOverlap', None
+        ], [
+            err['what'] if err is not None else None for _, err in core_results
+        ])
+
+        self.assertListEqual([1, 2, 3], [row[0] for row in core_rows])
+        self.assertEqual(30, core_rows[1][3])
+
+    def test_unknown(self) -> None:
+        with self.assertRaises(ValueError):
+            mesito.ingest.select(name='nonexisting')
+
+
+if __name__ == '__main__':
+    unittest.main()
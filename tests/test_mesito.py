@@ -2,8 +2,11 @@
 
 # pylint: disable=missing-docstring
 import contextlib
+import pathlib
+import subprocess
+import sys
 import unittest
-from typing import Any, Iterator
+from typing import Any, Dict, Iterator, List
 
 import flask.testing
 import flask.wrappers
@@ -11,12 +14,14 @@ import sqlalchemy
 import sqlalchemy.orm
 
 import mesito.app
+import mesito.front.codec
+import mesito.front.valid
 import mesito.model
 import mesito.operation
 
 
 @contextlib.contextmanager
-def client_fixture() -> Iterator[flask.testing.FlaskClient]:  # type: ignore
+def client_fixture() -> Iterator[flask.testing.FlaskClient]:
     """Create and tear down a temporary client."""
     # See https://docs.sqlalchemy.org/en/13/dialects/sqlite.html#connect-strings
     database_url = 'sqlite://'
@@ -148,6 +153,366 @@ class TestMachines(unittest.TestCase):
                 }
             }, resp.json)
 
+    def test_conflicting_renames(self) -> None:
+        with client_fixture() as client:
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine', json={'name': 'some-machine'}))
+            self.assertEqual(200, resp.status_code)
+
+            # Two clients read the version 1 and rename concurrently.
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine',
+                    json={
+                        'id': 1,
+                        'name': 'first',
+                        'version': 1
+                    }))
+            self.assertEqual(200, resp.status_code)
+            self.assertDictEqual({"id": 1, "version": 2}, resp.json)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine',
+                    json={
+                        'id': 1,
+                        'name': 'second'
+                    },
+                    headers={'If-Match': '"1"'}))
+            self.assertEqual(409, resp.status_code)
+            self.assertEqual({
+                'what': 'MachineVersionConflict',
+                'why': {
+                    'machine_id': 1,
+                    'expected': 1,
+                    'actual': 2
+                }
+            }, resp.json)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine',
+                    json={
+                        'id': 1,
+                        'name': 'second'
+                    },
+                    headers={'If-Match': 'W/"2"'}))
+            self.assertEqual(200, resp.status_code)
+            self.assertDictEqual({"id": 1, "version": 3}, resp.json)
+
+            resp = assert_response_type(client.post('/api/v1/machines'))
+            self.assertListEqual([{
+                "id": 1,
+                "name": "second",
+                "version": 3
+            }], resp.json)
+
+    def test_invalid_expected_version_fails(self) -> None:
+        cases = [
+            {
+                'json': {
+                    'id': 1,
+                    'name': 'some-machine'
+                },
+                'headers': {
+                    'If-Match': 'oi'
+                }
+            },
+            {
+                'json': {
+                    'id': 1,
+                    'name': 'some-machine',
+                    'version': 2
+                },
+                'headers': {
+                    'If-Match': '1'
+                }
+            },
+            {
+                'json': {
+                    'name': 'some-machine',
+                    'version': 1
+                }
+            },
+        ]  # type: List[Dict[str, Any]]
+
+        with client_fixture() as client:
+            for kwargs in cases:
+                resp = assert_response_type(
+                    client.post('/api/v1/put_machine', **kwargs))
+                self.assertEqual(400, resp.status_code)
+                self.assertEqual('ConstraintViolation', resp.json['what'])
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machines',
+                    json=[{
+                        'id': 1,
+                        'name': 'some-machine',
+                        'version': 1
+                    }]))
+            self.assertEqual(400, resp.status_code)
+
+
+class TestPutMachines(unittest.TestCase):
+    def test_insert_and_rename(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, socketio = mesito.app.produce(
+            session_factory=session_factory, cors_allowed_all_origins=False)
+
+        socketio_client = socketio.test_client(app)
+
+        with app.test_client() as client:
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machines',
+                    json=[{
+                        'name': 'machine-b'
+                    }, {
+                        'name': 'machine-a'
+                    }]))
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([{
+                'id': 1,
+                'version': 1
+            }, {
+                'id': 2,
+                'version': 1
+            }], resp.json)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machines',
+                    json=[{
+                        'name': 'machine-c'
+                    }, {
+                        'id': 1,
+                        'name': 'renamed-b'
+                    }]))
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([{
+                'id': 3,
+                'version': 1
+            }, {
+                'id': 1,
+                'version': 2
+            }], resp.json)
+
+            resp = assert_response_type(client.post('/api/v1/machines'))
+            self.assertListEqual([{
+                "id": 2,
+                "name": "machine-a",
+                "version": 1
+            }, {
+                "id": 3,
+                "name": "machine-c",
+                "version": 1
+            }, {
+                "id": 1,
+                "name": "renamed-b",
+                "version": 2
+            }], resp.json)
+
+        received = socketio_client.get_received()
+        self.assertListEqual(['put_machines', 'put_machines'],
+                             [event['name'] for event in received])
+        self.assertListEqual([{
+            'id': 3,
+            'name': 'machine-c',
+            'version': 1,
+            'change_seq': 3
+        }, {
+            'id': 1,
+            'name': 'renamed-b',
+            'version': 2,
+            'change_seq': 4
+        }], received[1]['args'][0])
+
+    def test_non_existing_machine_fails(self) -> None:
+        with client_fixture() as client:
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machines',
+                    json=[{
+                        'name': 'some-machine'
+                    }, {
+                        'id': 1984,
+                        'name': 'renamed-machine'
+                    }]))
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual({
+                'what': 'MachineNotFound',
+                'why': {
+                    'machine_id': 1984
+                }
+            }, resp.json)
+
+            # Nothing has been inserted.
+            resp = assert_response_type(client.post('/api/v1/machines'))
+            self.assertListEqual([], resp.json)
+
+    def test_duplicate_ids_fail(self) -> None:
+        with client_fixture() as client:
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machines',
+                    json=[{
+                        'id': 1,
+                        'name': 'a'
+                    }, {
+                        'id': 1,
+                        'name': 'b'
+                    }]))
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual({
+                'what': 'ConstraintViolation',
+                'why': 'duplicate machine ID'
+            }, resp.json)
+
+    def test_statements_do_not_grow_with_machines(self) -> None:
+        def count_statements(machine_count: int) -> List[str]:
+            engine = sqlalchemy.create_engine('sqlite://')
+            mesito.model.Base.metadata.create_all(engine)
+            session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+            data = [{
+                'name': 'machine-{}'.format(i)
+            } for i in range(machine_count)
+                    ]  # type: List[mesito.front.valid.MachinePut]
+
+            result, err = mesito.operation.put_machines(
+                session=session, data=data)
+            self.assertIsNone(err)
+
+            statements = []  # type: List[str]
+
+            def collect(
+                    conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+                # pylint: disable=unused-argument
+                statements.append(' '.join(statement.split()[:3]))
+
+            renames = [{
+                'id': machine_id,
+                'name': 'renamed-{}'.format(machine_id)
+            } for machine_id, _, _ in result or []
+                       ]  # type: List[mesito.front.valid.MachinePut]
+            data = renames + data
+
+            sqlalchemy.event.listen(engine, 'before_cursor_execute', collect)
+            result, err = mesito.operation.put_machines(
+                session=session, data=data)
+            sqlalchemy.event.remove(engine, 'before_cursor_execute', collect)
+            self.assertIsNone(err)
+
+            self.assertListEqual(
+                list(range(machine_count + 1, 2 * machine_count + 1)),
+                [machine_id
+                 for machine_id, _, _ in result or []][machine_count:])
+
+            self.assertListEqual([2] * machine_count,
+                                 [version for _, version, _ in result or []
+                                  ][:machine_count])
+
+            return statements
+
+        few = count_statements(machine_count=3)
+        many = count_statements(machine_count=300)
+
+        self.assertListEqual(few, many)
+        self.assertEqual(1, many.count('INSERT INTO machine'))
+        self.assertEqual(1, many.count('UPDATE machine SET'))
+
+
+class TestMachineChanges(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        with client_fixture() as client:
+            for name in ['machine-a', 'machine-b']:
+                resp = assert_response_type(
+                    client.post('/api/v1/put_machine', json={'name': name}))
+                self.assertEqual(200, resp.status_code)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine', json={
+                        'id': 1,
+                        'name': 'renamed-a'
+                    }))
+            self.assertEqual(200, resp.status_code)
+
+            resp = assert_response_type(
+                client.post('/api/v1/machines/changes', json={'since': 0}))
+            self.assertEqual(200, resp.status_code)
+            self.assertDictEqual({
+                'machines': [{
+                    'id': 2,
+                    'name': 'machine-b',
+                    'version': 1
+                }, {
+                    'id': 1,
+                    'name': 'renamed-a',
+                    'version': 2
+                }],
+                'cursor':
+                3
+            }, resp.json)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/machines/changes', json={
+                        'since': 0,
+                        'limit': 1
+                    }))
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(2, resp.json['cursor'])
+            self.assertListEqual(
+                [2], [machine['id'] for machine in resp.json['machines']])
+
+            resp = assert_response_type(
+                client.post('/api/v1/machines/changes', json={'since': 3}))
+            self.assertEqual(200, resp.status_code)
+            self.assertDictEqual({'machines': [], 'cursor': 3}, resp.json)
+
+            resp = assert_response_type(
+                client.post('/api/v1/machines/changes', json={'since': -1}))
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('SchemaViolation', resp.json['what'])
+
+    def test_conflict_does_not_advance(self) -> None:
+        with client_fixture() as client:
+            resp = assert_response_type(
+                client.post('/api/v1/put_machine', json={'name': 'machine'}))
+            self.assertEqual(200, resp.status_code)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine',
+                    json={
+                        'id': 1,
+                        'name': 'renamed',
+                        'version': 2
+                    }))
+            self.assertEqual(409, resp.status_code)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine',
+                    json={
+                        'id': 1,
+                        'name': 'renamed',
+                        'version': 1
+                    }))
+            self.assertEqual(200, resp.status_code)
+
+            resp = assert_response_type(
+                client.post('/api/v1/machines/changes', json={'since': 0}))
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(2, resp.json['cursor'])
+
 
 class TestMachineState(unittest.TestCase):
     def test_that_it_works(self) -> None:
@@ -520,5 +885,317 @@ class TestMachineState(unittest.TestCase):
             }, resp.json)
 
 
+class TestCurrentStates(unittest.TestCase):
+    def test_updated_on_put(self) -> None:
+        with client_fixture() as client:
+            resp = assert_response_type(client.post('/api/v1/current_states'))
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([], resp.json)
+
+            for name in ['some-machine', 'another-machine']:
+                resp = assert_response_type(
+                    client.post('/api/v1/put_machine', json={'name': name}))
+                self.assertEqual(200, resp.status_code)
+
+            # The last state is older and must not replace the current one.
+            for machine_id, start, stop, condition in [
+                (1, 1000, 2000, 'working'), (1, 2000, 3000, 'idle'),
+                (2, 1500, 1600, 'broken'), (1, 500, 1000, 'off')
+            ]:
+                resp = assert_response_type(
+                    client.post(
+                        '/api/v1/put_machine_state',
+                        json={
+                            "machine_id": machine_id,
+                            "start": start,
+                            "stop": stop,
+                            "condition": condition
+                        }))
+                self.assertEqual(200, resp.status_code)
+
+            resp = assert_response_type(client.post('/api/v1/current_states'))
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual(
+                [(1, 2000, 'idle'), (2, 1500, 'broken')],
+                [(state['machine_id'], state['start'], state['condition'])
+                 for state in resp.json])
+
+    def test_warmed_from_database(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        session = session_factory()
+        session.add(mesito.model.Machine(name='some-machine', version=1))
+        for start, stop in [(1000, 2000), (3000, 4000), (2000, 3000)]:
+            session.add(
+                mesito.model.MachineState(
+                    machine_id=1,
+                    start=start,
+                    stop=stop,
+                    condition='working',
+                    pieces=start // 1000))
+        session.commit()
+        session_factory.remove()
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory, cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            resp = assert_response_type(client.post('/api/v1/current_states'))
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([{
+                'machine_id': 1,
+                'start': 3000,
+                'stop': 4000,
+                'condition': 'working',
+                'min_power_consumption': None,
+                'max_power_consumption': None,
+                'avg_power_consumption': None,
+                'total_energy': None,
+                'pieces': 3
+            }], resp.json)
+
+
+class TestExtendMachineState(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        with client_fixture() as client:
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine', json={'name': 'some-machine'}))
+            self.assertEqual(200, resp.status_code)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine_state',
+                    json={
+                        "machine_id": 1,
+                        "start": 1000,
+                        "stop": 1010,
+                        "condition": "working",
+                        "total_energy": 1.0
+                    }))
+            self.assertEqual(200, resp.status_code)
+
+            for stop, total_energy in [(1020, 2.0), (1030, 3.0)]:
+                resp = assert_response_type(
+                    client.post(
+                        '/api/v1/extend_machine_state',
+                        json={
+                            "machine_id": 1,
+                            "start": 1000,
+                            "stop": stop,
+                            "total_energy": total_energy
+                        }))
+                self.assertEqual(200, resp.status_code)
+                self.assertEqual(stop, resp.json['stop'])
+                self.assertEqual('working', resp.json['condition'])
+                self.assertEqual(total_energy, resp.json['total_energy'])
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/machine_states',
+                    json={
+                        "machine_id": 1,
+                        "start": 0,
+                        "stop": 2000
+                    }))
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual(
+                [(1000, 1030, 3.0)],
+                [(state['start'], state['stop'], state['total_energy'])
+                 for state in resp.json])
+
+            resp = assert_response_type(client.post('/api/v1/current_states'))
+            self.assertEqual(1030, resp.json[0]['stop'])
+
+    def test_errors(self) -> None:
+        with client_fixture() as client:
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/put_machine', json={'name': 'some-machine'}))
+            self.assertEqual(200, resp.status_code)
+
+            for start, stop in [(1000, 2000), (2000, 3000)]:
+                resp = assert_response_type(
+                    client.post(
+                        '/api/v1/put_machine_state',
+                        json={
+                            "machine_id": 1,
+                            "start": start,
+                            "stop": stop,
+                            "condition": "working"
+                        }))
+                self.assertEqual(200, resp.status_code)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/extend_machine_state',
+                    json={
+                        "machine_id": 1,
+                        "start": 1000,
+                        "stop": 2500
+                    }))
+            self.assertEqual(400, resp.status_code)
+            self.assertDictEqual({
+                'what': 'MachineStateSuperseded',
+                'why': {
+                    'machine_id': 1,
+                    'start': 1000,
+                    'later_start': 2000
+                }
+            }, resp.json)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/extend_machine_state',
+                    json={
+                        "machine_id": 1,
+                        "start": 2500,
+                        "stop": 3500
+                    }))
+            self.assertEqual(400, resp.status_code)
+            self.assertDictEqual({
+                'what': 'MachineStateNotFound',
+                'why': {
+                    'machine_id': 1,
+                    'start': 2500
+                }
+            }, resp.json)
+
+            resp = assert_response_type(
+                client.post(
+                    '/api/v1/extend_machine_state',
+                    json={
+                        "machine_id": 1,
+                        "start": 2000,
+                        "stop": 2500
+                    }))
+            self.assertEqual(400, resp.status_code)
+            self.assertDictEqual({
+                'what': 'ConstraintViolation',
+                'why': 'stop before the current stop'
+            }, resp.json)
+
+    def test_superseded_without_board(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        session = session_factory()
+        session.add(mesito.model.Machine(name='some-machine', version=1))
+        for start, stop in [(1000, 2000), (2000, 3000)]:
+            session.add(
+                mesito.model.MachineState(
+                    machine_id=1, start=start, stop=stop, condition='idle'))
+        session.commit()
+
+        # The database is consulted if the state is not known in memory.
+        machine_state, err = mesito.operation.extend_machine_state(
+            session=session,
+            data={
+                'machine_id': 1,
+                'start': 1000,
+                'stop': 2500
+            },
+            current=None)
+        self.assertIsNone(machine_state)
+        assert err is not None
+        self.assertEqual('MachineStateSuperseded', err['what'])
+
+        machine_state, err = mesito.operation.extend_machine_state(
+            session=session,
+            data={
+                'machine_id': 1,
+                'start': 2000,
+                'stop': 3500
+            },
+            current=None)
+        self.assertIsNone(err)
+        assert machine_state is not None
+        self.assertEqual('idle', machine_state['condition'])
+        self.assertEqual(3500, machine_state['stop'])
+
+        session_factory.remove()
+
+
+class TestJsonCodec(unittest.TestCase):
+    def test_codecs_agree(self) -> None:
+        names = ['json']
+        try:
+            mesito.front.codec.select('orjson')
+            names.append('orjson')
+        except ImportError:
+            pass
+
+        for name in names:
+            engine = sqlalchemy.create_engine('sqlite://')
+            mesito.model.Base.metadata.create_all(engine)
+            session_factory = sqlalchemy.orm.scoped_session(
+                sqlalchemy.orm.sessionmaker(bind=engine))
+
+            app, socketio = mesito.app.produce(
+                session_factory=session_factory,
+                cors_allowed_all_origins=False,
+                json_codec=mesito.front.codec.select(name))
+
+            socketio_client = socketio.test_client(app)
+
+            with app.test_client() as client:
+                resp = assert_response_type(
+                    client.post(
+                        '/api/v1/put_machine', json={'name': 'some-machine'}))
+                self.assertEqual(200, resp.status_code, name)
+                self.assertEqual('application/json', resp.mimetype, name)
+                self.assertDictEqual({"id": 1, "version": 1}, resp.json, name)
+
+                resp = assert_response_type(client.post('/api/v1/machines'))
+                self.assertListEqual([{
+                    "id": 1,
+                    "name": "some-machine",
+                    "version": 1
+                }], resp.json, name)
+
+            received = socketio_client.get_received()
+            self.assertListEqual([{
+                'name':
+                'put_machine',
+                'args': [{
+                    "id": 1,
+                    "name": "some-machine",
+                    "version": 1,
+                    "change_seq": 1
+                }],
+                'namespace':
+                '/'
+            }], received, name)
+
+
+class TestImport(unittest.TestCase):
+    def test_main_does_not_monkey_patch(self) -> None:
+        # Only the entry point patches; the importers of the module, such as
+        # the tests and the tools, keep the standard library intact.
+        completed = subprocess.run([
+            sys.executable, '-c', 'import sys\n'
+            'import mesito.main\n'
+            'import threading\n'
+            'print(threading.get_ident.__module__)\n'
+            'print("gevent.monkey" in sys.modules)\n'
+        ],
+                                   cwd=str(
+                                       pathlib.Path(__file__).parent.parent),
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   timeout=60,
+                                   check=False)
+
+        self.assertEqual(
+            0, completed.returncode, completed.stderr.decode('utf-8'))
+        self.assertEqual(['_thread', 'False'],
+                         completed.stdout.decode('utf-8').split())
+
+
 if __name__ == '__main__':
     unittest.main()
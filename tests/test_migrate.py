@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import contextlib
+import io
+import pathlib
+import tempfile
+import unittest
+
+import sqlalchemy
+
+import mesito.migrate
+import mesito.model
+import mesito.setup
+
+
+class TestMigrate(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        self.assertListEqual(
+            mesito.migrate.MIGRATIONS, mesito.migrate.pending(engine=engine))
+
+        self.assertListEqual([],
+                             mesito.migrate.migrate(engine=engine, target=0))
+
+        applied = mesito.migrate.migrate(engine=engine)
+        self.assertListEqual(mesito.migrate.MIGRATIONS, applied)
+
+        self.assertSetEqual(
+            {migration.version
+             for migration in mesito.migrate.MIGRATIONS},
+            mesito.migrate.applied_versions(engine=engine))
+
+        self.assertListEqual([], mesito.migrate.migrate(engine=engine))
+
+    def test_index_existing_before_the_migration(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        with engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.text(
+                    "CREATE INDEX machine_state_covering "
+                    "ON machine_state (machine_id, start, stop, condition)"))
+
+        self.assertEqual(
+            len(mesito.migrate.MIGRATIONS),
+            len(mesito.migrate.migrate(engine=engine)))
+
+    def test_index_of_other_dialect(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        mesito.migrate.migrate(engine=engine)
+
+        self.assertNotIn(
+            'machine_name_pattern', {
+                index['name']
+                for index in sqlalchemy.inspect(engine).get_indexes('machine')
+            })
+
+    def test_machines_put_before_the_change_sequence(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text("DROP TABLE machine"))
+            connection.execute(
+                sqlalchemy.text(
+                    "CREATE TABLE machine (id INTEGER PRIMARY KEY, "
+                    "name VARCHAR(256) NOT NULL, version INTEGER NOT NULL)"))
+            connection.execute(
+                sqlalchemy.text(
+                    "INSERT INTO machine (name, version) "
+                    "VALUES ('machine-a', 1), ('machine-b', 3)"))
+
+        mesito.migrate.migrate(engine=engine)
+
+        with engine.connect() as connection:
+            self.assertListEqual([(1, 1), (2, 2)], [
+                tuple(row) for row in connection.execute(
+                    sqlalchemy.text(
+                        "SELECT id, change_seq FROM machine ORDER BY id"))
+            ])
+
+            self.assertEqual(
+                2,
+                connection.execute(
+                    sqlalchemy.text(
+                        "SELECT value FROM change_counter")).scalar())
+
+    def test_versions_in_order(self) -> None:
+        self.assertListEqual(
+            list(range(1,
+                       len(mesito.migrate.MIGRATIONS) + 1)),
+            [migration.version for migration in mesito.migrate.MIGRATIONS])
+
+
+class TestSetup(unittest.TestCase):
+    def test_explain(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            database_url = 'sqlite:///{}'.format(
+                pathlib.Path(tmpdir) / 'mesito.sqlite')
+
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                self.assertEqual(
+                    0,
+                    mesito.setup.main(
+                        command_line_args=[
+                            '--database_url', database_url, '--explain'
+                        ]))
+
+            before, after = stdout.getvalue().split(
+                'Query plans after the migration:')
+
+            self.assertIn('overlap:', before)
+            self.assertNotIn('machine_state_covering', before)
+
+            for name in mesito.migrate.hot_queries():
+                self.assertIn('{}:'.format(name), after)
+            self.assertIn('COVERING INDEX machine_state_covering', after)
+
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                self.assertEqual(
+                    0,
+                    mesito.setup.main(
+                        command_line_args=[
+                            '--database_url', database_url, '--list_migrations'
+                        ]))
+
+            self.assertEqual(
+                'version\tname\tapplied\n'
+                '1\tmachine_state_covering\tyes\n'
+                '2\tmachine_change_seq_column\tyes\n'
+                '3\tmachine_change_seq\tyes\n'
+                '4\tmachine_name_pattern\tyes\n', stdout.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import unittest
+from typing import List, Optional
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.front.out
+import mesito.model
+import mesito.recent
+
+
+def state(
+        start: int, stop: int,
+        power: Optional[float] = None) -> mesito.front.out.MachineState:
+    return mesito.front.out.machine_state(
+        machine_id=1,
+        start=start,
+        stop=stop,
+        condition='working',
+        min_power_consumption=None,
+        max_power_consumption=None,
+        avg_power_consumption=power,
+        total_energy=None,
+        pieces=None)
+
+
+def starts(ring: mesito.recent.Ring) -> List[int]:
+    result = ring.ordered()['start'].tolist()  # type: List[int]
+    return result
+
+
+class TestRing(unittest.TestCase):
+    def test_evicts_the_earliest(self) -> None:
+        ring = mesito.recent.Ring(capacity=3)
+        for start in range(0, 50, 10):
+            ring.put(state=state(start=start, stop=start + 10))
+
+        self.assertListEqual([20, 30, 40], starts(ring))
+
+    def test_prolongs(self) -> None:
+        ring = mesito.recent.Ring(capacity=3)
+        ring.put(state=state(start=0, stop=10))
+        ring.put(state=state(start=0, stop=20, power=1.5))
+
+        rows = ring.ordered()
+        self.assertListEqual([20], rows['stop'].tolist())
+        self.assertListEqual([1.5], rows['avg_power'].tolist())
+
+    def test_out_of_order(self) -> None:
+        ring = mesito.recent.Ring(capacity=3)
+        for start in [0, 20, 40, 30]:
+            ring.put(state=state(start=start, stop=start + 5))
+
+        self.assertListEqual([20, 30, 40], starts(ring))
+
+        # Earlier than every state of the full buffer
+        ring.put(state=state(start=10, stop=15))
+        self.assertListEqual([20, 30, 40], starts(ring))
+
+        # Replaced in the middle of the buffer
+        ring.put(state=state(start=30, stop=38, power=2.0))
+        self.assertListEqual([25, 38, 45], ring.ordered()['stop'].tolist())
+
+        # Wraps around before it is rearranged.
+        ring.put(state=state(start=50, stop=55))
+        ring.put(state=state(start=45, stop=50))
+        self.assertListEqual([40, 45, 50], starts(ring))
+
+
+class TestRecentPower(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        session = session_factory()
+        session.add(mesito.model.Machine(name='some-machine', version=1))
+        session.add_all([
+            mesito.model.MachineState(
+                machine_id=1,
+                start=start,
+                stop=start + 10,
+                condition='working',
+                avg_power_consumption=float(start))
+            for start in range(0, 100, 10)
+        ])
+        session.commit()
+        session_factory.remove()
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory,
+            cors_allowed_all_origins=False,
+            recent=mesito.recent.Recent(capacity=5))
+
+        with app.test_client() as client:
+            resp = client.post('/api/v1/recent_power', json={'machine_id': 2})
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([], resp.json['start'])
+
+            # The first read warms the buffer.
+            resp = client.post('/api/v1/recent_power', json={'machine_id': 1})
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([50, 60, 70, 80, 90], resp.json['start'])
+
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': 100,
+                    'stop': 105,
+                    'condition': 'idle'
+                })
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/extend_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': 100,
+                    'stop': 110,
+                    'avg_power_consumption': 3.5
+                })
+            self.assertEqual(200, resp.status_code)
+
+            # The reads must not touch the database.
+            session = session_factory()
+            session.query(mesito.model.MachineState).delete()
+            session.commit()
+            session_factory.remove()
+
+            resp = client.post(
+                '/api/v1/recent_power',
+                json={
+                    'machine_id': 1,
+                    'since': 75,
+                    'limit': 2
+                })
+            self.assertEqual(200, resp.status_code)
+
+            self.assertDictEqual({
+                'machine_id':
+                1,
+                'conditions':
+                mesito.recent.CONDITIONS,
+                'start': [90, 100],
+                'stop': [100, 110],
+                'condition': [
+                    mesito.recent.CONDITIONS.index('working'),
+                    mesito.recent.CONDITIONS.index('idle')
+                ],
+                'min_power': [None, None],
+                'max_power': [None, None],
+                'avg_power': [90.0, 3.5],
+                'energy': [None, None]
+            }, resp.json)
+
+            resp = client.post(
+                '/api/v1/recent_power', json={
+                    'machine_id': 1,
+                    'since': 75
+                })
+            self.assertListEqual([70, 80, 90, 100], resp.json['start'])
+
+            resp = client.post(
+                '/api/v1/recent_power', json={
+                    'machine_id': 1,
+                    'limit': 0
+                })
+            self.assertEqual(400, resp.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
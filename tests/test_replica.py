@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import pathlib
+import shutil
+import tempfile
+import unittest
+from typing import List
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.front.out
+import mesito.model
+import mesito.replica
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1577836800.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def machine_names(resp_json: List[mesito.front.out.Machine]) -> List[str]:
+    return [machine['name'] for machine in resp_json]
+
+
+class TestRouter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+        self.clock = Clock()
+
+        self.primary_pth = pathlib.Path(self.tmpdir.name) / 'primary.sqlite'
+        self.primary = sqlalchemy.create_engine(
+            'sqlite:///{}'.format(self.primary_pth))
+        mesito.model.Base.metadata.create_all(self.primary)
+
+        self.session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=self.primary))
+
+    def replicate(self, name: str) -> sqlalchemy.engine.Engine:
+        """Copy the primary to a file-based replica."""
+        pth = pathlib.Path(self.tmpdir.name) / name
+        shutil.copy(str(self.primary_pth), str(pth))
+
+        engine = sqlalchemy.create_engine('sqlite:///{}'.format(pth))
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def put_machine(self, name: str) -> None:
+        session = self.session_factory()
+        session.add(mesito.model.Machine(name=name, version=1))
+        session.commit()
+        self.session_factory.remove()
+
+    def test_round_robin_and_lag(self) -> None:
+        router = mesito.replica.Router(
+            primary=self.primary,
+            replicas=[],
+            max_lag=5.0,
+            read_your_writes=10.0,
+            check_interval=0.0,
+            clock=self.clock)
+
+        router.beat()
+        self.put_machine(name='machine-a')
+        router.replicas.append(self.replicate('replica-a.sqlite'))
+
+        self.put_machine(name='machine-b')
+        router.replicas.append(self.replicate('replica-b.sqlite'))
+
+        self.put_machine(name='machine-c')
+
+        app, _ = mesito.app.produce(
+            session_factory=self.session_factory,
+            cors_allowed_all_origins=False,
+            router=router)
+
+        with app.test_client() as client:
+            served = []  # type: List[List[str]]
+            for _ in range(4):
+                resp = client.post('/api/v1/machines')
+                self.assertEqual(200, resp.status_code)
+                served.append(machine_names(resp.json))
+
+            expected = [['machine-a'], ['machine-a', 'machine-b']]
+            self.assertListEqual(expected + expected, served)
+
+            # Both replicas lag too much.
+            self.clock.now += 6.0
+            resp = client.post('/api/v1/machines')
+            self.assertListEqual(['machine-a', 'machine-b', 'machine-c'],
+                                 machine_names(resp.json))
+
+    def test_read_your_writes(self) -> None:
+        router = mesito.replica.Router(
+            primary=self.primary,
+            replicas=[],
+            max_lag=5.0,
+            read_your_writes=10.0,
+            clock=self.clock)
+
+        router.beat()
+        router.replicas.append(self.replicate('replica.sqlite'))
+
+        app, _ = mesito.app.produce(
+            session_factory=self.session_factory,
+            cors_allowed_all_origins=False,
+            router=router)
+
+        with app.test_client() as writer, app.test_client() as reader:
+            resp = writer.post(
+                '/api/v1/put_machine', json={'name': 'some-machine'})
+            self.assertEqual(200, resp.status_code)
+
+            resp = writer.post('/api/v1/machines')
+            self.assertListEqual(['some-machine'], machine_names(resp.json))
+
+            resp = reader.post('/api/v1/machines')
+            self.assertListEqual([], machine_names(resp.json))
+
+            # The writer reads from the replica again once the window passed.
+            self.clock.now += 11.0
+            router.beat()
+            router.replicas[0] = self.replicate('replica.sqlite')
+            self.put_machine(name='unreplicated-machine')
+
+            resp = writer.post('/api/v1/machines')
+            self.assertListEqual(['some-machine'], machine_names(resp.json))
+
+    def test_unavailable_replica(self) -> None:
+        router = mesito.replica.Router(
+            primary=self.primary,
+            replicas=[
+                sqlalchemy.create_engine(
+                    'sqlite:///{}'.format(
+                        pathlib.Path(self.tmpdir.name) / 'missing.sqlite'))
+            ],
+            max_lag=5.0,
+            read_your_writes=10.0,
+            clock=self.clock)
+
+        router.beat()
+
+        self.assertIsNone(router.lag(index=0))
+        self.assertIs(self.primary, router.pick())
+
+
+if __name__ == '__main__':
+    unittest.main()
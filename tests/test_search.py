@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import unittest
+from typing import Any, Dict, List, Tuple
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.model
+import mesito.search
+
+NAMES = [
+    'press-10', 'press-2', 'Press-3', 'lathe 50%', 'lathe_7', 'mill-press',
+    'press-2'
+]  # type: List[str]
+
+
+class TestSearchMachines(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(self.engine)
+        self.session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=self.engine))
+
+    def put_machines(self, client: Any) -> None:
+        resp = client.post(
+            '/api/v1/put_machines', json=[{
+                'name': name
+            } for name in NAMES])
+        self.assertEqual(200, resp.status_code)
+
+    def check_search(self, with_index: bool) -> None:
+        if with_index:
+            mesito.search.create_index(self.engine)
+
+        app, _ = mesito.app.produce(
+            session_factory=self.session_factory,
+            cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            self.put_machines(client=client)
+
+            resp = client.post(
+                '/api/v1/search_machines', json={'prefix': 'press-'})
+            self.assertEqual(200, resp.status_code)
+            self.assertListEqual([(1, 'press-10'), (2, 'press-2'),
+                                  (7, 'press-2')],
+                                 [(machine['id'], machine['name'])
+                                  for machine in resp.json])
+
+            resp = client.post(
+                '/api/v1/search_machines',
+                json={
+                    'prefix': 'press-',
+                    'limit': 2
+                })
+            self.assertListEqual(['press-10', 'press-2'],
+                                 [machine['name'] for machine in resp.json])
+
+            resp = client.post(
+                '/api/v1/search_machines', json={'substring': 'PRESS'})
+            self.assertListEqual(
+                ['Press-3', 'mill-press', 'press-10', 'press-2', 'press-2'],
+                [machine['name'] for machine in resp.json])
+
+            # Shorter than a trigram
+            resp = client.post(
+                '/api/v1/search_machines', json={'substring': '-1'})
+            self.assertListEqual(['press-10'],
+                                 [machine['name'] for machine in resp.json])
+
+            # Wildcards are matched literally.
+            resp = client.post(
+                '/api/v1/search_machines', json={'substring': '_'})
+            self.assertListEqual(['lathe_7'],
+                                 [machine['name'] for machine in resp.json])
+
+            resp = client.post(
+                '/api/v1/search_machines', json={'substring': 'e 50%'})
+            self.assertListEqual(['lathe 50%'],
+                                 [machine['name'] for machine in resp.json])
+
+            # Renamed machines are found by the new name.
+            resp = client.post(
+                '/api/v1/put_machine', json={
+                    'id': 6,
+                    'name': 'mill-6'
+                })
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/search_machines', json={'substring': 'ill-'})
+            self.assertListEqual(['mill-6'],
+                                 [machine['name'] for machine in resp.json])
+
+    def test_without_index(self) -> None:
+        self.check_search(with_index=False)
+
+    def test_with_index(self) -> None:
+        self.check_search(with_index=True)
+
+        session = self.session_factory()
+        try:
+            self.assertTrue(mesito.search.has_fts(session=session))
+        finally:
+            self.session_factory.remove()
+
+    def test_invalid(self) -> None:
+        app, _ = mesito.app.produce(
+            session_factory=self.session_factory,
+            cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/search_machines',
+                json={
+                    'prefix': 'press',
+                    'substring': 'press'
+                })
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('ConstraintViolation', resp.json['what'])
+
+            resp = client.post('/api/v1/search_machines', json={'limit': 1})
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('ConstraintViolation', resp.json['what'])
+
+            resp = client.post('/api/v1/search_machines', json={'prefix': ''})
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('SchemaViolation', resp.json['what'])
+
+    def test_keyset_pagination(self) -> None:
+        app, _ = mesito.app.produce(
+            session_factory=self.session_factory,
+            cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            self.put_machines(client=client)
+
+            resp = client.post('/api/v1/machines')
+            self.assertEqual(200, resp.status_code)
+            expected = [(machine['id'], machine['name'])
+                        for machine in resp.json]
+            self.assertEqual(len(NAMES), len(expected))
+
+            pages = []  # type: List[List[Tuple[int, str]]]
+            request = {'limit': 3}  # type: Dict[str, Any]
+            while True:
+                resp = client.post('/api/v1/machines', json=request)
+                self.assertEqual(200, resp.status_code)
+
+                page = [(machine['id'], machine['name'])
+                        for machine in resp.json]
+                if not page:
+                    break
+
+                pages.append(page)
+                request['after'] = {'id': page[-1][0], 'name': page[-1][1]}
+
+            self.assertListEqual([3, 3, 1], [len(page) for page in pages])
+            self.assertListEqual(
+                expected, [machine for page in pages for machine in page])
+
+            # The duplicate names are ordered by ID.
+            self.assertListEqual(
+                [(2, 'press-2'), (7, 'press-2')],
+                [machine for machine in expected if machine[1] == 'press-2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import pathlib
+import tempfile
+import unittest
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.model
+import mesito.shift
+
+# Monday, 2020-01-06 00:00:00 UTC
+MONDAY = 1578268800
+
+HOUR = 3600
+
+
+class TestCalendar(unittest.TestCase):
+    def test_parse(self) -> None:
+        calendar = mesito.shift.parse(
+            data={
+                'utc_offset':
+                HOUR,
+                'shifts': [{
+                    'name': 'day',
+                    'start': '06:00',
+                    'stop': '18:00'
+                }, {
+                    'name': 'night',
+                    'start': '18:00',
+                    'stop': '06:00',
+                    'weekdays': [0]
+                }]
+            })
+
+        instances = calendar.instances(start=MONDAY, stop=MONDAY + 48 * HOUR)
+
+        # The local midnight is at 23:00 UTC of the previous day.
+        self.assertListEqual([('day', MONDAY + 5 * HOUR, MONDAY + 17 * HOUR),
+                              ('night', MONDAY + 17 * HOUR, MONDAY + 29 * HOUR),
+                              ('day', MONDAY + 29 * HOUR, MONDAY + 41 * HOUR)],
+                             [(instance.name, instance.start, instance.stop)
+                              for instance in instances])
+
+    def test_load_invalid(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pth = pathlib.Path(tmpdir) / 'calendar.json'
+            pth.write_text(
+                '{"shifts": [{"name": "day", "start": "6:00", '
+                '"stop": "18:00"}]}')
+
+            with self.assertRaises(ValueError):
+                mesito.shift.load(path=pth)
+
+
+class TestShiftReport(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory, cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            for name in ['machine-a', 'machine-b']:
+                resp = client.post('/api/v1/put_machine', json={'name': name})
+                self.assertEqual(200, resp.status_code)
+
+            # Crosses the change from the early to the late shift
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': MONDAY + 13 * HOUR,
+                    'stop': MONDAY + 15 * HOUR,
+                    'condition': 'working',
+                    'pieces': 20
+                })
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json={
+                    'machine_id': 1,
+                    'start': MONDAY + 15 * HOUR,
+                    'stop': MONDAY + 16 * HOUR,
+                    'condition': 'idle'
+                })
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/put_machine_state',
+                json={
+                    'machine_id': 2,
+                    'start': MONDAY + 7 * HOUR,
+                    'stop': MONDAY + 8 * HOUR,
+                    'condition': 'working',
+                    'pieces': 5
+                })
+            self.assertEqual(200, resp.status_code)
+
+            resp = client.post(
+                '/api/v1/machine_states',
+                json={
+                    'machine_id': 1,
+                    'start': MONDAY,
+                    'stop': MONDAY + 24 * HOUR
+                })
+            self.assertEqual(20, resp.json[0]['pieces'])
+
+            resp = client.post(
+                '/api/v1/shift_report',
+                json={
+                    'start': MONDAY,
+                    'stop': MONDAY + 24 * HOUR
+                })
+            self.assertEqual(200, resp.status_code)
+
+            self.assertListEqual(
+                [('night', MONDAY, MONDAY + 6 * HOUR),
+                 ('early', MONDAY + 6 * HOUR, MONDAY + 14 * HOUR),
+                 ('late', MONDAY + 14 * HOUR, MONDAY + 22 * HOUR),
+                 ('night', MONDAY + 22 * HOUR, MONDAY + 24 * HOUR)],
+                [(shift['name'], shift['start'], shift['stop'])
+                 for shift in resp.json['shifts']])
+
+            self.assertListEqual(
+                ['shift', 'machine_id', 'condition', 'duration', 'pieces'],
+                resp.json['columns'])
+
+            self.assertListEqual(
+                [[1, 1, 'working', HOUR, 0], [1, 2, 'working', HOUR, 5],
+                 [2, 1, 'idle', HOUR, 0], [2, 1, 'working', HOUR, 20]],
+                resp.json['rows'])
+
+            resp = client.post(
+                '/api/v1/shift_report',
+                json={
+                    'start': MONDAY,
+                    'stop': MONDAY + 24 * HOUR,
+                    'machine_ids': [2]
+                })
+            self.assertListEqual([[1, 2, 'working', HOUR, 5]],
+                                 resp.json['rows'])
+
+            resp = client.post(
+                '/api/v1/shift_report',
+                json={
+                    'start': MONDAY,
+                    'stop': MONDAY + 365 * 24 * HOUR
+                })
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('ConstraintViolation', resp.json['what'])
+
+
+if __name__ == '__main__':
+    unittest.main()
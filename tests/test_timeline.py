@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring
+import random
+import unittest
+from typing import List
+
+import sqlalchemy
+import sqlalchemy.orm
+
+import mesito.app
+import mesito.model
+import mesito.timeline
+
+
+class TestDecimate(unittest.TestCase):
+    def test_bounded_and_complete(self) -> None:
+        rng = random.Random(0)
+
+        intervals = []  # type: List[mesito.timeline.Interval]
+        stop = 0
+        for _ in range(10000):
+            start = stop + rng.choice([0, 0, 0, 3])
+            stop = start + rng.choice([1, 2, 5, 500])
+            intervals.append(
+                (start, stop, rng.choice(['working', 'idle', 'off'])))
+
+        buckets = 100
+        segments = mesito.timeline.decimate(
+            intervals=intervals, start=0, stop=stop, buckets=buckets)
+
+        self.assertLessEqual(len(segments), 2 * buckets)
+
+        covered = sum(
+            interval_stop - interval_start
+            for interval_start, interval_stop, _ in intervals)
+
+        decimated = sum((segment['stop'] - segment['start']) *
+                        sum(segment['fractions'].values())
+                        for segment in segments)
+
+        self.assertAlmostEqual(1.0, decimated / covered, places=2)
+
+        for previous, segment in zip(segments, segments[1:]):
+            self.assertLessEqual(previous['stop'], segment['start'])
+
+    def test_wide_states_kept(self) -> None:
+        segments = mesito.timeline.decimate(
+            intervals=[(0, 50, 'working'), (50, 100, 'working'),
+                       (100, 200, 'idle')],
+            start=0,
+            stop=200,
+            buckets=10)
+
+        self.assertListEqual(
+            [(0, 100, 'working'), (100, 200, 'idle')],
+            [(segment['start'], segment['stop'], segment['condition'])
+             for segment in segments])
+
+        self.assertListEqual([{
+            'working': 1.0
+        }, {
+            'idle': 1.0
+        }], [segment['fractions'] for segment in segments])
+
+
+class TestMachineTimeline(unittest.TestCase):
+    def test_that_it_works(self) -> None:
+        engine = sqlalchemy.create_engine('sqlite://')
+        mesito.model.Base.metadata.create_all(engine)
+
+        session_factory = sqlalchemy.orm.scoped_session(
+            sqlalchemy.orm.sessionmaker(bind=engine))
+
+        session = session_factory()
+        session.add(mesito.model.Machine(name='some-machine', version=1))
+        session.add_all([
+            mesito.model.MachineState(
+                machine_id=1,
+                start=start,
+                stop=start + 10,
+                condition='working' if start % 30 else 'idle')
+            for start in range(0, 6000, 10)
+        ])
+        session.commit()
+        session_factory.remove()
+
+        app, _ = mesito.app.produce(
+            session_factory=session_factory, cors_allowed_all_origins=False)
+
+        with app.test_client() as client:
+            resp = client.post(
+                '/api/v1/machine_timeline',
+                json={
+                    'machine_id': 1,
+                    'start': 0,
+                    'stop': 6000,
+                    'buckets': 60
+                })
+            self.assertEqual(200, resp.status_code)
+
+            self.assertEqual(60, len(resp.json))
+            self.assertDictEqual({
+                'start': 0,
+                'stop': 100,
+                'condition': 'working',
+                'fractions': {
+                    'idle': 0.4,
+                    'working': 0.6
+                }
+            }, resp.json[0])
+
+            resp = client.post(
+                '/api/v1/machine_timeline',
+                json={
+                    'machine_id': 1,
+                    'start': 0,
+                    'stop': 6000,
+                    'buckets': 0
+                })
+            self.assertEqual(400, resp.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
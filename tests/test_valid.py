@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# pylint: disable=missing-docstring,protected-access
+import pathlib
+import sys
+import tempfile
+import unittest
+
+import fastjsonschema
+
+import mesito.front.valid
+
+
+class TestGeneratedValidators(unittest.TestCase):
+    def test_generated_code_is_imported(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            package = 'mesito_test_generated'
+            paths = mesito.front.valid.generate(
+                directory=pathlib.Path(tmpdir) / package)
+
+            self.assertIn(
+                pathlib.Path(tmpdir) / package / 'machine_put.py', paths)
+
+            sys.path.insert(0, tmpdir)
+            try:
+                validate = mesito.front.valid._load(
+                    name='machine_put',
+                    definition=mesito.front.valid._machine_put.definition,
+                    package=package)
+
+                self.assertEqual(
+                    '{}.machine_put'.format(package), validate.__module__)
+
+                self.assertEqual({'name': 'x'}, validate({'name': 'x'}))
+                with self.assertRaises(fastjsonschema.JsonSchemaException):
+                    validate({})
+
+                # A module generated for another schema is not trusted.
+                validate = mesito.front.valid._load(
+                    name='machine_put',
+                    definition={
+                        'type': 'object',
+                        'required': ['id']
+                    },
+                    package=package)
+
+                self.assertNotEqual(
+                    '{}.machine_put'.format(package), validate.__module__)
+                with self.assertRaises(fastjsonschema.JsonSchemaException):
+                    validate({'name': 'x'})
+            finally:
+                sys.path.remove(tmpdir)
+                for name in list(sys.modules):
+                    if name.startswith(package):
+                        del sys.modules[name]
+
+    def test_compiled_in_memory_without_generated_code(self) -> None:
+        validate = mesito.front.valid._load(
+            name='some_schema',
+            definition={
+                'type': 'object',
+                'required': ['name']
+            },
+            package='mesito_nonexisting_package')
+
+        self.assertEqual({'name': 'x'}, validate({'name': 'x'}))
+        with self.assertRaises(fastjsonschema.JsonSchemaException):
+            validate({})
+
+
+if __name__ == '__main__':
+    unittest.main()